@@ -0,0 +1,95 @@
+"""
+Benchmark del arranque en frío de la aplicación.
+
+Cada medición corre en un proceso nuevo: el tiempo de importar src.vista.APP
+(con el desglose de python -X importtime para los módulos más caros) y el tiempo
+hasta que la ventana de login está dibujada, si hay un display disponible.
+
+    python -m benchmarks.bench_arranque --repeticiones 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORTAR = """
+import time
+inicio = time.perf_counter()
+import src.vista.APP
+print(time.perf_counter() - inicio)
+"""
+
+PRIMERA_VENTANA = """
+import time
+inicio = time.perf_counter()
+import tkinter as tk
+from src.vista import APP
+root = tk.Tk()
+APP.trabajador = APP.TrabajadorBD(APP.contexto.engine)
+APP.trabajador.enviar(lambda session: APP.contexto.preparar_esquema())
+APP.LoginWindow(root)
+root.update()
+print(time.perf_counter() - inicio)
+APP.trabajador.detener()
+root.destroy()
+"""
+
+
+def _ejecutar(codigo, directorio, *opciones):
+    """Ejecuta el código en un intérprete nuevo desde un directorio vacío, como un primer arranque"""
+    entorno = {**os.environ, "PYTHONPATH": RAIZ, "PASSKEEPER_DB_URL": f"sqlite:///{directorio}/arranque.db"}
+    return subprocess.run([sys.executable, *opciones, "-c", codigo], cwd=directorio, env=entorno,
+                          capture_output=True, text=True)
+
+
+def _importtime(directorio, cantidad):
+    """Los módulos que importa directamente src.vista.APP, por tiempo acumulado según -X importtime"""
+    salida = _ejecutar("import src.vista.APP", directorio, "-X", "importtime").stderr
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        # Un espacio de sangría por el separador y dos por cada nivel de importación
+        if nombre.startswith("   ") and not nombre.startswith("    "):
+            modulos.append((int(acumulado), nombre.strip()))
+    return sorted(modulos, reverse=True)[:cantidad]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--modulos", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        tiempos = []
+        for _ in range(args.repeticiones):
+            resultado = _ejecutar(IMPORTAR, directorio)
+            if resultado.returncode:
+                sys.exit(resultado.stderr)
+            tiempos.append(float(resultado.stdout) * 1000)
+        print(f"importar src.vista.APP: {statistics.median(tiempos):7.1f} ms (mediana de {args.repeticiones})")
+        print(f"base de datos creada al importar: {'sí' if os.path.exists(os.path.join(directorio, 'arranque.db')) else 'no'}")
+
+        print("importados por src.vista.APP (acumulado, -X importtime):")
+        for acumulado, nombre in _importtime(directorio, args.modulos):
+            print(f"  {acumulado / 1000:7.1f} ms  {nombre}")
+
+        tiempos = []
+        for _ in range(args.repeticiones):
+            resultado = _ejecutar(PRIMERA_VENTANA, directorio)
+            if resultado.returncode:
+                print(f"primera ventana: no medida ({resultado.stderr.strip().splitlines()[-1]})")
+                break
+            tiempos.append(float(resultado.stdout) * 1000)
+        else:
+            print(f"hasta la primera ventana: {statistics.median(tiempos):7.1f} ms (mediana de {args.repeticiones})")
+
+
+if __name__ == "__main__":
+    main()
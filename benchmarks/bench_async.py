@@ -0,0 +1,104 @@
+"""
+Benchmark de latencia del CRUD asíncrono con clientes concurrentes.
+
+Cada cliente simulado es una tarea de asyncio que repite pedidos, cada uno con su
+AsyncSession: una página del listado, una búsqueda y revelar una contraseña, o un
+inicio de sesión (scrypt fuera del bucle de eventos). Para 1, 10 y 100 clientes a
+la vez se informa la latencia por pedido (p50, p95, p99) y los pedidos por segundo.
+
+    python -m benchmarks.bench_async --filas 10000 --pedidos 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine
+from benchmarks.generador import crear_base_sintetica
+from src.config import crear_engine_async
+from src.logica.CRUD_async import UsuarioCRUDAsync, ContraseniacrudAsync, crear_sessionmaker
+from src.logica.boveda import Llavero
+from src.logica.seguridad import Hasheador
+from src.modelo.migraciones import actualizar_esquema
+
+TEXTOS = ["git", "mail", "banco", "sistema 12", "slack", "zoom"]
+
+
+def _percentiles(latencias):
+    cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+    return cortes[49] * 1000, cortes[94] * 1000, cortes[98] * 1000
+
+
+async def _consultar(Session, llavero, id_usuario, aleatorio):
+    async with Session() as session:
+        crud = ContraseniacrudAsync(session, llavero=llavero)
+        pagina, _ = await crud.listar_pagina(id_usuario, tamanio_pagina=50)
+        await crud.buscar(id_usuario, aleatorio.choice(TEXTOS))
+        await crud.revelar_contrasenia(aleatorio.choice(pagina).id_contrasenia)
+
+
+async def _iniciar_sesion(Session, llavero, hasheador):
+    async with Session() as session:
+        assert await UsuarioCRUDAsync(session, hasheador=hasheador, llavero=llavero).iniciar_sesion(
+            "bench@example.com", "x") is not None
+
+
+async def _escenario(pedido, clientes, pedidos):
+    latencias = []
+
+    async def cliente(numero):
+        aleatorio = random.Random(numero)
+        for _ in range(pedidos // clientes):
+            inicio = time.perf_counter()
+            await pedido(aleatorio)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(numero) for numero in range(clientes)))
+    return latencias, len(latencias) / (time.perf_counter() - inicio)
+
+
+async def _medir(ruta, id_usuario, args):
+    engine = crear_engine_async(url=f"sqlite:///{ruta}", pool="QueuePool", pool_size=args.conexiones, max_overflow=0)
+    Session = crear_sessionmaker(engine)
+    llavero = Llavero()
+    hasheador = Hasheador()
+    # El primer inicio de sesión guarda el hash con scrypt y deja la bóveda abierta
+    await _iniciar_sesion(Session, llavero, hasheador)
+    escenarios = {
+        "consultas": (lambda aleatorio: _consultar(Session, llavero, id_usuario, aleatorio), args.pedidos),
+        "inicios de sesión": (lambda aleatorio: _iniciar_sesion(Session, llavero, hasheador), args.logins),
+    }
+
+    print(f"{'escenario':<18} {'clientes':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'pedidos/s':>10}")
+    for nombre, (pedido, pedidos) in escenarios.items():
+        for clientes in args.clientes:
+            latencias, por_segundo = await _escenario(pedido, clientes, max(pedidos, clientes))
+            p50, p95, p99 = _percentiles(latencias)
+            print(f"{nombre:<18} {clientes:>8} {p50:>6.1f} ms {p95:>6.1f} ms {p99:>6.1f} ms {por_segundo:>10.0f}")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--pedidos", type=int, default=2000, help="pedidos de consulta por nivel de concurrencia")
+    parser.add_argument("--logins", type=int, default=200, help="inicios de sesión por nivel de concurrencia")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--conexiones", type=int, default=8, help="tamaño del pool de conexiones")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        engine.dispose()
+        print(f"{args.filas} filas, pool de {args.conexiones} conexiones")
+        asyncio.run(_medir(ruta, id_usuario, args))
+
+
+if __name__ == "__main__":
+    main()
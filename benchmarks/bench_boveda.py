@@ -0,0 +1,88 @@
+"""
+Benchmark del cifrado de la bóveda.
+
+Mide la derivación de la clave (una vez por inicio de sesión), cuántas contraseñas
+por segundo se sellan y se abren, y la carga de la primera página del listado
+con las contraseñas selladas: tal como la hace la ventana (sin descifrar, con la
+máscara) y, para comparar, descifrando cada fila al cargarla.
+
+    python -m benchmarks.bench_boveda --filas 50000 --operaciones 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import Contraseniacrud
+from src.logica.boveda import Llavero, derivar_clave, nueva_sal
+from src.modelo.migraciones import actualizar_esquema
+from src.vista.tabla import valores_fila
+
+
+def _medir(funcion, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=50_000)
+    parser.add_argument("--operaciones", type=int, default=20_000)
+    parser.add_argument("--tamanio-pagina", type=int, default=200)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    sal = nueva_sal()
+    print(f"derivar la clave (scrypt {sal.split('$')[0]}): {_medir(lambda: derivar_clave('maestra', sal), 3):8.1f} ms")
+
+    llavero = Llavero()
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        Session = sessionmaker(bind=engine)
+        boveda = llavero.desbloquear(id_usuario, "maestra", sal)
+
+        textos = [f"secreto-{i:016x}" for i in range(args.operaciones)]
+        inicio = time.perf_counter()
+        sellados = [boveda.sellar(texto, id_usuario) for texto in textos]
+        sellar = args.operaciones / (time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        for sellado in sellados:
+            boveda.abrir(sellado, id_usuario)
+        abrir = args.operaciones / (time.perf_counter() - inicio)
+        print(f"sellar: {sellar:10.0f}/s   abrir: {abrir:10.0f}/s")
+
+        with Session() as session:
+            inicio = time.perf_counter()
+            Contraseniacrud(session, llavero=llavero).sellar_pendientes(id_usuario)
+            print(f"sellar la bóveda existente ({args.filas} filas): {(time.perf_counter() - inicio) * 1000:8.1f} ms")
+
+        def primera_pagina(descifrar):
+            session = Session()
+            try:
+                crud = Contraseniacrud(session, llavero=llavero)
+                contrasenias, _ = crud.listar_pagina(id_usuario, tamanio_pagina=args.tamanio_pagina)
+                filas = [valores_fila(c) for c in contrasenias]
+                if descifrar:
+                    [crud.descifrar(id_usuario, c.contrasenia_encriptada) for c in contrasenias]
+                return filas
+            finally:
+                session.close()
+
+        perezosa = _medir(lambda: primera_pagina(False), args.repeticiones)
+        ansiosa = _medir(lambda: primera_pagina(True), args.repeticiones)
+        print(f"primera página ({args.tamanio_pagina} filas), sin descifrar: {perezosa:8.2f} ms")
+        print(f"primera página ({args.tamanio_pagina} filas), descifrando:   {ansiosa:8.2f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark de Contraseniacrud.buscar sobre el índice FTS5.
+
+    python -m benchmarks.bench_busqueda --filas 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import Contraseniacrud
+from src.modelo.migraciones import actualizar_esquema
+
+# Lo que llega a buscar() mientras se teclea, de la primera letra a la consulta completa
+CONSULTAS = ["g", "gi", "git", "github", "banco nac", "sis", "sistema 12", "ana1", "compartida", "example", "inexistente"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        session = sessionmaker(bind=engine)()
+        crud = Contraseniacrud(session)
+
+        print(f"{args.filas} filas")
+        for consulta in CONSULTAS:
+            tiempos = []
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                resultados = crud.buscar(id_usuario, consulta)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                session.expunge_all()
+            print(f"{consulta!r:>16}: mediana {statistics.median(tiempos):6.2f} ms  máx {max(tiempos):6.2f} ms"
+                  f"  ({len(resultados)} resultados)")
+
+
+if __name__ == "__main__":
+    main()
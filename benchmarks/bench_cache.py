@@ -0,0 +1,79 @@
+"""
+Benchmark de las lecturas por clave del CRUD con y sin CacheEntidades.
+
+Repite get_usuario_by_id, get_usuario_by_email, get_etiqueta y get_sesion sobre
+un conjunto de claves con reparto sesgado, como el de una aplicación real.
+
+    python -m benchmarks.bench_cache --lecturas 5000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.logica.CRUD import UsuarioCRUD, EtiquetaCRUD, SesionCRUD
+from src.logica.cache import CacheEntidades
+from src.logica.seguridad import Hasheador
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _sembrar(session, usuarios, etiquetas):
+    # El coste del hash no es lo que se mide aquí
+    usuario_crud = UsuarioCRUD(session, hasheador=Hasheador(n=2 ** 4))
+    etiqueta_crud, sesion_crud = EtiquetaCRUD(session), SesionCRUD(session)
+    ids_usuarios = [usuario_crud.create_usuario(f"u{i}", f"u{i}@example.com", "x", "user").id_usuario
+                    for i in range(usuarios)]
+    ids_etiquetas = [etiqueta_crud.create_etiqueta(f"etiqueta{i}").id_etiqueta for i in range(etiquetas)]
+    ids_sesiones = [sesion_crud.create_sesion(id_usuario, "127.0.0.1").id_sesion for id_usuario in ids_usuarios]
+    return ids_usuarios, ids_etiquetas, ids_sesiones
+
+
+def _lecturas(session, cache, claves):
+    usuario_crud = UsuarioCRUD(session, cache=cache)
+    etiqueta_crud = EtiquetaCRUD(session, cache=cache)
+    sesion_crud = SesionCRUD(session, cache=cache)
+    inicio = time.perf_counter()
+    for id_usuario, id_etiqueta, id_sesion in claves:
+        usuario_crud.get_usuario_by_id(id_usuario)
+        usuario_crud.get_usuario_by_email(f"u{id_usuario - 1}@example.com")
+        etiqueta_crud.get_etiqueta(id_etiqueta)
+        sesion_crud.get_sesion(id_sesion)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lecturas", type=int, default=5_000)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--etiquetas", type=int, default=200)
+    parser.add_argument("--capacidad", type=int, default=1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = create_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}")
+        actualizar_esquema(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as session:
+            ids_usuarios, ids_etiquetas, ids_sesiones = _sembrar(session, args.usuarios, args.etiquetas)
+
+        # Reparto de Pareto: pocas claves concentran la mayoría de las lecturas
+        aleatorio = random.Random(1234)
+        def elegir(ids):
+            return ids[min(int(aleatorio.paretovariate(1.2)) - 1, len(ids) - 1)]
+        claves = [(elegir(ids_usuarios), elegir(ids_etiquetas), elegir(ids_sesiones)) for _ in range(args.lecturas)]
+
+        resultados = {}
+        for nombre, cache in (("sin caché", None), ("con caché", CacheEntidades(capacidad=args.capacidad))):
+            # Sesión nueva sin mapa de identidad poblado, como en cada trabajo del TrabajadorBD
+            with Session() as session:
+                resultados[nombre] = _lecturas(session, cache, claves)
+            print(f"{nombre:<10} {resultados[nombre] * 1000:8.1f} ms ({args.lecturas * 4} lecturas)")
+            if cache is not None:
+                print(f"           {cache.estadisticas()}")
+        print(f"aceleración x{resultados['sin caché'] / resultados['con caché']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark de la exportación en streaming.
+
+Para cada tamaño siembra una base temporal y exporta la bóveda en un proceso
+hijo, de modo que el pico de memoria (ru_maxrss) medido sea solo el de la
+exportación. Con --materializar el hijo carga antes todas las entidades con
+obtener_contrasenias_usuario, como referencia.
+
+    python -m benchmarks.bench_exportacion --filas 100000 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _exportar(ruta, id_usuario, formato, materializar):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from src.logica.CRUD import Contraseniacrud
+    from src.logica.exportador import exportar_archivo
+
+    session = sessionmaker(bind=create_engine(f"sqlite:///{ruta}"))()
+    crud = Contraseniacrud(session)
+    inicio = time.perf_counter()
+    if materializar:
+        crud.obtener_contrasenias_usuario(id_usuario)
+    with open(os.devnull, "w", newline="") as destino:
+        total = exportar_archivo(crud, id_usuario, destino, formato=formato)
+    segundos = time.perf_counter() - inicio
+    # En Linux ru_maxrss se expresa en KiB
+    pico_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"filas": total, "segundos": round(segundos, 3), "pico_rss_mib": round(pico_mib, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--formato", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--materializar", action="store_true")
+    parser.add_argument("--hijo", nargs=2, metavar=("RUTA", "ID_USUARIO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        _exportar(args.hijo[0], int(args.hijo[1]), args.formato, args.materializar)
+        return
+
+    from benchmarks.generador import crear_base_sintetica
+
+    for filas in args.filas:
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "bench.db")
+            id_usuario = crear_base_sintetica(ruta, contrasenias=filas)
+            comando = [sys.executable, "-m", "benchmarks.bench_exportacion", "--formato", args.formato,
+                       "--hijo", ruta, str(id_usuario)]
+            if args.materializar:
+                comando.append("--materializar")
+            salida = subprocess.run(comando, check=True, capture_output=True, text=True)
+            resultado = json.loads(salida.stdout.strip().splitlines()[-1])
+            print(f"{filas:>9} filas  {resultado['segundos']:>8.2f} s  pico RSS {resultado['pico_rss_mib']:>8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark de las facetas de etiquetas (EtiquetaCRUD.contar_etiquetas).
+
+Compara la agregación en el momento sobre contrasenia_etiqueta con la lectura
+de la tabla conteo_etiquetas que mantienen los triggers.
+
+    python -m benchmarks.bench_facetas --filas 100000 --etiquetas 500
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import EtiquetaCRUD
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--etiquetas", type=int, default=500)
+    parser.add_argument("--etiquetas-por-contrasenia", type=int, default=3)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas, etiquetas=args.etiquetas,
+                                          etiquetas_por_contrasenia=args.etiquetas_por_contrasenia)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        session = sessionmaker(bind=engine)()
+        crud = EtiquetaCRUD(session)
+
+        materializadas = crud.contar_etiquetas(id_usuario)
+        agregadas = crud.contar_etiquetas(id_usuario, materializado=False)
+        assert [tuple(f) for f in materializadas] == [tuple(f) for f in agregadas]
+
+        print(f"{args.filas} contraseñas, {len(materializadas)} etiquetas con uso")
+        for nombre, materializado in (("agregación", False), ("conteo_etiquetas", True)):
+            mediana = _medir(lambda: crud.contar_etiquetas(id_usuario, materializado), args.repeticiones)
+            print(f"{nombre:<18} {mediana:8.2f} ms (mediana)")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
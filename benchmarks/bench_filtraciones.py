@@ -0,0 +1,84 @@
+"""
+Benchmark de la comprobación de contraseñas filtradas contra un corpus mapeado en memoria.
+
+Genera un corpus SHA-1 de --hashes hashes con benchmarks.generador.crear_corpus_filtraciones
+y mide:
+
+- búsquedas sueltas (CorpusFiltraciones.veces), en una primera pasada con las cachés
+  vacías y en una segunda, y cuántas páginas finales lee cada una del mapa;
+- Contraseniacrud.revisar_filtraciones sobre una bóveda sellada de --filas entradas, con
+  1 hilo y con --hilos hilos, en entradas por segundo.
+
+La búsqueda es binaria, así que un corpus real de decenas de GB solo suma unos pocos
+pasos por contraseña (uno cada vez que el corpus duplica su tamaño).
+
+    python -m benchmarks.bench_filtraciones --hashes 5000000 --filas 20000 --hilos 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_boveda_sintetica, crear_corpus_filtraciones
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import Llavero
+from src.logica.filtraciones import TAMANIO_PAGINA, CorpusFiltraciones
+
+
+def _buscar(corpus, textos):
+    """(búsquedas por segundo, páginas leídas del mapa por búsqueda)"""
+    lecturas = corpus.lecturas
+    inicio = time.perf_counter()
+    for texto in textos:
+        corpus.veces(texto)
+    segundos = time.perf_counter() - inicio
+    return len(textos) / segundos, (corpus.lecturas - lecturas) / len(textos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashes", type=int, default=2_000_000, help="hashes del corpus generado")
+    parser.add_argument("--busquedas", type=int, default=20_000)
+    parser.add_argument("--filas", type=int, default=20_000, help="entradas de la bóveda revisada")
+    parser.add_argument("--hilos", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_corpus = os.path.join(directorio, "corpus-sha1.txt")
+        inicio = time.perf_counter()
+        tamanio = crear_corpus_filtraciones(ruta_corpus, hashes=args.hashes)
+        print(f"corpus: {args.hashes} hashes, {tamanio / 2 ** 20:.0f} MB, {tamanio // TAMANIO_PAGINA} páginas "
+              f"(generado en {time.perf_counter() - inicio:.1f} s)")
+
+        aleatorio = random.Random(1)
+        # Una de cada veinte está en el corpus, como las contraseñas comunes de una bóveda
+        textos = [f"comun{aleatorio.randrange(200)}" if i % 20 == 0 else f"secreto-{aleatorio.getrandbits(64):016x}"
+                  for i in range(args.busquedas)]
+        with CorpusFiltraciones(ruta_corpus) as corpus:
+            for pasada in ("primera", "segunda"):
+                por_segundo, paginas = _buscar(corpus, textos)
+                print(f"búsquedas, {pasada} pasada  {por_segundo:10.0f} /s  {paginas:5.2f} páginas leídas por búsqueda")
+
+            ruta = os.path.join(directorio, "bench.db")
+            (id_usuario,) = crear_boveda_sintetica(ruta, usuarios=1, entradas_por_usuario=args.filas, etiquetas=0,
+                                                   sesiones_por_usuario=0, reutilizadas=0.05)
+            engine = create_engine(f"sqlite:///{ruta}")
+            session = sessionmaker(bind=engine)()
+            llavero = Llavero()
+            # El usuario del generador tiene la contraseña "x" en claro, como en versiones anteriores
+            UsuarioCRUD(session, llavero=llavero).iniciar_sesion(f"usuario{id_usuario}@example.com", "x")
+            crud = Contraseniacrud(session, llavero=llavero, filtraciones=corpus)
+            crud.sellar_pendientes(id_usuario)  # Revisar obliga a descifrar, como en una bóveda real
+
+            for hilos in sorted({1, args.hilos}):
+                resultado = crud.revisar_filtraciones(id_usuario, hilos=hilos)
+                print(f"revisar_filtraciones, {hilos} hilo(s)  {resultado.filas_por_segundo:8.0f} entradas/s  "
+                      f"({resultado.revisadas} en {resultado.segundos:.2f} s, {resultado.filtradas} filtradas)")
+            session.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
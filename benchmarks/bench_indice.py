@@ -0,0 +1,58 @@
+"""
+Microbenchmark de IndiceContrasenias: construcción, búsquedas y cambios incrementales.
+
+    python -m benchmarks.bench_indice --filas 100000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import Contraseniacrud
+from src.logica.indice import IndiceContrasenias
+
+CONSULTAS = ["g", "gi", "git", "github", "banco nac", "sistema 12", "ana1", "githbu", "mercdo libre", "zzz"]
+
+
+def _microsegundos(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1_000_000)
+    return statistics.median(tiempos), max(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        session = sessionmaker(bind=create_engine(f"sqlite:///{ruta}"))()
+
+        inicio = time.perf_counter()
+        indice = IndiceContrasenias.construir(Contraseniacrud(session), id_usuario)
+        print(f"construcción con {len(indice)} contraseñas: {time.perf_counter() - inicio:.2f} s")
+
+        for consulta in CONSULTAS:
+            mediana, maximo = _microsegundos(lambda: indice.buscar(consulta), args.repeticiones)
+            print(f"buscar({consulta!r:>14}): mediana {mediana:8.1f} µs  máx {maximo:8.1f} µs"
+                  f"  ({len(indice.buscar(consulta))} resultados)")
+
+        nueva = SimpleNamespace(id_contrasenia=args.filas + 1, id_usuario=id_usuario,
+                                servicio="Servicio Nuevo", nombre_usuario_servicio="alguien@example.com")
+        mediana, _ = _microsegundos(lambda: (indice.agregar(nueva), indice.eliminar(nueva.id_contrasenia)),
+                                    args.repeticiones)
+        print(f"agregar + eliminar una contraseña: mediana {mediana:8.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
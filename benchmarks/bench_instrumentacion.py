@@ -0,0 +1,65 @@
+"""
+Benchmark del coste de la instrumentación del CRUD.
+
+Repite una lectura que acierta en CacheEntidades (casi sin trabajo propio, así el coste
+del decorador se nota) y otra que va a la base, en tres variantes: el método sin
+decorar (__wrapped__), decorado con la instrumentación desactivada y activada.
+
+    python -m benchmarks.bench_instrumentacion --llamadas 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.logica.CRUD import UsuarioCRUD
+from src.logica.cache import CacheEntidades
+from src.logica.instrumentacion import INSTRUMENTACION
+from src.logica.seguridad import Hasheador
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _medir(funcion, argumento, llamadas, repeticiones):
+    """Mejor tiempo por llamada, en microsegundos"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion(argumento)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor / llamadas * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llamadas", type=int, default=100_000, help="lecturas de la caché por repetición")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = create_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}")
+        actualizar_esquema(engine)
+        with sessionmaker(bind=engine)() as session:
+            id_usuario = UsuarioCRUD(session, hasheador=Hasheador(n=2 ** 4)).create_usuario(
+                "u", "u@example.com", "x", "user").id_usuario
+            con_cache = UsuarioCRUD(session, cache=CacheEntidades())
+            sin_cache = UsuarioCRUD(session)
+            casos = [("caché", con_cache.get_usuario_by_id, args.llamadas),
+                     ("base", sin_cache.get_usuario_by_id, max(args.llamadas // 50, 1))]
+
+            print(f"{'lectura':<8} {'sin decorar':>12} {'desactivada':>12} {'activada':>12}")
+            for nombre, metodo, llamadas in casos:
+                crudo = metodo.__wrapped__.__get__(metodo.__self__)
+                sin_decorar = _medir(crudo, id_usuario, llamadas, args.repeticiones)
+                desactivada = _medir(metodo, id_usuario, llamadas, args.repeticiones)
+                INSTRUMENTACION.activar(engine)
+                try:
+                    activada = _medir(metodo, id_usuario, llamadas, args.repeticiones)
+                finally:
+                    INSTRUMENTACION.desactivar()
+                print(f"{nombre:<8} {sin_decorar:>9.2f} us {desactivada:>9.2f} us {activada:>9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
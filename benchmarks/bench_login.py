@@ -0,0 +1,74 @@
+"""
+Benchmark de inicios de sesión por segundo con distintos costes de hash.
+
+Varios hilos (como los de un servicio) inician sesión a la vez, cada uno con su
+sesión de SQLAlchemy. Para cada coste se compara derivar el hash en el propio
+hilo con hacerlo en un pool de procesos.
+
+    python -m benchmarks.bench_login --clientes 8 --logins 64
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+from src.logica.CRUD import UsuarioCRUD
+from src.logica.seguridad import Hasheador
+from src.modelo.migraciones import actualizar_esquema
+
+COSTES = {
+    "scrypt n=2^12": {"n": 2 ** 12},
+    "scrypt n=2^14": {"n": 2 ** 14},
+    "scrypt n=2^15": {"n": 2 ** 15},
+    "pbkdf2 100k": {"algoritmo": "pbkdf2-sha256", "iteraciones": 100_000},
+    "pbkdf2 600k": {"algoritmo": "pbkdf2-sha256", "iteraciones": 600_000},
+}
+
+
+def _medir(Session, hasheador, usuarios, logins, clientes):
+    def iniciar(i):
+        crud = UsuarioCRUD(Session(), hasheador=hasheador)
+        assert crud.iniciar_sesion(f"u{i % usuarios}@example.com", f"clave{i % usuarios}") is not None
+
+    with ThreadPoolExecutor(max_workers=clientes) as hilos:
+        inicio = time.perf_counter()
+        list(hilos.map(iniciar, range(logins)))
+        return logins / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=8, help="hilos que inician sesión a la vez")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--usuarios", type=int, default=16)
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"{args.clientes} clientes, {args.logins} inicios de sesión, pool de {args.procesos} procesos")
+    print(f"{'coste':<16} {'en el hilo':>12} {'en procesos':>12}")
+    for nombre, costo in COSTES.items():
+        with tempfile.TemporaryDirectory() as directorio:
+            engine = create_engine(f"sqlite:///{os.path.join(directorio, 'bench.db')}",
+                                   connect_args={"timeout": 30})
+            actualizar_esquema(engine)
+            Session = scoped_session(sessionmaker(bind=engine))
+            en_hilo = Hasheador(**costo)
+            with Session() as session:
+                crud = UsuarioCRUD(session, hasheador=en_hilo)
+                for i in range(args.usuarios):
+                    crud.create_usuario(f"u{i}", f"u{i}@example.com", f"clave{i}", "user")
+            Session.remove()
+
+            resultados = [_medir(Session, en_hilo, args.usuarios, args.logins, args.clientes)]
+            en_procesos = Hasheador(procesos=args.procesos, **costo)
+            en_procesos.hashear("calentar")  # Arrancar los procesos fuera de la medición
+            resultados.append(_medir(Session, en_procesos, args.usuarios, args.logins, args.clientes))
+            en_procesos.cerrar()
+            engine.dispose()
+        print(f"{nombre:<16} {resultados[0]:9.1f}/s {resultados[1]:9.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
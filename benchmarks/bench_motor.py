@@ -0,0 +1,66 @@
+"""
+Benchmark de los preajustes del engine (src.config.PRESETS).
+
+Para cada preajuste mide escrituras por segundo (un INSERT por commit, como las
+altas desde la interfaz) y lecturas por segundo (consultas por id al azar) sobre
+una base en archivo.
+
+    python -m benchmarks.bench_motor --escrituras 2000 --lecturas 20000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import insert, select
+from src.config import PRESETS, crear_engine
+from src.modelo.migraciones import actualizar_esquema
+from src.modelo.modelo import Contrasenia, Usuario
+
+
+def _escrituras(engine, id_usuario, cantidad):
+    inicio = time.perf_counter()
+    for i in range(cantidad):
+        with engine.begin() as conexion:
+            conexion.execute(insert(Contrasenia), {
+                "servicio": f"servicio{i}", "nombre_usuario_servicio": "yo", "contrasenia_encriptada": "pw",
+                "fecha_creacion": datetime.now(), "id_usuario": id_usuario,
+            })
+    return cantidad / (time.perf_counter() - inicio)
+
+
+def _lecturas(engine, maximo, cantidad):
+    aleatorio = random.Random(1234)
+    consulta = select(Contrasenia.__table__)
+    inicio = time.perf_counter()
+    with engine.connect() as conexion:
+        for _ in range(cantidad):
+            conexion.execute(consulta.where(Contrasenia.id_contrasenia == aleatorio.randint(1, maximo))).first()
+    return cantidad / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escrituras", type=int, default=2000)
+    parser.add_argument("--lecturas", type=int, default=20_000)
+    parser.add_argument("--presets", nargs="*", default=list(PRESETS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        print(f"{'preajuste':<12} {'escrituras/s':>13} {'lecturas/s':>12}")
+        for preset in args.presets:
+            engine = crear_engine(url=f"sqlite:///{os.path.join(directorio, preset + '.db')}", preset=preset)
+            actualizar_esquema(engine)
+            with engine.begin() as conexion:
+                id_usuario = conexion.execute(insert(Usuario).returning(Usuario.id_usuario), {
+                    "nombre_usuario": "bench", "email": "bench@example.com", "password_hash": "x", "rol": "user",
+                }).scalar()
+            escrituras = _escrituras(engine, id_usuario, args.escrituras)
+            lecturas = _lecturas(engine, args.escrituras, args.lecturas)
+            print(f"{preset:<12} {escrituras:13.0f} {lecturas:12.0f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
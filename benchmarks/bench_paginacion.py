@@ -0,0 +1,74 @@
+"""
+Benchmark del primer pintado de GestionContrasenasWindow.
+
+Compara lo que cuesta obtener y formatear la primera página (listar_pagina)
+con cargar la bóveda completa (obtener_contrasenias_usuario), para cada orden.
+
+    python -m benchmarks.bench_paginacion --filas 50000
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import Contraseniacrud
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _formatear(contrasenias):
+    # Lo mismo que hace la ventana con cada fila antes de insertarla en el Treeview
+    return [
+        (c.id_contrasenia, c.servicio, c.nombre_usuario_servicio, c.contrasenia_encriptada,
+         c.fecha_creacion.strftime("%Y-%m-%d %H:%M:%S") if c.fecha_creacion else "",
+         c.ultima_modificacion.strftime("%Y-%m-%d %H:%M:%S") if c.ultima_modificacion else "",
+         c.nota or "")
+        for c in contrasenias
+    ]
+
+
+def _medir(funcion, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=50_000)
+    parser.add_argument("--tamanio-pagina", type=int, default=200)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        Session = sessionmaker(bind=engine)
+
+        def con_sesion_nueva(accion):
+            # Sesión nueva en cada repetición para no medir el mapa de identidad ya poblado
+            def ejecutar():
+                session = Session()
+                try:
+                    _formatear(accion(Contraseniacrud(session)))
+                finally:
+                    session.close()
+            return ejecutar
+
+        completa = _medir(con_sesion_nueva(lambda crud: crud.obtener_contrasenias_usuario(id_usuario)), args.repeticiones)
+        print(f"bóveda completa ({args.filas} filas): {completa:8.1f} ms")
+        for orden in Contraseniacrud.ORDENES_PAGINACION:
+            pagina = _medir(con_sesion_nueva(
+                lambda crud: crud.listar_pagina(id_usuario, tamanio_pagina=args.tamanio_pagina, orden=orden)[0]
+            ), args.repeticiones)
+            print(f"primera página por {orden:<20} {pagina:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
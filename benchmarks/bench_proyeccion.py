@@ -0,0 +1,87 @@
+"""
+Benchmark del listado con entidades frente a proyecciones.
+
+Para las mismas filas compara lo que cuesta leerlas y dejarlas listas para el Treeview:
+entidades Contrasenia (obtener_contrasenias_usuario) formateadas fila por fila con
+strftime, como hacía la ventana, frente a FilaListado (proyectar_contrasenias_usuario)
+formateadas por columnas con valores_filas. Informa el tiempo y el pico de memoria
+(tracemalloc), también escalados a 100k filas.
+
+    python -m benchmarks.bench_proyeccion --filas 100000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import Contraseniacrud
+from src.modelo.migraciones import actualizar_esquema
+from src.vista.tabla import MASCARA, valores_filas
+
+
+def _fecha(valor):
+    return valor.strftime("%Y-%m-%d %H:%M:%S") if valor else ""
+
+
+def _entidades(crud, id_usuario):
+    return [
+        (c.id_contrasenia, c.servicio, c.nombre_usuario_servicio, MASCARA,
+         _fecha(c.fecha_creacion), _fecha(c.ultima_modificacion), c.nota or "")
+        for c in crud.obtener_contrasenias_usuario(id_usuario)
+    ]
+
+
+def _proyecciones(crud, id_usuario):
+    return valores_filas(crud.proyectar_contrasenias_usuario(id_usuario))
+
+
+def _medir(Session, funcion, id_usuario, repeticiones):
+    """(mejor tiempo en ms, pico de memoria en MB); sesión nueva cada vez para no reusar el mapa de identidad"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        with Session() as session:
+            gc.collect()
+            inicio = time.perf_counter()
+            funcion(Contraseniacrud(session), id_usuario)
+            mejor = min(mejor, time.perf_counter() - inicio)
+    with Session() as session:
+        gc.collect()
+        tracemalloc.start()
+        filas = funcion(Contraseniacrud(session), id_usuario)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return mejor * 1000, pico / 2 ** 20, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        id_usuario = crear_base_sintetica(ruta, contrasenias=args.filas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        Session = sessionmaker(bind=engine)
+
+        escala = 100_000 / args.filas
+        resultados = {}
+        print(f"{args.filas} filas; por 100k filas:")
+        for nombre, funcion in (("entidades", _entidades), ("proyecciones", _proyecciones)):
+            ms, mb, filas = _medir(Session, funcion, id_usuario, args.repeticiones)
+            resultados[nombre] = (ms, mb, sorted(filas))
+            print(f"{nombre:<13} {ms * escala:9.1f} ms {mb * escala:8.1f} MB")
+        (ms_e, mb_e, filas_e), (ms_p, mb_p, filas_p) = resultados.values()
+        assert filas_e == filas_p, "las dos variantes deben mostrar lo mismo"
+        print(f"{'ahorro':<13} {(ms_e - ms_p) * escala:9.1f} ms {(mb_e - mb_p) * escala:8.1f} MB"
+              f"  ({ms_e / ms_p:.1f}x más rápido, {mb_e / mb_p:.1f}x menos memoria)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark del informe de contraseñas reutilizadas.
+
+Sobre una bóveda sellada con una fracción de contraseñas repetidas, compara
+Contraseniacrud.contrasenias_reutilizadas (GROUP BY sobre las huellas) con lo que
+haría falta sin huellas: descifrar todas las entradas y agruparlas en memoria. Mide
+también calcular_huellas, lo que cuesta una sola vez dar huella a una bóveda anterior.
+
+    python -m benchmarks.bench_reutilizadas --filas 100000 --reutilizadas 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import defaultdict
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_boveda_sintetica
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import Llavero
+from src.modelo.modelo import Contrasenia
+
+
+def _descifrando(crud, id_usuario):
+    """Lo mismo sin huellas: descifrar cada entrada y agruparlas por texto"""
+    grupos = defaultdict(list)
+    filas = crud.session.execute(
+        select(Contrasenia.id_contrasenia, Contrasenia.contrasenia_encriptada).where(Contrasenia.id_usuario == id_usuario))
+    for id_contrasenia, valor in filas:
+        grupos[crud.descifrar(id_usuario, valor)].append(id_contrasenia)
+    return sorted((ids for ids in grupos.values() if len(ids) > 1), key=len, reverse=True)
+
+
+def _medir(funcion, repeticiones):
+    mejor, resultado = float("inf"), None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--reutilizadas", type=float, default=0.05, help="fracción de contraseñas comunes")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        (id_usuario,) = crear_boveda_sintetica(ruta, usuarios=1, entradas_por_usuario=args.filas, etiquetas=0,
+                                               sesiones_por_usuario=0, reutilizadas=args.reutilizadas)
+        engine = create_engine(f"sqlite:///{ruta}")
+        session = sessionmaker(bind=engine)()
+        llavero = Llavero()
+        # El usuario del generador tiene la contraseña "x" en claro, como en versiones anteriores
+        UsuarioCRUD(session, llavero=llavero).iniciar_sesion(f"usuario{id_usuario}@example.com", "x")
+        crud = Contraseniacrud(session, llavero=llavero)
+        crud.sellar_pendientes(id_usuario)  # Sella y calcula las huellas
+
+        session.execute(update(Contrasenia).values(huella=None))
+        session.commit()
+        inicio = time.perf_counter()
+        crud.calcular_huellas(id_usuario)
+        calcular = (time.perf_counter() - inicio) * 1000
+
+        informe, grupos = _medir(lambda: crud.contrasenias_reutilizadas(id_usuario), args.repeticiones)
+        descifrando, esperado = _medir(lambda: _descifrando(crud, id_usuario), 1)
+        assert sorted(map(len, grupos)) == sorted(map(len, esperado)), "los dos métodos deben encontrar los mismos grupos"
+
+        print(f"{args.filas} filas, {sum(map(len, grupos))} en {len(grupos)} grupos de repetidas")
+        print(f"contrasenias_reutilizadas     {informe:9.1f} ms")
+        print(f"descifrando todo              {descifrando:9.1f} ms  ({descifrando / informe:.0f}x)")
+        print(f"calcular_huellas (una vez)    {calcular:9.1f} ms")
+        session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark de la rotación de la clave de la bóveda tras cambiar la contraseña maestra.
+
+Sobre una copia de la misma bóveda ya sellada, mide Contraseniacrud.rotar_clave con
+distintos tamaños de lote y cantidades de hilos: filas por segundo y el lote más
+lento (lo que se retiene el bloqueo de escritura). Con --memoria se mide además el
+pico de memoria de Python con tracemalloc, que hace todo varias veces más lento.
+Un único lote del tamaño de la bóveda equivale a hacerlo en una sola transacción.
+
+    python -m benchmarks.bench_rotacion --filas 100000 [--memoria]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import crear_base_sintetica
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import Llavero
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _sesion(ruta, llavero):
+    engine = create_engine(f"sqlite:///{ruta}")
+    session = sessionmaker(bind=engine)()
+    # El usuario del generador tiene la contraseña "x" en claro, como en versiones anteriores
+    UsuarioCRUD(session, llavero=llavero).iniciar_sesion("bench@example.com", "x")
+    return engine, session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--lotes", type=int, nargs="+", default=[500, 2000, 10_000])
+    parser.add_argument("--hilos", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--memoria", action="store_true", help="medir el pico de memoria (más lento)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        sellada = os.path.join(directorio, "sellada.db")
+        id_usuario = crear_base_sintetica(sellada, contrasenias=args.filas)
+        actualizar_esquema(create_engine(f"sqlite:///{sellada}"))
+        llavero = Llavero()
+        engine, session = _sesion(sellada, llavero)
+        Contraseniacrud(session, llavero=llavero).sellar_pendientes(id_usuario)
+        session.close()
+        engine.dispose()
+
+        print(f"{args.filas} filas selladas")
+        print(f"{'lote':>8} {'hilos':>6} {'filas/s':>10} {'lote más lento':>15}"
+              + (f" {'pico de memoria':>16}" if args.memoria else ""))
+        for tamanio_lote in [*args.lotes, args.filas]:
+            for hilos in args.hilos:
+                ruta = os.path.join(directorio, "rotacion.db")
+                shutil.copy(sellada, ruta)
+                llavero = Llavero()
+                engine, session = _sesion(ruta, llavero)
+                UsuarioCRUD(session, llavero=llavero).update_usuario(id_usuario, password_hash="nueva maestra")
+
+                tiempos = []
+                anterior = [time.perf_counter()]
+
+                def progreso(resultado):
+                    ahora = time.perf_counter()
+                    tiempos.append(ahora - anterior[0])
+                    anterior[0] = ahora
+
+                if args.memoria:
+                    tracemalloc.start()
+                resultado = Contraseniacrud(session, llavero=llavero).rotar_clave(
+                    id_usuario, tamanio_lote=tamanio_lote, hilos=hilos, al_progresar=progreso)
+                linea = f"{tamanio_lote:>8} {hilos:>6} {resultado.filas_por_segundo:>10.0f} {max(tiempos) * 1000:>12.1f} ms"
+                if args.memoria:
+                    linea += f" {tracemalloc.get_traced_memory()[1] / 2 ** 20:>13.1f} MiB"
+                    tracemalloc.stop()
+                session.close()
+                engine.dispose()
+                os.remove(ruta)
+                print(linea)
+
+
+if __name__ == "__main__":
+    main()
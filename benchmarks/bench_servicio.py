@@ -0,0 +1,150 @@
+"""
+Prueba de carga del servicio HTTP (src.vista.servicio).
+
+Levanta una instancia local sobre una base temporal, o usa la de --url, crea un usuario
+con algunas entradas y lanza clientes concurrentes (hilos) que repiten una mezcla de
+pedidos: páginas del listado, búsquedas, revelar una contraseña y crear entradas nuevas.
+Para cada cantidad de clientes informa los pedidos por segundo y la latencia p50 y p99.
+
+    python -m benchmarks.bench_servicio --clientes 1 10 50 --pedidos 2000
+    python -m benchmarks.bench_servicio --url http://127.0.0.1:8765
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+TEXTOS = ["git", "mail", "banco", "sistema 12", "slack", "zoom"]
+SERVICIOS = ["GitHub", "Gmail", "Banco Nación", "Slack", "Zoom", "Sistema 12", "Jira", "Notion"]
+# Peso de cada tipo de pedido en la mezcla
+MEZCLA = {"pagina": 50, "buscar": 30, "revelar": 15, "crear": 5}
+
+
+class Cliente:
+    def __init__(self, host, puerto, token=None):
+        self.host, self.puerto, self.token = host, puerto, token
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+        cabeceras = {"Content-Type": "application/json"}
+        if self.token:
+            cabeceras["Authorization"] = f"Bearer {self.token}"
+        try:
+            conexion.request(metodo, ruta, json.dumps(cuerpo) if cuerpo is not None else None, cabeceras)
+            respuesta = conexion.getresponse()
+            datos = json.loads(respuesta.read())
+        finally:
+            conexion.close()
+        if respuesta.status >= 400:
+            raise RuntimeError(f"{metodo} {ruta}: {respuesta.status} {datos}")
+        return datos
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _levantar(directorio, hilos):
+    puerto = _puerto_libre()
+    entorno = dict(os.environ, PASSKEEPER_DB_URL=f"sqlite:///{os.path.join(directorio, 'servicio.db')}")
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "src.vista.servicio", "--puerto", str(puerto), "--hilos", str(hilos)],
+        env=entorno, stdout=subprocess.PIPE, text=True)
+    proceso.stdout.readline()  # "PassKeeper escuchando en ..." cuando ya acepta conexiones
+    return proceso, puerto
+
+
+def _preparar(cliente, entradas):
+    email = f"carga{random.getrandbits(32)}@example.com"
+    cliente.pedir("POST", "/usuarios", {"nombre_usuario": "carga", "email": email, "password": "maestra"})
+    cliente.token = cliente.pedir("POST", "/sesiones", {"email": email, "password": "maestra"})["token"]
+    aleatorio = random.Random(1234)
+    for i in range(entradas):
+        cliente.pedir("POST", "/contrasenias", {
+            "servicio": f"{aleatorio.choice(SERVICIOS)} {i}", "nombre_usuario_servicio": f"usuario{i}@example.com",
+            "contrasenia": f"secreto-{aleatorio.getrandbits(64):016x}"})
+    return [c["id_contrasenia"] for c in cliente.pedir("GET", "/contrasenias?tamanio=500")["contrasenias"]]
+
+
+def _pedido(cliente, tipo, aleatorio, ids):
+    if tipo == "pagina":
+        cliente.pedir("GET", f"/contrasenias?tamanio=50&orden={aleatorio.choice(['servicio', 'fecha_creacion'])}")
+    elif tipo == "buscar":
+        cliente.pedir("GET", f"/contrasenias?q={aleatorio.choice(TEXTOS).replace(' ', '+')}")
+    elif tipo == "revelar":
+        cliente.pedir("GET", f"/contrasenias/{aleatorio.choice(ids)}")
+    else:
+        cliente.pedir("POST", "/contrasenias", {
+            "servicio": aleatorio.choice(SERVICIOS), "nombre_usuario_servicio": "carga", "contrasenia": "x"})
+
+
+def _medir(cliente, clientes, pedidos, ids):
+    latencias = []
+    lock = threading.Lock()
+    tipos, pesos = zip(*MEZCLA.items())
+
+    def trabajar(numero):
+        aleatorio = random.Random(numero)
+        propias = []
+        for tipo in aleatorio.choices(tipos, pesos, k=pedidos // clientes):
+            inicio = time.perf_counter()
+            _pedido(cliente, tipo, aleatorio, ids)
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=trabajar, args=(numero,)) for numero in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+    return len(latencias) / segundos, cortes[49] * 1000, cortes[98] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="instancia ya levantada; sin ella se levanta una sobre una base temporal")
+    parser.add_argument("--hilos", type=int, default=8, help="hilos del servicio que se levanta")
+    parser.add_argument("--clientes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--pedidos", type=int, default=2000, help="pedidos por nivel de concurrencia")
+    parser.add_argument("--entradas", type=int, default=500, help="entradas que se crean antes de medir")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        proceso = None
+        if args.url:
+            partes = urlsplit(args.url)
+            host, puerto = partes.hostname, partes.port or 80
+        else:
+            proceso, puerto = _levantar(directorio, args.hilos)
+            host = "127.0.0.1"
+        try:
+            cliente = Cliente(host, puerto)
+            ids = _preparar(cliente, args.entradas)
+            print(f"{host}:{puerto}, {args.entradas} entradas, mezcla {MEZCLA}")
+            print(f"{'clientes':>8} {'pedidos/s':>10} {'p50':>9} {'p99':>9}")
+            for clientes in args.clientes:
+                por_segundo, p50, p99 = _medir(cliente, clientes, max(args.pedidos, clientes), ids)
+                print(f"{clientes:>8} {por_segundo:>10.0f} {p50:>6.1f} ms {p99:>6.1f} ms")
+        finally:
+            if proceso is not None:
+                proceso.terminate()
+                proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark de la tabla de sesiones con un historial grande.
+
+Siembra sesiones repartidas en un año entre varios usuarios (casi todas cerradas) y mide:
+- las sesiones activas de un usuario y las de un rango de fechas, con los índices
+  de la versión 6 y sin ellos;
+- archivar las cerradas hace más de 90 días, por lotes;
+- el tamaño del archivo antes y después de liberar el espacio.
+
+    python -m benchmarks.bench_sesiones --sesiones 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.logica.CRUD import SesionCRUD
+from src.modelo.migraciones import actualizar_esquema, liberar_espacio
+
+AHORA = datetime(2025, 1, 1)
+INDICES_NUEVOS = ("ix_sesiones_activas", "ix_sesiones_cerradas_fin", "ix_sesiones_inicio")
+
+
+def _sembrar(ruta, sesiones, usuarios, semilla=1234):
+    aleatorio = random.Random(semilla)
+    conexion = sqlite3.connect(ruta)
+    with conexion:
+        conexion.executemany(
+            "INSERT INTO usuarios (id_usuario, nombre_usuario, email, password_hash, rol) VALUES (?, ?, ?, 'x', 'user')",
+            ((i, f"u{i}", f"u{i}@example.com") for i in range(1, usuarios + 1)),
+        )
+
+        def filas():
+            for _ in range(sesiones):
+                inicio = AHORA - timedelta(seconds=aleatorio.randrange(365 * 86400))
+                # Una de cada mil sigue abierta
+                fin = None if aleatorio.random() < 0.001 else inicio + timedelta(seconds=aleatorio.randrange(60, 7200))
+                yield (aleatorio.randrange(1, usuarios + 1), inicio.isoformat(sep=" "),
+                       fin.isoformat(sep=" ") if fin else None, "10.0.0.1")
+
+        conexion.executemany("INSERT INTO sesiones (id_usuario, fecha_inicio, fecha_fin, ip) VALUES (?, ?, ?, ?)", filas())
+    conexion.close()
+
+
+def _medir(funcion, repeticiones=20):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def _consultas(Session, usuarios):
+    session = Session()
+    crud = SesionCRUD(session)
+    resultados = {
+        "activas de un usuario": _medir(lambda: crud.sesiones_activas(usuarios // 2)),
+        "un día, todos los usuarios": _medir(
+            lambda: crud.sesiones_en_rango(AHORA - timedelta(days=30), AHORA - timedelta(days=29), limite=None)),
+        "30 días de un usuario": _medir(
+            lambda: crud.sesiones_en_rango(AHORA - timedelta(days=60), AHORA - timedelta(days=30), id_usuario=usuarios // 2)),
+    }
+    session.close()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sesiones", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--tamanio-lote", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "bench.db")
+        engine = create_engine(f"sqlite:///{ruta}")
+        actualizar_esquema(engine)
+        _sembrar(ruta, args.sesiones, args.usuarios)
+        Session = sessionmaker(bind=engine)
+        print(f"{args.sesiones} sesiones de {args.usuarios} usuarios")
+
+        con_indices = _consultas(Session, args.usuarios)
+        with engine.begin() as conexion:
+            for nombre in INDICES_NUEVOS:
+                conexion.exec_driver_sql(f"DROP INDEX {nombre}")
+        sin_indices = _consultas(Session, args.usuarios)
+        with engine.begin() as conexion:
+            conexion.exec_driver_sql("PRAGMA user_version = 5")
+        actualizar_esquema(engine)
+        print(f"{'consulta':<28} {'sin índices v6':>15} {'con índices v6':>15}")
+        for nombre, tiempo in con_indices.items():
+            print(f"{nombre:<28} {sin_indices[nombre]:>12.2f} ms {tiempo:>12.2f} ms")
+
+        tamanio = os.path.getsize(ruta)
+        session = Session()
+        inicio = time.perf_counter()
+        archivadas = SesionCRUD(session).archivar_sesiones(90, tamanio_lote=args.tamanio_lote, ahora=AHORA)
+        segundos = time.perf_counter() - inicio
+        session.close()
+        print(f"archivadas {archivadas} sesiones en {segundos:.1f} s ({archivadas / segundos:.0f}/s, "
+              f"lotes de {args.tamanio_lote})")
+        inicio = time.perf_counter()
+        antes, despues = liberar_espacio(engine)
+        print(f"liberar espacio: {(time.perf_counter() - inicio) * 1000:.0f} ms, páginas libres {antes} -> {despues}, "
+              f"archivo {tamanio / 2 ** 20:.1f} -> {os.path.getsize(ruta) / 2 ** 20:.1f} MiB")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
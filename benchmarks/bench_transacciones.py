@@ -0,0 +1,83 @@
+"""
+Benchmark de operaciones del CRUD confirmando cada una o agrupadas con transaccion().
+
+Ejecuta una mezcla de operaciones (crear contraseña, crear etiqueta, vincularlas,
+editar y eliminar) sobre una base en archivo, donde cada commit paga su fsync.
+
+    python -m benchmarks.bench_transacciones --operaciones 10000 --grupo 500
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, ContraseniaEtiquetaCRUD
+from src.logica.boveda import Llavero
+from src.modelo.migraciones import actualizar_esquema
+
+
+def _operaciones(session, llavero, id_usuario, cantidad):
+    """Generador que ejecuta una operación por paso, en un ciclo de cinco tipos"""
+    contrasenia_crud = Contraseniacrud(session, llavero=llavero)
+    etiqueta_crud = EtiquetaCRUD(session)
+    relacion_crud = ContraseniaEtiquetaCRUD(session)
+    contrasenia = etiqueta = None
+    for i in range(cantidad):
+        paso = i % 5
+        if paso == 0:
+            contrasenia = contrasenia_crud.create_contrasenia(f"servicio{i}", "yo", "pw", id_usuario)
+        elif paso == 1:
+            etiqueta = etiqueta_crud.create_etiqueta(f"etiqueta{i}")
+        elif paso == 2:
+            relacion_crud.create_contrasenia_etiqueta(contrasenia.id_contrasenia, etiqueta.id_etiqueta)
+        elif paso == 3:
+            contrasenia_crud.editar_contrasena(contrasenia.id_contrasenia, nota=f"nota {i}")
+        else:
+            # Se elimina la contraseña de dos ciclos atrás para no vaciar la tabla
+            anterior = contrasenia.id_contrasenia - 1
+            if anterior > 0:
+                contrasenia_crud.delete_contrasenia(anterior)
+        yield contrasenia_crud
+
+
+def _medir(ruta, operaciones, grupo):
+    engine = create_engine(f"sqlite:///{ruta}")
+    actualizar_esquema(engine)
+    with sessionmaker(bind=engine)() as session:
+        llavero = Llavero()
+        usuarios = UsuarioCRUD(session, llavero=llavero)
+        id_usuario = usuarios.create_usuario("bench", f"bench{grupo}@example.com", "x", "user").id_usuario
+        usuarios.iniciar_sesion(f"bench{grupo}@example.com", "x")  # Sin la bóveda abierta no se puede guardar
+        pasos = _operaciones(session, llavero, id_usuario, operaciones)
+        inicio = time.perf_counter()
+        if grupo <= 1:
+            for _ in pasos:
+                pass
+        else:
+            crud = Contraseniacrud(session)
+            restantes = operaciones
+            while restantes > 0:
+                with crud.transaccion():
+                    for _ in zip(range(grupo), pasos):
+                        pass
+                restantes -= grupo
+        transcurrido = time.perf_counter() - inicio
+    engine.dispose()
+    return transcurrido
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operaciones", type=int, default=10_000)
+    parser.add_argument("--grupo", type=int, default=500, help="operaciones por transacción agrupada")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre, grupo in (("un commit por operación", 1), (f"transacciones de {args.grupo}", args.grupo)):
+            segundos = _medir(os.path.join(directorio, f"bench{grupo}.db"), args.operaciones, grupo)
+            print(f"{nombre:<28} {segundos:7.2f} s  {args.operaciones / segundos:9.0f} op/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Generador determinista de bóvedas sintéticas para los benchmarks."""
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from src.modelo.modelo import Base
+
+FECHA_BASE = datetime(2024, 1, 1)
+
+# Servicios habituales; el resto de entradas son sistemas internos numerados, como en una bóveda real
+SERVICIOS = [
+    "GitHub", "Gmail", "Google Drive", "Amazon", "Netflix", "Spotify", "Facebook", "Instagram", "Twitter",
+    "LinkedIn", "Banco Nación", "Santander", "PayPal", "Dropbox", "Slack", "Jira", "Confluence", "Steam",
+    "Microsoft 365", "Apple ID", "Adobe", "Zoom", "Trello", "Notion", "Reddit", "Mercado Libre", "AFIP",
+]
+NOMBRES = ["ana", "luis", "dev", "admin", "soporte", "maria", "jorge", "ventas"]
+COMUNES = 200  # Contraseñas distintas entre las reutilizadas
+
+
+def _servicio(aleatorio):
+    if aleatorio.random() < 0.6:
+        return aleatorio.choice(SERVICIOS)
+    return f"Sistema {aleatorio.randrange(3000)}"
+
+
+def crear_base_sintetica(ruta, contrasenias=1000, etiquetas=20, etiquetas_por_contrasenia=2, semilla=1234):
+    """
+    Crea una base SQLite en `ruta` con un usuario y `contrasenias` entradas.
+
+    Las filas se insertan con sqlite3 directamente y desde generadores, para que
+    sembrar un millón de filas no dispare la memoria del propio benchmark.
+    Devuelve el id del usuario creado.
+    """
+    engine = create_engine(f"sqlite:///{ruta}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    aleatorio = random.Random(semilla)
+    conexion = sqlite3.connect(ruta)
+    with conexion:
+        conexion.execute(
+            "INSERT INTO usuarios (nombre_usuario, email, password_hash, rol, fecha_registro) VALUES (?, ?, ?, ?, ?)",
+            ("bench", "bench@example.com", "x", "user", FECHA_BASE.isoformat(sep=" ")),
+        )
+        id_usuario = conexion.execute("SELECT max(id_usuario) FROM usuarios").fetchone()[0]
+        conexion.executemany(
+            "INSERT INTO etiquetas (id_etiqueta, nombre) VALUES (?, ?)",
+            ((i, f"etiqueta{i}") for i in range(1, etiquetas + 1)),
+        )
+        conexion.executemany(
+            "INSERT INTO contrasenias (id_contrasenia, servicio, nombre_usuario_servicio, contrasenia_encriptada,"
+            " fecha_creacion, ultima_modificacion, nota, id_usuario) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    _servicio(aleatorio),
+                    f"{aleatorio.choice(NOMBRES)}{aleatorio.randrange(500)}@example.com",
+                    f"secreto-{aleatorio.getrandbits(64):016x}",
+                    (FECHA_BASE + timedelta(seconds=i)).isoformat(sep=" "),
+                    None,
+                    "cuenta compartida del equipo" if i % 10 == 0 else None,
+                    id_usuario,
+                )
+                for i in range(1, contrasenias + 1)
+            ),
+        )
+        if etiquetas:
+            conexion.executemany(
+                "INSERT INTO contrasenia_etiqueta (id_contrasenia, id_etiqueta) VALUES (?, ?)",
+                (
+                    (i, id_etiqueta)
+                    for i in range(1, contrasenias + 1)
+                    for id_etiqueta in aleatorio.sample(range(1, etiquetas + 1), min(etiquetas_por_contrasenia, etiquetas))
+                ),
+            )
+    conexion.close()
+    return id_usuario
+
+
+def _etiquetas_de(aleatorio, pesos):
+    """0 a 3 etiquetas distintas; la popularidad sigue una ley de potencias, como en una bóveda real"""
+    cantidad = aleatorio.choices((0, 1, 2, 3), weights=(30, 40, 20, 10))[0]
+    elegidas = set()
+    while len(elegidas) < cantidad:
+        elegidas.add(aleatorio.choices(range(1, len(pesos) + 1), weights=pesos)[0])
+    return elegidas
+
+
+def _contrasenia(aleatorio, reutilizadas):
+    # Sin repetidas no se consume otro número aleatorio, así la bóveda es la misma que antes de esta opción
+    if reutilizadas and aleatorio.random() < reutilizadas:
+        return f"comun{aleatorio.randrange(COMUNES)}"
+    return f"secreto-{aleatorio.getrandbits(64):016x}"
+
+
+def crear_boveda_sintetica(ruta, usuarios=10, entradas_por_usuario=1000, etiquetas=50, sesiones_por_usuario=100,
+                           password_hash="x", sal_boveda=None, semilla=1234, reutilizadas=0.0):
+    """
+    Crea en `ruta` una base con el esquema actual y `usuarios` usuarios, cada uno con
+    `entradas_por_usuario` contraseñas en claro, etiquetas repartidas entre las `etiquetas`
+    existentes (pocas muy usadas, muchas raras) y un año de historial de sesiones.
+
+    Todos los usuarios comparten password_hash y sal_boveda, que el llamador calcula una
+    vez con el coste que quiera medir. Una fracción `reutilizadas` de las contraseñas sale
+    de unas pocas contraseñas comunes, así hay repetidas. Devuelve los ids de los usuarios.
+    """
+    engine = create_engine(f"sqlite:///{ruta}")
+    # Importación diferida: el resto del generador no necesita las migraciones
+    from src.modelo.migraciones import actualizar_esquema
+    actualizar_esquema(engine)  # Con los triggers de búsqueda y de conteos, que se llenan al insertar
+    engine.dispose()
+
+    aleatorio = random.Random(semilla)
+    pesos = [1 / rango for rango in range(1, etiquetas + 1)]
+    ahora = FECHA_BASE + timedelta(days=365)
+    conexion = sqlite3.connect(ruta)
+    with conexion:
+        conexion.executemany(
+            "INSERT INTO usuarios (id_usuario, nombre_usuario, email, password_hash, rol, fecha_registro, sal_boveda)"
+            " VALUES (?, ?, ?, ?, 'user', ?, ?)",
+            ((i, f"usuario{i}", f"usuario{i}@example.com", password_hash, FECHA_BASE.isoformat(sep=" "), sal_boveda)
+             for i in range(1, usuarios + 1)),
+        )
+        conexion.executemany(
+            "INSERT INTO etiquetas (id_etiqueta, nombre) VALUES (?, ?)",
+            ((i, f"etiqueta{i}") for i in range(1, etiquetas + 1)),
+        )
+        total = usuarios * entradas_por_usuario
+        conexion.executemany(
+            "INSERT INTO contrasenias (id_contrasenia, servicio, nombre_usuario_servicio, contrasenia_encriptada,"
+            " fecha_creacion, ultima_modificacion, nota, id_usuario) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    _servicio(aleatorio),
+                    f"{aleatorio.choice(NOMBRES)}{aleatorio.randrange(500)}@example.com",
+                    _contrasenia(aleatorio, reutilizadas),
+                    (FECHA_BASE + timedelta(seconds=i)).isoformat(sep=" "),
+                    # Una de cada cuatro se modificó después de crearla
+                    (FECHA_BASE + timedelta(seconds=total + i)).isoformat(sep=" ") if i % 4 == 0 else None,
+                    "cuenta compartida del equipo" if i % 10 == 0 else None,
+                    (i - 1) // entradas_por_usuario + 1,
+                )
+                for i in range(1, total + 1)
+            ),
+        )
+        if etiquetas:
+            conexion.executemany(
+                "INSERT INTO contrasenia_etiqueta (id_contrasenia, id_etiqueta) VALUES (?, ?)",
+                ((i, id_etiqueta) for i in range(1, total + 1) for id_etiqueta in _etiquetas_de(aleatorio, pesos)),
+            )
+
+        def sesiones():
+            for id_usuario in range(1, usuarios + 1):
+                for _ in range(sesiones_por_usuario):
+                    inicio = ahora - timedelta(seconds=aleatorio.randrange(365 * 86400))
+                    # Una de cada mil sigue abierta
+                    fin = None if aleatorio.random() < 0.001 else inicio + timedelta(seconds=aleatorio.randrange(60, 7200))
+                    yield (id_usuario, inicio.isoformat(sep=" "), fin.isoformat(sep=" ") if fin else None, "10.0.0.1")
+
+        conexion.executemany("INSERT INTO sesiones (id_usuario, fecha_inicio, fecha_fin, ip) VALUES (?, ?, ?, ?)",
+                             sesiones())
+    conexion.close()
+    return list(range(1, usuarios + 1))
+
+
+def crear_corpus_filtraciones(ruta, hashes=1_000_000, contrasenias=(), hashear=None, semilla=1234):
+    """
+    Escribe en `ruta` un corpus de filtraciones con el formato de Pwned Passwords
+    ("HASH:VECES", ordenado): `hashes` hashes al azar más los de `contrasenias`, por
+    defecto las COMUNES que crear_boveda_sintetica usa como reutilizadas.
+
+    Los hashes al azar salen ya ordenados, sumando saltos aleatorios, y se mezclan con
+    los de las contraseñas sobre la marcha: el corpus puede ser mucho más grande que la
+    memoria. hashear es hash_sha1 (por defecto) o hash_ntlm. Devuelve el tamaño en bytes.
+    """
+    import heapq
+    from src.logica.filtraciones import hash_sha1
+    hashear = hashear or hash_sha1
+    aleatorio = random.Random(semilla)
+    ancho = len(hashear(""))
+    if not contrasenias:
+        contrasenias = [f"comun{i}" for i in range(COMUNES)]
+    conocidas = sorted({hashear(texto) for texto in contrasenias})
+    # Saltos de media 0,9 del espacio entre hashes: cubren casi todo el rango sin pasarse del ancho
+    salto = 16 ** ancho * 9 // 5 // (hashes + 1)
+
+    def al_azar():
+        valor = 0
+        for _ in range(hashes):
+            valor += aleatorio.randrange(1, salto)
+            yield b"%0*X" % (ancho, valor)
+
+    with open(ruta, "wb") as archivo:
+        for valor in heapq.merge(al_azar(), conocidas):
+            archivo.write(b"%s:%d\r\n" % (valor, aleatorio.randrange(1, 100_000)))
+        return archivo.tell()
@@ -0,0 +1,369 @@
+"""
+Suite de benchmarks del CRUD: mide cada método público de src/logica/CRUD.py sobre
+bóvedas sintéticas en archivo, de 1k, 100k y 1M contraseñas, y compara con una línea base.
+
+Para cada tamaño se genera la base con benchmarks.generador.crear_boveda_sintetica
+(--usuarios usuarios que se reparten las filas, --etiquetas etiquetas, historial de
+sesiones) y se ejecuta cada caso varias veces, hasta --repeticiones o hasta agotar
+--presupuesto segundos. Se guarda la mediana y el mínimo en milisegundos, en JSON.
+
+Con --base, cada caso cuyo tiempo mínimo (lo menos sensible al ruido de la máquina)
+supere el de la línea base en más de --umbral (proporción) y de --piso milisegundos se
+informa como regresión y la salida termina con código 1. --guardar-base escribe los resultados como línea base nueva.
+
+    python -m benchmarks.suite --filas 1000 100000 --salida resultados.json
+    python -m benchmarks.suite --base benchmarks/linea_base.json --umbral 0.5
+    python -m benchmarks.suite --filas 1000 --guardar-base benchmarks/linea_base.json
+
+La línea base incluida se midió en una sola máquina virtual de un núcleo, donde el
+mismo caso varía hasta un 30 % entre ejecuciones; en otra máquina conviene generar la
+propia antes de comparar, y en una más estable se puede bajar el umbral.
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+import sqlalchemy
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+from benchmarks.generador import FECHA_BASE, crear_boveda_sintetica, crear_corpus_filtraciones
+from src.config import crear_engine
+from src.logica import CRUD
+from src.logica.CRUD import (UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD, ContraseniaEtiquetaCRUD)
+from src.logica.boveda import Llavero
+from src.logica.filtraciones import CorpusFiltraciones
+from src.logica.seguridad import Hasheador
+from src.modelo.modelo import Contrasenia
+
+FORMATO = 1
+PASSWORD = "maestra"
+HASHES_CORPUS = 1_000_000  # Del corpus de filtraciones generado para los casos que lo usan
+# Métodos públicos que no tocan la base ni hacen trabajo propio
+SIN_MEDIR = {"suscribir", "en_transaccion"}
+
+
+class Caso:
+    """
+    Un método del CRUD a medir. funcion(ctx, *args) es lo que se cronometra; preparar(ctx),
+    si existe, se ejecuta antes de cada repetición fuera del cronómetro y devuelve los args.
+    Los casos con una_vez=True modifican la bóveda entera y se miden una sola vez.
+    """
+
+    def __init__(self, metodo, funcion, preparar=None, variante=None, una_vez=False):
+        self.metodo = metodo
+        self.funcion = funcion
+        self.preparar = preparar
+        self.una_vez = una_vez
+        self.nombre = f"{metodo} [{variante}]" if variante else metodo
+
+
+class Contexto:
+    """Sesión, clases del CRUD y datos de la bóveda que usan los casos"""
+
+    def __init__(self, session, usuarios, entradas_por_usuario, hasheador, llavero, filtraciones, semilla=1234):
+        self.session = session
+        self.aleatorio = random.Random(semilla)
+        self.id_usuario = usuarios[0]  # El usuario que inicia sesión y sobre el que se mide
+        self.otro_usuario = usuarios[-1]  # Para cerrar_sesion, que bloquea la bóveda de su usuario
+        self.ids_propios = range(1, entradas_por_usuario + 1)
+        self.llavero = llavero
+        self.usuarios = UsuarioCRUD(session, hasheador=hasheador, llavero=llavero)
+        self.contrasenias = Contraseniacrud(session, llavero=llavero)
+        self.con_corpus = Contraseniacrud(session, llavero=llavero, filtraciones=filtraciones)
+        self.etiquetas = EtiquetaCRUD(session)
+        self.sesiones = SesionCRUD(session)
+        self.relaciones = ContraseniaEtiquetaCRUD(session)
+        self.contador = 0
+
+    def unico(self, prefijo):
+        self.contador += 1
+        return f"{prefijo}{self.contador}"
+
+    def id_propio(self):
+        return self.aleatorio.choice(self.ids_propios)
+
+    def nueva_contrasenia(self):
+        return self.contrasenias.create_contrasenia(
+            self.unico("Servicio nuevo "), "bench@example.com", "secreto", self.id_usuario).id_contrasenia
+
+
+def _pagina_profunda(ctx):
+    """El cursor de la mitad del listado, para medir una página que no es la primera"""
+    fila = ctx.session.execute(
+        select(Contrasenia.servicio, Contrasenia.id_contrasenia)
+        .where(Contrasenia.id_usuario == ctx.id_usuario)
+        .order_by(Contrasenia.servicio, Contrasenia.id_contrasenia)
+        .offset(len(ctx.ids_propios) // 2).limit(1)
+    ).one()
+    return (tuple(fila),)
+
+
+def _filas_importadas(ctx, cantidad=1000):
+    return ([(numero, {"servicio": ctx.unico("Importado "), "nombre_usuario_servicio": "bench", "contrasenia": "x",
+                       "nota": None, "etiquetas": ["importada"]}) for numero in range(1, cantidad + 1)],)
+
+
+def _borrar_huellas(ctx):
+    """Deja la bóveda del usuario como la de una versión sin huellas"""
+    ctx.session.execute(update(Contrasenia).where(Contrasenia.id_usuario == ctx.id_usuario).values(huella=None))
+    ctx.session.commit()
+    return ()
+
+
+def _renovar(ctx):
+    """Deja pendiente una rotación de toda la bóveda del usuario"""
+    ctx.usuarios.renovar_clave_boveda(ctx.id_usuario, PASSWORD)
+    return ()
+
+
+def _terminar_rotacion(ctx):
+    ctx.contrasenias.rotar_clave(ctx.id_usuario)
+    return ()
+
+
+def _transaccion(ctx):
+    with ctx.contrasenias.transaccion():
+        for _ in range(100):
+            ctx.nueva_contrasenia()
+
+
+U, C, E, S, R = "UsuarioCRUD", "Contraseniacrud", "EtiquetaCRUD", "SesionCRUD", "ContraseniaEtiquetaCRUD"
+
+# En este orden: el inicio de sesión y el sellado dejan la bóveda como la usa la aplicación; luego las
+# lecturas y lo que reescribe o archiva toda la bóveda, antes de que las escrituras agreguen filas
+CASOS = [
+    Caso(f"{U}.iniciar_sesion", lambda ctx: ctx.usuarios.iniciar_sesion(f"usuario{ctx.id_usuario}@example.com", PASSWORD)),
+    Caso(f"{C}.sellar_pendientes", lambda ctx: ctx.contrasenias.sellar_pendientes(ctx.id_usuario), una_vez=True),
+    Caso(f"{C}.calcular_huellas", lambda ctx: ctx.contrasenias.calcular_huellas(ctx.id_usuario),
+         preparar=_borrar_huellas, una_vez=True),
+    Caso(f"{C}.revisar_filtraciones", lambda ctx: ctx.con_corpus.revisar_filtraciones(ctx.id_usuario), una_vez=True),
+
+    Caso(f"{U}.get_usuario_by_id", lambda ctx: ctx.usuarios.get_usuario_by_id(ctx.id_usuario)),
+    Caso(f"{U}.get_usuario_by_email", lambda ctx: ctx.usuarios.get_usuario_by_email(f"usuario{ctx.id_usuario}@example.com")),
+    Caso(f"{C}.revelar_contrasenia", lambda ctx: ctx.contrasenias.revelar_contrasenia(ctx.id_propio())),
+    Caso(f"{C}.descifrar", lambda ctx, valor: ctx.contrasenias.descifrar(ctx.id_usuario, valor),
+         preparar=lambda ctx: (ctx.llavero.obtener(ctx.id_usuario).sellar("secreto", ctx.id_usuario),)),
+    Caso(f"{C}.get_contrasenias_by_user", lambda ctx: ctx.contrasenias.get_contrasenias_by_user(ctx.id_usuario)),
+    Caso(f"{C}.obtener_contrasenias_usuario", lambda ctx: ctx.contrasenias.obtener_contrasenias_usuario(ctx.id_usuario)),
+    Caso(f"{C}.proyectar_contrasenias_usuario", lambda ctx: ctx.contrasenias.proyectar_contrasenias_usuario(ctx.id_usuario)),
+    Caso(f"{C}.contrasenias_reutilizadas", lambda ctx: ctx.contrasenias.contrasenias_reutilizadas(ctx.id_usuario)),
+    Caso(f"{C}.contrasenias_filtradas", lambda ctx: ctx.contrasenias.contrasenias_filtradas(ctx.id_usuario)),
+    Caso(f"{C}.obtener_contrasenias_por_ids", lambda ctx, ids: ctx.contrasenias.obtener_contrasenias_por_ids(ids),
+         preparar=lambda ctx: ([ctx.id_propio() for _ in range(100)],), variante="100 ids"),
+    Caso(f"{C}.iterar_contrasenias_usuario", lambda ctx: sum(1 for _ in ctx.contrasenias.iterar_contrasenias_usuario(ctx.id_usuario))),
+    Caso(f"{C}.listar_pagina", lambda ctx: ctx.contrasenias.listar_pagina(ctx.id_usuario), variante="primera"),
+    Caso(f"{C}.listar_pagina", lambda ctx, cursor: ctx.contrasenias.listar_pagina(ctx.id_usuario, cursor=cursor),
+         preparar=_pagina_profunda, variante="a la mitad"),
+    Caso(f"{C}.listar_pagina", lambda ctx: ctx.contrasenias.listar_pagina(ctx.id_usuario, orden="ultima_modificacion"),
+         variante="ultima_modificacion"),
+    Caso(f"{C}.listar_con_etiquetas", lambda ctx: ctx.contrasenias.listar_con_etiquetas(ctx.id_usuario, ["etiqueta3"]),
+         variante="una etiqueta"),
+    Caso(f"{C}.listar_con_etiquetas", lambda ctx: ctx.contrasenias.listar_con_etiquetas(
+        ctx.id_usuario, ["etiqueta1", "etiqueta2"], modo="todas", limite=100), variante="dos, todas, 100"),
+    Caso(f"{C}.buscar", lambda ctx: ctx.contrasenias.buscar(ctx.id_usuario, "s"), variante="una letra"),
+    Caso(f"{C}.buscar", lambda ctx: ctx.contrasenias.buscar(ctx.id_usuario, "git ana"), variante="selectiva"),
+    Caso(f"{E}.get_etiqueta", lambda ctx: ctx.etiquetas.get_etiqueta(1)),
+    Caso(f"{E}.listar_etiquetas", lambda ctx: ctx.etiquetas.listar_etiquetas(ctx.id_usuario), variante="de un usuario"),
+    Caso(f"{E}.contar_etiquetas", lambda ctx: ctx.etiquetas.contar_etiquetas(ctx.id_usuario), variante="materializado"),
+    Caso(f"{E}.contar_etiquetas", lambda ctx: ctx.etiquetas.contar_etiquetas(ctx.id_usuario, materializado=False),
+         variante="agregado"),
+    Caso(f"{S}.get_sesion", lambda ctx: ctx.sesiones.get_sesion(1)),
+    Caso(f"{S}.sesiones_activas", lambda ctx: ctx.sesiones.sesiones_activas(ctx.id_usuario)),
+    Caso(f"{S}.sesiones_en_rango", lambda ctx: ctx.sesiones.sesiones_en_rango(
+        FECHA_BASE + timedelta(days=180), FECHA_BASE + timedelta(days=181), limite=None), variante="un día"),
+
+    Caso(f"{C}.rotar_clave", lambda ctx: ctx.contrasenias.rotar_clave(ctx.id_usuario), preparar=_renovar),
+    Caso(f"{U}.renovar_clave_boveda", lambda ctx: ctx.usuarios.renovar_clave_boveda(ctx.id_usuario, PASSWORD),
+         preparar=_terminar_rotacion),
+    Caso(f"{S}.archivar_sesiones", lambda ctx: ctx.sesiones.archivar_sesiones(
+        90, ahora=FECHA_BASE + timedelta(days=365)), una_vez=True),
+    Caso(f"{U}.create_usuario", lambda ctx, email: ctx.usuarios.create_usuario(email, email, PASSWORD, "user"),
+         preparar=lambda ctx: (ctx.unico("nuevo") + "@example.com",)),
+    Caso(f"{U}.update_usuario", lambda ctx: ctx.usuarios.update_usuario(ctx.id_usuario, nombre_usuario=ctx.unico("nombre"))),
+    Caso(f"{U}.delete_usuario", lambda ctx, id_usuario: ctx.usuarios.delete_usuario(id_usuario),
+         preparar=lambda ctx: (ctx.usuarios.create_usuario(ctx.unico("borrar"), ctx.unico("borrar") + "@example.com",
+                                                           PASSWORD, "user").id_usuario,)),
+    Caso(f"{U}.cerrar_sesion", lambda ctx, id_sesion: ctx.usuarios.cerrar_sesion(id_sesion),
+         preparar=lambda ctx: (ctx.sesiones.create_sesion(ctx.otro_usuario, "10.0.0.1").id_sesion,)),
+    Caso(f"{C}.create_contrasenia", lambda ctx: ctx.nueva_contrasenia()),
+    Caso(f"{C}.create_contrasenia", lambda ctx: ctx.con_corpus.create_contrasenia(
+        ctx.unico("Servicio nuevo "), "bench@example.com", ctx.unico("comun"), ctx.id_usuario), variante="con corpus"),
+    Caso(f"{C}.transaccion", _transaccion, variante="100 create_contrasenia"),
+    Caso(f"{C}.editar_contrasena", lambda ctx: ctx.contrasenias.editar_contrasena(ctx.id_propio(), "otra", nota="editada")),
+    Caso(f"{C}.delete_contrasenia", lambda ctx, id_contrasenia: ctx.contrasenias.delete_contrasenia(id_contrasenia),
+         preparar=lambda ctx: (ctx.nueva_contrasenia(),)),
+    Caso(f"{E}.create_etiqueta", lambda ctx: ctx.etiquetas.create_etiqueta(ctx.unico("nueva"))),
+    Caso(f"{E}.update_etiqueta", lambda ctx: ctx.etiquetas.update_etiqueta(2, nombre=ctx.unico("etiqueta"))),
+    Caso(f"{E}.delete_etiqueta", lambda ctx, id_etiqueta: ctx.etiquetas.delete_etiqueta(id_etiqueta),
+         preparar=lambda ctx: (ctx.etiquetas.create_etiqueta(ctx.unico("borrar")).id_etiqueta,)),
+    Caso(f"{R}.create_contrasenia_etiqueta", lambda ctx, id_contrasenia: ctx.relaciones.create_contrasenia_etiqueta(
+        id_contrasenia, 1), preparar=lambda ctx: (ctx.nueva_contrasenia(),)),
+    Caso(f"{R}.delete_contrasenia_etiqueta", lambda ctx, id_relacion: ctx.relaciones.delete_contrasenia_etiqueta(id_relacion),
+         preparar=lambda ctx: (ctx.relaciones.create_contrasenia_etiqueta(
+             ctx.nueva_contrasenia(), 1).id_contrasenia_etiqueta,)),
+    Caso(f"{S}.create_sesion", lambda ctx: ctx.sesiones.create_sesion(ctx.otro_usuario, "10.0.0.1")),
+    Caso(f"{S}.update_sesion", lambda ctx: ctx.sesiones.update_sesion(1, ip=ctx.unico("10.0.1."))),
+    Caso(f"{S}.delete_sesion", lambda ctx, id_sesion: ctx.sesiones.delete_sesion(id_sesion),
+         preparar=lambda ctx: (ctx.sesiones.create_sesion(ctx.otro_usuario, "10.0.0.1").id_sesion,)),
+
+    Caso(f"{C}.importar_contrasenias", lambda ctx, filas: ctx.contrasenias.importar_contrasenias(ctx.id_usuario, filas),
+         preparar=_filas_importadas, variante="1000 filas"),
+]
+
+
+def metodos_sin_caso():
+    """Métodos públicos del CRUD que ningún caso mide, para no olvidar los nuevos"""
+    medidos = {caso.metodo for caso in CASOS}
+    # transaccion es de CRUDBase: basta medirla en una clase
+    medidos |= {f"{clase}.transaccion" for clase in (U, E, S, R)}
+    faltan = []
+    for nombre, clase in inspect.getmembers(CRUD, inspect.isclass):
+        if clase.__module__ != CRUD.__name__ or not issubclass(clase, CRUD.CRUDBase) or clase is CRUD.CRUDBase:
+            continue
+        for metodo in dir(clase):
+            if not metodo.startswith("_") and metodo not in SIN_MEDIR and callable(getattr(clase, metodo)) \
+                    and metodo.upper() != metodo and f"{nombre}.{metodo}" not in medidos:
+                faltan.append(f"{nombre}.{metodo}")
+    return faltan
+
+
+def medir(caso, ctx, repeticiones, presupuesto):
+    tiempos = []
+    limite = time.perf_counter() + presupuesto
+    for _ in range(1 if caso.una_vez else repeticiones):
+        args = caso.preparar(ctx) if caso.preparar else ()
+        ctx.session.expunge_all()  # Cada repetición construye sus entidades, como un pedido nuevo
+        inicio = time.perf_counter()
+        caso.funcion(ctx, *args)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if time.perf_counter() > limite:
+            break
+    return {"mediana_ms": round(statistics.median(tiempos), 4), "min_ms": round(min(tiempos), 4),
+            "repeticiones": len(tiempos)}
+
+
+def ejecutar(filas, usuarios, etiquetas, repeticiones, presupuesto, directorio, al_medir=None):
+    """Genera la bóveda de `filas` contraseñas y mide todos los casos. Devuelve {caso: resultado}"""
+    hasheador = Hasheador()
+    llavero = Llavero()
+    entradas_por_usuario = max(filas // usuarios, 1)
+    ruta = os.path.join(directorio, f"suite-{filas}.db")
+    inicio = time.perf_counter()
+    ids = crear_boveda_sintetica(
+        ruta, usuarios=usuarios, entradas_por_usuario=entradas_por_usuario, etiquetas=etiquetas,
+        sesiones_por_usuario=entradas_por_usuario, password_hash=hasheador.hashear(PASSWORD),
+        sal_boveda=llavero.nueva_sal())
+    ruta_corpus = os.path.join(directorio, "suite-corpus.txt")
+    crear_corpus_filtraciones(ruta_corpus, hashes=HASHES_CORPUS)
+    generacion = time.perf_counter() - inicio
+
+    engine = crear_engine(url=f"sqlite:///{ruta}")
+    session = sessionmaker(bind=engine)()
+    filtraciones = CorpusFiltraciones(ruta_corpus)
+    ctx = Contexto(session, ids, entradas_por_usuario, hasheador, llavero, filtraciones)
+    resultados = {}
+    for caso in CASOS:
+        resultados[caso.nombre] = medir(caso, ctx, repeticiones, presupuesto)
+        if al_medir:
+            al_medir(caso.nombre, resultados[caso.nombre])
+    session.close()
+    engine.dispose()
+    filtraciones.cerrar()
+    os.remove(ruta)
+    os.remove(ruta_corpus)
+    return generacion, resultados
+
+
+def comparar(resultados, base, umbral, piso):
+    """Regresiones (filas, caso, mínimo base, mínimo actual) respecto de la línea base"""
+    regresiones = []
+    for filas, casos in resultados.items():
+        for nombre, actual in casos.items():
+            anterior = base.get(filas, {}).get(nombre)
+            if anterior is None:
+                continue
+            diferencia = actual["min_ms"] - anterior["min_ms"]
+            if diferencia > piso and actual["min_ms"] > anterior["min_ms"] * (1 + umbral):
+                regresiones.append((filas, nombre, anterior["min_ms"], actual["min_ms"]))
+    return regresiones
+
+
+def _entorno():
+    return {
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--usuarios", type=int, default=10, help="usuarios entre los que se reparten las filas")
+    parser.add_argument("--etiquetas", type=int, default=50)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--presupuesto", type=float, default=2.0, help="segundos como mucho por caso")
+    parser.add_argument("--salida", help="archivo JSON con los resultados")
+    parser.add_argument("--base", help="línea base JSON con la que comparar")
+    parser.add_argument("--umbral", type=float, default=0.5, help="aumento relativo del mínimo que es regresión")
+    parser.add_argument("--piso", type=float, default=1.0, help="aumento en ms por debajo del cual no es regresión")
+    parser.add_argument("--guardar-base", help="escribir los resultados como línea base en este archivo")
+    args = parser.parse_args()
+
+    faltan = metodos_sin_caso()
+    if faltan:
+        print(f"Métodos sin caso en la suite: {', '.join(faltan)}", file=sys.stderr)
+
+    base = None
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)["resultados"]
+
+    documento = {"formato": FORMATO, "entorno": _entorno(), "parametros": {
+        "usuarios": args.usuarios, "etiquetas": args.etiquetas, "repeticiones": args.repeticiones,
+        "presupuesto": args.presupuesto}, "resultados": {}}
+    with tempfile.TemporaryDirectory() as directorio:
+        for filas in args.filas:
+            referencia = (base or {}).get(str(filas), {})
+
+            def mostrar(nombre, resultado):
+                anterior = referencia.get(nombre)
+                cambio = f"{resultado['min_ms'] / anterior['min_ms'] - 1:>+8.0%}" \
+                    if anterior and anterior["min_ms"] else ""
+                print(f"  {nombre:<58} {resultado['mediana_ms']:>10.3f} ms {resultado['repeticiones']:>4}x {cambio}",
+                      flush=True)
+
+            print(f"{filas} filas, {args.usuarios} usuarios", flush=True)
+            generacion, resultados = ejecutar(filas, args.usuarios, args.etiquetas, args.repeticiones,
+                                              args.presupuesto, directorio, al_medir=mostrar)
+            print(f"  (bóveda generada en {generacion:.1f} s)")
+            documento["resultados"][str(filas)] = resultados
+
+    for destino in (args.salida, args.guardar_base):
+        if destino:
+            with open(destino, "w", encoding="utf-8") as archivo:
+                json.dump(documento, archivo, ensure_ascii=False, indent=1, sort_keys=True)
+                archivo.write("\n")
+
+    if base is not None:
+        regresiones = comparar(documento["resultados"], base, args.umbral, args.piso)
+        for filas, nombre, anterior, actual in regresiones:
+            print(f"REGRESIÓN {filas} filas, {nombre}: {anterior:.3f} -> {actual:.3f} ms", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+        print(f"Sin regresiones respecto de {args.base} (umbral {args.umbral:.0%}, piso {args.piso} ms)")
+
+
+if __name__ == "__main__":
+    main()
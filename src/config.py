@@ -1,7 +1,245 @@
-from sqlalchemy import create_engine
+"""
+Configuración de la base de datos y fábrica del engine de SQLAlchemy.
+
+Los ajustes salen de un preajuste (PRESETS) y se pueden cambiar con un archivo
+INI, sección [base_de_datos], y con variables de entorno PASSKEEPER_DB_*, que
+tienen prioridad. Los PRAGMA se aplican en cada conexión nueva del pool.
+
+    [base_de_datos]
+    url = sqlite:///dbpasskeeper2.db
+    preset = equilibrado
+    cache_size = -131072
+
+    PASSKEEPER_DB_PRESET=seguro PASSKEEPER_DB_BUSY_TIMEOUT=10000 python -m src.vista.APP
+"""
+import configparser
+import os
+import threading
+from sqlalchemy import create_engine, event, pool
 from sqlalchemy.orm import sessionmaker
 
 # Configuración de la base de datos (ajusta la URL según tu base de datos)
 DATABASE_URL = "sqlite:///dbpasskeeper2.db"
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
+ARCHIVO_CONFIGURACION = "passkeeper.ini"
+SECCION = "base_de_datos"
+PREFIJO_ENTORNO = "PASSKEEPER_DB_"
+
+# PRAGMA que se aplican al conectar, en este orden; None deja el valor de SQLite
+PRAGMAS = ("busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store")
+
+PRESETS = {
+    # Lo que hace SQLite sin tocar nada: diario de rollback y fsync en cada commit
+    "original": {},
+    # WAL sin perder durabilidad: cada commit sigue esperando al disco
+    "seguro": {
+        "journal_mode": "WAL", "synchronous": "FULL", "busy_timeout": 5000,
+        "cache_size": -16384, "temp_store": "MEMORY",
+    },
+    # WAL con synchronous=NORMAL: un corte de luz puede perder los últimos commits, nunca corromper la base
+    "equilibrado": {
+        "journal_mode": "WAL", "synchronous": "NORMAL", "busy_timeout": 5000,
+        "cache_size": -65536, "mmap_size": 268435456, "temp_store": "MEMORY",
+    },
+    # Para cargas masivas y benchmarks: sin esperar al disco
+    "rapido": {
+        "journal_mode": "WAL", "synchronous": "OFF", "busy_timeout": 5000,
+        "cache_size": -262144, "mmap_size": 1073741824, "temp_store": "MEMORY",
+    },
+}
+PRESET_POR_DEFECTO = "equilibrado"
+
+POOLS = {
+    "QueuePool": pool.QueuePool,
+    "NullPool": pool.NullPool,
+    "StaticPool": pool.StaticPool,
+    "SingletonThreadPool": pool.SingletonThreadPool,
+}
+
+_ENTEROS = {"busy_timeout", "cache_size", "mmap_size", "pool_size", "max_overflow"}
+
+
+class ConfiguracionBD:
+    """Ajustes del engine: URL, PRAGMA de SQLite y pool de conexiones"""
+
+    def __init__(self, url=DATABASE_URL, preset=PRESET_POR_DEFECTO, pool=None, pool_size=None,
+                 max_overflow=None, **pragmas):
+        if preset not in PRESETS:
+            raise ValueError(f"Preajuste desconocido: {preset}")
+        desconocidos = set(pragmas) - set(PRAGMAS)
+        if desconocidos:
+            raise ValueError(f"Ajustes desconocidos: {', '.join(sorted(desconocidos))}")
+        if pool is not None and pool not in POOLS:
+            raise ValueError(f"Pool desconocido: {pool}")
+
+        self.url = url
+        self.preset = preset
+        self.pool = pool
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pragmas = {**dict.fromkeys(PRAGMAS), **PRESETS[preset], **pragmas}
+
+    def __repr__(self):
+        return f"ConfiguracionBD(url={self.url!r}, preset={self.preset!r}, pool={self.pool!r}, pragmas={self.pragmas!r})"
+
+
+def _convertir(clave, valor):
+    if valor is None or valor == "":
+        return None
+    return int(valor) if clave in _ENTEROS else valor
+
+
+def cargar_configuracion(archivo=None, entorno=None):
+    """
+    Lee la configuración del archivo INI y del entorno. Sin archivo se usa
+    PASSKEEPER_CONFIG o, si existe, passkeeper.ini en el directorio actual.
+    """
+    entorno = os.environ if entorno is None else entorno
+    ajustes = {}
+
+    archivo = archivo or entorno.get("PASSKEEPER_CONFIG")
+    if archivo is None and os.path.exists(ARCHIVO_CONFIGURACION):
+        archivo = ARCHIVO_CONFIGURACION
+    if archivo is not None:
+        parser = configparser.ConfigParser()
+        if not parser.read(archivo, encoding="utf-8"):
+            raise FileNotFoundError(f"No se encontró el archivo de configuración {archivo}")
+        if parser.has_section(SECCION):
+            ajustes.update(parser.items(SECCION))
+
+    for variable, valor in entorno.items():
+        if variable.startswith(PREFIJO_ENTORNO):
+            ajustes[variable[len(PREFIJO_ENTORNO):].lower()] = valor
+
+    ajustes = {clave: _convertir(clave, valor) for clave, valor in ajustes.items()}
+    return ConfiguracionBD(**{clave: valor for clave, valor in ajustes.items() if valor is not None})
+
+
+def _aplicar_pragmas(pragmas):
+    def al_conectar(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        try:
+            for nombre in PRAGMAS:
+                if nombre == "journal_mode":
+                    # En una base nueva, antes de que WAL escriba la cabecera: después ya no se puede
+                    # activar sin un VACUUM completo (ver migraciones.liberar_espacio)
+                    cursor.execute("PRAGMA page_count")
+                    if cursor.fetchone()[0] == 0:
+                        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                if pragmas[nombre] is not None:
+                    cursor.execute(f"PRAGMA {nombre} = {pragmas[nombre]}")
+        finally:
+            cursor.close()
+    return al_conectar
+
+
+def crear_engine(configuracion=None, **ajustes):
+    """
+    Crea un engine con la configuración dada. Sin ella, con los ajustes sueltos
+    (url, preset, pool, PRAGMA...) o, si tampoco los hay, con cargar_configuracion().
+    """
+    if configuracion is None:
+        configuracion = ConfiguracionBD(**ajustes) if ajustes else cargar_configuracion()
+
+    opciones = {}
+    if configuracion.pool is not None:
+        opciones["poolclass"] = POOLS[configuracion.pool]
+    if configuracion.pool_size is not None:
+        opciones["pool_size"] = configuracion.pool_size
+    if configuracion.max_overflow is not None:
+        opciones["max_overflow"] = configuracion.max_overflow
+
+    engine = create_engine(configuracion.url, **opciones)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _aplicar_pragmas(configuracion.pragmas))
+    return engine
+
+
+def crear_engine_async(configuracion=None, **ajustes):
+    """
+    Como crear_engine, pero un AsyncEngine de sqlalchemy.ext.asyncio con aiosqlite, para
+    src.logica.CRUD_async. Una URL sqlite:/// se pasa al driver aiosqlite y los PRAGMA
+    se aplican igual en cada conexión.
+    """
+    # Importación diferida: la aplicación de escritorio no usa asyncio
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    if configuracion is None:
+        configuracion = ConfiguracionBD(**ajustes) if ajustes else cargar_configuracion()
+
+    url = make_url(configuracion.url)
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    opciones = {}
+    if configuracion.pool is not None:
+        opciones["poolclass"] = pool.AsyncAdaptedQueuePool if configuracion.pool == "QueuePool" else POOLS[configuracion.pool]
+    if configuracion.pool_size is not None:
+        opciones["pool_size"] = configuracion.pool_size
+    if configuracion.max_overflow is not None:
+        opciones["max_overflow"] = configuracion.max_overflow
+
+    engine = create_async_engine(url, **opciones)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _aplicar_pragmas(configuracion.pragmas))
+    return engine
+
+
+class ContextoApp:
+    """
+    Engine, esquema y sesiones de la aplicación, creados la primera vez que se piden.
+
+    Importar los módulos del proyecto no abre la base de datos: la configuración se
+    lee al pedir el engine, y el esquema se crea o actualiza con preparar_esquema().
+    """
+
+    def __init__(self, configuracion=None):
+        self._configuracion = configuracion
+        self._engine = None
+        self._Session = None
+        self._version_esquema = None
+        self._lock = threading.RLock()
+
+    @property
+    def configuracion(self):
+        with self._lock:
+            if self._configuracion is None:
+                self._configuracion = cargar_configuracion()
+            return self._configuracion
+
+    @property
+    def engine(self):
+        with self._lock:
+            if self._engine is None:
+                self._engine = crear_engine(self.configuracion)
+            return self._engine
+
+    @property
+    def Session(self):
+        with self._lock:
+            if self._Session is None:
+                self._Session = sessionmaker(bind=self.engine)
+            return self._Session
+
+    def preparar_esquema(self):
+        """Crea las tablas y aplica las migraciones pendientes, una sola vez. Devuelve la versión"""
+        # Importación diferida: el modelo y las migraciones solo hacen falta al tocar la base
+        from src.modelo.migraciones import actualizar_esquema
+        with self._lock:
+            if self._version_esquema is None:
+                self._version_esquema = actualizar_esquema(self.engine)
+            return self._version_esquema
+
+    def sesion(self):
+        """Una sesión nueva sobre el esquema ya preparado"""
+        self.preparar_esquema()
+        return self.Session()
+
+    def cerrar(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = self._Session = self._version_esquema = None
+
+
+# Contexto de la aplicación; crearlo no tiene efectos hasta que se usa
+contexto = ContextoApp()
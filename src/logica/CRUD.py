@@ -1,41 +1,164 @@
-from pkg_resources import non_empty_lines
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
-from datetime import datetime
-from src.modelo.modelo import Usuario, engine, Sesion, Etiqueta, ContraseniaEtiqueta
-from src.config import sessionmaker
-from datetime import datetime
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlalchemy import insert, select, update, delete, bindparam, cast, func, tuple_, text, Integer
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlalchemy.orm import selectinload
+from datetime import datetime, timedelta
+from itertools import groupby
+from operator import attrgetter, itemgetter
+from src.modelo.modelo import Usuario, Sesion, SesionArchivada, Etiqueta, ContraseniaEtiqueta, ConteoEtiqueta, RotacionClave
 from src.modelo.modelo import Contrasenia  # Asegúrate de importar correctamente el modelo Contrasenia
+from src.logica.importador import ResultadoImportacion, validar_fila
+from src.logica.cache import leer_con_cache
+from src.logica.seguridad import HASHEADOR_POR_DEFECTO
+from src.logica.boveda import LLAVERO, Boveda, BovedaBloqueada, derivar_clave, es_sellado
+from src.logica.rotacion import ResultadoRotacion, resellar
+from src.logica.filtraciones import ResultadoRevision, revisar
+from src.logica.instrumentacion import instrumentado
 
-class UsuarioCRUD:
-    def __init__(self, session):
+# Claves en session.info del estado de CRUDBase.transaccion
+_PROFUNDIDAD_TRANSACCION = "crud_profundidad_transaccion"
+_AL_CONFIRMAR = "crud_al_confirmar"
+
+# Fila del listado de contraseñas: solo las columnas que se muestran, sin entidad ni sesión detrás
+FilaListado = namedtuple("FilaListado", [
+    "id_contrasenia", "servicio", "nombre_usuario_servicio", "fecha_creacion", "ultima_modificacion", "nota"])
+
+
+class CRUDBase:
+    """
+    Confirmación de cambios común a las clases del CRUD.
+
+    Cada método que modifica datos confirma su propia transacción, salvo dentro de
+    `with crud.transaccion():`. Ahí los métodos solo hacen flush y el grupo entero se
+    confirma una vez al salir, o se deshace si sale con una excepción. El estado se
+    guarda en session.info, así todas las clases del CRUD que comparten la sesión
+    participan de la misma transacción.
+    """
+
+    @contextmanager
+    def transaccion(self):
+        """Agrupa las operaciones del bloque en un único commit. Los bloques anidados se unen al exterior"""
+        info = self.session.info
+        if info.get(_PROFUNDIDAD_TRANSACCION):
+            info[_PROFUNDIDAD_TRANSACCION] += 1
+            try:
+                yield self
+            finally:
+                info[_PROFUNDIDAD_TRANSACCION] -= 1
+            return
+
+        info[_PROFUNDIDAD_TRANSACCION] = 1
+        al_confirmar = info[_AL_CONFIRMAR] = []
+        try:
+            yield self
+            self.session.commit()
+        except BaseException:
+            self.session.rollback()
+            raise
+        finally:
+            del info[_PROFUNDIDAD_TRANSACCION]
+            del info[_AL_CONFIRMAR]
+        for accion in al_confirmar:
+            accion()
+
+    @property
+    def en_transaccion(self):
+        return bool(self.session.info.get(_PROFUNDIDAD_TRANSACCION))
+
+    def _confirmar(self):
+        """Commit fuera de una transacción agrupada; dentro, solo flush"""
+        if self.en_transaccion:
+            self.session.flush()
+        else:
+            self.session.commit()
+
+    def _deshacer(self):
+        """Rollback fuera de una transacción agrupada; dentro, el error deshace el grupo al salir del bloque"""
+        if not self.en_transaccion:
+            self.session.rollback()
+
+    def _leer_con_cache(self, clave, cargar):
+        """leer_con_cache con la caché de la clase, salvo dentro de una transacción agrupada"""
+        # Ahí las escrituras solo hacen flush y la invalidación espera al commit: guardar lo
+        # leído dejaría en la caché datos que un rollback puede descartar
+        return leer_con_cache(self.cache, clave, cargar, guardar=not self.en_transaccion)
+
+    def _al_confirmar(self, accion, *args):
+        """Ejecuta la acción tras el commit: ya, o al confirmar la transacción agrupada (nunca si se deshace)"""
+        if self.en_transaccion:
+            self.session.info[_AL_CONFIRMAR].append(lambda: accion(*args))
+        else:
+            accion(*args)
+
+
+@instrumentado
+class UsuarioCRUD(CRUDBase):
+    def __init__(self, session, cache=None, hasheador=None, llavero=None):
+        """
+        cache es una CacheEntidades opcional: con ella, get_usuario_by_id y get_usuario_by_email
+        devuelven instantáneas inmutables en lugar de entidades de la sesión.
+        hasheador es el Hasheador de las contraseñas; por defecto, scrypt en el mismo hilo.
+        llavero es donde se guarda la clave de la bóveda al iniciar sesión; por defecto, el de la aplicación.
+        """
         self.session = session
+        self.cache = cache
+        self.hasheador = hasheador or HASHEADOR_POR_DEFECTO
+        self.llavero = llavero or LLAVERO
+
+    def _invalidar(self, id_usuario, *emails):
+        if self.cache is not None:
+            claves = [("usuario", "id", id_usuario)] + [("usuario", "email", email) for email in emails]
+            self._al_confirmar(self.cache.invalidar, *claves)
 
     def create_usuario(self, nombre_usuario, email, password_hash, rol):
-        """Crear un nuevo usuario"""
+        """Crear un nuevo usuario. password_hash es la contraseña tal como la escribe el usuario; se guarda su hash"""
         try:
             nuevo_usuario = Usuario(
                 nombre_usuario=nombre_usuario,
                 email=email,
-                password_hash=password_hash,
-                rol=rol
+                password_hash=self.hasheador.hashear(password_hash),
+                rol=rol,
+                sal_boveda=self.llavero.nueva_sal()
             )
             self.session.add(nuevo_usuario)
-            self.session.commit()
+            self._confirmar()
             return nuevo_usuario
         except IntegrityError:
-            self.session.rollback()  # Rollback en caso de error (por ejemplo, email duplicado)
+            self._deshacer()  # Rollback en caso de error (por ejemplo, email duplicado)
             raise Exception("El email ya está registrado.")
 
     def iniciar_sesion(self, email, password_hash):
-        """Iniciar sesión con un usuario basado en el correo y la contraseña proporcionados"""
+        """
+        Iniciar sesión con un usuario basado en el correo y la contraseña proporcionados.
+
+        Deriva además la clave de la bóveda del usuario y la deja en el llavero hasta que
+        se cierre la última de sus sesiones que la usan, así las contraseñas se sellan y se
+        revelan sin volver a derivarla.
+        """
         usuario = self.session.query(Usuario).filter_by(email=email).first()
-        if usuario and usuario.password_hash == password_hash:
-            # Aquí podrías hacer cualquier lógica adicional, como registrar la sesión
-            # Crear una sesión para el usuario
+        if usuario and self.hasheador.verificar(password_hash, usuario.password_hash):
+            # Si el hash está en claro o con otro coste, se regenera ahora que se conoce la contraseña
+            if self.hasheador.necesita_rehash(usuario.password_hash):
+                usuario.password_hash = self.hasheador.hashear(password_hash)
+                self._invalidar(usuario.id_usuario, usuario.email)
+            if usuario.sal_boveda is None:  # Usuario de una versión anterior
+                usuario.sal_boveda = self.llavero.nueva_sal()
+                self._invalidar(usuario.id_usuario, usuario.email)
+            # Crear una sesión para el usuario; el llavero guarda la clave a su nombre
             sesion = Sesion(id_usuario=usuario.id_usuario, fecha_inicio=datetime.now())
             self.session.add(sesion)
-            self.session.commit()
+            self.session.flush()
+            boveda = self.llavero.desbloquear(usuario.id_usuario, password_hash, usuario.sal_boveda, self.hasheador,
+                                              id_sesion=sesion.id_sesion)
+            rotacion = self.session.get(RotacionClave, usuario.id_usuario)
+            if rotacion is not None:
+                # Rotación sin terminar: la clave anterior hace falta para lo que aún no se volvió a sellar
+                anterior = boveda.desenvolver(rotacion.clave_anterior, usuario.id_usuario)
+                boveda.anteriores[anterior.id_clave] = anterior
+            self._confirmar()
             return sesion  # Retornar la sesión creada
         return None
 
@@ -43,39 +166,83 @@ class UsuarioCRUD:
         """
         Obtiene un usuario específico por su ID.
         """
-        return self.session.query(Usuario).filter_by(id_usuario=id_usuario).first()
+        return self._leer_con_cache(("usuario", "id", id_usuario), lambda: self._get_usuario(id_usuario))
 
     def get_usuario_by_email(self, email):
         """
         Obtiene un usuario específico por su email.
         """
-        return self.session.query(Usuario).filter_by(email=email).first()
+        return self._leer_con_cache(
+            ("usuario", "email", email),
+            lambda: self.session.query(Usuario).filter_by(email=email).first())
+
+    def _get_usuario(self, id_usuario):
+        # Siempre la entidad de la sesión, para los métodos que la modifican
+        return self.session.query(Usuario).filter_by(id_usuario=id_usuario).first()
 
     def update_usuario(self, id_usuario, nombre_usuario=None, email=None, password_hash=None, rol=None):
         """
         Actualiza la información de un usuario.
         """
-        usuario = self.get_usuario_by_id(id_usuario)
+        usuario = self._get_usuario(id_usuario)
         if usuario:
+            if password_hash:
+                # Primero, porque falla si la bóveda está bloqueada y entonces no debe cambiar nada
+                self._rotar_clave_boveda(usuario, password_hash)
+            email_anterior = usuario.email
             if nombre_usuario:
                 usuario.nombre_usuario = nombre_usuario
             if email:
                 usuario.email = email
             if password_hash:
-                usuario.password_hash = password_hash
+                usuario.password_hash = self.hasheador.hashear(password_hash)
             if rol:
                 usuario.rol = rol
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_usuario, email_anterior, usuario.email)
         return usuario
 
+    def renovar_clave_boveda(self, id_usuario, password):
+        """
+        Deriva una clave nueva de la bóveda con la misma contraseña maestra, por ejemplo tras
+        subir el coste de scrypt del llavero. Las contraseñas se vuelven a sellar con
+        Contraseniacrud.rotar_clave.
+        """
+        usuario = self._get_usuario(id_usuario)
+        if usuario is None or not self.hasheador.verificar(password, usuario.password_hash):
+            raise Exception("Contraseña incorrecta")
+        self._rotar_clave_boveda(usuario, password)
+        self._confirmar()
+        self._invalidar(id_usuario, usuario.email)
+
+    def _rotar_clave_boveda(self, usuario, password):
+        """Cambia la sal y la clave de la bóveda y deja registrada la rotación pendiente, en la misma transacción"""
+        anterior = self.llavero.obtener(usuario.id_usuario)
+        sal_boveda = self.llavero.nueva_sal()
+        if anterior is None:
+            if usuario.sal_boveda is not None:
+                # Sin la clave actual, las contraseñas selladas quedarían ilegibles
+                raise BovedaBloqueada("Inicie sesión para cambiar la clave de la bóveda")
+            usuario.sal_boveda = sal_boveda
+            return
+        if anterior.anteriores or self.session.get(RotacionClave, usuario.id_usuario) is not None:
+            raise Exception("Hay una rotación de la clave de la bóveda sin terminar")
+
+        nueva = Boveda(derivar_clave(password, sal_boveda, self.hasheador), anteriores=[anterior])
+        usuario.sal_boveda = sal_boveda
+        self.session.add(RotacionClave(id_usuario=usuario.id_usuario, id_clave=nueva.id_clave,
+                                       clave_anterior=nueva.envolver(anterior, usuario.id_usuario)))
+        self._al_confirmar(self.llavero.guardar, usuario.id_usuario, nueva)
+
     def delete_usuario(self, id_usuario):
         """
         Elimina un usuario de la base de datos.
         """
-        usuario = self.get_usuario_by_id(id_usuario)
+        usuario = self._get_usuario(id_usuario)
         if usuario:
             self.session.delete(usuario)
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_usuario, usuario.email)
         return usuario
 
     def cerrar_sesion(self, id_sesion):
@@ -85,26 +252,289 @@ class UsuarioCRUD:
         if sesion:
             # Establecer la fecha de cierre de la sesión
             sesion.fecha_fin = datetime.now()
-            self.session.commit()
+            self._confirmar()
+            if self.cache is not None:
+                self._al_confirmar(self.cache.invalidar, ("sesion", "id", id_sesion))
+            # La clave es del usuario: se descarta al cerrar la última de sus sesiones en este proceso
+            self._al_confirmar(self.llavero.soltar, sesion.id_usuario, id_sesion)
             return sesion
         else:
             raise Exception("Sesión no encontrada")
 
-class Contraseniacrud:
-    def __init__(self, session):
+@instrumentado
+class Contraseniacrud(CRUDBase):
+    def __init__(self, session, llavero=None, filtraciones=None):
+        """
+        llavero tiene las claves de las bóvedas desbloqueadas; por defecto, el de la aplicación.
+        Las contraseñas se sellan al crearlas, editarlas o importarlas; con la bóveda bloqueada
+        eso lanza BovedaBloqueada. Solo los usuarios de versiones anteriores, que aún no tienen
+        bóveda (sal_boveda), las guardan tal como llegan; sellar_pendientes las sella después.
+        Con un CorpusFiltraciones en filtraciones, cada contraseña creada, editada o importada
+        se comprueba contra él y se guarda cuántas veces aparece en veces_filtrada.
+        """
         self.session = session
+        self.llavero = llavero or LLAVERO
+        self.filtraciones = filtraciones
+        self.observadores = []
+
+    def suscribir(self, observador):
+        """
+        Registra un objeto al que avisar tras cada cambio confirmado. Debe implementar
+        contrasenia_creada, contrasenia_editada y contrasenia_eliminada, que reciben la contraseña.
+        """
+        self.observadores.append(observador)
+
+    def _notificar(self, evento, contrasenia):
+        for observador in self.observadores:
+            self._al_confirmar(getattr(observador, evento), contrasenia)
+
+    def _boveda_para_sellar(self, id_usuario):
+        """La Boveda con la que sellar, o None si el usuario todavía no tiene bóveda"""
+        boveda = self.llavero.obtener(id_usuario)
+        if boveda is None and self.session.execute(
+                select(Usuario.sal_boveda).where(Usuario.id_usuario == id_usuario)).scalar() is not None:
+            # Tiene bóveda pero está bloqueada (por ejemplo, cerró sesión): no se guarda nada en claro
+            raise BovedaBloqueada("Inicie sesión para guardar contraseñas")
+        return boveda
+
+    @staticmethod
+    def _sellar(boveda, id_usuario, contrasenia):
+        """(valor a guardar, huella); sin bóveda, la contraseña en claro y sin huella"""
+        if boveda is None:
+            return contrasenia, None
+        return boveda.sellar(contrasenia, id_usuario), boveda.huella(contrasenia)
+
+    def _veces_filtrada(self, contrasenia):
+        """Veces que aparece la contraseña en el corpus; None sin corpus, porque no se sabe"""
+        return None if self.filtraciones is None else self.filtraciones.veces(contrasenia)
+
+    def descifrar(self, id_usuario, contrasenia_encriptada):
+        """El texto de una contraseña guardada. Lanza BovedaBloqueada si está sellada y no hay clave"""
+        if not es_sellado(contrasenia_encriptada):
+            return contrasenia_encriptada  # Guardada en claro por una versión anterior
+        boveda = self.llavero.obtener(id_usuario)
+        if boveda is None:
+            raise BovedaBloqueada("Inicie sesión para ver las contraseñas")
+        return boveda.abrir(contrasenia_encriptada, id_usuario)
+
+    def revelar_contrasenia(self, id_contrasenia):
+        """
+        Descifra una sola contraseña, para mostrarla o copiarla. Es el único punto en que
+        se descifra: los listados devuelven el valor sellado y no cuestan criptografía.
+        """
+        fila = self.session.execute(
+            select(Contrasenia.id_usuario, Contrasenia.contrasenia_encriptada)
+            .where(Contrasenia.id_contrasenia == id_contrasenia)
+        ).first()
+        if fila is None:
+            raise Exception("La contraseña no existe")
+        return self.descifrar(fila.id_usuario, fila.contrasenia_encriptada)
+
+    # UPDATE de Core para volver a sellar por lotes: un executemany sin la contabilidad del UPDATE masivo del ORM
+    _ACTUALIZAR_VALOR = (
+        update(Contrasenia.__table__)
+        .where(Contrasenia.__table__.c.id_contrasenia == bindparam("b_id"))
+        .values(contrasenia_encriptada=bindparam("b_valor"), huella=bindparam("b_huella"))
+    )
+
+    def sellar_pendientes(self, id_usuario, tamanio_lote=500):
+        """
+        Sella las contraseñas del usuario guardadas en claro por versiones anteriores.
+        Recorre la tabla por id en lotes, con un commit por lote. Devuelve cuántas selló.
+        """
+        boveda = self.llavero.obtener(id_usuario)
+        if boveda is None:
+            raise BovedaBloqueada("Inicie sesión para sellar las contraseñas")
+        total = 0
+        ultimo_id = 0
+        while True:
+            filas = self.session.execute(
+                select(Contrasenia.id_contrasenia, Contrasenia.contrasenia_encriptada)
+                .where(Contrasenia.id_usuario == id_usuario, Contrasenia.id_contrasenia > ultimo_id)
+                .order_by(Contrasenia.id_contrasenia)
+                .limit(tamanio_lote)
+            ).all()
+            if not filas:
+                return total
+            ultimo_id = filas[-1].id_contrasenia
+            pendientes = [
+                {"b_id": fila.id_contrasenia, "b_valor": boveda.sellar(fila.contrasenia_encriptada, id_usuario),
+                 "b_huella": boveda.huella(fila.contrasenia_encriptada)}
+                for fila in filas if not es_sellado(fila.contrasenia_encriptada)
+            ]
+            if pendientes:
+                self.session.execute(self._ACTUALIZAR_VALOR, pendientes)
+                self._confirmar()
+                total += len(pendientes)
+
+    _ACTUALIZAR_HUELLA = (
+        update(Contrasenia.__table__)
+        .where(Contrasenia.__table__.c.id_contrasenia == bindparam("b_id"))
+        .values(huella=bindparam("b_huella"))
+    )
+
+    def calcular_huellas(self, id_usuario, tamanio_lote=500):
+        """
+        Calcula la huella de las contraseñas del usuario que no tienen una con la clave actual,
+        como las guardadas antes de que existieran las huellas. Es la única vez que hace falta
+        descifrarlas: después, crear, editar, importar y rotar la clave mantienen la huella.
+        Procesa lotes de tamanio_lote, con un commit por lote. Devuelve cuántas calculó.
+        """
+        boveda = self.llavero.obtener(id_usuario)
+        if boveda is None:
+            raise BovedaBloqueada("Inicie sesión para calcular las huellas")
+        # Las huellas vigentes empiezan con "<id_clave>$"; '%' es el carácter que sigue a '$'. Cada
+        # condición es un rango de ix_contrasenias_usuario_huella del que salen las filas procesadas,
+        # así cada lote empieza donde hay trabajo sin recorrer lo ya hecho
+        pendientes = (Contrasenia.huella.is_(None), Contrasenia.huella < f"{boveda.id_clave}$",
+                      Contrasenia.huella >= f"{boveda.id_clave}%")
+        total = 0
+        for condicion in pendientes:
+            while True:
+                filas = self.session.execute(
+                    select(Contrasenia.id_contrasenia, Contrasenia.contrasenia_encriptada)
+                    .where(Contrasenia.id_usuario == id_usuario, condicion)
+                    .limit(tamanio_lote)
+                ).all()
+                if not filas:
+                    break
+                self._guardar_huellas(boveda, id_usuario, filas)
+                total += len(filas)
+        return total
+
+    def _guardar_huellas(self, boveda, id_usuario, filas):
+        huellas = []
+        for fila in filas:
+            valor = fila.contrasenia_encriptada
+            texto = boveda.abrir(valor, id_usuario) if es_sellado(valor) else valor
+            huellas.append({"b_id": fila.id_contrasenia, "b_huella": boveda.huella(texto)})
+        self.session.execute(self._ACTUALIZAR_HUELLA, huellas)
+        self._confirmar()
+
+    _ACTUALIZAR_FILTRADA = (
+        update(Contrasenia.__table__)
+        .where(Contrasenia.__table__.c.id_contrasenia == bindparam("b_id"))
+        .values(veces_filtrada=bindparam("b_veces"))
+    )
+
+    def revisar_filtraciones(self, id_usuario, tamanio_lote=1000, hilos=4, al_progresar=None):
+        """
+        Comprueba contra el corpus todas las contraseñas del usuario y actualiza veces_filtrada,
+        como tras descargar una versión nueva del corpus o para las guardadas antes de tenerlo.
+
+        Recorre las filas por id en lotes de tamanio_lote, que se reparten entre `hilos` hilos
+        (descifrar, hashear y buscar en el corpus), con un commit por lote que cambie algo.
+        al_progresar recibe el ResultadoRevision tras cada lote.
+        """
+        if self.filtraciones is None:
+            raise ValueError("No hay un corpus de filtraciones con el que revisar")
+        descifrar = lambda valor: self.descifrar(id_usuario, valor)
+        resultado = ResultadoRevision()
+        ultimo_id = 0
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            while True:
+                filas = self.session.execute(
+                    select(Contrasenia.id_contrasenia, Contrasenia.contrasenia_encriptada, Contrasenia.veces_filtrada)
+                    .where(Contrasenia.id_usuario == id_usuario, Contrasenia.id_contrasenia > ultimo_id)
+                    .order_by(Contrasenia.id_contrasenia)
+                    .limit(tamanio_lote)
+                ).all()
+                if not filas:
+                    return resultado
+                ultimo_id = filas[-1].id_contrasenia
+                valores = [fila.contrasenia_encriptada for fila in filas]
+                tramo = -(-len(valores) // hilos)
+                veces = [
+                    cantidad
+                    for parte in pool.map(lambda inicio: revisar(self.filtraciones, descifrar, valores[inicio:inicio + tramo]),
+                                          range(0, len(valores), tramo))
+                    for cantidad in parte
+                ]
+                cambios = [
+                    {"b_id": fila.id_contrasenia, "b_veces": cantidad}
+                    for fila, cantidad in zip(filas, veces) if cantidad != fila.veces_filtrada
+                ]
+                if cambios:
+                    self.session.execute(self._ACTUALIZAR_FILTRADA, cambios)
+                    self._confirmar()
+                resultado.agregar_lote(len(filas), sum(1 for cantidad in veces if cantidad), len(cambios))
+                if al_progresar is not None:
+                    al_progresar(resultado)
+
+    def rotar_clave(self, id_usuario, tamanio_lote=1000, hilos=4, al_progresar=None):
+        """
+        Vuelve a sellar con la clave actual las contraseñas de una rotación pendiente.
+
+        Recorre las filas por id en lotes de tamanio_lote, que se reparten entre `hilos`
+        hilos. Cada lote se confirma junto con el punto de control (rotaciones_clave), así
+        una ejecución interrumpida continúa donde quedó. al_progresar recibe el
+        ResultadoRotacion tras cada lote. Sin rotación pendiente no hace nada.
+        """
+        boveda = self.llavero.obtener(id_usuario)
+        if boveda is None:
+            raise BovedaBloqueada("Inicie sesión para rotar la clave de la bóveda")
+        rotacion = self.session.get(RotacionClave, id_usuario)
+        if rotacion is None:
+            return ResultadoRotacion()
+        if rotacion.id_clave != boveda.id_clave:
+            raise ValueError("La clave del llavero no es la de la rotación pendiente")
+
+        pendientes = self.session.execute(
+            select(func.count()).select_from(Contrasenia)
+            .where(Contrasenia.id_usuario == id_usuario, Contrasenia.id_contrasenia > rotacion.ultimo_id)
+        ).scalar()
+        resultado = ResultadoRotacion(total=pendientes, reanudada=rotacion.ultimo_id > 0)
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            while True:
+                filas = self.session.execute(
+                    select(Contrasenia.id_contrasenia, Contrasenia.contrasenia_encriptada)
+                    .where(Contrasenia.id_usuario == id_usuario, Contrasenia.id_contrasenia > rotacion.ultimo_id)
+                    .order_by(Contrasenia.id_contrasenia)
+                    .limit(tamanio_lote)
+                ).all()
+                if not filas:
+                    break
+                valores = [fila.contrasenia_encriptada for fila in filas]
+                tramo = -(-len(valores) // hilos)
+                selladas = [
+                    valor
+                    for parte in pool.map(lambda inicio: resellar(boveda, id_usuario, valores[inicio:inicio + tramo]),
+                                          range(0, len(valores), tramo))
+                    for valor in parte
+                ]
+                # La huella cambia con la clave, así se actualiza junto con el valor
+                cambios = [
+                    {"b_id": fila.id_contrasenia, "b_valor": sellada, "b_huella": huella}
+                    for fila, (sellada, huella) in zip(filas, selladas) if sellada != fila.contrasenia_encriptada
+                ]
+                if cambios:
+                    self.session.execute(self._ACTUALIZAR_VALOR, cambios)
+                rotacion.ultimo_id = filas[-1].id_contrasenia
+                rotacion.procesadas += len(filas)
+                self._confirmar()
+                resultado.agregar_lote(len(filas), len(cambios))
+                if al_progresar is not None:
+                    al_progresar(resultado)
+
+        self.session.delete(rotacion)
+        self._confirmar()
+        self._al_confirmar(boveda.anteriores.clear)  # La clave anterior ya no hace falta
+        return resultado
 
     def create_contrasenia(self, servicio, nombre_usuario_servicio, contrasenia_encriptada, id_usuario, nota=None):
-        """Crear una nueva contrasenia en la base de datos"""
+        """Crear una nueva contrasenia en la base de datos. contrasenia_encriptada se sella si la bóveda está desbloqueada"""
         # Verificar si ya existe una contraseña para este servicio y usuario
        # existing_contrasenia = self.session.query(Contrasenia).filter_by(servicio=servicio, id_usuario=id_usuario).first()
        # if existing_contrasenia:
         #    raise Exception("Ya existe una contraseña para este servicio y usuario")
 
+        valor, huella = self._sellar(self._boveda_para_sellar(id_usuario), id_usuario, contrasenia_encriptada)
         contrasenia = Contrasenia(
             servicio=servicio,
             nombre_usuario_servicio=nombre_usuario_servicio,
-            contrasenia_encriptada=contrasenia_encriptada,
+            contrasenia_encriptada=valor,
+            huella=huella,
+            veces_filtrada=self._veces_filtrada(contrasenia_encriptada),
             fecha_creacion=datetime.now(),
             #ultima_modificacion=datetime.now(),
             ultima_modificacion=None,
@@ -112,7 +542,8 @@ class Contraseniacrud:
             nota=nota
         )
         self.session.add(contrasenia)
-        self.session.commit()
+        self._confirmar()
+        self._notificar("contrasenia_creada", contrasenia)
         return contrasenia
 
     def get_contrasenias_by_user(self, id_usuario):
@@ -126,12 +557,16 @@ class Contraseniacrud:
             raise Exception("La contraseña no existe")
 
         if contrasenia_encriptada:
-            contrasenia.contrasenia_encriptada = contrasenia_encriptada
+            valor, huella = self._sellar(
+                self._boveda_para_sellar(contrasenia.id_usuario), contrasenia.id_usuario, contrasenia_encriptada)
+            contrasenia.contrasenia_encriptada, contrasenia.huella = valor, huella
+            contrasenia.veces_filtrada = self._veces_filtrada(contrasenia_encriptada)
         if nota:
             contrasenia.nota = nota
 
         contrasenia.ultima_modificacion = datetime.now()
-        self.session.commit()
+        self._confirmar()
+        self._notificar("contrasenia_editada", contrasenia)
         return contrasenia
 
     def delete_contrasenia(self, id_contrasenia):
@@ -141,7 +576,17 @@ class Contraseniacrud:
             raise Exception("La contraseña no existe")
 
         self.session.delete(contrasenia)
-        self.session.commit()
+        self._confirmar()
+        self._notificar("contrasenia_eliminada", contrasenia)
+        return contrasenia
+
+    def obtener_contrasenias_por_ids(self, ids):
+        """Obtener las contraseñas con esos ids, en el mismo orden en que se piden"""
+        contrasenias = {
+            c.id_contrasenia: c
+            for c in self.session.query(Contrasenia).filter(Contrasenia.id_contrasenia.in_(ids))
+        }
+        return [contrasenias[id_contrasenia] for id_contrasenia in ids if id_contrasenia in contrasenias]
 
     def obtener_contrasenias_usuario(self, usuario_id):
         try:
@@ -151,47 +596,412 @@ class Contraseniacrud:
             print(f"Error al obtener contraseñas: {e}")
             return []
 
+    # Columnas de FilaListado, en el mismo orden
+    COLUMNAS_LISTADO = (
+        Contrasenia.id_contrasenia, Contrasenia.servicio, Contrasenia.nombre_usuario_servicio,
+        Contrasenia.fecha_creacion, Contrasenia.ultima_modificacion, Contrasenia.nota,
+    )
 
-class EtiquetaCRUD:
-    def __init__(self, session):
+    def _proyectar(self, consulta):
+        return list(map(FilaListado._make, self.session.execute(consulta)))
+
+    def proyectar_contrasenias_usuario(self, id_usuario):
+        """
+        Las contraseñas de un usuario como FilaListado, ordenadas por servicio.
+
+        Para listar no hacen falta entidades: así no pasan por el mapa de identidad ni
+        la instrumentación de atributos, y cada fila ocupa una tupla de seis campos.
+        """
+        return self._proyectar(
+            select(*self.COLUMNAS_LISTADO)
+            .where(Contrasenia.id_usuario == id_usuario)
+            .order_by(Contrasenia.servicio, Contrasenia.id_contrasenia)
+        )
+
+    # Columnas por las que se puede paginar y la expresión SQL con la que se ordena cada una
+    ORDENES_PAGINACION = {
+        "servicio": Contrasenia.servicio,
+        "fecha_creacion": Contrasenia.fecha_creacion,
+        "ultima_modificacion": func.coalesce(Contrasenia.ultima_modificacion, Contrasenia.fecha_creacion),
+    }
+
+    def listar_pagina(self, id_usuario, cursor=None, tamanio_pagina=100, orden="servicio", proyeccion=False):
+        """
+        Obtiene una página de contraseñas de un usuario usando paginación por clave (keyset).
+
+        cursor es None para la primera página, o el cursor devuelto por la llamada
+        anterior. Devuelve (contrasenias, siguiente_cursor); siguiente_cursor es None
+        cuando no quedan más páginas. Con proyeccion=True las contraseñas son FilaListado
+        en lugar de entidades.
+        """
+        try:
+            expresion = self.ORDENES_PAGINACION[orden]
+        except KeyError:
+            raise ValueError(f"No se puede ordenar por {orden}")
+
+        consulta = select(*self.COLUMNAS_LISTADO) if proyeccion else select(Contrasenia)
+        consulta = consulta.where(Contrasenia.id_usuario == id_usuario)
+        if cursor is not None:
+            # El id desempata entre valores iguales, así ninguna fila se repite ni se pierde entre páginas
+            consulta = consulta.where(tuple_(expresion, Contrasenia.id_contrasenia) > tuple_(*cursor))
+        # Se pide una fila de más para saber si hay otra página sin hacer un COUNT
+        consulta = consulta.order_by(expresion, Contrasenia.id_contrasenia).limit(tamanio_pagina + 1)
+        contrasenias = self._proyectar(consulta) if proyeccion else self.session.scalars(consulta).all()
+
+        if len(contrasenias) <= tamanio_pagina:
+            return contrasenias, None
+        contrasenias = contrasenias[:tamanio_pagina]
+        ultima = contrasenias[-1]
+        if orden == "ultima_modificacion":
+            valor = ultima.ultima_modificacion or ultima.fecha_creacion
+        else:
+            valor = getattr(ultima, orden)
+        return contrasenias, (valor, ultima.id_contrasenia)
+
+    # Cómo combinar varias etiquetas al filtrar
+    MODOS_ETIQUETAS = ("todas", "alguna")
+
+    def listar_con_etiquetas(self, id_usuario, etiquetas=None, modo="todas", limite=None):
+        """
+        Obtiene las contraseñas de un usuario con sus etiquetas ya cargadas, ordenadas por servicio.
+
+        etiquetas es una lista de nombres para filtrar: con modo "todas" se devuelven las
+        contraseñas que tienen todas esas etiquetas, con "alguna" las que tienen al menos una.
+        El filtro va en la misma sentencia que la lista y las etiquetas se cargan con
+        selectinload, así son dos consultas sin importar cuántas contraseñas haya.
+        """
+        if modo not in self.MODOS_ETIQUETAS:
+            raise ValueError(f"Modo de etiquetas desconocido: {modo}")
+
+        consulta = (
+            select(Contrasenia)
+            .where(Contrasenia.id_usuario == id_usuario)
+            .options(selectinload(Contrasenia.etiquetas))
+            .order_by(Contrasenia.servicio, Contrasenia.id_contrasenia)
+        )
+        nombres = set(etiquetas or ())
+        if nombres:
+            con_etiqueta = (
+                select(ContraseniaEtiqueta.id_contrasenia)
+                .join(Etiqueta, Etiqueta.id_etiqueta == ContraseniaEtiqueta.id_etiqueta)
+                .where(Etiqueta.nombre.in_(nombres))
+            )
+            if modo == "todas":
+                con_etiqueta = con_etiqueta.group_by(ContraseniaEtiqueta.id_contrasenia).having(
+                    func.count(func.distinct(Etiqueta.nombre)) == len(nombres))
+            consulta = consulta.where(Contrasenia.id_contrasenia.in_(con_etiqueta))
+        if limite is not None:
+            consulta = consulta.limit(limite)
+        return self.session.scalars(consulta).all()
+
+    # Máximo de coincidencias que se puntúan con bm25 en cada búsqueda
+    CANDIDATOS_BUSQUEDA = 1000
+
+    def buscar(self, id_usuario, texto, limite=50):
+        """
+        Busca contraseñas del usuario por servicio, usuario del servicio o nota.
+
+        Cada palabra del texto se busca como prefijo y todas deben aparecer. Los
+        resultados se ordenan por relevancia (bm25), dando más peso al servicio.
+        Solo se puntúan las primeras CANDIDATOS_BUSQUEDA coincidencias, para que
+        las primeras teclas (que coinciden con casi toda la bóveda) sigan siendo
+        rápidas; el orden es exacto en cuanto la búsqueda se vuelve selectiva.
+        """
+        terminos = re.findall(r"\w+", texto)
+        if not terminos:
+            return []
+        # Cada término entre comillas para que FTS5 no interprete operadores (AND, NOT, -, ...)
+        consulta_fts = " ".join(f'"{termino}"*' for termino in terminos)
+        # CROSS JOIN obliga a SQLite a partir del índice FTS en lugar de recorrer las contraseñas del usuario
+        return (
+            self.session.query(Contrasenia)
+            .from_statement(text(
+                "SELECT contrasenias.* FROM ("
+                " SELECT contrasenias_fts.rowid AS id, bm25(contrasenias_fts, 10.0, 5.0, 1.0) AS puntuacion"
+                " FROM contrasenias_fts CROSS JOIN contrasenias"
+                " ON contrasenias.id_contrasenia = contrasenias_fts.rowid"
+                " WHERE contrasenias_fts MATCH :consulta AND contrasenias.id_usuario = :id_usuario"
+                " LIMIT :candidatos"
+                ") AS coincidencias "
+                "JOIN contrasenias ON contrasenias.id_contrasenia = coincidencias.id "
+                "ORDER BY coincidencias.puntuacion LIMIT :limite"
+            ).bindparams(consulta=consulta_fts, id_usuario=id_usuario,
+                         candidatos=self.CANDIDATOS_BUSQUEDA, limite=limite))
+            .all()
+        )
+
+    def contrasenias_reutilizadas(self, id_usuario):
+        """
+        Grupos de contraseñas del usuario iguales entre sí, de mayor a menor, cada uno como
+        lista de FilaListado ordenada por servicio.
+
+        No descifra nada: compara las huellas con un GROUP BY que recorre solo el índice
+        ix_contrasenias_usuario_huella. Las entradas sin huella no se comparan (ver
+        calcular_huellas).
+        """
+        repetidas = (
+            select(Contrasenia.huella)
+            .where(Contrasenia.id_usuario == id_usuario, Contrasenia.huella.is_not(None))
+            .group_by(Contrasenia.huella)
+            .having(func.count() > 1)
+        )
+        filas = self.session.execute(
+            select(Contrasenia.huella, *self.COLUMNAS_LISTADO)
+            .where(Contrasenia.id_usuario == id_usuario, Contrasenia.huella.in_(repetidas))
+            .order_by(Contrasenia.huella, Contrasenia.servicio, Contrasenia.id_contrasenia)
+        )
+        grupos = [[FilaListado._make(fila[1:]) for fila in grupo] for _, grupo in groupby(filas, key=itemgetter(0))]
+        grupos.sort(key=lambda grupo: (-len(grupo), grupo[0].servicio, grupo[0].id_contrasenia))
+        return grupos
+
+    def contrasenias_filtradas(self, id_usuario):
+        """
+        (veces, FilaListado) de las contraseñas del usuario que aparecen en el corpus de
+        filtraciones, las más repetidas en él primero. Lee veces_filtrada por el índice
+        parcial ix_contrasenias_filtradas, sin consultar el corpus.
+        """
+        filas = self.session.execute(
+            select(Contrasenia.veces_filtrada, *self.COLUMNAS_LISTADO)
+            .where(Contrasenia.id_usuario == id_usuario, Contrasenia.veces_filtrada > 0)
+            .order_by(Contrasenia.veces_filtrada.desc(), Contrasenia.servicio, Contrasenia.id_contrasenia)
+        )
+        return [(fila[0], FilaListado._make(fila[1:])) for fila in filas]
+
+    def iterar_contrasenias_usuario(self, id_usuario, tamanio_lote=1000):
+        """
+        Recorre las contraseñas de un usuario, con sus etiquetas, sin cargarlas todas en memoria.
+
+        Las filas se leen del cursor en bloques de tamanio_lote y se entregan como
+        diccionarios, sin construir entidades Contrasenia.
+        """
+        consulta = (
+            select(
+                Contrasenia.id_contrasenia,
+                Contrasenia.servicio,
+                Contrasenia.nombre_usuario_servicio,
+                Contrasenia.contrasenia_encriptada,
+                Contrasenia.fecha_creacion,
+                Contrasenia.ultima_modificacion,
+                Contrasenia.nota,
+                Etiqueta.nombre.label("etiqueta"),
+            )
+            .outerjoin(ContraseniaEtiqueta, ContraseniaEtiqueta.id_contrasenia == Contrasenia.id_contrasenia)
+            .outerjoin(Etiqueta, Etiqueta.id_etiqueta == ContraseniaEtiqueta.id_etiqueta)
+            .where(Contrasenia.id_usuario == id_usuario)
+            # Mismo orden que ix_contrasenias_usuario_servicio, así SQLite no necesita ordenar aparte
+            .order_by(Contrasenia.servicio, Contrasenia.id_contrasenia)
+            .execution_options(yield_per=tamanio_lote)
+        )
+        filas = self.session.execute(consulta)
+        try:
+            # El orden incluye el id, así quedan juntas las filas de cada contraseña (una por etiqueta)
+            for _, grupo in groupby(filas, key=attrgetter("id_contrasenia")):
+                grupo = list(grupo)
+                primera = grupo[0]
+                yield {
+                    "id_contrasenia": primera.id_contrasenia,
+                    "servicio": primera.servicio,
+                    "nombre_usuario_servicio": primera.nombre_usuario_servicio,
+                    "contrasenia_encriptada": primera.contrasenia_encriptada,
+                    "fecha_creacion": primera.fecha_creacion,
+                    "ultima_modificacion": primera.ultima_modificacion,
+                    "nota": primera.nota,
+                    "etiquetas": [fila.etiqueta for fila in grupo if fila.etiqueta is not None],
+                }
+        finally:
+            filas.close()
+
+    def importar_contrasenias(self, id_usuario, filas, tamanio_lote=500):
+        """
+        Importa contraseñas en bloque a partir de un iterable de (numero_fila, datos).
+
+        Las filas se insertan por lotes dentro de una única transacción. Las filas
+        inválidas o rechazadas por la base de datos se reportan en el resultado sin
+        abortar el resto de la importación.
+        """
+        resultado = ResultadoImportacion()
+        lote = []
+        try:
+            for numero, datos in filas:
+                error = validar_fila(datos)
+                if error:
+                    resultado.agregar_error(numero, error)
+                    continue
+                lote.append((numero, datos))
+                if len(lote) >= tamanio_lote:
+                    self._insertar_lote(id_usuario, lote, resultado)
+                    lote = []
+            if lote:
+                self._insertar_lote(id_usuario, lote, resultado)
+            self._confirmar()
+        except Exception:
+            self._deshacer()
+            raise
+        return resultado
+
+    def _insertar_lote(self, id_usuario, lote, resultado):
+        ahora = datetime.now()
+        boveda = self._boveda_para_sellar(id_usuario)
+        selladas = [self._sellar(boveda, id_usuario, datos["contrasenia"]) for _, datos in lote]
+        valores = [
+            {
+                "servicio": datos["servicio"],
+                "nombre_usuario_servicio": datos["nombre_usuario_servicio"],
+                "contrasenia_encriptada": valor,
+                "huella": huella,
+                "veces_filtrada": self._veces_filtrada(datos["contrasenia"]),
+                "fecha_creacion": ahora,
+                "ultima_modificacion": None,
+                "id_usuario": id_usuario,
+                "nota": datos["nota"],
+            }
+            for (_, datos), (valor, huella) in zip(lote, selladas)
+        ]
+        sentencia = insert(Contrasenia).returning(Contrasenia.id_contrasenia, sort_by_parameter_order=True)
+        try:
+            with self.session.begin_nested():
+                ids = self.session.execute(sentencia, valores).scalars().all()
+        except DBAPIError:
+            # Reintentar fila a fila para aislar las filas que la base de datos rechaza
+            ids = []
+            for (numero, _), valor in zip(lote, valores):
+                try:
+                    with self.session.begin_nested():
+                        ids.append(self.session.execute(sentencia, [valor]).scalar_one())
+                except DBAPIError as e:
+                    ids.append(None)
+                    resultado.agregar_error(numero, str(e.orig))
+
+        insertadas = [(id_contrasenia, datos) for id_contrasenia, (_, datos) in zip(ids, lote) if id_contrasenia is not None]
+        resultado.importadas += len(insertadas)
+        self._vincular_etiquetas(insertadas)
+
+    def _vincular_etiquetas(self, insertadas):
+        """Resuelve los nombres de etiqueta del lote con una consulta y crea las relaciones en bloque"""
+        nombres = {nombre for _, datos in insertadas for nombre in datos["etiquetas"]}
+        if not nombres:
+            return
+        # Ordenadas de mayor a menor id para que, ante nombres repetidos, gane la etiqueta más antigua
+        existentes = dict(self.session.execute(
+            select(Etiqueta.nombre, Etiqueta.id_etiqueta)
+            .where(Etiqueta.nombre.in_(nombres))
+            .order_by(Etiqueta.id_etiqueta.desc())
+        ).all())
+        faltantes = [nombre for nombre in nombres if nombre not in existentes]
+        if faltantes:
+            nuevas = self.session.execute(
+                insert(Etiqueta).returning(Etiqueta.nombre, Etiqueta.id_etiqueta),
+                [{"nombre": nombre} for nombre in faltantes]
+            )
+            existentes.update(nuevas.all())
+
+        relaciones = [
+            {"id_contrasenia": id_contrasenia, "id_etiqueta": existentes[nombre]}
+            for id_contrasenia, datos in insertadas
+            for nombre in dict.fromkeys(datos["etiquetas"])
+        ]
+        self.session.execute(insert(ContraseniaEtiqueta), relaciones)
+
+
+@instrumentado
+class EtiquetaCRUD(CRUDBase):
+    def __init__(self, session, cache=None):
+        """cache es una CacheEntidades opcional: con ella, get_etiqueta devuelve instantáneas inmutables"""
         self.session = session
+        self.cache = cache
+
+    def _invalidar(self, id_etiqueta):
+        if self.cache is not None:
+            self._al_confirmar(self.cache.invalidar, ("etiqueta", "id", id_etiqueta))
 
     def create_etiqueta(self, nombre):
         if not nombre:
             raise ValueError("El nombre de la etiqueta no puede ser vacío.")
         etiqueta = Etiqueta(nombre=nombre)
         self.session.add(etiqueta)
-        self.session.commit()
+        self._confirmar()
         return etiqueta
 
     def get_etiqueta(self, id_etiqueta):
-        etiqueta = self.session.query(Etiqueta).filter(Etiqueta.id_etiqueta == id_etiqueta).first()
+        etiqueta = self._leer_con_cache(("etiqueta", "id", id_etiqueta), lambda: self._get_etiqueta(id_etiqueta))
         if not etiqueta:
             raise ValueError(f"Etiqueta con id {id_etiqueta} no encontrada.")
         return etiqueta
 
+    def _get_etiqueta(self, id_etiqueta):
+        return self.session.query(Etiqueta).filter(Etiqueta.id_etiqueta == id_etiqueta).first()
+
     def update_etiqueta(self, id_etiqueta, **kwargs):
-        etiqueta = self.get_etiqueta(id_etiqueta)
+        etiqueta = self._get_etiqueta(id_etiqueta)
         if etiqueta:
             for key, value in kwargs.items():
                 setattr(etiqueta, key, value)
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_etiqueta)
             return etiqueta
         else:
             raise ValueError(f"No se pudo actualizar. Etiqueta con id {id_etiqueta} no encontrada.")
 
+    def listar_etiquetas(self, id_usuario=None):
+        """
+        Obtiene las etiquetas, por nombre, con sus contraseñas ya cargadas (selectinload).
+        Con id_usuario, solo las etiquetas que usa ese usuario y solo sus contraseñas.
+        """
+        opcion = Etiqueta.contrasenias
+        consulta = select(Etiqueta).order_by(Etiqueta.nombre)
+        if id_usuario is not None:
+            opcion = opcion.and_(Contrasenia.id_usuario == id_usuario)
+            consulta = consulta.where(Etiqueta.contrasenias.any(Contrasenia.id_usuario == id_usuario))
+        # populate_existing: una colección cargada antes con otro filtro no se reutiliza
+        consulta = consulta.options(selectinload(opcion)).execution_options(populate_existing=True)
+        return self.session.scalars(consulta).all()
+
+    def contar_etiquetas(self, id_usuario, materializado=True):
+        """
+        Facetas de etiquetas de un usuario: filas (id_etiqueta, nombre, cantidad) con cuántas
+        contraseñas suyas tienen cada etiqueta, de la más usada a la menos usada.
+
+        Por defecto se leen de conteo_etiquetas, que los triggers mantienen al día; con
+        materializado=False se agregan en el momento desde contrasenia_etiqueta.
+        """
+        if materializado:
+            cantidad = ConteoEtiqueta.cantidad
+            consulta = (
+                select(Etiqueta.id_etiqueta, Etiqueta.nombre, cantidad.label("cantidad"))
+                .join(ConteoEtiqueta, ConteoEtiqueta.id_etiqueta == Etiqueta.id_etiqueta)
+                .where(ConteoEtiqueta.id_usuario == id_usuario)
+            )
+        else:
+            cantidad = func.count()
+            consulta = (
+                select(Etiqueta.id_etiqueta, Etiqueta.nombre, cantidad.label("cantidad"))
+                .join(ContraseniaEtiqueta, ContraseniaEtiqueta.id_etiqueta == Etiqueta.id_etiqueta)
+                .join(Contrasenia, Contrasenia.id_contrasenia == ContraseniaEtiqueta.id_contrasenia)
+                .where(Contrasenia.id_usuario == id_usuario)
+                .group_by(Etiqueta.id_etiqueta)
+            )
+        return self.session.execute(consulta.order_by(cantidad.desc(), Etiqueta.nombre)).all()
+
     def delete_etiqueta(self, id_etiqueta):
-        etiqueta = self.get_etiqueta(id_etiqueta)
+        etiqueta = self._get_etiqueta(id_etiqueta)
         if etiqueta:
             self.session.delete(etiqueta)
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_etiqueta)
             return etiqueta
         else:
             raise ValueError(f"No se pudo eliminar. Etiqueta con id {id_etiqueta} no encontrada.")
 
-class SesionCRUD:
-    def __init__(self, session):
+@instrumentado
+class SesionCRUD(CRUDBase):
+    def __init__(self, session, cache=None):
+        """cache es una CacheEntidades opcional: con ella, get_sesion devuelve instantáneas inmutables"""
         self.session = session
+        self.cache = cache
+
+    def _invalidar(self, id_sesion):
+        if self.cache is not None:
+            self._al_confirmar(self.cache.invalidar, ("sesion", "id", id_sesion))
 
     def create_sesion(self, id_usuario, ip):
         sesion = Sesion(
@@ -200,28 +1010,89 @@ class SesionCRUD:
             ip=ip
         )
         self.session.add(sesion)
-        self.session.commit()
+        self._confirmar()
         return sesion
 
     def get_sesion(self, id_sesion):
+        return self._leer_con_cache(("sesion", "id", id_sesion), lambda: self._get_sesion(id_sesion))
+
+    def _get_sesion(self, id_sesion):
         return self.session.query(Sesion).filter(Sesion.id_sesion == id_sesion).first()
 
     def update_sesion(self, id_sesion, **kwargs):
-        sesion = self.get_sesion(id_sesion)
+        sesion = self._get_sesion(id_sesion)
         if sesion:
             for key, value in kwargs.items():
                 setattr(sesion, key, value)
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_sesion)
         return sesion
 
     def delete_sesion(self, id_sesion):
-        sesion = self.get_sesion(id_sesion)
+        sesion = self._get_sesion(id_sesion)
         if sesion:
             self.session.delete(sesion)
-            self.session.commit()
+            self._confirmar()
+            self._invalidar(id_sesion)
         return sesion
 
-class ContraseniaEtiquetaCRUD:
+    def sesiones_activas(self, id_usuario):
+        """Las sesiones sin cerrar del usuario, de la más reciente a la más antigua (índice parcial ix_sesiones_activas)"""
+        return self.session.scalars(
+            select(Sesion)
+            .where(Sesion.id_usuario == id_usuario, Sesion.fecha_fin.is_(None))
+            .order_by(Sesion.fecha_inicio.desc())
+        ).all()
+
+    def sesiones_en_rango(self, desde, hasta, id_usuario=None, limite=1000):
+        """
+        Las sesiones iniciadas en [desde, hasta), en orden de inicio, de un usuario o de todos.
+        Se resuelve con ix_sesiones_usuario_inicio o ix_sesiones_inicio según se filtre o no por usuario.
+        """
+        consulta = select(Sesion).where(Sesion.fecha_inicio >= desde, Sesion.fecha_inicio < hasta)
+        if id_usuario is not None:
+            consulta = consulta.where(Sesion.id_usuario == id_usuario)
+        consulta = consulta.order_by(Sesion.fecha_inicio, Sesion.id_sesion)
+        if limite is not None:
+            consulta = consulta.limit(limite)
+        return self.session.scalars(consulta).all()
+
+    def archivar_sesiones(self, dias, tamanio_lote=5000, ahora=None):
+        """
+        Pasa a sesiones_archivo las sesiones cerradas hace más de `dias` días.
+
+        Avanza por ix_sesiones_cerradas_fin en lotes de tamanio_lote: cada lote se copia y
+        se borra de sesiones en su propia transacción, así el bloqueo de escritura dura
+        poco aunque haya millones de filas. Devuelve cuántas sesiones archivó. El espacio
+        liberado se devuelve al sistema con migraciones.liberar_espacio.
+        """
+        corte = (ahora or datetime.now()) - timedelta(days=dias)
+        segundos = lambda columna: cast(func.strftime("%s", columna), Integer)
+        inicio = func.coalesce(Sesion.fecha_inicio, Sesion.fecha_fin)
+        total = 0
+        while True:
+            ids = self.session.scalars(
+                select(Sesion.id_sesion)
+                .where(Sesion.fecha_fin.isnot(None), Sesion.fecha_fin < corte)
+                .order_by(Sesion.fecha_fin)
+                .limit(tamanio_lote)
+            ).all()
+            if not ids:
+                return total
+            self.session.execute(insert(SesionArchivada).from_select(
+                ["id_sesion", "id_usuario", "inicio", "duracion", "ip"],
+                select(Sesion.id_sesion, Sesion.id_usuario, segundos(inicio),
+                       segundos(Sesion.fecha_fin) - segundos(inicio), Sesion.ip)
+                .where(Sesion.id_sesion.in_(ids))
+            ))
+            self.session.execute(delete(Sesion).where(Sesion.id_sesion.in_(ids)))
+            self._confirmar()
+            if self.cache is not None:
+                self._al_confirmar(self.cache.invalidar, *[("sesion", "id", id_sesion) for id_sesion in ids])
+            total += len(ids)
+
+@instrumentado
+class ContraseniaEtiquetaCRUD(CRUDBase):
     def __init__(self, session):
         self.session = session
 
@@ -231,12 +1102,12 @@ class ContraseniaEtiquetaCRUD:
             id_etiqueta=id_etiqueta
         )
         self.session.add(relacion)
-        self.session.commit()
+        self._confirmar()
         return relacion
 
     def delete_contrasenia_etiqueta(self, id_contrasenia_etiqueta):
         relacion = self.session.query(ContraseniaEtiqueta).filter(ContraseniaEtiqueta.id_contrasenia_etiqueta == id_contrasenia_etiqueta).first()
         if relacion:
             self.session.delete(relacion)
-            self.session.commit()
+            self._confirmar()
         return relacion
@@ -0,0 +1,210 @@
+"""
+Versión asíncrona del CRUD, sobre sqlalchemy.ext.asyncio con aiosqlite, para servir a
+muchos clientes concurrentes desde un solo proceso.
+
+Cada clase tiene los mismos métodos que su par de src.logica.CRUD, como corrutinas.
+Por dentro ejecutan el método síncrono con AsyncSession.run_sync, así las consultas,
+la caché, las transacciones agrupadas y los observadores se comportan igual. Las
+esperas a la base no bloquean el bucle de eventos, y tampoco el hash de contraseñas
+ni la derivación de la clave de la bóveda: HasheadorAsincrono los espera en un hilo
+(o en el pool de procesos del Hasheador) mientras el bucle atiende a otros clientes.
+
+    engine = crear_engine_async(url="sqlite:///passkeeper.db")
+    await preparar_esquema(engine)
+    Session = crear_sessionmaker(engine)
+    async with Session() as session:
+        sesion = await UsuarioCRUDAsync(session).iniciar_sesion(email, password)
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from itertools import islice
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.util import await_only
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD, ContraseniaEtiquetaCRUD
+from src.logica.seguridad import HASHEADOR_POR_DEFECTO
+from src.modelo.migraciones import actualizar_esquema
+
+
+def crear_sessionmaker(engine):
+    """
+    Fábrica de AsyncSession para estas clases. Sin expire_on_commit, porque leer un atributo
+    expirado fuera de run_sync no puede ir a la base (MissingGreenlet).
+    """
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def preparar_esquema(engine):
+    """Crea las tablas y aplica las migraciones pendientes sobre un AsyncEngine. Devuelve la versión"""
+    async with engine.connect() as conexion:
+        return await conexion.run_sync(lambda sincronica: actualizar_esquema(sincronica.engine))
+
+
+class HasheadorAsincrono:
+    """
+    Envuelve un Hasheador para usarlo desde el código síncrono que corre en run_sync.
+
+    Cada derivación se lanza en un hilo, o en el pool de procesos si el Hasheador tiene
+    uno, y se espera con await_only: se suspende solo el greenlet de esa llamada. scrypt
+    y PBKDF2 sueltan el GIL, así que los hilos avanzan en paralelo con el bucle. Con el
+    pool lleno, enviar espera a que se libere un hueco; también eso ocurre en un hilo.
+    """
+
+    def __init__(self, hasheador=None):
+        self.hasheador = hasheador or HASHEADOR_POR_DEFECTO
+
+    def _esperar(self, enviar, *args):
+        if self.hasheador.procesos:
+            futuro = await_only(asyncio.to_thread(enviar, *args))
+            return await_only(asyncio.wrap_future(futuro))
+        return await_only(asyncio.to_thread(lambda: enviar(*args).result()))
+
+    def hashear(self, password):
+        return self._esperar(self.hasheador.enviar_hash, password)
+
+    def verificar(self, password, almacenado):
+        return self._esperar(self.hasheador.enviar_verificacion, password, almacenado)
+
+    def derivar(self, algoritmo, password, sal, costo):
+        return self._esperar(self.hasheador.enviar_derivacion, algoritmo, password, sal, costo)
+
+    def necesita_rehash(self, almacenado):
+        return self.hasheador.necesita_rehash(almacenado)
+
+
+def _delegar(metodo):
+    """Corrutina que ejecuta el método de la clase síncrona en run_sync"""
+    nombre = metodo.__name__
+
+    async def delegado(self, *args, **kwargs):
+        return await self.session.run_sync(lambda _: getattr(self._crud, nombre)(*args, **kwargs))
+
+    delegado.__name__ = nombre
+    delegado.__qualname__ = metodo.__qualname__
+    delegado.__doc__ = metodo.__doc__
+    return delegado
+
+
+class CRUDAsyncBase:
+    """
+    Base de las clases asíncronas. session es una AsyncSession; la clase síncrona
+    trabaja sobre su sync_session, así que varias clases sobre la misma AsyncSession
+    comparten las transacciones agrupadas igual que en el CRUD síncrono.
+    """
+
+    def __init__(self, session, crud):
+        self.session = session
+        self._crud = crud
+
+    @asynccontextmanager
+    async def transaccion(self):
+        """Agrupa en un único commit las operaciones del bloque, como CRUDBase.transaccion"""
+        bloque = self._crud.transaccion()
+        await self.session.run_sync(lambda _: bloque.__enter__())
+        try:
+            yield self
+        except BaseException as e:
+            await self.session.run_sync(lambda _: bloque.__exit__(type(e), e, e.__traceback__))
+            raise
+        else:
+            await self.session.run_sync(lambda _: bloque.__exit__(None, None, None))
+
+    @property
+    def en_transaccion(self):
+        return self._crud.en_transaccion
+
+
+class UsuarioCRUDAsync(CRUDAsyncBase):
+    def __init__(self, session, cache=None, hasheador=None, llavero=None):
+        """Mismos parámetros que UsuarioCRUD; el hasheador se envuelve en un HasheadorAsincrono"""
+        super().__init__(session, UsuarioCRUD(session.sync_session, cache=cache,
+                                              hasheador=HasheadorAsincrono(hasheador), llavero=llavero))
+
+    create_usuario = _delegar(UsuarioCRUD.create_usuario)
+    iniciar_sesion = _delegar(UsuarioCRUD.iniciar_sesion)
+    get_usuario_by_id = _delegar(UsuarioCRUD.get_usuario_by_id)
+    get_usuario_by_email = _delegar(UsuarioCRUD.get_usuario_by_email)
+    update_usuario = _delegar(UsuarioCRUD.update_usuario)
+    renovar_clave_boveda = _delegar(UsuarioCRUD.renovar_clave_boveda)
+    delete_usuario = _delegar(UsuarioCRUD.delete_usuario)
+    cerrar_sesion = _delegar(UsuarioCRUD.cerrar_sesion)
+
+
+class ContraseniacrudAsync(CRUDAsyncBase):
+    def __init__(self, session, llavero=None, filtraciones=None):
+        super().__init__(session, Contraseniacrud(session.sync_session, llavero=llavero, filtraciones=filtraciones))
+
+    def suscribir(self, observador):
+        self._crud.suscribir(observador)
+
+    def descifrar(self, id_usuario, contrasenia_encriptada):
+        # Sin consultas: la clave ya está en el llavero
+        return self._crud.descifrar(id_usuario, contrasenia_encriptada)
+
+    revelar_contrasenia = _delegar(Contraseniacrud.revelar_contrasenia)
+    sellar_pendientes = _delegar(Contraseniacrud.sellar_pendientes)
+    calcular_huellas = _delegar(Contraseniacrud.calcular_huellas)
+    revisar_filtraciones = _delegar(Contraseniacrud.revisar_filtraciones)
+    rotar_clave = _delegar(Contraseniacrud.rotar_clave)
+    create_contrasenia = _delegar(Contraseniacrud.create_contrasenia)
+    get_contrasenias_by_user = _delegar(Contraseniacrud.get_contrasenias_by_user)
+    editar_contrasena = _delegar(Contraseniacrud.editar_contrasena)
+    delete_contrasenia = _delegar(Contraseniacrud.delete_contrasenia)
+    obtener_contrasenias_por_ids = _delegar(Contraseniacrud.obtener_contrasenias_por_ids)
+    obtener_contrasenias_usuario = _delegar(Contraseniacrud.obtener_contrasenias_usuario)
+    proyectar_contrasenias_usuario = _delegar(Contraseniacrud.proyectar_contrasenias_usuario)
+    listar_pagina = _delegar(Contraseniacrud.listar_pagina)
+    listar_con_etiquetas = _delegar(Contraseniacrud.listar_con_etiquetas)
+    buscar = _delegar(Contraseniacrud.buscar)
+    contrasenias_reutilizadas = _delegar(Contraseniacrud.contrasenias_reutilizadas)
+    contrasenias_filtradas = _delegar(Contraseniacrud.contrasenias_filtradas)
+    importar_contrasenias = _delegar(Contraseniacrud.importar_contrasenias)
+
+    async def iterar_contrasenias_usuario(self, id_usuario, tamanio_lote=1000):
+        """
+        Como Contraseniacrud.iterar_contrasenias_usuario, pero un generador asíncrono. El
+        generador síncrono avanza de a un lote por run_sync, sin cargar toda la bóveda.
+        """
+        filas = await self.session.run_sync(
+            lambda _: self._crud.iterar_contrasenias_usuario(id_usuario, tamanio_lote=tamanio_lote))
+        try:
+            while True:
+                lote = await self.session.run_sync(lambda _: list(islice(filas, tamanio_lote)))
+                if not lote:
+                    return
+                for contrasenia in lote:
+                    yield contrasenia
+        finally:
+            await self.session.run_sync(lambda _: filas.close())
+
+
+class EtiquetaCRUDAsync(CRUDAsyncBase):
+    def __init__(self, session, cache=None):
+        super().__init__(session, EtiquetaCRUD(session.sync_session, cache=cache))
+
+    create_etiqueta = _delegar(EtiquetaCRUD.create_etiqueta)
+    get_etiqueta = _delegar(EtiquetaCRUD.get_etiqueta)
+    update_etiqueta = _delegar(EtiquetaCRUD.update_etiqueta)
+    listar_etiquetas = _delegar(EtiquetaCRUD.listar_etiquetas)
+    contar_etiquetas = _delegar(EtiquetaCRUD.contar_etiquetas)
+    delete_etiqueta = _delegar(EtiquetaCRUD.delete_etiqueta)
+
+
+class SesionCRUDAsync(CRUDAsyncBase):
+    def __init__(self, session, cache=None):
+        super().__init__(session, SesionCRUD(session.sync_session, cache=cache))
+
+    create_sesion = _delegar(SesionCRUD.create_sesion)
+    get_sesion = _delegar(SesionCRUD.get_sesion)
+    update_sesion = _delegar(SesionCRUD.update_sesion)
+    delete_sesion = _delegar(SesionCRUD.delete_sesion)
+    sesiones_activas = _delegar(SesionCRUD.sesiones_activas)
+    sesiones_en_rango = _delegar(SesionCRUD.sesiones_en_rango)
+    archivar_sesiones = _delegar(SesionCRUD.archivar_sesiones)
+
+
+class ContraseniaEtiquetaCRUDAsync(CRUDAsyncBase):
+    def __init__(self, session):
+        super().__init__(session, ContraseniaEtiquetaCRUD(session.sync_session))
+
+    create_contrasenia_etiqueta = _delegar(ContraseniaEtiquetaCRUD.create_contrasenia_etiqueta)
+    delete_contrasenia_etiqueta = _delegar(ContraseniaEtiquetaCRUD.delete_contrasenia_etiqueta)
@@ -0,0 +1,180 @@
+"""
+Cifrado autenticado de las contraseñas guardadas, con AES-256-GCM (paquete cryptography).
+
+La clave de la bóveda se deriva con scrypt de la contraseña maestra y de una sal
+propia del usuario (distinta de la del hash de login), una sola vez al iniciar
+sesión, y queda en un Llavero hasta que se cierra la sesión. Cada contraseña se
+guarda como $aesgcm$<id_clave>$<nonce>$<cifrado>; id_clave identifica la clave con
+la que se selló, y el id del usuario va como dato asociado, así un valor copiado a
+la fila de otro usuario no se descifra. Un valor sin ese formato es una contraseña
+guardada en claro por versiones anteriores.
+
+Cada contraseña sellada lleva además una huella: un HMAC-SHA256 con una subclave de
+la de la bóveda, igual para contraseñas iguales del mismo usuario. Permite encontrar
+contraseñas repetidas sin descifrar nada, y sin la clave no sirve para adivinarlas.
+"""
+import hashlib
+import hmac
+import os
+import threading
+from src.logica.seguridad import LONGITUD_SAL, derivar, _b64, _desde_b64
+
+PREFIJO = "$aesgcm$"
+LONGITUD_NONCE = 12
+LONGITUD_HUELLA = 16  # Bytes del HMAC que se guardan
+# Coste de scrypt para las sales nuevas; las existentes guardan el suyo
+COSTO_CLAVE = (2 ** 14, 8, 1)
+
+
+class BovedaBloqueada(Exception):
+    """No hay clave de la bóveda para el usuario: no inició sesión o ya la cerró"""
+
+
+def es_sellado(valor):
+    return valor is not None and valor.startswith(PREFIJO)
+
+
+def nueva_sal(costo=COSTO_CLAVE):
+    """Sal de la bóveda para un usuario, con el coste de scrypt con el que se derivará su clave"""
+    return "n={},r={},p={}${}".format(*costo, _b64(os.urandom(LONGITUD_SAL)))
+
+
+def _leer_sal(sal_boveda):
+    """(sal, costo) de la sal guardada de un usuario"""
+    parametros, sal = sal_boveda.split("$")
+    valores = dict(parametro.split("=") for parametro in parametros.split(","))
+    return _desde_b64(sal), (int(valores["n"]), int(valores["r"]), int(valores["p"]))
+
+
+def derivar_clave(password, sal_boveda, hasheador=None):
+    """
+    Clave de 32 bytes de la bóveda a partir de la contraseña maestra y de la sal guardada
+    del usuario. Con un Hasheador, la derivación usa su pool de procesos si lo tiene.
+    """
+    sal, costo = _leer_sal(sal_boveda)
+    if hasheador is None:
+        return derivar("scrypt", password, sal, costo)
+    return hasheador.derivar("scrypt", password, sal, costo)
+
+
+def id_clave_de(sellado):
+    """El id de la clave con que se selló un valor"""
+    return sellado[len(PREFIJO):].split("$", 1)[0]
+
+
+def _datos_asociados(id_usuario, uso="passkeeper"):
+    return f"{uso}:{id_usuario}".encode("ascii")
+
+
+class Boveda:
+    """
+    Sella y abre contraseñas con una clave ya derivada. Es segura entre hilos.
+
+    Mientras se rota la clave, las bóvedas anteriores permiten abrir los valores
+    que aún no se volvieron a sellar; lo nuevo se sella siempre con la clave actual.
+    """
+
+    def __init__(self, clave, anteriores=()):
+        # Se importa aquí para no cargar cryptography al arrancar la aplicación
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        self._clave = clave
+        self._aead = AESGCM(clave)
+        self.id_clave = _b64(hashlib.sha256(b"passkeeper-id-clave" + clave).digest()[:6])
+        self._clave_huella = hashlib.sha256(b"passkeeper-huella" + clave).digest()
+        self.anteriores = {anterior.id_clave: anterior for anterior in anteriores}
+
+    def _cifrar(self, datos, asociados):
+        nonce = os.urandom(LONGITUD_NONCE)
+        return f"{PREFIJO}{self.id_clave}${_b64(nonce)}${_b64(self._aead.encrypt(nonce, datos, asociados))}"
+
+    def _descifrar(self, sellado, asociados):
+        id_clave, nonce, cifrado = sellado[len(PREFIJO):].split("$")
+        if id_clave != self.id_clave:
+            try:
+                return self.anteriores[id_clave]._descifrar(sellado, asociados)
+            except KeyError:
+                raise ValueError("La contraseña está sellada con otra clave") from None
+        return self._aead.decrypt(_desde_b64(nonce), _desde_b64(cifrado), asociados)
+
+    def sellar(self, texto, id_usuario):
+        return self._cifrar(texto.encode("utf-8"), _datos_asociados(id_usuario))
+
+    def huella(self, texto):
+        """<id_clave>$<hmac>: la misma para el mismo texto mientras no cambie la clave de la bóveda"""
+        resumen = hmac.new(self._clave_huella, texto.encode("utf-8"), hashlib.sha256).digest()
+        return f"{self.id_clave}${_b64(resumen[:LONGITUD_HUELLA])}"
+
+    def abrir(self, sellado, id_usuario):
+        """El texto original. Lanza cryptography.exceptions.InvalidTag si el valor fue alterado"""
+        return self._descifrar(sellado, _datos_asociados(id_usuario)).decode("utf-8")
+
+    def envolver(self, anterior, id_usuario):
+        """La clave de otra bóveda sellada con esta, para guardarla mientras dura una rotación"""
+        return self._cifrar(anterior._clave, _datos_asociados(id_usuario, "passkeeper-clave"))
+
+    def desenvolver(self, envuelta, id_usuario):
+        """La Boveda cuya clave se guardó con envolver"""
+        return Boveda(self._descifrar(envuelta, _datos_asociados(id_usuario, "passkeeper-clave")))
+
+
+class Llavero:
+    """
+    Las claves de las bóvedas desbloqueadas, por id de usuario, mientras dura su sesión.
+
+    Lleva además las sesiones de este proceso que usan cada clave: soltar la olvida al
+    cerrarse la última. Las sesiones abiertas en otro proceso, o abandonadas en una
+    ejecución anterior, no la retienen.
+
+    costo es el de scrypt para las sales de los usuarios nuevos o que aún no tenían.
+    """
+
+    def __init__(self, costo=COSTO_CLAVE):
+        self.costo = costo
+        self._bovedas = {}
+        self._sesiones = {}  # id_usuario -> ids de las sesiones que usan la clave
+        self._lock = threading.Lock()
+
+    def nueva_sal(self):
+        return nueva_sal(self.costo)
+
+    def desbloquear(self, id_usuario, password, sal_boveda, hasheador=None, id_sesion=None):
+        """Deriva la clave del usuario (la parte costosa) y la guarda para la sesión. Devuelve la Boveda"""
+        boveda = Boveda(derivar_clave(password, sal_boveda, hasheador))
+        self.guardar(id_usuario, boveda, id_sesion)
+        return boveda
+
+    def guardar(self, id_usuario, boveda, id_sesion=None):
+        with self._lock:
+            self._bovedas[id_usuario] = boveda
+            if id_sesion is not None:
+                self._sesiones.setdefault(id_usuario, set()).add(id_sesion)
+
+    def obtener(self, id_usuario):
+        """La Boveda del usuario, o None si está bloqueada"""
+        with self._lock:
+            return self._bovedas.get(id_usuario)
+
+    def soltar(self, id_usuario, id_sesion):
+        """La sesión deja de usar la clave; si era la última de este proceso, se olvida. Devuelve si se olvidó"""
+        with self._lock:
+            sesiones = self._sesiones.get(id_usuario, set())
+            sesiones.discard(id_sesion)
+            if sesiones:
+                return False
+            self._sesiones.pop(id_usuario, None)
+            self._bovedas.pop(id_usuario, None)
+            return True
+
+    def olvidar(self, id_usuario):
+        with self._lock:
+            self._sesiones.pop(id_usuario, None)
+            self._bovedas.pop(id_usuario, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._sesiones.clear()
+            self._bovedas.clear()
+
+
+# Llavero de la aplicación cuando no se indica otro
+LLAVERO = Llavero()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from sqlalchemy import inspect
+
+
+@lru_cache(maxsize=None)
+def _tipo_instantanea(clase):
+    """Una namedtuple con las columnas del modelo, para leer la copia igual que la entidad"""
+    columnas = [atributo.key for atributo in inspect(clase).column_attrs]
+    return namedtuple(f"{clase.__name__}Instantanea", columnas)
+
+
+def instantanea(entidad):
+    """Copia inmutable de las columnas de una entidad, desligada de la sesión"""
+    tipo = _tipo_instantanea(type(entidad))
+    return tipo(*(getattr(entidad, campo) for campo in tipo._fields))
+
+
+class CacheEntidades:
+    """
+    Caché de lectura para las consultas por clave del CRUD, limitada en tamaño (LRU) y en tiempo (TTL).
+
+    Guarda instantáneas inmutables, no entidades, así lo que devuelve no depende de la
+    sesión que lo cargó y se puede compartir entre sesiones e hilos. Las claves son
+    tuplas como ("usuario", "id", 3); los métodos del CRUD que modifican o eliminan
+    invalidan las suyas. Un mismo objeto puede compartirse entre todas las clases del CRUD.
+    """
+
+    def __init__(self, capacidad=1024, ttl=300, reloj=time.monotonic):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._reloj = reloj
+        self._entradas = OrderedDict()  # clave -> (vence, valor), de la menos a la más usada
+        self._lock = threading.Lock()
+        self._invalidaciones = 0  # Cuántas veces se invalidó algo; ver obtener
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expiraciones = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave, cargar):
+        """Devuelve la instantánea guardada o, si no hay o venció, la de cargar(). No guarda los None"""
+        ahora = self._reloj()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                vence, valor = entrada
+                if vence > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._entradas[clave]
+                self.expiraciones += 1
+            self.fallos += 1
+            invalidaciones = self._invalidaciones
+
+        # La consulta se hace fuera del lock para no bloquear a los demás hilos
+        entidad = cargar()
+        if entidad is None:
+            return None
+        valor = instantanea(entidad)
+        with self._lock:
+            if self._invalidaciones != invalidaciones:
+                # Algo se invalidó mientras se cargaba: lo cargado puede ser anterior al cambio y no se guarda
+                return valor
+            self._entradas[clave] = (ahora + self.ttl, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+        return valor
+
+    def invalidar(self, *claves):
+        with self._lock:
+            self._invalidaciones += 1
+            for clave in claves:
+                self._entradas.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._invalidaciones += 1
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "expiraciones": self.expiraciones,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            }
+
+
+def leer_con_cache(cache, clave, cargar, guardar=True):
+    """
+    Lee a través de la caché si la hay; sin caché devuelve directamente la entidad de cargar().
+    Con guardar=False la instantánea sale de cargar() y no se lee ni se guarda en la caché:
+    dentro de una transacción sin confirmar, lo que se ve puede deshacerse todavía.
+    """
+    if cache is None:
+        return cargar()
+    if not guardar:
+        entidad = cargar()
+        return None if entidad is None else instantanea(entidad)
+    return cache.obtener(clave, cargar)
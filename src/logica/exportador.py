@@ -0,0 +1,71 @@
+import csv
+import json
+
+# Mismas columnas que lee importador.leer_csv_generico, más las fechas
+COLUMNAS_CSV = ["servicio", "nombre_usuario_servicio", "contrasenia", "nota", "etiquetas", "fecha_creacion", "ultima_modificacion"]
+
+
+def _fecha(valor):
+    return valor.isoformat(sep=" ") if valor else ""
+
+
+def escribir_csv(contrasenias, archivo):
+    """Escribe las contraseñas como CSV fila a fila y devuelve cuántas se escribieron"""
+    escritor = csv.writer(archivo)
+    escritor.writerow(COLUMNAS_CSV)
+    total = 0
+    for contrasenia in contrasenias:
+        escritor.writerow([
+            contrasenia["servicio"],
+            contrasenia["nombre_usuario_servicio"],
+            contrasenia["contrasenia"],
+            contrasenia["nota"] or "",
+            ";".join(contrasenia["etiquetas"]),
+            _fecha(contrasenia["fecha_creacion"]),
+            _fecha(contrasenia["ultima_modificacion"]),
+        ])
+        total += 1
+    return total
+
+
+def escribir_jsonl(contrasenias, archivo):
+    """Escribe las contraseñas como JSON lines (un objeto por línea) y devuelve cuántas se escribieron"""
+    total = 0
+    for contrasenia in contrasenias:
+        registro = dict(contrasenia)
+        registro["fecha_creacion"] = _fecha(registro["fecha_creacion"]) or None
+        registro["ultima_modificacion"] = _fecha(registro["ultima_modificacion"]) or None
+        archivo.write(json.dumps(registro, ensure_ascii=False))
+        archivo.write("\n")
+        total += 1
+    return total
+
+
+FORMATOS = {
+    "csv": escribir_csv,
+    "jsonl": escribir_jsonl,
+}
+
+
+def exportar_archivo(contrasenia_crud, id_usuario, archivo, formato="csv", tamanio_lote=1000):
+    """
+    Exporta la bóveda de un usuario a un archivo abierto sin materializar la tabla completa.
+    Las contraseñas se escriben descifradas, así que la bóveda tiene que estar desbloqueada.
+    """
+    try:
+        escritor = FORMATOS[formato]
+    except KeyError:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
+    return escritor(_descifradas(contrasenia_crud, id_usuario, tamanio_lote), archivo)
+
+
+def _descifradas(contrasenia_crud, id_usuario, tamanio_lote):
+    """
+    Las contraseñas del usuario con el texto descifrado, una a una, para que el archivo se pueda
+    importar. El texto va en "contrasenia", la columna que lee el importador, y no con el nombre
+    del valor guardado.
+    """
+    for contrasenia in contrasenia_crud.iterar_contrasenias_usuario(id_usuario, tamanio_lote=tamanio_lote):
+        guardada = contrasenia.pop("contrasenia_encriptada")
+        contrasenia["contrasenia"] = contrasenia_crud.descifrar(id_usuario, guardada)
+        yield contrasenia
@@ -0,0 +1,210 @@
+"""
+Comprobación sin conexión de contraseñas filtradas, contra un corpus de hashes descargado
+como el de Pwned Passwords: un archivo de texto con una línea "HASH:VECES" por contraseña,
+el hash en hexadecimal en mayúsculas y las líneas ordenadas por él. Vale con SHA-1
+(40 caracteres) o NTLM (32); el algoritmo se reconoce por el ancho de la primera línea.
+
+El archivo ocupa decenas de GB, así que no se lee: se mapea en memoria y se busca en
+binario por páginas de TAMANIO_PAGINA bytes. Cada paso compara solo el primer hash de
+una página. Los NIVELES_FIJOS primeros pasos caen siempre en las mismas páginas (a lo
+sumo 2 ** NIVELES_FIJOS), cuyo primer hash se guarda la primera vez; los demás leen el
+mapa. La página final, donde se busca el hash como texto, pasa por una caché LRU
+pequeña, así las contraseñas repetidas o cercanas no vuelven a leerla.
+
+Contraseniacrud comprueba con un CorpusFiltraciones cada contraseña al crearla o editarla
+y guarda en veces_filtrada cuántas veces aparece; revisar_filtraciones recorre toda la
+bóveda de un usuario. El texto de las contraseñas no sale del proceso.
+"""
+import hashlib
+import mmap
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+TAMANIO_PAGINA = 4096
+PAGINAS_CACHE = 1024  # 4 MB del archivo
+NIVELES_FIJOS = 12
+
+
+def hash_sha1(texto):
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest().upper().encode("ascii")
+
+
+def _md4_puro(datos):
+    """MD4 (RFC 1320), para cuando OpenSSL no lo ofrece: desde OpenSSL 3 está en el proveedor legacy"""
+    mascara = 0xFFFFFFFF
+    bits = len(datos) * 8
+    datos += b"\x80" + b"\x00" * ((55 - len(datos)) % 64) + struct.pack("<Q", bits & 0xFFFFFFFFFFFFFFFF)
+    estado = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476]
+    rondas = (
+        (lambda b, c, d: (b & c) | (~b & d), 0, range(16), (3, 7, 11, 19)),
+        (lambda b, c, d: (b & c) | (b & d) | (c & d), 0x5A827999,
+         (0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15), (3, 5, 9, 13)),
+        (lambda b, c, d: b ^ c ^ d, 0x6ED9EBA1,
+         (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15), (3, 9, 11, 15)),
+    )
+    for inicio in range(0, len(datos), 64):
+        x = struct.unpack("<16I", datos[inicio:inicio + 64])
+        a, b, c, d = estado
+        for funcion, constante, orden, desplazamientos in rondas:
+            for i, k in enumerate(orden):
+                valor = (a + funcion(b, c, d) + x[k] + constante) & mascara
+                s = desplazamientos[i % 4]
+                a, b, c, d = d, ((valor << s) | (valor >> (32 - s))) & mascara, b, c
+        estado = [(v + w) & mascara for v, w in zip(estado, (a, b, c, d))]
+    return struct.pack("<4I", *estado)
+
+
+try:
+    hashlib.new("md4")
+    _md4 = lambda datos: hashlib.new("md4", datos).digest()
+except ValueError:
+    _md4 = _md4_puro
+
+
+def hash_ntlm(texto):
+    return _md4(texto.encode("utf-16-le")).hex().upper().encode("ascii")
+
+
+# Ancho del hash en hexadecimal -> (nombre, función)
+ALGORITMOS = {40: ("sha1", hash_sha1), 32: ("ntlm", hash_ntlm)}
+
+
+class CorpusFiltraciones:
+    """
+    Un corpus ordenado de hashes filtrados, mapeado en memoria. Se puede usar desde varios
+    hilos a la vez: el mapa es de solo lectura y la caché de páginas tiene su cerrojo.
+
+    Una página contiene las líneas que empiezan en ella, aunque terminen en la siguiente.
+    Las líneas deben ser más cortas que una página, como en cualquier corpus de hashes.
+    """
+
+    def __init__(self, ruta, paginas_cache=PAGINAS_CACHE):
+        self.ruta = ruta
+        with open(ruta, "rb") as archivo:
+            try:
+                self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError(f"El corpus {ruta} está vacío") from None
+        if hasattr(self._mapa, "madvise"):
+            # La búsqueda salta por el archivo: leer por adelantado solo trae páginas que no se usan
+            self._mapa.madvise(mmap.MADV_RANDOM)
+        primera = self._mapa[:self._mapa.find(b"\n")].rstrip(b"\r").partition(b":")[0]
+        if len(primera) not in ALGORITMOS:
+            self._mapa.close()
+            raise ValueError(f"{ruta} no es un corpus de hashes SHA-1 o NTLM")
+        self.algoritmo, self._hashear = ALGORITMOS[len(primera)]
+        self._ancho = len(primera)
+        self._paginas = -(-len(self._mapa) // TAMANIO_PAGINA)
+        self._cache = OrderedDict()
+        self._capacidad = paginas_cache
+        self._cerrojo = threading.Lock()
+        self._primeros = {}  # Primer hash de las páginas de los NIVELES_FIJOS primeros pasos
+        self.aciertos = 0  # Páginas servidas por la caché
+        self.lecturas = 0  # Páginas leídas del mapa
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
+
+    def cerrar(self):
+        self._mapa.close()
+
+    def hashear(self, texto):
+        return self._hashear(texto)
+
+    def veces(self, texto):
+        """Cuántas veces aparece la contraseña en el corpus; 0 si no aparece"""
+        return self.veces_hash(self._hashear(texto))
+
+    def veces_hash(self, valor):
+        """Como veces, con el hash ya calculado (bytes en hexadecimal, en mayúsculas)"""
+        # La última página cuyo primer hash no es mayor que el buscado es la única que puede tenerlo
+        bajo, alto = 0, self._paginas - 1
+        primeros = self._primeros
+        nivel = 0
+        while bajo < alto:
+            medio = (bajo + alto + 1) // 2
+            if nivel < NIVELES_FIJOS:
+                primero = primeros.get(medio)
+                if primero is None:
+                    primero = primeros[medio] = self._primero(medio)
+                nivel += 1
+            else:
+                primero = self._primero(medio)
+            if primero and primero <= valor:
+                bajo = medio
+            else:
+                alto = medio - 1
+        # Los hashes tienen todos el mismo ancho: "\n<hash>" solo aparece al principio de su línea
+        datos = self._pagina(bajo)
+        inicio = datos.find(b"\n" + valor)
+        if inicio == -1:
+            return 0
+        fin = datos.find(b"\n", inicio + 1)
+        cantidad = datos[inicio + 1 + len(valor):len(datos) if fin == -1 else fin].strip(b":\r")
+        return int(cantidad) if cantidad else 1
+
+    def _pagina(self, numero):
+        """Las líneas que empiezan en la página, cada una precedida de un salto de línea"""
+        with self._cerrojo:
+            datos = self._cache.get(numero)
+            if datos is not None:
+                self._cache.move_to_end(numero)
+                self.aciertos += 1
+                return datos
+        datos = self._leer_pagina(numero)
+        with self._cerrojo:
+            self.lecturas += 1
+            self._cache[numero] = datos
+            if len(self._cache) > self._capacidad:
+                self._cache.popitem(last=False)
+        return datos
+
+    def _inicio(self, numero):
+        """Dónde empieza la primera línea de la página, o None si no empieza ninguna en ella"""
+        if not numero:
+            return 0
+        # La que sigue al primer salto de línea desde el último byte de la página anterior
+        inicio = self._mapa.find(b"\n", numero * TAMANIO_PAGINA - 1) + 1
+        return inicio if 0 < inicio < (numero + 1) * TAMANIO_PAGINA else None
+
+    def _primero(self, numero):
+        inicio = self._inicio(numero)
+        return b"" if inicio is None else self._mapa[inicio:inicio + self._ancho]
+
+    def _leer_pagina(self, numero):
+        mapa = self._mapa
+        inicio = self._inicio(numero)
+        if inicio is None:
+            return b""
+        fin = mapa.find(b"\n", (numero + 1) * TAMANIO_PAGINA - 1)
+        return b"\n" + mapa[inicio:len(mapa) if fin == -1 else fin]
+
+
+class ResultadoRevision:
+    """Resumen de una revisión de la bóveda contra el corpus: entradas revisadas, filtradas y a qué ritmo"""
+    def __init__(self):
+        self.revisadas = 0
+        self.filtradas = 0
+        self.cambiadas = 0  # Entradas cuyo veces_filtrada cambió
+        self._inicio = time.perf_counter()
+        self.segundos = 0.0
+
+    def agregar_lote(self, revisadas, filtradas, cambiadas):
+        self.revisadas += revisadas
+        self.filtradas += filtradas
+        self.cambiadas += cambiadas
+        self.segundos = time.perf_counter() - self._inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.revisadas / self.segundos if self.segundos else 0.0
+
+
+def revisar(corpus, descifrar, valores):
+    """Veces que aparece en el corpus cada valor guardado; descifrar lleva del valor guardado al texto"""
+    return [corpus.veces(descifrar(valor)) for valor in valores]
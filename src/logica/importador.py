@@ -0,0 +1,141 @@
+import csv
+import json
+from urllib.parse import urlparse
+
+
+class ErrorImportacion:
+    def __init__(self, fila, mensaje):
+        self.fila = fila
+        self.mensaje = mensaje
+
+    def __repr__(self):
+        return f"ErrorImportacion(fila={self.fila!r}, mensaje={self.mensaje!r})"
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: cuántas filas entraron y qué filas fallaron"""
+    def __init__(self):
+        self.importadas = 0
+        self.errores = []
+
+    def agregar_error(self, fila, mensaje):
+        self.errores.append(ErrorImportacion(fila, mensaje))
+
+
+def _servicio_desde_url(url):
+    """Usa el host de la URL como nombre del servicio"""
+    if not url:
+        return ""
+    return urlparse(url).hostname or url
+
+
+def _separar_etiquetas(valor):
+    if not valor:
+        return []
+    return [nombre.strip() for nombre in valor.split(";") if nombre.strip()]
+
+
+def _fila(servicio, usuario, contrasenia, nota=None, etiquetas=None):
+    return {
+        "servicio": (servicio or "").strip(),
+        "nombre_usuario_servicio": (usuario or "").strip(),
+        "contrasenia": contrasenia or "",
+        "nota": nota or None,
+        "etiquetas": etiquetas or [],
+    }
+
+
+def leer_csv_generico(archivo):
+    """CSV propio con columnas servicio, nombre_usuario_servicio, contrasenia, nota y etiquetas (separadas por ';')"""
+    for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+        yield numero, _fila(
+            registro.get("servicio"),
+            registro.get("nombre_usuario_servicio"),
+            registro.get("contrasenia"),
+            registro.get("nota"),
+            _separar_etiquetas(registro.get("etiquetas")),
+        )
+
+
+def leer_chrome_csv(archivo):
+    """Exportación de Chrome/Edge: name, url, username, password, note"""
+    for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+        servicio = registro.get("name") or _servicio_desde_url(registro.get("url"))
+        yield numero, _fila(servicio, registro.get("username"), registro.get("password"), registro.get("note"))
+
+
+def leer_firefox_csv(archivo):
+    """Exportación de Firefox: url, username, password, httpRealm, formActionOrigin, guid, ..."""
+    for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+        yield numero, _fila(_servicio_desde_url(registro.get("url")), registro.get("username"), registro.get("password"))
+
+
+def leer_bitwarden_csv(archivo):
+    """Exportación CSV de Bitwarden; la carpeta se importa como etiqueta"""
+    for numero, registro in enumerate(csv.DictReader(archivo), start=2):
+        if registro.get("type", "login") != "login":
+            continue
+        servicio = registro.get("name") or _servicio_desde_url(registro.get("login_uri"))
+        carpeta = registro.get("folder")
+        yield numero, _fila(
+            servicio,
+            registro.get("login_username"),
+            registro.get("login_password"),
+            registro.get("notes"),
+            [carpeta] if carpeta else [],
+        )
+
+
+def leer_bitwarden_json(archivo):
+    """Exportación JSON (sin cifrar) de Bitwarden; la carpeta se importa como etiqueta"""
+    datos = json.load(archivo)
+    carpetas = {carpeta["id"]: carpeta["name"] for carpeta in datos.get("folders", [])}
+    for numero, item in enumerate(datos.get("items", []), start=1):
+        login = item.get("login")
+        if item.get("type", 1) != 1 or login is None:
+            continue
+        uris = login.get("uris") or []
+        servicio = item.get("name") or _servicio_desde_url(uris[0].get("uri") if uris else None)
+        carpeta = carpetas.get(item.get("folderId"))
+        yield numero, _fila(
+            servicio,
+            login.get("username"),
+            login.get("password"),
+            item.get("notes"),
+            [carpeta] if carpeta else [],
+        )
+
+
+FORMATOS = {
+    "csv": leer_csv_generico,
+    "chrome": leer_chrome_csv,
+    "firefox": leer_firefox_csv,
+    "bitwarden_csv": leer_bitwarden_csv,
+    "bitwarden_json": leer_bitwarden_json,
+}
+
+
+def leer_exportacion(archivo, formato="csv"):
+    """Devuelve un generador de (numero_fila, datos) para el formato indicado"""
+    try:
+        lector = FORMATOS[formato]
+    except KeyError:
+        raise ValueError(f"Formato de importación desconocido: {formato}")
+    return lector(archivo)
+
+
+def validar_fila(datos):
+    """Devuelve un mensaje de error si la fila no se puede importar, o None si es válida"""
+    if not datos["servicio"]:
+        return "Falta el servicio"
+    if not datos["nombre_usuario_servicio"]:
+        return "Falta el usuario del servicio"
+    if not datos["contrasenia"]:
+        return "Falta la contraseña"
+    return None
+
+
+def importar_archivo(contrasenia_crud, id_usuario, archivo, formato="csv", tamanio_lote=500):
+    """Importa un archivo de exportación completo en una sola transacción"""
+    filas = leer_exportacion(archivo, formato)
+    return contrasenia_crud.importar_contrasenias(id_usuario, filas, tamanio_lote=tamanio_lote)
@@ -0,0 +1,169 @@
+import heapq
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from functools import lru_cache
+
+
+# Los servicios y usuarios se repiten mucho dentro de una bóveda
+@lru_cache(maxsize=65536)
+def normalizar(texto):
+    """Minúsculas y sin acentos, para comparar como lo haría una persona"""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold().strip()
+
+
+def trigramas(texto):
+    relleno = f"  {texto} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+def _terminos(valor):
+    """El texto completo y cada una de sus palabras, para las búsquedas aproximadas"""
+    return {valor, *valor.split()}
+
+
+def _claves_prefijo(valor):
+    """El texto completo y cada sufijo que empieza en una palabra: 'banco nacion' -> 'banco nacion', 'nacion'"""
+    palabras = valor.split()
+    return {" ".join(palabras[i:]) for i in range(len(palabras))}
+
+
+class IndiceContrasenias:
+    """
+    Índice en memoria del servicio y del usuario del servicio de las contraseñas de un usuario.
+
+    Trabaja sobre los textos distintos (en una bóveda real el mismo servicio aparece
+    muchas veces), con una lista ordenada para las búsquedas por prefijo y trigramas
+    para las aproximadas. Se mantiene al día suscribiéndolo a Contraseniacrud; las
+    importaciones en bloque no notifican, así que tras ellas hay que reconstruirlo.
+    """
+
+    def __init__(self, id_usuario):
+        self.id_usuario = id_usuario
+        self._claves = []                         # claves de prefijo distintas, ordenadas
+        self._ids_por_clave = defaultdict(set)    # clave de prefijo -> ids
+        self._ids_por_termino = defaultdict(set)  # texto normalizado o una de sus palabras -> ids
+        self._terminos_por_trigrama = defaultdict(set)
+        self._num_trigramas = {}                  # termino -> cuántos trigramas tiene
+        self._valores_por_id = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def construir(cls, contrasenia_crud, id_usuario):
+        """Crea el índice con las contraseñas actuales del usuario y lo suscribe al CRUD"""
+        indice = cls(id_usuario)
+        for contrasenia in contrasenia_crud.proyectar_contrasenias_usuario(id_usuario):
+            indice.agregar(contrasenia)
+        contrasenia_crud.suscribir(indice)
+        return indice
+
+    def __len__(self):
+        return len(self._valores_por_id)
+
+    def agregar(self, contrasenia):
+        valores = {normalizar(contrasenia.servicio), normalizar(contrasenia.nombre_usuario_servicio)} - {""}
+        with self._lock:
+            self._valores_por_id[contrasenia.id_contrasenia] = valores
+            for valor in valores:
+                for termino in _terminos(valor):
+                    if not self._ids_por_termino[termino]:
+                        propios = trigramas(termino)
+                        self._num_trigramas[termino] = len(propios)
+                        for trigrama in propios:
+                            self._terminos_por_trigrama[trigrama].add(termino)
+                    self._ids_por_termino[termino].add(contrasenia.id_contrasenia)
+                for clave in _claves_prefijo(valor):
+                    if not self._ids_por_clave[clave]:
+                        insort(self._claves, clave)
+                    self._ids_por_clave[clave].add(contrasenia.id_contrasenia)
+
+    def eliminar(self, id_contrasenia):
+        with self._lock:
+            valores = self._valores_por_id.pop(id_contrasenia, ())
+            # Servicio y usuario pueden compartir palabras ("Banco Nacion", "nacion"): cada término
+            # y cada clave se quitan una sola vez, como agregar los guarda una sola vez por id
+            for termino in set().union(*map(_terminos, valores)):
+                self._ids_por_termino[termino].discard(id_contrasenia)
+                if not self._ids_por_termino[termino]:
+                    del self._ids_por_termino[termino]
+                    del self._num_trigramas[termino]
+                    for trigrama in trigramas(termino):
+                        self._terminos_por_trigrama[trigrama].discard(termino)
+            for clave in set().union(*map(_claves_prefijo, valores)):
+                self._ids_por_clave[clave].discard(id_contrasenia)
+                if not self._ids_por_clave[clave]:
+                    del self._ids_por_clave[clave]
+                    del self._claves[bisect_left(self._claves, clave)]
+
+    def actualizar(self, contrasenia):
+        with self._lock:
+            self.eliminar(contrasenia.id_contrasenia)
+            self.agregar(contrasenia)
+
+    # Notificaciones de Contraseniacrud
+    def contrasenia_creada(self, contrasenia):
+        if contrasenia.id_usuario == self.id_usuario:
+            self.agregar(contrasenia)
+
+    def contrasenia_editada(self, contrasenia):
+        if contrasenia.id_usuario == self.id_usuario:
+            self.actualizar(contrasenia)
+
+    def contrasenia_eliminada(self, contrasenia):
+        self.eliminar(contrasenia.id_contrasenia)
+
+    def buscar_prefijo(self, texto, limite=50):
+        """Ids cuyo servicio o usuario (o alguna de sus palabras) empieza por el texto, en orden alfabético"""
+        prefijo = normalizar(texto)
+        if not prefijo:
+            return []
+        resultado = {}
+        with self._lock:
+            for i in range(bisect_left(self._claves, prefijo), len(self._claves)):
+                clave = self._claves[i]
+                if not clave.startswith(prefijo):
+                    break
+                self._completar(resultado, self._ids_por_clave[clave], limite)
+                if len(resultado) >= limite:
+                    return list(resultado)
+        return list(resultado)
+
+    def buscar_aproximado(self, texto, limite=50, umbral=0.3):
+        """Ids cuyo servicio o usuario, o una de sus palabras, se parece al texto (similitud de trigramas)"""
+        consulta = trigramas(normalizar(texto))
+        coincidencias = defaultdict(int)
+        with self._lock:
+            for trigrama in consulta:
+                for termino in self._terminos_por_trigrama.get(trigrama, ()):
+                    coincidencias[termino] += 1
+            puntuados = []
+            for termino, comunes in coincidencias.items():
+                similitud = comunes / (len(consulta) + self._num_trigramas[termino] - comunes)
+                if similitud >= umbral:
+                    puntuados.append((-similitud, termino))
+            resultado = {}
+            for _, termino in sorted(puntuados):
+                self._completar(resultado, self._ids_por_termino[termino], limite)
+                if len(resultado) >= limite:
+                    break
+        return list(resultado)
+
+    @staticmethod
+    def _completar(resultado, ids, limite):
+        """Añade a resultado los ids más bajos hasta llegar al límite, sin ordenar el conjunto entero"""
+        for id_contrasenia in heapq.nsmallest(limite, ids):
+            if len(resultado) >= limite:
+                return
+            resultado.setdefault(id_contrasenia)
+
+    def buscar(self, texto, limite=50):
+        """Coincidencias por prefijo y, si no llegan al límite, completadas con las aproximadas"""
+        resultado = dict.fromkeys(self.buscar_prefijo(texto, limite))
+        if len(resultado) < limite:
+            for id_contrasenia in self.buscar_aproximado(texto, limite):
+                resultado.setdefault(id_contrasenia)
+                if len(resultado) >= limite:
+                    break
+        return list(resultado)
@@ -0,0 +1,348 @@
+"""
+Instrumentación del CRUD: cuántas sentencias SQL ejecuta cada método, cuánto tiempo pasa
+en la base y en total, histogramas de esos tiempos y un registro de consultas lentas con
+su plan (EXPLAIN QUERY PLAN).
+
+Las clases del CRUD llevan el decorador @instrumentado; las sentencias se cuentan con los
+eventos before/after_cursor_execute de los engines activados. Mientras está desactivada,
+que es lo normal, cada método del CRUD solo paga la comprobación de un atributo y los
+engines no tienen ningún listener.
+
+    INSTRUMENTACION.activar(contexto.engine, umbral_lento=0.1)
+    ...
+    print(INSTRUMENTACION.a_prometheus())
+    INSTRUMENTACION.desactivar()
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Límites superiores (segundos) de los histogramas, como los de un cliente de Prometheus
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UMBRAL_LENTO = 0.1  # Segundos a partir de los cuales una sentencia va al registro de lentas
+MAXIMO_LENTAS = 100
+LARGO_SQL = 2000  # Caracteres que se guardan de cada sentencia lenta
+
+# Medición del método del CRUD en curso en este hilo (o greenlet, en el CRUD asíncrono)
+_en_curso = ContextVar("crud_medicion_en_curso", default=None)
+_metodo_en_curso = ContextVar("crud_metodo_en_curso", default=None)
+_CLAVE_INICIO = "instrumentacion_inicio"
+
+
+class Histograma:
+    """Cuántas observaciones cayeron en cada intervalo de LIMITES, más la suma y el total"""
+
+    def __init__(self, limites=LIMITES):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)  # La última, por encima del mayor límite
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        indice = 0
+        for limite in self.limites:
+            if valor <= limite:
+                break
+            indice += 1
+        self.cuentas[indice] += 1
+        self.suma += valor
+        self.total += 1
+
+    def acumulado(self):
+        """(límite, observaciones <= límite) por intervalo, terminando en infinito"""
+        resultado, cantidad = [], 0
+        for limite, cuenta in zip((*self.limites, float("inf")), self.cuentas):
+            cantidad += cuenta
+            resultado.append((limite, cantidad))
+        return resultado
+
+    def a_dict(self):
+        return {"limites": list(self.limites), "cuentas": list(self.cuentas), "suma": self.suma, "total": self.total}
+
+
+class EstadisticasMetodo:
+    def __init__(self):
+        self.llamadas = 0
+        self.errores = 0
+        self.sentencias = 0
+        self.segundos_bd = 0.0
+        self.segundos = Histograma()  # Tiempo total de cada llamada
+        self.segundos_bd_llamada = Histograma()  # Tiempo en la base de cada llamada
+
+    def a_dict(self):
+        return {
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "sentencias": self.sentencias,
+            "segundos_bd": self.segundos_bd,
+            "segundos_total": self.segundos.suma,
+            "histograma_segundos": self.segundos.a_dict(),
+            "histograma_segundos_bd": self.segundos_bd_llamada.a_dict(),
+        }
+
+
+class _Medicion:
+    __slots__ = ("sentencias", "segundos_bd")
+
+    def __init__(self):
+        self.sentencias = 0
+        self.segundos_bd = 0.0
+
+
+class Instrumentacion:
+    """
+    Estadísticas por método del CRUD y por sentencia SQL, en el proceso.
+
+    Las sentencias se atribuyen al método del CRUD en curso; las de un método llamado
+    desde otro cuentan también para el de afuera. al_lento, si se da, recibe cada
+    entrada del registro de lentas en cuanto se produce (por ejemplo, para escribirla
+    en stderr).
+    """
+
+    def __init__(self, umbral_lento=UMBRAL_LENTO, maximo_lentas=MAXIMO_LENTAS, al_lento=None):
+        self.activa = False
+        self.umbral_lento = umbral_lento
+        self.al_lento = al_lento
+        self._engines = []
+        self._lock = threading.Lock()
+        self._maximo_lentas = maximo_lentas
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._metodos = {}
+            self._sentencias = Histograma()
+            self._lentas = deque(maxlen=self._maximo_lentas)
+            self._desde = time.time()
+
+    def activar(self, *engines, umbral_lento=None):
+        """Empieza a medir, contando las sentencias de estos engines (Engine o AsyncEngine)"""
+        if umbral_lento is not None:
+            self.umbral_lento = umbral_lento
+        for engine in engines:
+            engine = getattr(engine, "sync_engine", engine)
+            if not event.contains(engine, "before_cursor_execute", self._antes):
+                event.listen(engine, "before_cursor_execute", self._antes)
+                event.listen(engine, "after_cursor_execute", self._despues)
+                self._engines.append(engine)
+        self.activa = True
+
+    def desactivar(self):
+        """Deja de medir y quita los listeners; las estadísticas se conservan hasta reiniciar()"""
+        self.activa = False
+        for engine in self._engines:
+            event.remove(engine, "before_cursor_execute", self._antes)
+            event.remove(engine, "after_cursor_execute", self._despues)
+        self._engines = []
+
+    # Eventos del engine
+
+    def _antes(self, conexion, cursor, sentencia, parametros, contexto, executemany):
+        conexion.info.setdefault(_CLAVE_INICIO, []).append(time.perf_counter())
+
+    def _despues(self, conexion, cursor, sentencia, parametros, contexto, executemany):
+        inicios = conexion.info.get(_CLAVE_INICIO)
+        if not inicios:
+            return  # Se activó entre el antes y el después de esta sentencia
+        segundos = time.perf_counter() - inicios.pop()
+        medicion = _en_curso.get()
+        if medicion is not None:
+            medicion.sentencias += 1
+            medicion.segundos_bd += segundos
+        with self._lock:
+            self._sentencias.observar(segundos)
+        if segundos >= self.umbral_lento:
+            self._registrar_lenta(conexion, cursor, sentencia, parametros, executemany, segundos)
+
+    def _registrar_lenta(self, conexion, cursor, sentencia, parametros, executemany, segundos):
+        entrada = {
+            "fecha": time.time(),
+            "segundos": segundos,
+            "metodo": _metodo_en_curso.get(),
+            "sql": sentencia[:LARGO_SQL],
+            "executemany": executemany,
+            "plan": _plan(conexion, cursor, sentencia, parametros, executemany),
+        }
+        with self._lock:
+            self._lentas.append(entrada)
+        if self.al_lento is not None:
+            self.al_lento(entrada)
+
+    # Métodos del CRUD
+
+    def medir(self, nombre, funcion, *args, **kwargs):
+        """Ejecuta funcion(*args, **kwargs) midiéndola como el método `nombre`"""
+        medicion = _Medicion()
+        token = _en_curso.set(medicion)
+        token_nombre = _metodo_en_curso.set(nombre)
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = funcion(*args, **kwargs)
+            error = False
+            return resultado
+        finally:
+            segundos = time.perf_counter() - inicio
+            _en_curso.reset(token)
+            _metodo_en_curso.reset(token_nombre)
+            self._registrar(nombre, medicion, segundos, error)
+
+    def _registrar(self, nombre, medicion, segundos, error):
+        exterior = _en_curso.get()
+        if exterior is not None:
+            # Llamado desde otro método del CRUD: sus sentencias también son del de afuera
+            exterior.sentencias += medicion.sentencias
+            exterior.segundos_bd += medicion.segundos_bd
+        with self._lock:
+            estadisticas = self._metodos.get(nombre)
+            if estadisticas is None:
+                estadisticas = self._metodos[nombre] = EstadisticasMetodo()
+            estadisticas.llamadas += 1
+            estadisticas.errores += error
+            estadisticas.sentencias += medicion.sentencias
+            estadisticas.segundos_bd += medicion.segundos_bd
+            estadisticas.segundos.observar(segundos)
+            estadisticas.segundos_bd_llamada.observar(medicion.segundos_bd)
+
+    # Lectura
+
+    def instantanea(self):
+        """Copia de las estadísticas acumuladas, como diccionarios y listas"""
+        with self._lock:
+            return {
+                "activa": self.activa,
+                "desde": self._desde,
+                "umbral_lento": self.umbral_lento,
+                "metodos": {nombre: estadisticas.a_dict() for nombre, estadisticas in sorted(self._metodos.items())},
+                "sentencias": self._sentencias.a_dict(),
+                "lentas": list(self._lentas),
+            }
+
+    def a_json(self, **opciones):
+        return json.dumps(self.instantanea(), ensure_ascii=False, **opciones)
+
+    def a_prometheus(self, prefijo="passkeeper"):
+        """Las estadísticas en el formato de texto de Prometheus"""
+        with self._lock:
+            metodos = sorted(self._metodos.items())
+            sentencias = self._sentencias
+            lineas = []
+
+            def metrica(nombre, tipo, ayuda, filas):
+                lineas.append(f"# HELP {prefijo}_{nombre} {ayuda}")
+                lineas.append(f"# TYPE {prefijo}_{nombre} {tipo}")
+                for sufijo, etiquetas, valor in filas:
+                    lineas.append(f"{prefijo}_{nombre}{sufijo}{_etiquetas(etiquetas)} {_numero(valor)}")
+
+            def histograma(histograma, etiquetas):
+                for limite, cantidad in histograma.acumulado():
+                    yield "_bucket", {**etiquetas, "le": "+Inf" if limite == float("inf") else repr(limite)}, cantidad
+                yield "_sum", etiquetas, histograma.suma
+                yield "_count", etiquetas, histograma.total
+
+            metrica("crud_llamadas_total", "counter", "Llamadas a cada método del CRUD",
+                    [("", {"metodo": nombre}, e.llamadas) for nombre, e in metodos])
+            metrica("crud_errores_total", "counter", "Llamadas que terminaron con una excepción",
+                    [("", {"metodo": nombre}, e.errores) for nombre, e in metodos])
+            metrica("crud_sentencias_total", "counter", "Sentencias SQL ejecutadas por cada método",
+                    [("", {"metodo": nombre}, e.sentencias) for nombre, e in metodos])
+            metrica("crud_segundos_bd_total", "counter", "Segundos en la base de datos por método",
+                    [("", {"metodo": nombre}, e.segundos_bd) for nombre, e in metodos])
+            metrica("crud_segundos", "histogram", "Duración de cada llamada a un método del CRUD",
+                    [fila for nombre, e in metodos for fila in histograma(e.segundos, {"metodo": nombre})])
+            metrica("sql_segundos", "histogram", "Duración de cada sentencia SQL",
+                    list(histograma(sentencias, {})))
+            metrica("sql_lentas", "gauge", "Sentencias lentas en el registro",
+                    [("", {}, len(self._lentas))])
+        return "\n".join(lineas) + "\n"
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ""
+    texto = ",".join(
+        f'{clave}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for clave, valor in etiquetas.items())
+    return "{" + texto + "}"
+
+
+def _numero(valor):
+    return str(valor) if isinstance(valor, int) else repr(float(valor))
+
+
+def _plan(conexion, cursor, sentencia, parametros, executemany):
+    """EXPLAIN QUERY PLAN de la sentencia, con los mismos parámetros, por la conexión DBAPI (sin eventos)"""
+    if conexion.dialect.name != "sqlite":
+        return None
+    if executemany:
+        parametros = parametros[0] if parametros else ()
+    try:
+        filas = cursor.connection.execute(f"EXPLAIN QUERY PLAN {sentencia}", parametros).fetchall()
+    except Exception as e:  # Una sentencia que no admite EXPLAIN (PRAGMA, VACUUM...) no debe romper la original
+        return f"(sin plan: {e})"
+    return [fila[-1] for fila in filas]
+
+
+# Instrumentación de la aplicación; desactivada hasta que se llama a activar()
+INSTRUMENTACION = Instrumentacion()
+
+
+def instrumentado(clase):
+    """
+    Decorador de clase: mide los métodos públicos definidos en la clase con INSTRUMENTACION.
+    Los generadores se miden solo mientras producen cada elemento, no mientras el
+    llamador procesa lo que recibe.
+    """
+    for nombre, metodo in list(vars(clase).items()):
+        if nombre.startswith("_") or not inspect.isfunction(metodo):
+            continue
+        envoltura = _envolver_generador if inspect.isgeneratorfunction(metodo) else _envolver
+        setattr(clase, nombre, envoltura(f"{clase.__name__}.{nombre}", metodo))
+    return clase
+
+
+def _envolver(nombre, metodo):
+    @functools.wraps(metodo)
+    def envoltura(*args, **kwargs):
+        if not INSTRUMENTACION.activa:
+            return metodo(*args, **kwargs)
+        return INSTRUMENTACION.medir(nombre, metodo, *args, **kwargs)
+    return envoltura
+
+
+def _envolver_generador(nombre, metodo):
+    @functools.wraps(metodo)
+    def envoltura(*args, **kwargs):
+        if not INSTRUMENTACION.activa:
+            yield from metodo(*args, **kwargs)
+            return
+        generador = metodo(*args, **kwargs)
+        medicion = _Medicion()
+        segundos = 0.0
+        error = True
+        try:
+            while True:
+                token, token_nombre = _en_curso.set(medicion), _metodo_en_curso.set(nombre)
+                inicio = time.perf_counter()
+                try:
+                    elemento = next(generador)
+                except StopIteration:
+                    error = False
+                    return
+                finally:
+                    segundos += time.perf_counter() - inicio
+                    _en_curso.reset(token)
+                    _metodo_en_curso.reset(token_nombre)
+                yield elemento
+        except GeneratorExit:
+            error = False  # El llamador dejó de iterar antes del final
+            raise
+        finally:
+            generador.close()
+            INSTRUMENTACION._registrar(nombre, medicion, segundos, error)
+    return envoltura
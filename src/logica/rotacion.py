@@ -0,0 +1,52 @@
+"""
+Rotación de la clave de la bóveda: volver a sellar las contraseñas de un usuario con
+su clave nueva tras cambiar la contraseña maestra o los parámetros de derivación.
+
+La recorre Contraseniacrud.rotar_clave; aquí están el resumen de progreso y el
+trabajo por lote que se reparte entre los hilos.
+"""
+import time
+from src.logica.boveda import es_sellado, id_clave_de
+
+
+class ResultadoRotacion:
+    """Progreso de una rotación: filas recorridas, cuántas se volvieron a sellar y a qué ritmo"""
+    def __init__(self, total=0, reanudada=False):
+        self.total = total  # Filas pendientes al empezar
+        self.reanudada = reanudada  # Si continuó desde el punto de control de una ejecución anterior
+        self.procesadas = 0
+        self.reselladas = 0
+        self.lotes = 0
+        self._inicio = time.perf_counter()
+        self.segundos = 0.0
+
+    def agregar_lote(self, procesadas, reselladas):
+        self.procesadas += procesadas
+        self.reselladas += reselladas
+        self.lotes += 1
+        self.segundos = time.perf_counter() - self._inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.procesadas / self.segundos if self.segundos else 0.0
+
+    @property
+    def fraccion(self):
+        return self.procesadas / self.total if self.total else 1.0
+
+
+def resellar(boveda, id_usuario, valores):
+    """
+    (sellado, huella) de cada valor con la clave actual de la bóveda. Los que ya están
+    sellados con ella se devuelven igual y con huella None (la que tienen sigue valiendo),
+    así repetir un lote tras una caída no cambia nada.
+    """
+    resultado = []
+    for valor in valores:
+        if es_sellado(valor):
+            if id_clave_de(valor) == boveda.id_clave:
+                resultado.append((valor, None))
+                continue
+            valor = boveda.abrir(valor, id_usuario)
+        resultado.append((boveda.sellar(valor, id_usuario), boveda.huella(valor)))
+    return resultado
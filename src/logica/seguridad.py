@@ -0,0 +1,154 @@
+"""
+Hash de las contraseñas maestras de los usuarios con scrypt o PBKDF2 (hashlib).
+
+Los hashes se guardan con su algoritmo y sus parámetros, por ejemplo
+$scrypt$n=16384,r=8,p=1$<sal>$<hash>, así al cambiar el coste se puede
+detectar qué hashes hay que regenerar. Un valor sin ese formato es una
+contraseña guardada en claro por versiones anteriores.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+ALGORITMOS = ("scrypt", "pbkdf2-sha256")
+LONGITUD_SAL = 16
+LONGITUD_HASH = 32
+
+
+def _b64(datos):
+    return base64.b64encode(datos).decode("ascii").rstrip("=")
+
+
+def _desde_b64(texto):
+    return base64.b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def derivar(algoritmo, password, sal, costo):
+    """La derivación en sí. Es una función de módulo para poder ejecutarla en otro proceso"""
+    if algoritmo == "scrypt":
+        n, r, p = costo
+        # scrypt necesita 128 * r * n bytes; el límite por defecto de OpenSSL (32 MiB) se queda corto con n altos
+        return hashlib.scrypt(password.encode("utf-8"), salt=sal, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=LONGITUD_HASH)
+    (iteraciones,) = costo
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), sal, iteraciones, dklen=LONGITUD_HASH)
+
+
+def _leer(almacenado):
+    """(algoritmo, costo, sal, hash) de un valor guardado, o None si no tiene el formato de un hash"""
+    if not almacenado or not almacenado.startswith("$"):
+        return None
+    try:
+        _, algoritmo, parametros, sal, resumen = almacenado.split("$")
+        valores = dict(parametro.split("=") for parametro in parametros.split(","))
+        if algoritmo == "scrypt":
+            costo = (int(valores["n"]), int(valores["r"]), int(valores["p"]))
+        elif algoritmo == "pbkdf2-sha256":
+            costo = (int(valores["i"]),)
+        else:
+            return None
+        return algoritmo, costo, _desde_b64(sal), _desde_b64(resumen)
+    except (ValueError, KeyError):
+        return None
+
+
+class Hasheador:
+    """
+    Genera y verifica hashes con un algoritmo y un coste configurables.
+
+    Con procesos > 0 las derivaciones corren en un ProcessPoolExecutor de ese tamaño,
+    así varios inicios de sesión simultáneos (en un servicio) usan varios núcleos.
+    Como mucho se encolan limite_pendientes derivaciones; las siguientes esperan.
+    """
+
+    def __init__(self, algoritmo="scrypt", n=2 ** 14, r=8, p=1, iteraciones=600_000, procesos=0,
+                 limite_pendientes=None):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo de hash desconocido: {algoritmo}")
+        self.algoritmo = algoritmo
+        self.costo = (n, r, p) if algoritmo == "scrypt" else (iteraciones,)
+        self.procesos = procesos
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pendientes = threading.BoundedSemaphore(limite_pendientes or max(procesos, 1) * 4)
+
+    def _parametros(self):
+        if self.algoritmo == "scrypt":
+            return "n={},r={},p={}".format(*self.costo)
+        return "i={}".format(*self.costo)
+
+    def enviar_derivacion(self, algoritmo, password, sal, costo):
+        """Future con la derivación en bruto: en el pool de procesos si lo hay, o calculada en este hilo"""
+        if not self.procesos:
+            futuro = Future()
+            futuro.set_result(derivar(algoritmo, password, sal, costo))
+            return futuro
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos)
+        self._pendientes.acquire()
+        futuro = self._pool.submit(derivar, algoritmo, password, sal, costo)
+        futuro.add_done_callback(lambda _: self._pendientes.release())
+        return futuro
+
+    def enviar_hash(self, password):
+        """Future con el hash de la contraseña en el formato que se guarda"""
+        sal = os.urandom(LONGITUD_SAL)
+        futuro = Future()
+        derivacion = self.enviar_derivacion(self.algoritmo, password, sal, self.costo)
+
+        def completar(hecho):
+            if hecho.exception() is not None:
+                futuro.set_exception(hecho.exception())
+            else:
+                futuro.set_result(f"${self.algoritmo}${self._parametros()}${_b64(sal)}${_b64(hecho.result())}")
+        derivacion.add_done_callback(completar)
+        return futuro
+
+    def enviar_verificacion(self, password, almacenado):
+        """Future con True si la contraseña corresponde al valor guardado"""
+        leido = _leer(almacenado)
+        if leido is None:
+            # Contraseña en claro de una versión anterior
+            futuro = Future()
+            futuro.set_result(almacenado is not None and hmac.compare_digest(
+                password.encode("utf-8"), almacenado.encode("utf-8")))
+            return futuro
+        algoritmo, costo, sal, esperado = leido
+        futuro = Future()
+        derivacion = self.enviar_derivacion(algoritmo, password, sal, costo)
+
+        def completar(hecho):
+            if hecho.exception() is not None:
+                futuro.set_exception(hecho.exception())
+            else:
+                futuro.set_result(hmac.compare_digest(hecho.result(), esperado))
+        derivacion.add_done_callback(completar)
+        return futuro
+
+    def derivar(self, algoritmo, password, sal, costo):
+        return self.enviar_derivacion(algoritmo, password, sal, costo).result()
+
+    def hashear(self, password):
+        return self.enviar_hash(password).result()
+
+    def verificar(self, password, almacenado):
+        return self.enviar_verificacion(password, almacenado).result()
+
+    def necesita_rehash(self, almacenado):
+        """Si el valor guardado está en claro o usa otro algoritmo o coste que el configurado"""
+        leido = _leer(almacenado)
+        return leido is None or (leido[0], leido[1]) != (self.algoritmo, self.costo)
+
+    def cerrar(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+# Hasheador de la aplicación cuando no se indica otro: scrypt con el coste recomendado, en el mismo hilo
+HASHEADOR_POR_DEFECTO = Hasheador()
@@ -0,0 +1,115 @@
+import queue
+import threading
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+class Trabajo:
+    """Una operación enviada al trabajador, con lo que hay que hacer al terminar"""
+    def __init__(self, funcion, al_terminar=None, al_fallar=None, clave=None):
+        self.funcion = funcion
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.clave = clave
+        self.cancelado = False
+
+    def cancelar(self):
+        """Si aún no empezó no se ejecuta; si ya terminó, su resultado se descarta"""
+        self.cancelado = True
+
+
+class TrabajadorBD:
+    """
+    Ejecuta las operaciones de base de datos fuera del hilo de la interfaz.
+
+    Cada hilo del trabajador tiene su propia sesión (scoped_session). Las funciones
+    enviadas reciben esa sesión y se ejecutan en orden; sus resultados se guardan
+    en una cola que el hilo de la interfaz vacía con procesar_resultados (por
+    ejemplo desde root.after), así los callbacks siempre corren en ese hilo.
+
+    Las sesiones no expiran los objetos al confirmar, para que las entidades
+    devueltas se puedan leer desde la interfaz sin volver a la base de datos. La
+    sesión se cierra al terminar cada trabajo: el siguiente empieza con el mapa de
+    identidad vacío y lee de nuevo lo que haya cambiado otro proceso o el servicio.
+    """
+
+    def __init__(self, engine, hilos=1):
+        self.Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+        self._pendientes = queue.Queue()
+        self._resultados = queue.Queue()
+        self._por_clave = {}
+        self._en_curso = 0
+        self._lock = threading.Lock()
+        self._hilos = [
+            threading.Thread(target=self._ejecutar, name=f"trabajador-bd-{i}", daemon=True)
+            for i in range(hilos)
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def enviar(self, funcion, al_terminar=None, al_fallar=None, clave=None):
+        """
+        Encola funcion(session). Si se indica una clave, el trabajo anterior con la misma
+        clave queda cancelado: por ejemplo, una recarga ya encolada que la nueva reemplaza.
+        """
+        trabajo = Trabajo(funcion, al_terminar, al_fallar, clave)
+        with self._lock:
+            if clave is not None:
+                anterior = self._por_clave.get(clave)
+                if anterior is not None:
+                    anterior.cancelar()
+                self._por_clave[clave] = trabajo
+            self._en_curso += 1
+        self._pendientes.put(trabajo)
+        return trabajo
+
+    @property
+    def ocupado(self):
+        """Hay trabajos encolados, ejecutándose o con el resultado sin procesar"""
+        with self._lock:
+            return self._en_curso > 0
+
+    def _ejecutar(self):
+        try:
+            while True:
+                trabajo = self._pendientes.get()
+                if trabajo is None:
+                    return
+                if trabajo.cancelado:
+                    self._resultados.put((trabajo, False, None))
+                    continue
+                session = self.Session()
+                try:
+                    self._resultados.put((trabajo, True, trabajo.funcion(session)))
+                except Exception as e:
+                    self._resultados.put((trabajo, False, e))
+                finally:
+                    session.close()  # Deshace lo que quedara sin confirmar y suelta las entidades
+        finally:
+            self.Session.remove()
+
+    def procesar_resultados(self):
+        """Ejecuta los callbacks de los trabajos terminados. Llamar solo desde el hilo de la interfaz"""
+        procesados = 0
+        while True:
+            try:
+                trabajo, exito, valor = self._resultados.get_nowait()
+            except queue.Empty:
+                return procesados
+            with self._lock:
+                self._en_curso -= 1
+                if trabajo.clave is not None and self._por_clave.get(trabajo.clave) is trabajo:
+                    del self._por_clave[trabajo.clave]
+            if trabajo.cancelado:
+                continue
+            if exito and trabajo.al_terminar is not None:
+                trabajo.al_terminar(valor)
+            elif not exito and trabajo.al_fallar is not None:
+                trabajo.al_fallar(valor)
+            procesados += 1
+
+    def detener(self):
+        """Termina los hilos después de los trabajos ya encolados"""
+        for _ in self._hilos:
+            self._pendientes.put(None)
+        for hilo in self._hilos:
+            hilo.join()
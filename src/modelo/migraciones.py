@@ -0,0 +1,195 @@
+"""
+Actualización en sitio de bases de datos creadas con versiones anteriores del modelo.
+
+La versión del esquema se guarda en PRAGMA user_version. Cada migración debe ser
+idempotente, porque en una base nueva create_all ya deja el esquema completo y
+las migraciones se ejecutan igualmente sobre ella.
+
+    python -m src.modelo.migraciones [ruta.db] [--reconstruir-busqueda] [--recalcular-conteos]
+                                     [--archivar-sesiones DIAS] [--liberar-espacio]
+"""
+import argparse
+from sqlalchemy import create_engine
+from src.modelo.modelo import Base, DDL_BUSQUEDA, DDL_CONTEOS
+
+
+def _crear_indices(conexion, *nombres):
+    """Crea, si no existen, los índices declarados en el modelo con esos nombres"""
+    indices = {indice.name: indice for tabla in Base.metadata.sorted_tables for indice in tabla.indexes}
+    # Se consulta sqlite_master en lugar de checkfirst porque la reflexión omite los índices sobre expresiones
+    existentes = {fila[0] for fila in conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    for nombre in nombres:
+        if nombre not in existentes:
+            indices[nombre].create(conexion)
+
+
+def _v1_indices_busqueda(conexion):
+    # El índice único no se puede crear mientras haya relaciones repetidas
+    conexion.exec_driver_sql(
+        "DELETE FROM contrasenia_etiqueta WHERE id_contrasenia_etiqueta NOT IN ("
+        " SELECT min(id_contrasenia_etiqueta) FROM contrasenia_etiqueta GROUP BY id_contrasenia, id_etiqueta)"
+    )
+    _crear_indices(
+        conexion,
+        "ux_contrasenia_etiqueta_par",
+        "ix_contrasenia_etiqueta_etiqueta",
+        "ix_contrasenias_usuario_servicio",
+        "ix_etiquetas_nombre",
+        "ix_sesiones_usuario_inicio",
+    )
+
+
+def _v2_indices_paginacion(conexion):
+    _crear_indices(conexion, "ix_contrasenias_usuario_creacion", "ix_contrasenias_usuario_modificacion")
+
+
+def _v3_busqueda_texto(conexion):
+    for sentencia in DDL_BUSQUEDA:
+        conexion.exec_driver_sql(sentencia)
+    _reconstruir_busqueda(conexion)
+
+
+def _reconstruir_busqueda(conexion):
+    conexion.exec_driver_sql("INSERT INTO contrasenias_fts(contrasenias_fts) VALUES ('rebuild')")
+
+
+def _v4_conteo_etiquetas(conexion):
+    for sentencia in DDL_CONTEOS:
+        conexion.exec_driver_sql(sentencia)
+    _recalcular_conteos(conexion)
+
+
+def _recalcular_conteos(conexion):
+    conexion.exec_driver_sql("DELETE FROM conteo_etiquetas")
+    conexion.exec_driver_sql(
+        "INSERT INTO conteo_etiquetas (id_usuario, id_etiqueta, cantidad) "
+        "SELECT c.id_usuario, ce.id_etiqueta, count(*) FROM contrasenia_etiqueta ce "
+        "JOIN contrasenias c ON c.id_contrasenia = ce.id_contrasenia "
+        "GROUP BY c.id_usuario, ce.id_etiqueta"
+    )
+
+
+def _v5_sal_boveda(conexion):
+    columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(usuarios)")}
+    if "sal_boveda" not in columnas:
+        # Los usuarios existentes reciben su sal en el próximo inicio de sesión
+        conexion.exec_driver_sql("ALTER TABLE usuarios ADD COLUMN sal_boveda VARCHAR")
+
+
+def _v6_indices_sesiones(conexion):
+    _crear_indices(conexion, "ix_sesiones_activas", "ix_sesiones_cerradas_fin", "ix_sesiones_inicio",
+                   "ix_sesiones_archivo_usuario_inicio")
+
+
+def _v7_huellas(conexion):
+    columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(contrasenias)")}
+    if "huella" not in columnas:
+        # Las entradas existentes reciben su huella con Contraseniacrud.calcular_huellas
+        conexion.exec_driver_sql("ALTER TABLE contrasenias ADD COLUMN huella VARCHAR")
+    _crear_indices(conexion, "ix_contrasenias_usuario_huella")
+
+
+def _v8_filtraciones(conexion):
+    columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(contrasenias)")}
+    if "veces_filtrada" not in columnas:
+        # Las entradas existentes se revisan con Contraseniacrud.revisar_filtraciones
+        conexion.exec_driver_sql("ALTER TABLE contrasenias ADD COLUMN veces_filtrada INTEGER")
+    _crear_indices(conexion, "ix_contrasenias_filtradas")
+
+
+# (versión, migración) en orden; añadir siempre al final
+MIGRACIONES = [
+    (1, _v1_indices_busqueda),
+    (2, _v2_indices_paginacion),
+    (3, _v3_busqueda_texto),
+    (4, _v4_conteo_etiquetas),
+    (5, _v5_sal_boveda),
+    (6, _v6_indices_sesiones),
+    (7, _v7_huellas),
+    (8, _v8_filtraciones),
+]
+
+
+def version_esquema(conexion):
+    return conexion.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def actualizar_esquema(engine):
+    """Crea las tablas que falten y aplica las migraciones pendientes. Devuelve la versión final"""
+    with engine.begin() as conexion:
+        if not conexion.exec_driver_sql("SELECT count(*) FROM sqlite_master").scalar():
+            # Solo tiene efecto antes de crear la primera tabla y de pasar a WAL: los engines de
+            # config.crear_engine ya lo activan al conectar. En bases existentes lo activa liberar_espacio
+            conexion.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        Base.metadata.create_all(conexion)
+    with engine.begin() as conexion:
+        version = version_esquema(conexion)
+        for numero, migracion in MIGRACIONES:
+            if numero > version:
+                migracion(conexion)
+                conexion.exec_driver_sql(f"PRAGMA user_version = {numero}")
+                version = numero
+    return version
+
+
+def reconstruir_indice_busqueda(engine):
+    """Regenera el índice de texto completo a partir de la tabla contrasenias"""
+    with engine.begin() as conexion:
+        _reconstruir_busqueda(conexion)
+
+
+def recalcular_conteos_etiquetas(engine):
+    """Regenera la tabla conteo_etiquetas a partir de contrasenia_etiqueta"""
+    with engine.begin() as conexion:
+        _recalcular_conteos(conexion)
+
+
+def liberar_espacio(engine, paginas=None):
+    """
+    Devuelve al sistema las páginas libres que dejan los borrados (por ejemplo, tras archivar sesiones).
+
+    Con auto_vacuum incremental libera hasta `paginas` páginas (todas si es None) sin
+    reescribir la base. Una base creada sin él se convierte la primera vez con un VACUUM
+    completo, que sí la reescribe. Devuelve cuántas páginas libres quedaban antes y después.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        libres = conexion.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if conexion.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            conexion.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conexion.exec_driver_sql("VACUUM")
+        else:
+            # sqlite3 solo avanza un paso por execute, y este pragma libera una página por paso;
+            # executescript lo ejecuta hasta el final
+            conexion.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(paginas or 0)})")
+        return libres, conexion.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza el esquema de una base de PassKeeper")
+    parser.add_argument("ruta", nargs="?", default="dbpasskeeper2.db")
+    parser.add_argument("--reconstruir-busqueda", action="store_true",
+                        help="regenerar además el índice de búsqueda de texto completo")
+    parser.add_argument("--recalcular-conteos", action="store_true",
+                        help="regenerar además los conteos de etiquetas por usuario")
+    parser.add_argument("--archivar-sesiones", type=int, metavar="DIAS",
+                        help="archivar las sesiones cerradas hace más de DIAS días")
+    parser.add_argument("--liberar-espacio", action="store_true",
+                        help="devolver al sistema el espacio libre (vacuum incremental)")
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.ruta}")
+    print(f"{args.ruta}: esquema en versión {actualizar_esquema(engine)}")
+    if args.reconstruir_busqueda:
+        reconstruir_indice_busqueda(engine)
+        print(f"{args.ruta}: índice de búsqueda reconstruido")
+    if args.recalcular_conteos:
+        recalcular_conteos_etiquetas(engine)
+        print(f"{args.ruta}: conteos de etiquetas recalculados")
+    if args.archivar_sesiones is not None:
+        from sqlalchemy.orm import Session
+        from src.logica.CRUD import SesionCRUD
+        with Session(engine) as session:
+            print(f"{args.ruta}: {SesionCRUD(session).archivar_sesiones(args.archivar_sesiones)} sesiones archivadas")
+    if args.liberar_espacio:
+        antes, despues = liberar_espacio(engine)
+        print(f"{args.ruta}: páginas libres {antes} -> {despues}")
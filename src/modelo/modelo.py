@@ -1,7 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table, Index, func, DDL, event
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
 Base = declarative_base()
@@ -13,6 +11,12 @@ class ContraseniaEtiqueta(Base):
     id_contrasenia = Column(Integer, ForeignKey('contrasenias.id_contrasenia'))
     id_etiqueta = Column(Integer, ForeignKey('etiquetas.id_etiqueta'))
 
+    __table_args__ = (
+        # Índice único (y no UniqueConstraint) para poder añadirlo también a bases existentes
+        Index('ux_contrasenia_etiqueta_par', 'id_contrasenia', 'id_etiqueta', unique=True),
+        Index('ix_contrasenia_etiqueta_etiqueta', 'id_etiqueta'),
+    )
+
 
 class Usuario(Base):
     __tablename__ = 'usuarios'
@@ -23,6 +27,8 @@ class Usuario(Base):
     password_hash = Column(String, nullable=False)
     rol = Column(String, nullable=False)
     fecha_registro = Column(DateTime, default=datetime.now)
+    # Coste de scrypt y sal con que se deriva la clave de la bóveda (src.logica.boveda)
+    sal_boveda = Column(String, nullable=True)
 
     contrasenias = relationship("Contrasenia", back_populates="usuario")
     sesiones = relationship("Sesion", back_populates="usuario")
@@ -39,11 +45,50 @@ class Contrasenia(Base):
     #ultima_modificacion = Column(DateTime, onupdate=datetime.now)
     ultima_modificacion = Column(DateTime, nullable=True)
     nota = Column(String)
+    # HMAC de la contraseña con una clave derivada de la de la bóveda (Boveda.huella): iguales si se repite
+    huella = Column(String, nullable=True)
+    # Veces que aparece en el corpus de filtraciones (CorpusFiltraciones); 0 si no aparece, NULL si no se revisó
+    veces_filtrada = Column(Integer, nullable=True)
 
     id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'))
     usuario = relationship("Usuario", back_populates="contrasenias")
     etiquetas = relationship("Etiqueta", secondary='contrasenia_etiqueta', back_populates="contrasenias")
 
+    __table_args__ = (
+        Index('ix_contrasenias_usuario_servicio', 'id_usuario', 'servicio'),
+        Index('ix_contrasenias_usuario_creacion', 'id_usuario', 'fecha_creacion'),
+        # Las entradas nunca modificadas se ordenan por su fecha de creación
+        Index('ix_contrasenias_usuario_modificacion', 'id_usuario', func.coalesce(ultima_modificacion, fecha_creacion)),
+        Index('ix_contrasenias_usuario_huella', 'id_usuario', 'huella'),
+        Index('ix_contrasenias_filtradas', 'id_usuario', sqlite_where=veces_filtrada > 0),
+    )
+
+
+# Índice de texto completo (FTS5) sobre las columnas visibles de cada contraseña. Es una tabla
+# de contenido externo: solo guarda el índice, y los triggers lo mantienen al día con contrasenias.
+# Los índices de prefijos de 2 y 3 caracteres aceleran las primeras teclas de la búsqueda.
+DDL_BUSQUEDA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contrasenias_fts USING fts5("
+    "servicio, nombre_usuario_servicio, nota, content='contrasenias', content_rowid='id_contrasenia', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS contrasenias_fts_ai AFTER INSERT ON contrasenias BEGIN "
+    "INSERT INTO contrasenias_fts(rowid, servicio, nombre_usuario_servicio, nota) "
+    "VALUES (new.id_contrasenia, new.servicio, new.nombre_usuario_servicio, new.nota); END",
+    "CREATE TRIGGER IF NOT EXISTS contrasenias_fts_ad AFTER DELETE ON contrasenias BEGIN "
+    "INSERT INTO contrasenias_fts(contrasenias_fts, rowid, servicio, nombre_usuario_servicio, nota) "
+    "VALUES ('delete', old.id_contrasenia, old.servicio, old.nombre_usuario_servicio, old.nota); END",
+    # Solo las columnas indexadas: cambiar la contraseña o la fecha no toca el índice
+    "CREATE TRIGGER IF NOT EXISTS contrasenias_fts_au AFTER UPDATE OF servicio, nombre_usuario_servicio, nota "
+    "ON contrasenias BEGIN "
+    "INSERT INTO contrasenias_fts(contrasenias_fts, rowid, servicio, nombre_usuario_servicio, nota) "
+    "VALUES ('delete', old.id_contrasenia, old.servicio, old.nombre_usuario_servicio, old.nota); "
+    "INSERT INTO contrasenias_fts(rowid, servicio, nombre_usuario_servicio, nota) "
+    "VALUES (new.id_contrasenia, new.servicio, new.nombre_usuario_servicio, new.nota); END",
+]
+
+for _sentencia in DDL_BUSQUEDA:
+    event.listen(Contrasenia.__table__, "after_create", DDL(_sentencia).execute_if(dialect="sqlite"))
+
 
 class Etiqueta(Base):
     __tablename__ = 'etiquetas'
@@ -53,6 +98,43 @@ class Etiqueta(Base):
 
     contrasenias = relationship("Contrasenia", secondary='contrasenia_etiqueta', back_populates="etiquetas")
 
+    __table_args__ = (
+        Index('ix_etiquetas_nombre', 'nombre'),
+    )
+
+
+# Cuántas contraseñas de cada usuario tienen cada etiqueta, para mostrar las facetas sin
+# agregar toda la bóveda. Los triggers la mantienen al día con contrasenia_etiqueta, así
+# cuentan también las relaciones que se crean o eliminan fuera de ContraseniaEtiquetaCRUD.
+class ConteoEtiqueta(Base):
+    __tablename__ = 'conteo_etiquetas'
+
+    id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'), primary_key=True)
+    id_etiqueta = Column(Integer, ForeignKey('etiquetas.id_etiqueta'), primary_key=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+
+_SUMAR_CONTEO = (
+    "INSERT INTO conteo_etiquetas (id_usuario, id_etiqueta, cantidad) "
+    "SELECT id_usuario, new.id_etiqueta, 1 FROM contrasenias WHERE id_contrasenia = new.id_contrasenia "
+    "ON CONFLICT (id_usuario, id_etiqueta) DO UPDATE SET cantidad = cantidad + 1; "
+)
+_RESTAR_CONTEO = (
+    "UPDATE conteo_etiquetas SET cantidad = cantidad - 1 WHERE id_etiqueta = old.id_etiqueta "
+    "AND id_usuario = (SELECT id_usuario FROM contrasenias WHERE id_contrasenia = old.id_contrasenia); "
+    "DELETE FROM conteo_etiquetas WHERE id_etiqueta = old.id_etiqueta AND cantidad <= 0 "
+    "AND id_usuario = (SELECT id_usuario FROM contrasenias WHERE id_contrasenia = old.id_contrasenia); "
+)
+DDL_CONTEOS = [
+    f"CREATE TRIGGER IF NOT EXISTS conteo_etiquetas_ai AFTER INSERT ON contrasenia_etiqueta BEGIN {_SUMAR_CONTEO}END",
+    f"CREATE TRIGGER IF NOT EXISTS conteo_etiquetas_ad AFTER DELETE ON contrasenia_etiqueta BEGIN {_RESTAR_CONTEO}END",
+    "CREATE TRIGGER IF NOT EXISTS conteo_etiquetas_au AFTER UPDATE OF id_contrasenia, id_etiqueta "
+    f"ON contrasenia_etiqueta BEGIN {_RESTAR_CONTEO}{_SUMAR_CONTEO}END",
+]
+
+for _sentencia in DDL_CONTEOS:
+    event.listen(ContraseniaEtiqueta.__table__, "after_create", DDL(_sentencia).execute_if(dialect="sqlite"))
+
 
 class Sesion(Base):
     __tablename__ = 'sesiones'
@@ -65,11 +147,43 @@ class Sesion(Base):
     id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'))
     usuario = relationship("Usuario", back_populates="sesiones")
 
+    __table_args__ = (
+        Index('ix_sesiones_usuario_inicio', 'id_usuario', 'fecha_inicio'),
+        # Parciales: solo las sesiones abiertas, que son pocas aunque el historial tenga millones.
+        # fecha_fin (siempre NULL aquí) da a la consulta una igualdad más que ix_sesiones_usuario_inicio,
+        # así el planificador elige este índice aunque no haya estadísticas (ANALYZE)
+        Index('ix_sesiones_activas', 'id_usuario', 'fecha_fin', 'fecha_inicio', sqlite_where=fecha_fin.is_(None)),
+        # Para archivar las cerradas más antiguas sin recorrer la tabla
+        Index('ix_sesiones_cerradas_fin', 'fecha_fin', sqlite_where=fecha_fin.isnot(None)),
+        Index('ix_sesiones_inicio', 'fecha_inicio'),
+    )
 
-# Configuración de la base de datos para pruebas (en memoria)
-engine = create_engine("sqlite:///dbpasskeeper2.db")
-Session = sessionmaker(bind=engine)
-Session = Session()
 
-# Crear las tablas en la base de datos de prueba
-Base.metadata.create_all(engine)
+# Sesiones cerradas que SesionCRUD.archivar_sesiones sacó de la tabla sesiones. Guarda las
+# fechas como segundos desde 1970 (y la duración en lugar del fin) para ocupar menos.
+class SesionArchivada(Base):
+    __tablename__ = 'sesiones_archivo'
+
+    id_sesion = Column(Integer, primary_key=True)
+    id_usuario = Column(Integer)
+    inicio = Column(Integer, nullable=False)
+    duracion = Column(Integer, nullable=False)
+    ip = Column(String)
+
+    __table_args__ = (
+        Index('ix_sesiones_archivo_usuario_inicio', 'id_usuario', 'inicio'),
+    )
+
+
+# Rotación pendiente de la clave de la bóveda de un usuario (src.logica.rotacion). Sirve de
+# punto de control: se actualiza en la misma transacción que cada lote vuelto a sellar, y la
+# fila se elimina al terminar.
+class RotacionClave(Base):
+    __tablename__ = 'rotaciones_clave'
+
+    id_usuario = Column(Integer, ForeignKey('usuarios.id_usuario'), primary_key=True)
+    id_clave = Column(String, nullable=False)  # Clave nueva, con la que se vuelve a sellar
+    clave_anterior = Column(String, nullable=False)  # Clave anterior, sellada con la nueva
+    ultimo_id = Column(Integer, nullable=False, default=0)  # Última contraseña ya procesada
+    procesadas = Column(Integer, nullable=False, default=0)
+    fecha_inicio = Column(DateTime, default=datetime.now)
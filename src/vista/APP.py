@@ -1,16 +1,43 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
-from sqlalchemy.orm import sessionmaker
-from src.modelo.modelo import engine
+from src.config import contexto
 from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.indice import IndiceContrasenias
+from src.logica.trabajador import TrabajadorBD
+from src.vista.tabla import FilasTabla
 from tkinter import ttk
 from datetime import datetime
 
-# Configurar sesión de SQLAlchemy
-Session = sessionmaker(bind=engine)
-session = Session()
-usuario_crud = UsuarioCRUD(session)
-contrasenia_crud = Contraseniacrud(session)
+# Las consultas se ejecutan en el hilo del trabajador, cada uno con su propia sesión.
+# Se crea al arrancar la aplicación, no al importar el módulo.
+trabajador = None
+# Otro trabajador, con su hilo y su sesión, para el mantenimiento largo de la bóveda (rotar
+# la clave, sellar lo guardado en claro): así no deja en cola las consultas de la interfaz
+mantenimiento = None
+
+INTERVALO_SONDEO_MS = 30  # Cada cuánto recoge la interfaz los resultados del trabajador
+
+TAMANIO_PAGINA = 200
+ESPERA_BUSQUEDA_MS = 50  # Pausa de tecleo tras la que se lanza la búsqueda
+LIMPIAR_PORTAPAPELES_MS = 30_000  # Tiempo que queda una contraseña copiada en el portapapeles
+# Encabezados de la tabla que permiten ordenar, y la columna de paginación que usa cada uno
+ORDEN_POR_ENCABEZADO = {
+    "Servicio": "servicio",
+    "Fecha de Creación": "fecha_creacion",
+    "Última Modificación": "ultima_modificacion",
+}
+
+
+def sondear_trabajador(root, indicador=None):
+    """Ejecuta en el hilo de Tk los callbacks de los trabajos terminados y vuelve a programarse"""
+    trabajador.procesar_resultados()
+    mantenimiento.procesar_resultados()
+    try:
+        if indicador is not None:
+            indicador.config(text="Cargando..." if trabajador.ocupado else "")
+        root.after(INTERVALO_SONDEO_MS, sondear_trabajador, root, indicador)
+    except tk.TclError:
+        pass  # La ventana se cerró desde uno de los callbacks
 
 class LoginWindow:
     def __init__(self, root):
@@ -36,6 +63,10 @@ class LoginWindow:
         self.button_register = tk.Button(root, text="Crear Usuario", command=self.open_register_window)
         self.button_register.pack(pady=5)
 
+        self.label_estado = tk.Label(root, text="")
+        self.label_estado.pack()
+        sondear_trabajador(self.root, self.label_estado)
+
     def login(self):
         email = self.entry_email.get()
         password = self.entry_password.get()
@@ -44,16 +75,25 @@ class LoginWindow:
             messagebox.showwarning("Advertencia", "Por favor, complete todos los campos.")
             return
 
-        try:
-            sesion = usuario_crud.iniciar_sesion(email, password)
-            if sesion:
-                messagebox.showinfo("Éxito", "Inicio de sesión exitoso.")
-                self.root.destroy()  # Cierra la ventana de login
-                GestionContrasenasWindow(sesion.id_usuario)  # Pasa el id_usuario al abrir la ventana de contraseñas
-            else:
-                messagebox.showerror("Error", "Correo o contraseña incorrectos.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Ha ocurrido un error: {e}")
+        self.button_login.config(state="disabled")
+        trabajador.enviar(
+            lambda session: UsuarioCRUD(session).iniciar_sesion(email, password),
+            al_terminar=self._sesion_iniciada,
+            al_fallar=self._error_login,
+        )
+
+    def _sesion_iniciada(self, sesion):
+        self.button_login.config(state="normal")
+        if sesion:
+            messagebox.showinfo("Éxito", "Inicio de sesión exitoso.")
+            self.root.destroy()  # Cierra la ventana de login
+            GestionContrasenasWindow(sesion.id_usuario, sesion.id_sesion)  # Abre la ventana de contraseñas del usuario
+        else:
+            messagebox.showerror("Error", "Correo o contraseña incorrectos.")
+
+    def _error_login(self, e):
+        self.button_login.config(state="normal")
+        messagebox.showerror("Error", f"Ha ocurrido un error: {e}")
 
     def open_register_window(self):
         RegisterWindow(self.root)
@@ -99,31 +139,51 @@ class RegisterWindow:
             messagebox.showwarning("Advertencia", "Por favor, complete todos los campos.")
             return
 
-        try:
-            usuario_crud.create_usuario(nombre_usuario, email, password, rol)
-            messagebox.showinfo("Éxito", "Usuario registrado correctamente.")
-            self.window.destroy()
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo registrar el usuario: {e}")
+        self.button_register.config(state="disabled")
+        trabajador.enviar(
+            lambda session: UsuarioCRUD(session).create_usuario(nombre_usuario, email, password, rol),
+            al_terminar=self._usuario_registrado,
+            al_fallar=self._error_registro,
+        )
+
+    def _usuario_registrado(self, usuario):
+        messagebox.showinfo("Éxito", "Usuario registrado correctamente.")
+        self.window.destroy()
+
+    def _error_registro(self, e):
+        self.button_register.config(state="normal")
+        messagebox.showerror("Error", f"No se pudo registrar el usuario: {e}")
 
 
 class GestionContrasenasWindow:
-    def __init__(self, usuario_id):
+    def __init__(self, usuario_id, id_sesion):
         self.usuario_id = usuario_id  # Recibe el id del usuario
+        self.id_sesion = id_sesion
         self.root = tk.Tk()
         self.root.title("Gestión de Contraseñas")
         self.root.geometry("800x400")  # Ajusté el tamaño para más espacio
 
+        # Búsqueda: se consulta mientras el usuario escribe
+        frame_busqueda = tk.Frame(self.root)
+        frame_busqueda.pack(fill="x", padx=5, pady=5)
+        tk.Label(frame_busqueda, text="Buscar:").pack(side="left")
+        self.entry_busqueda = tk.Entry(frame_busqueda)
+        self.entry_busqueda.pack(side="left", fill="x", expand=True, padx=5)
+        self.entry_busqueda.bind("<KeyRelease>", self._al_escribir_busqueda)
+        self._busqueda_pendiente = None
+
         # Tabla de contraseñas
-        self.tree = ttk.Treeview(self.root, columns=(
-            "ID", "Servicio", "Usuario", "Contraseña Encriptada", "Fecha de Creación", "Última Modificación", "Nota"),
+        frame_tabla = tk.Frame(self.root)
+        frame_tabla.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(frame_tabla, columns=(
+            "ID", "Servicio", "Usuario", "Contraseña", "Fecha de Creación", "Última Modificación", "Nota"),
                                  show="headings")
 
         # Definir encabezados de las columnas
         self.tree.heading("ID", text="ID")
         self.tree.heading("Servicio", text="Servicio")
         self.tree.heading("Usuario", text="Usuario")
-        self.tree.heading("Contraseña Encriptada", text="Contraseña Encriptada")
+        self.tree.heading("Contraseña", text="Contraseña")
         self.tree.heading("Fecha de Creación", text="Fecha de Creación")
         self.tree.heading("Última Modificación", text="Última Modificación")
         self.tree.heading("Nota", text="Nota")
@@ -132,13 +192,25 @@ class GestionContrasenasWindow:
         self.tree.column("ID", width=50)
         self.tree.column("Servicio", width=150)
         self.tree.column("Usuario", width=150)
-        self.tree.column("Contraseña Encriptada", width=150)
+        self.tree.column("Contraseña", width=150)
         self.tree.column("Fecha de Creación", width=150)
         self.tree.column("Última Modificación", width=150)
         self.tree.column("Nota", width=200)
 
-        # Mostrar la tabla
-        self.tree.pack(fill="both", expand=True)
+        # Ordenar al pulsar los encabezados que lo permiten
+        for encabezado, orden in ORDEN_POR_ENCABEZADO.items():
+            self.tree.heading(encabezado, command=lambda orden=orden: self.ordenar_por(orden))
+
+        # Mostrar la tabla; las páginas siguientes se cargan al acercarse al final del desplazamiento
+        self.scrollbar = ttk.Scrollbar(frame_tabla, orient="vertical", command=self.tree.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.configure(yscrollcommand=self._al_desplazar)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.filas = FilasTabla(self.tree)
+
+        self.orden = "servicio"
+        self._cursor = None
+        self._cargando = False
 
         # Botones
         frame_botones = tk.Frame(self.root)
@@ -147,34 +219,129 @@ class GestionContrasenasWindow:
         tk.Button(frame_botones, text="Agregar", command=self.agregar_contrasena).pack(side="left", padx=10)
         tk.Button(frame_botones, text="Editar", command=self.editar_contrasena).pack(side="left", padx=10)
         tk.Button(frame_botones, text="Eliminar", command=self.eliminar_contrasena).pack(side="left", padx=10)
+        tk.Button(frame_botones, text="Mostrar", command=self.mostrar_contrasena).pack(side="left", padx=10)
+        tk.Button(frame_botones, text="Copiar", command=self.copiar_contrasena).pack(side="left", padx=10)
+        self.label_estado = tk.Label(frame_botones, text="", width=12)
+        self.label_estado.pack(side="left", padx=10)
+        sondear_trabajador(self.root, self.label_estado)
+
+        # Índice en memoria para filtrar mientras se escribe. Se construye en segundo plano;
+        # hasta que esté listo, la búsqueda usa solo el índice de texto completo
+        self.indice = None
+        trabajador.enviar(
+            lambda session: IndiceContrasenias.construir(Contraseniacrud(session), self.usuario_id),
+            al_terminar=self._indice_listo,
+        )
 
         # Cargar contraseñas
         self.cargar_contrasenas()
 
+        # En segundo plano: terminar una rotación de la clave pendiente y sellar las contraseñas
+        # que versiones anteriores guardaron en claro. Cada lote se confirma por separado, así
+        # las escrituras de la interfaz solo esperan a que termine el lote en curso
+        mantenimiento.enviar(
+            self._mantener_boveda,
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudieron cifrar las contraseñas: {e}"),
+        )
+
         self.root.mainloop()
+        # Al cerrar la ventana: la sesión queda cerrada y la clave sale del llavero. Es lo último
+        # que ejecuta el trabajador, que termina los trabajos encolados antes de detenerse
+        trabajador.enviar(lambda session: UsuarioCRUD(session).cerrar_sesion(self.id_sesion))
+
+    def _mantener_boveda(self, session):
+        crud = Contraseniacrud(session)
+        crud.rotar_clave(self.usuario_id)
+        crud.sellar_pendientes(self.usuario_id)
+
+    def _indice_listo(self, indice):
+        self.indice = indice
+
+    def _contrasenia_crud(self, session):
+        """CRUD sobre la sesión del trabajador, con el índice suscrito para que siga los cambios"""
+        crud = Contraseniacrud(session)
+        if self.indice is not None:
+            crud.suscribir(self.indice)
+        return crud
+
+    def _enviar_listado(self, funcion, al_terminar):
+        """
+        Encola una consulta que reemplaza o amplía el listado. Comparten clave, así una
+        recarga o búsqueda nueva cancela la anterior si aún no había terminado.
+        """
+        self._cargando = True
+
+        def terminar(resultado):
+            self._cargando = False
+            al_terminar(resultado)
+
+        def fallar(e):
+            self._cargando = False
+            messagebox.showerror("Error", f"No se pudieron cargar las contraseñas: {e}")
+
+        trabajador.enviar(funcion, al_terminar=terminar, al_fallar=fallar, clave=("listado", id(self)))
 
     def cargar_contrasenas(self):
-        """Carga las contraseñas del usuario desde la base de datos"""
-        # Limpiar la tabla antes de cargar datos
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
-        # Obtener contraseñas de la base de datos
-        contrasenas = contrasenia_crud.obtener_contrasenias_usuario(self.usuario_id)
-
-        # Insertar los datos en la tabla
-        for contrasenia in contrasenas:
-            self.tree.insert("", "end", values=(
-                contrasenia.id_contrasenia,
-                contrasenia.servicio,
-                contrasenia.nombre_usuario_servicio,
-                contrasenia.contrasenia_encriptada,  # Columna de Contraseña Encriptada
-                contrasenia.fecha_creacion.strftime("%Y-%m-%d %H:%M:%S") if contrasenia.fecha_creacion else "",
-                # Fecha de creación
-                contrasenia.ultima_modificacion.strftime(
-                    "%Y-%m-%d %H:%M:%S") if contrasenia.ultima_modificacion else "",  # Última modificación
-                contrasenia.nota or ""  # Nota (si no hay nota, colocar vacío)
-            ))
+        """Vacía la tabla y carga la primera página de contraseñas del usuario"""
+        self._cursor = None
+        self._cargar_pagina(reemplazar=True)
+
+    def ordenar_por(self, orden):
+        self.orden = orden
+        self.cargar_contrasenas()
+
+    def _cargar_pagina(self, reemplazar=False):
+        """Pide la siguiente página de contraseñas; reemplazar vacía antes la tabla"""
+        if not reemplazar and (self._cargando or not self.filas.hay_mas):
+            return
+        usuario_id, cursor, orden = self.usuario_id, self._cursor, self.orden
+
+        def pagina_cargada(resultado):
+            contrasenas, self._cursor = resultado
+            if reemplazar:
+                self.filas.reemplazar(contrasenas, orden=orden, hay_mas=self._cursor is not None)
+            else:
+                self.filas.agregar_pagina(contrasenas, hay_mas=self._cursor is not None)
+
+        self._enviar_listado(
+            lambda session: Contraseniacrud(session).listar_pagina(
+                usuario_id, cursor=cursor, tamanio_pagina=TAMANIO_PAGINA, orden=orden, proyeccion=True),
+            pagina_cargada,
+        )
+
+    def _al_escribir_busqueda(self, event=None):
+        # Reiniciar la espera en cada tecla para no consultar por cada carácter
+        if self._busqueda_pendiente is not None:
+            self.root.after_cancel(self._busqueda_pendiente)
+        self._busqueda_pendiente = self.root.after(ESPERA_BUSQUEDA_MS, self.buscar)
+
+    def buscar(self):
+        """Muestra los resultados de la búsqueda, o la lista paginada si el texto está vacío"""
+        self._busqueda_pendiente = None
+        texto = self.entry_busqueda.get().strip()
+        if not texto:
+            self.cargar_contrasenas()
+            return
+        # Primero el índice en memoria (servicio y usuario); si no encuentra nada, el de texto completo (incluye notas)
+        ids = self.indice.buscar(texto, limite=TAMANIO_PAGINA) if self.indice is not None else []
+        usuario_id = self.usuario_id
+
+        def consultar(session):
+            crud = Contraseniacrud(session)
+            if ids:
+                return crud.obtener_contrasenias_por_ids(ids)
+            return crud.buscar(usuario_id, texto, limite=TAMANIO_PAGINA)
+
+        def mostrar(resultados):
+            self.filas.reemplazar(resultados)  # Los resultados no se paginan ni siguen un orden de columna
+
+        self._enviar_listado(consultar, mostrar)
+
+    def _al_desplazar(self, primero, ultimo):
+        self.scrollbar.set(primero, ultimo)
+        # Cargar la siguiente página cuando se ve el último 10% de lo cargado
+        if float(ultimo) > 0.9:
+            self.root.after_idle(self._cargar_pagina)
 
     def agregar_contrasena(self):
         def guardar_contrasena():
@@ -187,20 +354,30 @@ class GestionContrasenasWindow:
                 messagebox.showwarning("Advertencia", "Por favor, complete todos los campos obligatorios.")
                 return
 
-            try:
-                # Crear la nueva contraseña en la base de datos
-                contrasenia_crud.create_contrasenia(
+            def contrasena_agregada(nueva):
+                # Solo se inserta la fila nueva; en una búsqueda, se repite para ver si coincide
+                if not self.filas.insertar(nueva) and self.entry_busqueda.get().strip():
+                    self.buscar()
+                messagebox.showinfo("Éxito", "Contraseña agregada correctamente.")
+                ventana_agregar.destroy()
+
+            def error(e):
+                boton_guardar.config(state="normal")
+                messagebox.showerror("Error", f"No se pudo agregar la contraseña: {e}")
+
+            # Crear la nueva contraseña en la base de datos
+            boton_guardar.config(state="disabled")
+            trabajador.enviar(
+                lambda session: self._contrasenia_crud(session).create_contrasenia(
                     id_usuario=self.usuario_id,
                     servicio=servicio,
                     nombre_usuario_servicio=nombre_usuario_servicio,
-                    contrasenia_encriptada=contrasenia,  # Aquí deberías encriptar la contraseña
+                    contrasenia_encriptada=contrasenia,  # Se sella con la clave de la bóveda del usuario
                     nota=nota
-                )
-                messagebox.showinfo("Éxito", "Contraseña agregada correctamente.")
-                self.cargar_contrasenas()
-                ventana_agregar.destroy()
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo agregar la contraseña: {e}")
+                ),
+                al_terminar=contrasena_agregada,
+                al_fallar=error,
+            )
 
         # Crear una nueva ventana para añadir una contraseña
         ventana_agregar = tk.Toplevel(self.root)
@@ -225,9 +402,39 @@ class GestionContrasenasWindow:
         text_nota.pack(pady=5)
 
         # Botón para guardar
-        tk.Button(ventana_agregar, text="Guardar", command=guardar_contrasena).pack(pady=10)
+        boton_guardar = tk.Button(ventana_agregar, text="Guardar", command=guardar_contrasena)
+        boton_guardar.pack(pady=10)
         pass
 
+    def _revelar_seleccionada(self, al_terminar):
+        """Descifra en el trabajador la contraseña seleccionada y pasa el texto a al_terminar"""
+        seleccion = self.tree.focus()
+        if not seleccion:
+            messagebox.showwarning("Advertencia", "Por favor, seleccione una contraseña.")
+            return
+        trabajador.enviar(
+            lambda session: Contraseniacrud(session).revelar_contrasenia(int(seleccion)),
+            al_terminar=al_terminar,
+            al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo descifrar la contraseña: {e}"),
+        )
+
+    def mostrar_contrasena(self):
+        self._revelar_seleccionada(lambda texto: messagebox.showinfo("Contraseña", texto))
+
+    def copiar_contrasena(self):
+        def copiar(texto):
+            self.root.clipboard_clear()
+            self.root.clipboard_append(texto)
+            self.root.after(LIMPIAR_PORTAPAPELES_MS, self._limpiar_portapapeles, texto)
+        self._revelar_seleccionada(copiar)
+
+    def _limpiar_portapapeles(self, texto):
+        try:
+            if self.root.clipboard_get() == texto:  # Salvo que el usuario haya copiado otra cosa
+                self.root.clipboard_clear()
+        except tk.TclError:
+            pass  # Portapapeles vacío o ventana cerrada
+
     def editar_contrasena(self):
         # Implementar ventana para editar contraseña seleccionada
         pass
@@ -250,20 +457,37 @@ class GestionContrasenasWindow:
             if not confirmacion:
                 return
 
-            # Eliminar contraseña en la base de datos
-            try:
-                contrasenia_crud.delete_contrasenia(contrasena_id)
+            def contrasena_eliminada(eliminada):
+                self.filas.eliminar(eliminada.id_contrasenia)  # Quitar solo esa fila de la tabla
                 messagebox.showinfo("Éxito", "La contraseña ha sido eliminada correctamente.")
-                self.cargar_contrasenas()  # Refrescar la tabla después de eliminar
-            except Exception as e:
-                messagebox.showerror("Error", f"No se pudo eliminar la contraseña: {e}")
+
+            # Eliminar contraseña en la base de datos
+            trabajador.enviar(
+                lambda session: self._contrasenia_crud(session).delete_contrasenia(contrasena_id),
+                al_terminar=contrasena_eliminada,
+                al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo eliminar la contraseña: {e}"),
+            )
 
         except Exception as e:
             messagebox.showerror("Error", f"Hubo un problema al intentar eliminar la contraseña: {e}")
             pass
 
 
-if __name__ == "__main__":
+def main():
+    global trabajador, mantenimiento
     root = tk.Tk()
+    trabajador = TrabajadorBD(contexto.engine)
+    mantenimiento = TrabajadorBD(contexto.engine)
+    # Primer trabajo: crear las tablas o añadir índices y tablas nuevas a bases creadas con versiones
+    # anteriores. La ventana se muestra mientras tanto y el login se encola detrás
+    trabajador.enviar(lambda session: contexto.preparar_esquema(),
+                      al_fallar=lambda e: messagebox.showerror("Error", f"No se pudo abrir la base de datos: {e}"))
     app = LoginWindow(root)
     root.mainloop()
+    trabajador.detener()
+    # Sin esperar al mantenimiento: cada lote ya confirmado queda hecho y el resto sigue
+    # en el próximo inicio de sesión (la rotación guarda su punto de control)
+
+
+if __name__ == "__main__":
+    main()
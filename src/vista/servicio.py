@@ -0,0 +1,543 @@
+"""
+PassKeeper como servicio local: una API HTTP con JSON sobre el CRUD, sin interfaz gráfica,
+para que varios clientes compartan la misma bóveda.
+
+Cada pedido se atiende en un hilo de un pool fijo (--hilos) con su propia sesión de
+SQLAlchemy, tomada del pool de conexiones del engine y devuelta al terminar. Todos los
+hilos comparten el llavero, así la clave de la bóveda que se deriva al iniciar sesión
+sirve para los pedidos siguientes del mismo usuario. Por eso los trabajadores son hilos
+y no procesos: las claves solo viven en la memoria de este proceso.
+
+    python -m src.vista.servicio --puerto 8765 --hilos 8
+
+Iniciar sesión devuelve un token firmado con HMAC que se manda en cada pedido como
+"Authorization: Bearer <token>". Rutas:
+
+    POST   /usuarios                            {nombre_usuario, email, password}
+    POST   /sesiones                            {email, password} -> {token, ...}
+    DELETE /sesiones
+    GET    /contrasenias?cursor=&tamanio=&orden= una página (keyset) y el cursor de la siguiente
+    GET    /contrasenias?q=texto                búsqueda
+    GET    /contrasenias?etiquetas=a,b&modo=    filtro por etiquetas
+    POST   /contrasenias                        {servicio, nombre_usuario_servicio, contrasenia, nota}
+    GET    /contrasenias/<id>                   la entrada con la contraseña descifrada
+    GET    /contrasenias/reutilizadas           grupos de entradas con la misma contraseña
+    GET    /contrasenias/filtradas              entradas que aparecen en el corpus de filtraciones (--filtraciones)
+    PATCH  /contrasenias/<id>                   {contrasenia, nota}
+    DELETE /contrasenias/<id>
+    GET    /etiquetas                           etiquetas del usuario con su cantidad
+    POST   /etiquetas                           {nombre}
+    POST   /contrasenias/<id>/etiquetas         {id_etiqueta}
+    DELETE /contrasenias/<id>/etiquetas/<id_etiqueta>
+    GET    /metricas?formato=json               estadísticas del CRUD (con --instrumentar y sesión), en texto de Prometheus
+"""
+import argparse
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from sqlalchemy.exc import SQLAlchemyError
+from src.config import ContextoApp, cargar_configuracion
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD, ContraseniaEtiquetaCRUD
+from src.logica.boveda import LLAVERO, BovedaBloqueada
+from src.logica.cache import CacheEntidades
+from src.logica.filtraciones import CorpusFiltraciones
+from src.logica.instrumentacion import INSTRUMENTACION
+from src.logica.seguridad import Hasheador
+from src.modelo.modelo import ContraseniaEtiqueta, Sesion
+
+DURACION_TOKEN = 8 * 3600  # Segundos que vale un token; cerrar sesión lo invalida antes
+TAMANIO_MAXIMO_CUERPO = 1 << 20
+TAMANIO_PAGINA_MAXIMO = 500
+ORDENES_FECHA = ("fecha_creacion", "ultima_modificacion")
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+class FirmaTokens:
+    """
+    Tokens de sesión "<id_sesion>.<id_usuario>.<vence>.<firma>" firmados con HMAC-SHA256.
+    Verificarlos no consulta la base; que la sesión siga abierta se comprueba aparte.
+    """
+
+    def __init__(self, secreto=None, duracion=DURACION_TOKEN, reloj=time.time):
+        # Sin secreto fijo, los tokens dejan de valer al reiniciar el servicio, igual que las claves del llavero
+        self._secreto = secreto or os.urandom(32)
+        self.duracion = duracion
+        self._reloj = reloj
+
+    def _firmar(self, mensaje):
+        return _b64(hmac.new(self._secreto, mensaje.encode("ascii"), hashlib.sha256).digest())
+
+    def vencimiento(self):
+        """Cuándo vence un token emitido ahora"""
+        return int(self._reloj()) + self.duracion
+
+    def vencido(self, vence):
+        return vence < self._reloj()
+
+    def emitir(self, id_sesion, id_usuario, vence=None):
+        mensaje = f"{id_sesion}.{id_usuario}.{self.vencimiento() if vence is None else vence}"
+        return f"{mensaje}.{self._firmar(mensaje)}"
+
+    def verificar(self, token):
+        """(id_sesion, id_usuario) si el token es auténtico y no venció; si no, None"""
+        mensaje, _, firma = token.rpartition(".")
+        if not hmac.compare_digest(firma.encode("ascii", "replace"), self._firmar(mensaje).encode("ascii")):
+            return None
+        id_sesion, id_usuario, vence = (int(parte) for parte in mensaje.split("."))
+        if self.vencido(vence):
+            return None
+        return id_sesion, id_usuario
+
+
+def _fecha(valor):
+    return valor.isoformat(sep=" ") if valor is not None else None
+
+
+def _entrada(contrasenia, etiquetas=False, filtrada=False):
+    datos = {
+        "id_contrasenia": contrasenia.id_contrasenia,
+        "servicio": contrasenia.servicio,
+        "nombre_usuario_servicio": contrasenia.nombre_usuario_servicio,
+        "nota": contrasenia.nota,
+        "fecha_creacion": _fecha(contrasenia.fecha_creacion),
+        "ultima_modificacion": _fecha(contrasenia.ultima_modificacion),
+    }
+    if etiquetas:
+        datos["etiquetas"] = [etiqueta.nombre for etiqueta in contrasenia.etiquetas]
+    if filtrada:
+        datos["veces_filtrada"] = contrasenia.veces_filtrada
+    return datos
+
+
+def codificar_cursor(cursor):
+    """El cursor de listar_pagina como texto opaco para la URL"""
+    if cursor is None:
+        return None
+    valor, id_contrasenia = cursor
+    valor = _fecha(valor) if isinstance(valor, datetime) else valor
+    return _b64(json.dumps([valor, id_contrasenia]).encode("utf-8"))
+
+
+def decodificar_cursor(texto, orden):
+    try:
+        valor, id_contrasenia = json.loads(_desde_b64(texto))
+        if orden in ORDENES_FECHA:
+            valor = datetime.fromisoformat(valor)
+        return valor, int(id_contrasenia)
+    except (ValueError, TypeError):
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Cursor inválido")
+
+
+def _entero(texto, nombre):
+    try:
+        return int(texto)
+    except (TypeError, ValueError):
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"{nombre} debe ser un número")
+
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    server_version = "PassKeeper/1.0"
+
+    # (método, ruta, función, requiere sesión); las funciones reciben (session, id_usuario, cuerpo, *grupos)
+    RUTAS = [
+        ("POST", r"/usuarios", "_registrar", False),
+        ("POST", r"/sesiones", "_iniciar_sesion", False),
+        ("DELETE", r"/sesiones", "_cerrar_sesion", True),
+        ("GET", r"/contrasenias", "_listar", True),
+        ("POST", r"/contrasenias", "_crear", True),
+        ("GET", r"/contrasenias/(\d+)", "_revelar", True),
+        ("GET", r"/contrasenias/reutilizadas", "_reutilizadas", True),
+        ("GET", r"/contrasenias/filtradas", "_filtradas", True),
+        ("PATCH", r"/contrasenias/(\d+)", "_editar", True),
+        ("DELETE", r"/contrasenias/(\d+)", "_eliminar", True),
+        ("GET", r"/etiquetas", "_listar_etiquetas", True),
+        ("POST", r"/etiquetas", "_crear_etiqueta", True),
+        ("POST", r"/contrasenias/(\d+)/etiquetas", "_etiquetar", True),
+        ("DELETE", r"/contrasenias/(\d+)/etiquetas/(\d+)", "_desetiquetar", True),
+        ("GET", r"/metricas", "_metricas", True),
+    ]
+    _RUTAS = [(metodo, re.compile(ruta + r"/?"), funcion, privada) for metodo, ruta, funcion, privada in RUTAS]
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PATCH(self):
+        self._atender("PATCH")
+
+    def do_DELETE(self):
+        self._atender("DELETE")
+
+    def do_PUT(self):
+        # No hay rutas PUT; así se responde 405 en JSON y no la página de error de http.server
+        self._atender("PUT")
+
+    def log_message(self, formato, *args):
+        if self.server.registrar_pedidos:
+            super().log_message(formato, *args)
+
+    def log_error(self, formato, *args):
+        # Los errores se escriben siempre en stderr, aunque no se registren los pedidos
+        super().log_message(formato, *args)
+
+    def _atender(self, metodo):
+        partes = urlsplit(self.path)
+        self.parametros = {clave: valores[-1] for clave, valores in parse_qs(partes.query).items()}
+        try:
+            funcion, grupos, privada = self._ruta(metodo, partes.path)
+            cuerpo = self._leer_cuerpo() if metodo in ("POST", "PATCH") else {}
+            with self.server.contexto.sesion() as session:
+                id_usuario = self._autenticar(session) if privada else None
+                estado, respuesta = getattr(self, funcion)(session, id_usuario, cuerpo, *grupos)
+        except ErrorHTTP as e:
+            estado, respuesta = e.estado, {"error": str(e)}
+        except BovedaBloqueada as e:
+            estado, respuesta = HTTPStatus.UNAUTHORIZED, {"error": str(e)}
+        except SQLAlchemyError:
+            self.log_error("Error de la base de datos en %s %s", metodo, self.path)
+            estado, respuesta = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error de la base de datos"}
+        except Exception as e:
+            if type(e) in (Exception, ValueError):
+                # El CRUD informa los errores de uso (email repetido, entrada inexistente...) con
+                # Exception o ValueError; sus subclases (KeyError, UnicodeError...) son fallos del servicio
+                estado, respuesta = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+            else:
+                self.log_error("Error inesperado en %s %s:\n%s", metodo, self.path, traceback.format_exc())
+                estado, respuesta = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error interno del servicio"}
+        self._responder(estado, respuesta)
+
+    def _ruta(self, metodo, camino):
+        permitida = False
+        for metodo_ruta, patron, funcion, privada in self._RUTAS:
+            encontrada = patron.fullmatch(camino)
+            if encontrada:
+                if metodo_ruta == metodo:
+                    return funcion, [int(grupo) for grupo in encontrada.groups()], privada
+                permitida = True
+        if permitida:
+            raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "Método no permitido")
+        raise ErrorHTTP(HTTPStatus.NOT_FOUND, "Ruta desconocida")
+
+    def _leer_cuerpo(self):
+        longitud = _entero(self.headers.get("Content-Length", 0), "Content-Length")
+        if longitud > TAMANIO_MAXIMO_CUERPO:
+            raise ErrorHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande")
+        try:
+            cuerpo = json.loads(self.rfile.read(longitud) or b"{}")
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "El cuerpo no es JSON válido")
+        if not isinstance(cuerpo, dict):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "El cuerpo debe ser un objeto JSON")
+        return cuerpo
+
+    def _responder(self, estado, respuesta):
+        if isinstance(respuesta, str):
+            datos, tipo = respuesta.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            datos, tipo = json.dumps(respuesta, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _autenticar(self, session):
+        """El id del usuario del token, si la sesión sigue abierta y su bóveda desbloqueada"""
+        esquema, _, token = self.headers.get("Authorization", "").partition(" ")
+        identidad = self.server.tokens.verificar(token.strip()) if esquema.lower() == "bearer" else None
+        if identidad is None:
+            raise ErrorHTTP(HTTPStatus.UNAUTHORIZED, "Token ausente, inválido o vencido")
+        id_sesion, id_usuario = identidad
+        sesion = SesionCRUD(session, cache=self.server.cache).get_sesion(id_sesion)
+        if sesion is None or sesion.fecha_fin is not None or self.server.llavero.obtener(id_usuario) is None:
+            raise ErrorHTTP(HTTPStatus.UNAUTHORIZED, "La sesión está cerrada")
+        self.id_sesion = id_sesion
+        return id_usuario
+
+    @staticmethod
+    def _campo(cuerpo, nombre, obligatorio=True):
+        valor = cuerpo.get(nombre)
+        if valor is not None and not isinstance(valor, str):
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"{nombre} debe ser texto")
+        if obligatorio and not valor:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"Falta {nombre}")
+        return valor
+
+    def _usuarios(self, session):
+        return UsuarioCRUD(session, cache=self.server.cache, hasheador=self.server.hasheador,
+                           llavero=self.server.llavero)
+
+    def _contrasenias(self, session):
+        return Contraseniacrud(session, llavero=self.server.llavero, filtraciones=self.server.filtraciones)
+
+    def _propia(self, session, id_usuario, id_contrasenia):
+        """La contraseña, si existe y es del usuario; a las de otros se responde igual que a las inexistentes"""
+        encontradas = self._contrasenias(session).obtener_contrasenias_por_ids([id_contrasenia])
+        if not encontradas or encontradas[0].id_usuario != id_usuario:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "La contraseña no existe")
+        return encontradas[0]
+
+    # Usuarios y sesiones
+
+    def _registrar(self, session, _, cuerpo):
+        usuario = self._usuarios(session).create_usuario(
+            self._campo(cuerpo, "nombre_usuario"), self._campo(cuerpo, "email"),
+            self._campo(cuerpo, "password"), "user")
+        return HTTPStatus.CREATED, {"id_usuario": usuario.id_usuario}
+
+    def _iniciar_sesion(self, session, _, cuerpo):
+        sesion = self._usuarios(session).iniciar_sesion(self._campo(cuerpo, "email"), self._campo(cuerpo, "password"))
+        if sesion is None:
+            raise ErrorHTTP(HTTPStatus.UNAUTHORIZED, "Email o contraseña incorrectos")
+        vence = self.server.tokens.vencimiento()
+        self.server.sesion_emitida(sesion.id_sesion, vence)
+        return HTTPStatus.CREATED, {
+            "token": self.server.tokens.emitir(sesion.id_sesion, sesion.id_usuario, vence),
+            "id_sesion": sesion.id_sesion,
+            "id_usuario": sesion.id_usuario,
+            "vence_en": self.server.tokens.duracion,
+        }
+
+    def _cerrar_sesion(self, session, id_usuario, _):
+        self._usuarios(session).cerrar_sesion(self.id_sesion)
+        return HTTPStatus.OK, {"id_sesion": self.id_sesion}
+
+    # Contraseñas
+
+    def _listar(self, session, id_usuario, _):
+        crud = self._contrasenias(session)
+        if "q" in self.parametros:
+            limite = min(_entero(self.parametros.get("limite", 50), "limite"), TAMANIO_PAGINA_MAXIMO)
+            return HTTPStatus.OK, {"contrasenias": [_entrada(c) for c in crud.buscar(id_usuario, self.parametros["q"], limite)]}
+        if "etiquetas" in self.parametros:
+            etiquetas = [nombre for nombre in self.parametros["etiquetas"].split(",") if nombre]
+            modo = self.parametros.get("modo", "todas")
+            if modo not in crud.MODOS_ETIQUETAS:
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"modo debe ser uno de {', '.join(crud.MODOS_ETIQUETAS)}")
+            filas = crud.listar_con_etiquetas(id_usuario, etiquetas, modo=modo, limite=TAMANIO_PAGINA_MAXIMO)
+            return HTTPStatus.OK, {"contrasenias": [_entrada(c, etiquetas=True) for c in filas]}
+
+        orden = self.parametros.get("orden", "servicio")
+        if orden not in crud.ORDENES_PAGINACION:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"No se puede ordenar por {orden}")
+        cursor = self.parametros.get("cursor")
+        tamanio = min(_entero(self.parametros.get("tamanio", 100), "tamanio"), TAMANIO_PAGINA_MAXIMO)
+        pagina, siguiente = crud.listar_pagina(
+            id_usuario, cursor=decodificar_cursor(cursor, orden) if cursor else None,
+            tamanio_pagina=tamanio, orden=orden, proyeccion=True)
+        return HTTPStatus.OK, {"contrasenias": [_entrada(c) for c in pagina], "cursor": codificar_cursor(siguiente)}
+
+    def _crear(self, session, id_usuario, cuerpo):
+        contrasenia = self._contrasenias(session).create_contrasenia(
+            self._campo(cuerpo, "servicio"), self._campo(cuerpo, "nombre_usuario_servicio"),
+            self._campo(cuerpo, "contrasenia"), id_usuario, nota=self._campo(cuerpo, "nota", obligatorio=False))
+        return HTTPStatus.CREATED, _entrada(contrasenia, filtrada=True)
+
+    def _reutilizadas(self, session, id_usuario, _):
+        grupos = self._contrasenias(session).contrasenias_reutilizadas(id_usuario)
+        return HTTPStatus.OK, {"grupos": [[_entrada(c) for c in grupo] for grupo in grupos]}
+
+    def _filtradas(self, session, id_usuario, _):
+        filas = self._contrasenias(session).contrasenias_filtradas(id_usuario)
+        return HTTPStatus.OK, {"contrasenias": [dict(_entrada(c), veces_filtrada=veces) for veces, c in filas]}
+
+    def _revelar(self, session, id_usuario, _, id_contrasenia):
+        contrasenia = self._propia(session, id_usuario, id_contrasenia)
+        datos = _entrada(contrasenia)
+        datos["contrasenia"] = self._contrasenias(session).descifrar(id_usuario, contrasenia.contrasenia_encriptada)
+        return HTTPStatus.OK, datos
+
+    def _editar(self, session, id_usuario, cuerpo, id_contrasenia):
+        self._propia(session, id_usuario, id_contrasenia)
+        contrasenia = self._contrasenias(session).editar_contrasena(
+            id_contrasenia, self._campo(cuerpo, "contrasenia", obligatorio=False),
+            self._campo(cuerpo, "nota", obligatorio=False))
+        return HTTPStatus.OK, _entrada(contrasenia, filtrada=True)
+
+    def _eliminar(self, session, id_usuario, _, id_contrasenia):
+        self._propia(session, id_usuario, id_contrasenia)
+        self._contrasenias(session).delete_contrasenia(id_contrasenia)
+        return HTTPStatus.OK, {"id_contrasenia": id_contrasenia}
+
+    # Etiquetas
+
+    def _listar_etiquetas(self, session, id_usuario, _):
+        filas = EtiquetaCRUD(session, cache=self.server.cache).contar_etiquetas(id_usuario)
+        return HTTPStatus.OK, {"etiquetas": [
+            {"id_etiqueta": fila.id_etiqueta, "nombre": fila.nombre, "cantidad": fila.cantidad} for fila in filas]}
+
+    def _crear_etiqueta(self, session, _, cuerpo):
+        etiqueta = EtiquetaCRUD(session, cache=self.server.cache).create_etiqueta(self._campo(cuerpo, "nombre"))
+        return HTTPStatus.CREATED, {"id_etiqueta": etiqueta.id_etiqueta, "nombre": etiqueta.nombre}
+
+    def _etiquetar(self, session, id_usuario, cuerpo, id_contrasenia):
+        self._propia(session, id_usuario, id_contrasenia)
+        id_etiqueta = _entero(cuerpo.get("id_etiqueta"), "id_etiqueta")
+        EtiquetaCRUD(session, cache=self.server.cache).get_etiqueta(id_etiqueta)
+        ContraseniaEtiquetaCRUD(session).create_contrasenia_etiqueta(id_contrasenia, id_etiqueta)
+        return HTTPStatus.CREATED, {"id_contrasenia": id_contrasenia, "id_etiqueta": id_etiqueta}
+
+    def _desetiquetar(self, session, id_usuario, _, id_contrasenia, id_etiqueta):
+        self._propia(session, id_usuario, id_contrasenia)
+        relacion = session.query(ContraseniaEtiqueta).filter_by(
+            id_contrasenia=id_contrasenia, id_etiqueta=id_etiqueta).first()
+        if relacion is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "La contraseña no tiene esa etiqueta")
+        ContraseniaEtiquetaCRUD(session).delete_contrasenia_etiqueta(relacion.id_contrasenia_etiqueta)
+        return HTTPStatus.OK, {"id_contrasenia": id_contrasenia, "id_etiqueta": id_etiqueta}
+
+    def _metricas(self, session, id_usuario, _):
+        # Con sesión: los nombres y tiempos de las consultas no son para cualquiera que llegue al puerto
+        if not INSTRUMENTACION.activa:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "La instrumentación está desactivada (--instrumentar)")
+        if self.parametros.get("formato") == "json":
+            return HTTPStatus.OK, INSTRUMENTACION.instantanea()
+        return HTTPStatus.OK, INSTRUMENTACION.a_prometheus()
+
+
+class ServidorPassKeeper(ThreadingHTTPServer):
+    """
+    Servidor HTTP que atiende cada conexión en un pool fijo de hilos, en lugar de un
+    hilo nuevo por conexión, así la concurrencia no supera las conexiones del engine.
+
+    Cierra además las sesiones cuyo token venció sin que el cliente cerrara sesión, para
+    que la clave de la bóveda no quede en el llavero mientras dure el proceso.
+    """
+    request_queue_size = 128  # Conexiones en espera de accept() antes de rechazarlas
+
+    def __init__(self, direccion, contexto=None, hilos=8, secreto=None, hasheador=None, llavero=None,
+                 registrar_pedidos=False, filtraciones=None):
+        super().__init__(direccion, ManejadorAPI)
+        self.contexto = contexto or ContextoApp()
+        self.tokens = FirmaTokens(secreto)
+        self.cache = CacheEntidades()
+        self.hasheador = hasheador or Hasheador()
+        self.llavero = llavero or LLAVERO
+        self.filtraciones = filtraciones  # CorpusFiltraciones con el que comprobar las contraseñas nuevas
+        self.registrar_pedidos = registrar_pedidos
+        self._trabajadores = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="passkeeper-http")
+        self._vencimientos = []  # (vence, id_sesion) de los tokens emitidos, el próximo a vencer primero
+        self._lock_vencimientos = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self._trabajadores.submit(self.process_request_thread, request, client_address)
+
+    def sesion_emitida(self, id_sesion, vence):
+        with self._lock_vencimientos:
+            heapq.heappush(self._vencimientos, (vence, id_sesion))
+
+    def cerrar_sesiones_vencidas(self):
+        """Cierra las sesiones cuyo token ya venció y siguen abiertas. Devuelve cuántas cerró"""
+        with self._lock_vencimientos:
+            vencidas = []
+            while self._vencimientos and self.tokens.vencido(self._vencimientos[0][0]):
+                vencidas.append(heapq.heappop(self._vencimientos)[1])
+        if not vencidas:
+            return 0
+        cerradas = 0
+        with self.contexto.sesion() as session:
+            usuarios = UsuarioCRUD(session, cache=self.cache, llavero=self.llavero)
+            for i, id_sesion in enumerate(vencidas):
+                try:
+                    sesion = session.get(Sesion, id_sesion)
+                    if sesion is not None and sesion.fecha_fin is None:  # No cerrada ya con DELETE /sesiones
+                        usuarios.cerrar_sesion(id_sesion)
+                        cerradas += 1
+                except SQLAlchemyError:
+                    # Las que faltan se reintentan en la próxima vuelta
+                    for pendiente in vencidas[i:]:
+                        self.sesion_emitida(pendiente, 0)
+                    raise
+        return cerradas
+
+    def service_actions(self):
+        # serve_forever la llama en cada vuelta de su bucle (cada medio segundo como mucho)
+        super().service_actions()
+        try:
+            self.cerrar_sesiones_vencidas()
+        except SQLAlchemyError:
+            traceback.print_exc(file=sys.stderr)
+
+    def server_close(self):
+        super().server_close()
+        self._trabajadores.shutdown()
+        self.contexto.cerrar()
+
+
+def _escribir_lenta(entrada):
+    plan = "; ".join(entrada["plan"]) if isinstance(entrada["plan"], list) else entrada["plan"]
+    print(f"Consulta lenta ({entrada['segundos'] * 1000:.1f} ms, {entrada['metodo']}): "
+          f"{' '.join(entrada['sql'].split())} -- plan: {plan}", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--hilos", type=int, default=8, help="pedidos atendidos a la vez")
+    parser.add_argument("--procesos", type=int, default=0, help="procesos para derivar los hashes (0: en el hilo)")
+    parser.add_argument("--registrar", action="store_true", help="escribir cada pedido en stderr")
+    parser.add_argument("--instrumentar", type=float, metavar="UMBRAL_MS",
+                        help="medir el CRUD (GET /metricas) y escribir en stderr las consultas más lentas que esto")
+    parser.add_argument("--filtraciones", metavar="RUTA",
+                        help="corpus de hashes filtrados (SHA-1 o NTLM, ordenado) contra el que comprobar las contraseñas")
+    args = parser.parse_args()
+
+    configuracion = cargar_configuracion()
+    if configuracion.pool is None:
+        # Una conexión por hilo, sin desbordar: los pedidos de más esperan en la cola del servidor
+        configuracion.pool, configuracion.pool_size, configuracion.max_overflow = "QueuePool", args.hilos, 0
+    # PASSKEEPER_SECRETO (hex) mantiene válidos los tokens entre reinicios
+    secreto = bytes.fromhex(os.environ["PASSKEEPER_SECRETO"]) if os.environ.get("PASSKEEPER_SECRETO") else None
+    hasheador = Hasheador(procesos=args.procesos)
+    filtraciones = CorpusFiltraciones(args.filtraciones) if args.filtraciones else None
+    servidor = ServidorPassKeeper((args.host, args.puerto), ContextoApp(configuracion), hilos=args.hilos,
+                                  secreto=secreto, hasheador=hasheador, registrar_pedidos=args.registrar,
+                                  filtraciones=filtraciones)
+    servidor.contexto.preparar_esquema()
+    if args.instrumentar is not None:
+        INSTRUMENTACION.al_lento = _escribir_lenta
+        INSTRUMENTACION.activar(servidor.contexto.engine, umbral_lento=args.instrumentar / 1000)
+    print(f"PassKeeper escuchando en http://{args.host}:{servidor.server_address[1]} con {args.hilos} hilos", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        hasheador.cerrar()
+        if filtraciones is not None:
+            filtraciones.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+from src.logica.CRUD import FilaListado
+
+
+# Lo que se muestra en lugar de la contraseña: el listado no descifra nada
+MASCARA = "••••••••"
+
+
+def _fecha(valor):
+    # Igual que strftime("%Y-%m-%d %H:%M:%S"), pero varias veces más rápido
+    return valor.isoformat(" ", "seconds") if valor else ""
+
+
+def _fechas(columna):
+    """_fecha de toda una columna en una pasada"""
+    formatear = _fecha
+    return [formatear(valor) for valor in columna]
+
+
+_CAMPOS_FILA = attrgetter(*FilaListado._fields)
+
+
+def valores_fila(contrasenia):
+    """Valores de una contraseña en el orden de las columnas de la tabla"""
+    return (
+        contrasenia.id_contrasenia,
+        contrasenia.servicio,
+        contrasenia.nombre_usuario_servicio,
+        MASCARA,  # Columna de Contraseña; se descifra solo al mostrarla o copiarla
+        _fecha(contrasenia.fecha_creacion),
+        _fecha(contrasenia.ultima_modificacion),
+        contrasenia.nota or ""  # Nota (si no hay nota, colocar vacío)
+    )
+
+
+def valores_filas(contrasenias):
+    """
+    valores_fila de una página entera. Trabaja por columnas: las fechas se formatean en
+    una pasada por columna y las FilaListado del CRUD se transponen sin leer atributos.
+    """
+    if not contrasenias:
+        return []
+    filas = contrasenias if type(contrasenias[0]) is FilaListado else list(map(_CAMPOS_FILA, contrasenias))
+    ids, servicios, usuarios, creadas, modificadas, notas = zip(*filas)
+    return list(zip(ids, servicios, usuarios, [MASCARA] * len(ids), _fechas(creadas), _fechas(modificadas),
+                    [nota or "" for nota in notas]))
+
+
+# Misma clave que usa Contraseniacrud.listar_pagina para cada orden, con el id como desempate
+CLAVES_ORDEN = {
+    "servicio": lambda c: (c.servicio, c.id_contrasenia),
+    "fecha_creacion": lambda c: (c.fecha_creacion, c.id_contrasenia),
+    "ultima_modificacion": lambda c: (c.ultima_modificacion or c.fecha_creacion, c.id_contrasenia),
+}
+
+
+class FilasTabla:
+    """
+    Refleja en un Treeview las contraseñas cargadas y aplica solo los cambios.
+
+    Cada fila usa str(id_contrasenia) como id del elemento del Treeview, y se guarda
+    la clave de orden de cada fila en una lista ordenada paralela a la tabla. Así
+    crear, editar o eliminar una contraseña cuesta una o dos llamadas a Tk en lugar
+    de vaciar y volver a insertar todas las filas.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._clave = None       # función de orden; None si las filas no siguen un orden (búsquedas)
+        self._claves = []        # claves de orden de las filas, en el mismo orden que la tabla
+        self._clave_por_id = {}
+        self.hay_mas = False     # quedan páginas sin cargar después de la última fila
+
+    def __len__(self):
+        return len(self._clave_por_id)
+
+    def __contains__(self, id_contrasenia):
+        return id_contrasenia in self._clave_por_id
+
+    def reemplazar(self, contrasenias, orden=None, hay_mas=False):
+        """
+        Vacía la tabla y muestra las contraseñas. Con orden (una clave de CLAVES_ORDEN) las filas
+        vienen ordenadas y las nuevas se insertan en su sitio; sin él, como en los resultados de
+        una búsqueda, las nuevas no se muestran.
+        """
+        self.tree.delete(*self.tree.get_children())
+        self._clave = CLAVES_ORDEN[orden] if orden is not None else None
+        self._claves = []
+        self._clave_por_id = {}
+        self.agregar_pagina(contrasenias, hay_mas)
+
+    def agregar_pagina(self, contrasenias, hay_mas=False):
+        """Añade al final la siguiente página, que empieza después de la última fila cargada"""
+        contrasenias = list(contrasenias)
+        for contrasenia, valores in zip(contrasenias, valores_filas(contrasenias)):
+            clave = self._clave(contrasenia) if self._clave is not None else contrasenia.id_contrasenia
+            self._claves.append(clave)
+            self._clave_por_id[contrasenia.id_contrasenia] = clave
+            self.tree.insert("", "end", iid=str(contrasenia.id_contrasenia), values=valores)
+        self.hay_mas = hay_mas
+
+    def _posicion(self, clave):
+        """Dónde va una fila con esa clave, o None si cae en una página que aún no se cargó"""
+        posicion = bisect_right(self._claves, clave)
+        if posicion == len(self._claves) and self.hay_mas:
+            return None
+        return posicion
+
+    def insertar(self, contrasenia):
+        """Muestra una contraseña nueva en su posición. Devuelve si se llegó a mostrar"""
+        if self._clave is None or contrasenia.id_contrasenia in self._clave_por_id:
+            return False
+        clave = self._clave(contrasenia)
+        posicion = self._posicion(clave)
+        if posicion is None:
+            return False  # Llegará con su página, que empieza después del cursor
+        self._claves.insert(posicion, clave)
+        self._clave_por_id[contrasenia.id_contrasenia] = clave
+        self.tree.insert("", posicion, iid=str(contrasenia.id_contrasenia), values=valores_fila(contrasenia))
+        return True
+
+    def actualizar(self, contrasenia):
+        """Refresca los valores de una fila y la mueve si cambió su posición en el orden"""
+        anterior = self._clave_por_id.get(contrasenia.id_contrasenia)
+        if anterior is None:
+            return self.insertar(contrasenia)
+        iid = str(contrasenia.id_contrasenia)
+        self.tree.item(iid, values=valores_fila(contrasenia))
+        if self._clave is None:
+            return True
+        clave = self._clave(contrasenia)
+        if clave == anterior:
+            return True
+        del self._claves[bisect_left(self._claves, anterior)]
+        posicion = self._posicion(clave)
+        if posicion is None:
+            del self._clave_por_id[contrasenia.id_contrasenia]
+            self.tree.delete(iid)
+            return False
+        self._claves.insert(posicion, clave)
+        self._clave_por_id[contrasenia.id_contrasenia] = clave
+        self.tree.move(iid, "", posicion)
+        return True
+
+    def eliminar(self, id_contrasenia):
+        """Quita la fila de esa contraseña, si estaba cargada"""
+        clave = self._clave_por_id.pop(id_contrasenia, None)
+        if clave is None:
+            return False
+        if self._clave is None:
+            self._claves.remove(clave)
+        else:
+            del self._claves[bisect_left(self._claves, clave)]
+        self.tree.delete(str(id_contrasenia))
+        return True
@@ -1,9 +1,14 @@
+import os
+import tempfile
 import unittest
-from datetime import datetime
-from sqlalchemy import create_engine
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from src.modelo.modelo import Base, Usuario, Sesion, Contrasenia, ContraseniaEtiqueta, Etiqueta
-from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD, ContraseniaEtiquetaCRUD
+from src.modelo.modelo import Base, Usuario, Sesion, SesionArchivada, Contrasenia, ContraseniaEtiqueta, Etiqueta
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD, ContraseniaEtiquetaCRUD, FilaListado
+from src.modelo.migraciones import reconstruir_indice_busqueda, actualizar_esquema, liberar_espacio
+from src.logica.boveda import Llavero
+from src.config import crear_engine
 
 
 class TestUsuarioCRUD(unittest.TestCase):
@@ -15,8 +20,8 @@ class TestUsuarioCRUD(unittest.TestCase):
         self.Session = sessionmaker(bind=self.engine)
         self.session = self.Session()
 
-        # Crear la instancia de la clase que vamos a probar, pasando la sesión
-        self.usuario_crud = UsuarioCRUD(self.session)
+        # Crear la instancia de la clase que vamos a probar, pasando la sesión y un llavero propio
+        self.usuario_crud = UsuarioCRUD(self.session, llavero=Llavero())
 
     def tearDown(self):
         """Limpiar después de cada prueba"""
@@ -175,6 +180,324 @@ class TestContraseniacrud(unittest.TestCase):
         with self.assertRaises(Exception):  # Aquí verificamos si se lanza una excepción
             self.contrasenia_crud.create_contrasenia(servicio, "different_username", "new_encrypted_password", id_usuario, "New note")
 
+class TestPaginacionContrasenias(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        self.session.add(self.usuario)
+        self.session.commit()
+
+        # Servicios repetidos para comprobar el desempate por id entre páginas
+        for i, servicio in enumerate(["b", "a", "c", "a", "b", "a", "d"]):
+            self.session.add(Contrasenia(
+                servicio=servicio,
+                nombre_usuario_servicio=f"user{i}",
+                contrasenia_encriptada="pw",
+                fecha_creacion=datetime(2024, 1, 1 + i),
+                ultima_modificacion=datetime(2024, 2, 7 - i) if i % 2 else None,
+                id_usuario=self.usuario.id_usuario,
+            ))
+        self.session.commit()
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def _todas_las_paginas(self, orden, tamanio_pagina, proyeccion=False):
+        paginas = []
+        cursor = None
+        while True:
+            contrasenias, cursor = self.contrasenia_crud.listar_pagina(
+                self.usuario.id_usuario, cursor=cursor, tamanio_pagina=tamanio_pagina, orden=orden,
+                proyeccion=proyeccion)
+            paginas.append(contrasenias)
+            if cursor is None:
+                return paginas
+
+    def test_listar_pagina_por_servicio(self):
+        """Probar que las páginas recorren todas las contraseñas en orden y sin repetir"""
+        paginas = self._todas_las_paginas("servicio", 2)
+        self.assertEqual([len(p) for p in paginas], [2, 2, 2, 1])
+        contrasenias = [c for pagina in paginas for c in pagina]
+        self.assertEqual([c.servicio for c in contrasenias], ["a", "a", "a", "b", "b", "c", "d"])
+        self.assertEqual(len({c.id_contrasenia for c in contrasenias}), 7)
+
+    def test_listar_pagina_por_ultima_modificacion(self):
+        """Probar que las contraseñas nunca modificadas se ordenan por su fecha de creación"""
+        contrasenias = [c for pagina in self._todas_las_paginas("ultima_modificacion", 3) for c in pagina]
+        fechas = [c.ultima_modificacion or c.fecha_creacion for c in contrasenias]
+        self.assertEqual(fechas, sorted(fechas))
+        self.assertEqual(len(contrasenias), 7)
+
+    def test_listar_pagina_proyeccion(self):
+        """Probar que la proyección recorre las mismas páginas que las entidades, como FilaListado"""
+        for orden in Contraseniacrud.ORDENES_PAGINACION:
+            entidades = self._todas_las_paginas(orden, 3)
+            filas = self._todas_las_paginas(orden, 3, proyeccion=True)
+            self.assertEqual([[c.id_contrasenia for c in p] for p in filas], [[c.id_contrasenia for c in p] for p in entidades])
+            self.assertIsInstance(filas[0][0], FilaListado)
+
+        todas = self.contrasenia_crud.proyectar_contrasenias_usuario(self.usuario.id_usuario)
+        self.assertEqual([f.servicio for f in todas], ["a", "a", "a", "b", "b", "c", "d"])
+        self.assertEqual(todas[0].fecha_creacion, datetime(2024, 1, 2))
+
+    def test_listar_pagina_orden_invalido(self):
+        """Probar que ordenar por una columna no permitida lanza ValueError"""
+        with self.assertRaises(ValueError):
+            self.contrasenia_crud.listar_pagina(self.usuario.id_usuario, orden="contrasenia_encriptada")
+
+
+class TestBusquedaContrasenias(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        self.otro_usuario = Usuario(nombre_usuario="otro", email="otro@example.com", password_hash="hashed_password", rol="user")
+        self.session.add_all([self.usuario, self.otro_usuario])
+        self.session.commit()
+
+        crear = self.contrasenia_crud.create_contrasenia
+        self.github = crear("GitHub", "dev@example.com", "pw", self.usuario.id_usuario)
+        self.banco = crear("Banco Nación", "cliente", "pw", self.usuario.id_usuario, nota="tarjeta de débito")
+        self.correo = crear("Correo", "github-notificaciones", "pw", self.usuario.id_usuario)
+        crear("GitHub", "ajeno", "pw", self.otro_usuario.id_usuario)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def _ids(self, texto):
+        return [c.id_contrasenia for c in self.contrasenia_crud.buscar(self.usuario.id_usuario, texto)]
+
+    def test_buscar_por_prefijo_y_usuario(self):
+        """Probar la búsqueda por prefijo, limitada a las contraseñas del usuario y con el servicio primero"""
+        self.assertEqual(self._ids("git"), [self.github.id_contrasenia, self.correo.id_contrasenia])
+
+    def test_buscar_en_nota_sin_acentos(self):
+        """Probar que la búsqueda incluye la nota e ignora los acentos"""
+        self.assertEqual(self._ids("debito"), [self.banco.id_contrasenia])
+        self.assertEqual(self._ids("nacion tarj"), [self.banco.id_contrasenia])
+
+    def test_buscar_texto_sin_palabras(self):
+        """Probar que un texto sin palabras (o con operadores sueltos) no falla"""
+        self.assertEqual(self._ids("  "), [])
+        self.assertEqual(self._ids('"-*'), [])
+
+    def test_indice_sigue_ediciones_y_borrados(self):
+        """Probar que los triggers mantienen el índice al editar y eliminar"""
+        self.contrasenia_crud.editar_contrasena(self.correo.id_contrasenia, nota="buzón personal")
+        self.assertEqual(self._ids("buzon"), [self.correo.id_contrasenia])
+
+        self.contrasenia_crud.delete_contrasenia(self.github.id_contrasenia)
+        self.assertEqual(self._ids("github"), [self.correo.id_contrasenia])
+
+    def test_reconstruir_indice_busqueda(self):
+        """Probar que el índice se puede regenerar desde la tabla contrasenias"""
+        self.session.connection().exec_driver_sql("INSERT INTO contrasenias_fts(contrasenias_fts) VALUES ('delete-all')")
+        self.session.commit()
+        self.assertEqual(self._ids("github"), [])
+
+        self.session.commit()
+        reconstruir_indice_busqueda(self.engine)
+        self.assertEqual(len(self._ids("github")), 2)
+
+
+class TestEtiquetasContrasenias(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+        self.etiqueta_crud = EtiquetaCRUD(self.session)
+
+        usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        otro_usuario = Usuario(nombre_usuario="otro", email="otro@example.com", password_hash="hashed_password", rol="user")
+        self.session.add_all([usuario, otro_usuario])
+        self.session.commit()
+        self.id_usuario, self.id_otro_usuario = usuario.id_usuario, otro_usuario.id_usuario
+
+        self.consultas = 0
+        event.listen(self.engine, "before_cursor_execute", self._contar)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        event.remove(self.engine, "before_cursor_execute", self._contar)
+        self.session.close()
+
+    def _contar(self, *args):
+        self.consultas += 1
+
+    def _crear(self, cantidad):
+        """Crea contraseñas alternando las etiquetas trabajo, personal y ambas"""
+        filas = []
+        for i in range(cantidad):
+            etiquetas = [["trabajo"], ["personal"], ["trabajo", "personal"]][i % 3]
+            filas.append({"servicio": f"servicio{i:03d}", "nombre_usuario_servicio": "yo",
+                          "contrasenia": "pw", "nota": None, "etiquetas": etiquetas})
+        self.contrasenia_crud.importar_contrasenias(self.id_usuario, enumerate(filas, 1))
+        self.contrasenia_crud.importar_contrasenias(
+            self.id_otro_usuario,
+            [(1, {"servicio": "ajeno", "nombre_usuario_servicio": "x", "contrasenia": "pw", "nota": None, "etiquetas": ["trabajo"]})])
+        self.session.expunge_all()
+
+    def _listar_y_contar(self, **kwargs):
+        """Lista y recorre las etiquetas de cada fila; devuelve el resultado y las consultas emitidas"""
+        self.consultas = 0
+        contrasenias = self.contrasenia_crud.listar_con_etiquetas(self.id_usuario, **kwargs)
+        nombres = [sorted(e.nombre for e in c.etiquetas) for c in contrasenias]
+        return contrasenias, nombres, self.consultas
+
+    def test_consultas_constantes(self):
+        """Probar que el número de consultas no depende de cuántas contraseñas haya"""
+        self._crear(6)
+        _, nombres, pocas = self._listar_y_contar()
+        self.assertEqual(len(nombres), 6)
+
+        self._crear(60)
+        _, nombres, muchas = self._listar_y_contar()
+        self.assertEqual(len(nombres), 66)
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(muchas, 2)
+
+    def test_filtro_todas_y_alguna(self):
+        """Probar el filtro AND y OR por etiquetas"""
+        self._crear(6)
+        _, todas, consultas = self._listar_y_contar(etiquetas=["trabajo", "personal"])
+        self.assertEqual(todas, [["personal", "trabajo"]] * 2)
+        self.assertEqual(consultas, 2)
+
+        _, alguna, _ = self._listar_y_contar(etiquetas=["trabajo", "inexistente"], modo="alguna")
+        self.assertEqual(len(alguna), 4)
+        _, ninguna, _ = self._listar_y_contar(etiquetas=["trabajo", "inexistente"])
+        self.assertEqual(ninguna, [])
+
+        with self.assertRaises(ValueError):
+            self.contrasenia_crud.listar_con_etiquetas(self.id_usuario, ["trabajo"], modo="ninguna")
+
+    def test_listar_etiquetas_de_un_usuario(self):
+        """Probar que las etiquetas traen solo las contraseñas del usuario, en consultas constantes"""
+        self._crear(9)
+        self.consultas = 0
+        etiquetas = self.etiqueta_crud.listar_etiquetas(self.id_usuario)
+        conteos = {e.nombre: len(e.contrasenias) for e in etiquetas}
+        self.assertEqual(conteos, {"personal": 6, "trabajo": 6})
+        self.assertEqual(self.consultas, 2)
+
+        conteos = {e.nombre: len(e.contrasenias) for e in self.etiqueta_crud.listar_etiquetas()}
+        self.assertEqual(conteos["trabajo"], 7)
+
+    def _facetas(self, materializado=True):
+        return [(f.nombre, f.cantidad) for f in self.etiqueta_crud.contar_etiquetas(self.id_usuario, materializado)]
+
+    def test_contar_etiquetas(self):
+        """Probar que los conteos materializados coinciden con la agregación y siguen los cambios"""
+        self._crear(10)
+        self.assertEqual(self._facetas(), [("trabajo", 7), ("personal", 6)])
+        self.assertEqual(self._facetas(materializado=False), self._facetas())
+
+        relaciones = ContraseniaEtiquetaCRUD(self.session)
+        primera = self.contrasenia_crud.listar_con_etiquetas(self.id_usuario, ["personal"], modo="alguna")[0]
+        nueva = self.etiqueta_crud.create_etiqueta("banco")
+        relaciones.create_contrasenia_etiqueta(primera.id_contrasenia, nueva.id_etiqueta)
+        self.assertEqual(self._facetas(), [("trabajo", 7), ("personal", 6), ("banco", 1)])
+
+        relacion = self.session.query(ContraseniaEtiqueta).filter_by(id_etiqueta=nueva.id_etiqueta).one()
+        relaciones.delete_contrasenia_etiqueta(relacion.id_contrasenia_etiqueta)
+        self.assertEqual(self._facetas(), [("trabajo", 7), ("personal", 6)])
+
+        # Al eliminar la contraseña se descuentan todas sus etiquetas
+        self.contrasenia_crud.delete_contrasenia(primera.id_contrasenia)
+        self.assertEqual(self._facetas(), self._facetas(materializado=False))
+        self.assertEqual(sum(cantidad for _, cantidad in self._facetas()), 12)
+
+
+class TestTransaccionAgrupada(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        llavero = Llavero(costo=(2 ** 10, 8, 1))
+        self.usuario_crud = UsuarioCRUD(self.session, llavero=llavero)
+        self.contrasenia_crud = Contraseniacrud(self.session, llavero=llavero)
+        self.etiqueta_crud = EtiquetaCRUD(self.session)
+        self.relacion_crud = ContraseniaEtiquetaCRUD(self.session)
+        self.id_usuario = self.usuario_crud.create_usuario("user_test", "user_test@example.com", "hashed_password", "user").id_usuario
+        self.usuario_crud.iniciar_sesion("user_test@example.com", "hashed_password")
+
+        self.commits = 0
+        event.listen(self.session, "after_commit", self._contar_commit)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def _contar_commit(self, session):
+        self.commits += 1
+
+    def _crear_con_etiqueta(self, servicio):
+        contrasenia = self.contrasenia_crud.create_contrasenia(servicio, "yo", "pw", self.id_usuario)
+        etiqueta = self.etiqueta_crud.create_etiqueta(f"etiqueta-{servicio}")
+        self.relacion_crud.create_contrasenia_etiqueta(contrasenia.id_contrasenia, etiqueta.id_etiqueta)
+        return contrasenia
+
+    def test_un_solo_commit_entre_clases(self):
+        """Probar que las operaciones de varias clases del CRUD se confirman juntas una vez"""
+        with self.contrasenia_crud.transaccion():
+            for servicio in ("a", "b", "c"):
+                self._crear_con_etiqueta(servicio)
+            self.assertEqual(self.commits, 0)
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(self.session.query(ContraseniaEtiqueta).count(), 3)
+
+        self._crear_con_etiqueta("d")
+        self.assertEqual(self.commits, 4)
+
+    def test_excepcion_deshace_todo(self):
+        """Probar que un error dentro del bloque deshace también las operaciones anteriores"""
+        with self.assertRaises(RuntimeError):
+            with self.contrasenia_crud.transaccion():
+                self._crear_con_etiqueta("a")
+                raise RuntimeError("fallo a mitad")
+        self.assertEqual(self.session.query(Contrasenia).count(), 0)
+        self.assertEqual(self.session.query(Etiqueta).count(), 0)
+        self.assertFalse(self.contrasenia_crud.en_transaccion)
+
+    def test_anidadas_y_avisos_tras_confirmar(self):
+        """Probar que los bloques anidados se unen al exterior y los observadores esperan al commit"""
+        avisos = []
+
+        class Observador:
+            def contrasenia_creada(self, contrasenia):
+                avisos.append(contrasenia.servicio)
+
+        self.contrasenia_crud.suscribir(Observador())
+        with self.etiqueta_crud.transaccion():
+            with self.contrasenia_crud.transaccion():
+                self.contrasenia_crud.create_contrasenia("a", "yo", "pw", self.id_usuario)
+            self.assertEqual((self.commits, avisos), (0, []))
+        self.assertEqual((self.commits, avisos), (1, ["a"]))
+
+        with self.assertRaises(RuntimeError):
+            with self.contrasenia_crud.transaccion():
+                self.contrasenia_crud.create_contrasenia("b", "yo", "pw", self.id_usuario)
+                raise RuntimeError
+        self.assertEqual(avisos, ["a"])
+
+
 class TestEtiquetaCRUD(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -366,5 +689,71 @@ class TestContraseniaEtiquetaCRUD(unittest.TestCase):
         self.assertIsNone(self.session.query(ContraseniaEtiqueta).filter(ContraseniaEtiqueta.id_contrasenia_etiqueta == relacion.id_contrasenia_etiqueta).first())
 
 
+class TestRetencionSesiones(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.directorio = tempfile.TemporaryDirectory()
+        # El engine de la aplicación, con el preajuste por defecto (WAL)
+        self.engine = crear_engine(url=f"sqlite:///{os.path.join(self.directorio.name, 'test.db')}")
+        actualizar_esquema(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.sesion_crud = SesionCRUD(self.session)
+        self.ahora = datetime(2024, 6, 1)
+
+        usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="x", rol="user")
+        self.session.add(usuario)
+        self.session.commit()
+        self.id_usuario = usuario.id_usuario
+        # 300 sesiones cerradas, una por día hacia atrás, de una hora cada una, y dos abiertas
+        self.session.add_all(
+            Sesion(id_usuario=self.id_usuario, fecha_inicio=self.ahora - timedelta(days=dia, hours=1),
+                   fecha_fin=self.ahora - timedelta(days=dia), ip="10.0.0.1")
+            for dia in range(1, 301)
+        )
+        self.session.add_all(Sesion(id_usuario=self.id_usuario, fecha_inicio=self.ahora - timedelta(hours=h)) for h in (1, 2))
+        self.session.commit()
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+        self.engine.dispose()
+        self.directorio.cleanup()
+
+    def test_archivar_por_lotes(self):
+        commits = []
+        event.listen(self.session, "after_commit", lambda session: commits.append(1))
+        self.assertEqual(self.sesion_crud.archivar_sesiones(90, tamanio_lote=50, ahora=self.ahora), 210)
+        self.assertEqual(len(commits), 5)
+        self.assertEqual(self.session.query(Sesion).count(), 92)
+        self.assertEqual(self.session.query(SesionArchivada).count(), 210)
+        archivada = self.session.query(SesionArchivada).order_by(SesionArchivada.inicio.desc()).first()
+        self.assertEqual(archivada.duracion, 3600)
+        self.assertEqual(archivada.ip, "10.0.0.1")
+        self.assertEqual(self.sesion_crud.archivar_sesiones(90, ahora=self.ahora), 0)
+
+    def test_sesiones_activas_y_rango(self):
+        activas = self.sesion_crud.sesiones_activas(self.id_usuario)
+        self.assertEqual([s.fecha_inicio for s in activas], [self.ahora - timedelta(hours=1), self.ahora - timedelta(hours=2)])
+        rango = self.sesion_crud.sesiones_en_rango(self.ahora - timedelta(days=10), self.ahora - timedelta(days=5))
+        self.assertEqual(len(rango), 5)
+        self.assertEqual(len(self.sesion_crud.sesiones_en_rango(self.ahora - timedelta(days=400), self.ahora, limite=7)), 7)
+        self.assertEqual(self.sesion_crud.sesiones_en_rango(self.ahora - timedelta(days=10), self.ahora,
+                                                            id_usuario=self.id_usuario + 1), [])
+
+    def test_liberar_espacio(self):
+        """Probar que el vacuum incremental devuelve las páginas que liberan los borrados"""
+        with self.engine.connect() as conexion:
+            self.assertEqual(conexion.exec_driver_sql("PRAGMA journal_mode").scalar(), "wal")
+            self.assertEqual(conexion.exec_driver_sql("PRAGMA auto_vacuum").scalar(), 2)
+        self.session.add_all(Sesion(id_usuario=self.id_usuario, ip="x" * 500) for _ in range(500))
+        self.session.commit()
+        self.session.query(Sesion).filter(Sesion.ip == "x" * 500).delete()
+        self.session.commit()
+        self.session.close()
+        antes, despues = liberar_espacio(self.engine)
+        self.assertGreater(antes, 0)
+        self.assertEqual(despues, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
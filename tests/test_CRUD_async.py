@@ -0,0 +1,134 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from sqlalchemy.util import greenlet_spawn
+from src.config import crear_engine_async
+from src.logica.CRUD_async import (HasheadorAsincrono, UsuarioCRUDAsync, ContraseniacrudAsync, EtiquetaCRUDAsync, SesionCRUDAsync,
+                                   ContraseniaEtiquetaCRUDAsync, crear_sessionmaker, preparar_esquema)
+from src.logica.boveda import Llavero, es_sellado
+from src.logica.seguridad import Hasheador
+from src.modelo.migraciones import MIGRACIONES
+
+# Costes bajos para que las pruebas sean rápidas
+BARATO = {"n": 2 ** 10, "r": 8, "p": 1}
+
+
+class TestCRUDAsync(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        """Configuración antes de cada prueba: una base en archivo, para que varias conexiones la compartan"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.engine = crear_engine_async(url=f"sqlite:///{os.path.join(self.directorio.name, 'async.db')}")
+        self.version = await preparar_esquema(self.engine)
+        self.Session = crear_sessionmaker(self.engine)
+        self.llavero = Llavero(costo=(2 ** 10, 8, 1))
+        self.hasheador = Hasheador(**BARATO)
+
+    async def asyncTearDown(self):
+        """Limpieza después de cada prueba"""
+        await self.engine.dispose()
+        self.directorio.cleanup()
+
+    def _usuarios(self, session):
+        return UsuarioCRUDAsync(session, hasheador=self.hasheador, llavero=self.llavero)
+
+    async def test_esquema(self):
+        self.assertEqual(self.version, MIGRACIONES[-1][0])
+
+    async def test_usuario_y_sesion(self):
+        async with self.Session() as session:
+            usuarios = self._usuarios(session)
+            usuario = await usuarios.create_usuario("ana", "ana@example.com", "maestra", "user")
+            self.assertTrue(usuario.password_hash.startswith("$scrypt$"))
+            sesion = await usuarios.iniciar_sesion("ana@example.com", "maestra")
+            self.assertIsNotNone(sesion)
+            self.assertIsNone(await usuarios.iniciar_sesion("ana@example.com", "otra"))
+            self.assertIsNotNone(self.llavero.obtener(usuario.id_usuario))
+
+            activas = await SesionCRUDAsync(session).sesiones_activas(usuario.id_usuario)
+            self.assertEqual([s.id_sesion for s in activas], [sesion.id_sesion])
+            await usuarios.cerrar_sesion(sesion.id_sesion)
+            self.assertIsNone(self.llavero.obtener(usuario.id_usuario))
+
+    async def test_contrasenias_selladas_y_paginadas(self):
+        async with self.Session() as session:
+            usuarios = self._usuarios(session)
+            usuario = await usuarios.create_usuario("ana", "ana@example.com", "maestra", "user")
+            await usuarios.iniciar_sesion("ana@example.com", "maestra")
+            contrasenias = ContraseniacrudAsync(session, llavero=self.llavero)
+            async with contrasenias.transaccion():
+                self.assertTrue(contrasenias.en_transaccion)
+                for i in range(25):
+                    await contrasenias.create_contrasenia(f"servicio{i:02}", "ana", f"clave{i}", usuario.id_usuario)
+            self.assertFalse(contrasenias.en_transaccion)
+
+            pagina, cursor = await contrasenias.listar_pagina(usuario.id_usuario, tamanio_pagina=10)
+            self.assertEqual([c.servicio for c in pagina], [f"servicio{i:02}" for i in range(10)])
+            siguiente, _ = await contrasenias.listar_pagina(usuario.id_usuario, cursor=cursor, tamanio_pagina=10)
+            self.assertEqual(siguiente[0].servicio, "servicio10")
+            self.assertTrue(es_sellado(pagina[0].contrasenia_encriptada))
+            self.assertEqual(await contrasenias.revelar_contrasenia(pagina[0].id_contrasenia), "clave0")
+
+            servicios = [c["servicio"] async for c in contrasenias.iterar_contrasenias_usuario(usuario.id_usuario, tamanio_lote=7)]
+            self.assertEqual(len(servicios), 25)
+
+            etiqueta = await EtiquetaCRUDAsync(session).create_etiqueta("trabajo")
+            await ContraseniaEtiquetaCRUDAsync(session).create_contrasenia_etiqueta(
+                pagina[0].id_contrasenia, etiqueta.id_etiqueta)
+            etiquetadas = await contrasenias.listar_con_etiquetas(usuario.id_usuario, ["trabajo"])
+            self.assertEqual([c.servicio for c in etiquetadas], ["servicio00"])
+
+    async def test_transaccion_deshecha(self):
+        """Probar que un error dentro del bloque deshace todo el grupo"""
+        async with self.Session() as session:
+            usuarios = self._usuarios(session)
+            usuario = await usuarios.create_usuario("ana", "ana@example.com", "maestra", "user")
+            await usuarios.iniciar_sesion("ana@example.com", "maestra")
+            # El rollback expira las entidades, y fuera de run_sync no se pueden recargar
+            id_usuario = usuario.id_usuario
+            contrasenias = ContraseniacrudAsync(session, llavero=self.llavero)
+            with self.assertRaises(RuntimeError):
+                async with contrasenias.transaccion():
+                    await contrasenias.create_contrasenia("a", "ana", "clave", id_usuario)
+                    raise RuntimeError("falla")
+            self.assertEqual(await contrasenias.get_contrasenias_by_user(id_usuario), [])
+
+    async def test_inicios_de_sesion_concurrentes(self):
+        """Probar que varias sesiones a la vez, cada una con su AsyncSession, no se bloquean entre sí"""
+        async with self.Session() as session:
+            usuarios = self._usuarios(session)
+            for i in range(5):
+                await usuarios.create_usuario(f"u{i}", f"u{i}@example.com", f"maestra{i}", "user")
+
+        async def cliente(i):
+            async with self.Session() as session:
+                return await self._usuarios(session).iniciar_sesion(f"u{i}@example.com", f"maestra{i}")
+
+        sesiones = await asyncio.gather(*(cliente(i) for i in range(5)))
+        self.assertTrue(all(sesion is not None for sesion in sesiones))
+        self.assertEqual(len({sesion.id_usuario for sesion in sesiones}), 5)
+
+    async def test_pool_lleno_no_bloquea_el_bucle(self):
+        """Probar que esperar un hueco en el pool de procesos no detiene el bucle de eventos"""
+        hueco = threading.Event()
+
+        class PoolLleno:
+            procesos = 1
+
+            def enviar_derivacion(self, *args):
+                hueco.wait(2)  # Como Hasheador con limite_pendientes alcanzado
+                futuro = Future()
+                futuro.set_result(b"clave")
+                return futuro
+
+        tarea = asyncio.create_task(greenlet_spawn(HasheadorAsincrono(PoolLleno()).derivar, "scrypt", "x", b"sal", (2,)))
+        await asyncio.sleep(0.05)
+        self.assertFalse(tarea.done())  # El bucle siguió atendiendo mientras tanto
+        hueco.set()
+        self.assertEqual(await tarea, b"clave")
+
+
+if __name__ == "__main__":
+    unittest.main()
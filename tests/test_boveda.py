@@ -0,0 +1,307 @@
+import io
+import os
+import unittest
+from datetime import datetime
+from cryptography.exceptions import InvalidTag
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario, Contrasenia, RotacionClave, Sesion
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import Boveda, BovedaBloqueada, Llavero, es_sellado, id_clave_de
+from src.logica.exportador import exportar_archivo
+from src.logica.importador import leer_exportacion
+from src.logica.seguridad import Hasheador
+
+# Costes bajos para que las pruebas sean rápidas
+BARATO = (2 ** 10, 8, 1)
+
+
+class TestBoveda(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.boveda = Boveda(os.urandom(32))
+
+    def test_sellar_y_abrir(self):
+        sellado = self.boveda.sellar("clave ñandú", 7)
+        self.assertTrue(es_sellado(sellado))
+        self.assertNotIn("ñandú", sellado)
+        self.assertNotEqual(sellado, self.boveda.sellar("clave ñandú", 7))  # Nonce distinto cada vez
+        self.assertEqual(self.boveda.abrir(sellado, 7), "clave ñandú")
+
+    def test_valor_de_otro_usuario_o_alterado(self):
+        """Probar que el cifrado autentica el usuario y el contenido"""
+        sellado = self.boveda.sellar("clave", 7)
+        with self.assertRaises(InvalidTag):
+            self.boveda.abrir(sellado, 8)
+        alterado = sellado[:-2] + ("A" if sellado[-2] != "A" else "B") + sellado[-1]
+        with self.assertRaises(InvalidTag):
+            self.boveda.abrir(alterado, 7)
+        with self.assertRaises(ValueError):
+            Boveda(os.urandom(32)).abrir(sellado, 7)
+
+    def test_huella(self):
+        """Probar que la huella es estable para el mismo texto y depende de la clave"""
+        huella = self.boveda.huella("clave")
+        self.assertEqual(huella, self.boveda.huella("clave"))
+        self.assertNotEqual(huella, self.boveda.huella("clave2"))
+        self.assertNotEqual(huella, Boveda(os.urandom(32)).huella("clave"))
+        self.assertTrue(huella.startswith(self.boveda.id_clave + "$"))
+
+
+class TestContraseniasSelladas(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.llavero = Llavero(costo=BARATO)
+        self.usuario_crud = UsuarioCRUD(self.session, hasheador=Hasheador(n=BARATO[0]), llavero=self.llavero)
+        self.contrasenia_crud = Contraseniacrud(self.session, llavero=self.llavero)
+
+        usuario = self.usuario_crud.create_usuario("user_test", "user_test@example.com", "maestra", "user")
+        self.id_usuario = usuario.id_usuario
+        self.sesion = self.usuario_crud.iniciar_sesion("user_test@example.com", "maestra")
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def test_crear_editar_y_revelar(self):
+        contrasenia = self.contrasenia_crud.create_contrasenia("Jira", "dev", "secreta", self.id_usuario)
+        self.assertTrue(es_sellado(contrasenia.contrasenia_encriptada))
+        self.assertEqual(self.contrasenia_crud.revelar_contrasenia(contrasenia.id_contrasenia), "secreta")
+
+        self.contrasenia_crud.editar_contrasena(contrasenia.id_contrasenia, contrasenia_encriptada="nueva")
+        self.assertTrue(es_sellado(contrasenia.contrasenia_encriptada))
+        self.assertEqual(self.contrasenia_crud.revelar_contrasenia(contrasenia.id_contrasenia), "nueva")
+
+    def test_la_clave_se_deriva_una_vez_por_sesion(self):
+        """Probar que sellar y revelar usan la clave del llavero y que cerrar la sesión la descarta"""
+        boveda = self.llavero.obtener(self.id_usuario)
+        self.assertIsNotNone(boveda)
+        id_contrasenia = self.contrasenia_crud.create_contrasenia("Jira", "dev", "secreta", self.id_usuario).id_contrasenia
+        self.assertIs(self.llavero.obtener(self.id_usuario), boveda)
+
+        self.usuario_crud.cerrar_sesion(self.sesion.id_sesion)
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.revelar_contrasenia(id_contrasenia)
+
+        # Otro inicio de sesión deriva la misma clave
+        self.usuario_crud.iniciar_sesion("user_test@example.com", "maestra")
+        self.assertEqual(self.contrasenia_crud.revelar_contrasenia(id_contrasenia), "secreta")
+
+    def test_cerrar_una_de_varias_sesiones(self):
+        """Probar que la clave sigue en el llavero mientras el usuario tenga otra sesión abierta"""
+        otra = self.usuario_crud.iniciar_sesion("user_test@example.com", "maestra")
+        self.usuario_crud.cerrar_sesion(self.sesion.id_sesion)
+        self.assertIsNotNone(self.llavero.obtener(self.id_usuario))
+        self.contrasenia_crud.create_contrasenia("Jira", "dev", "secreta", self.id_usuario)
+
+        self.usuario_crud.cerrar_sesion(otra.id_sesion)
+        self.assertIsNone(self.llavero.obtener(self.id_usuario))
+
+    def test_sesiones_abandonadas_no_retienen_la_clave(self):
+        """Probar que una sesión sin cerrar de otro proceso, o de una ejecución anterior, no deja la clave en el llavero"""
+        self.session.add(Sesion(id_usuario=self.id_usuario, fecha_inicio=datetime(2024, 1, 1)))
+        self.session.commit()
+        self.usuario_crud.cerrar_sesion(self.sesion.id_sesion)
+        self.assertIsNone(self.llavero.obtener(self.id_usuario))
+
+    def test_con_la_boveda_bloqueada_no_se_guarda_en_claro(self):
+        """Probar que crear, editar o importar sin la clave falla en vez de guardar la contraseña en claro"""
+        contrasenia = self.contrasenia_crud.create_contrasenia("Jira", "dev", "secreta", self.id_usuario)
+        self.llavero.olvidar(self.id_usuario)
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.create_contrasenia("Wiki", "dev", "otra", self.id_usuario)
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.editar_contrasena(contrasenia.id_contrasenia, "otra")
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.importar_contrasenias(self.id_usuario, [(1, {
+                "servicio": "Wiki", "nombre_usuario_servicio": "dev", "contrasenia": "otra", "nota": None, "etiquetas": []})])
+        self.session.rollback()
+        self.assertEqual([(c.servicio, es_sellado(c.contrasenia_encriptada)) for c in self.session.query(Contrasenia)],
+                         [("Jira", True)])
+
+    def test_el_listado_no_descifra(self):
+        """Probar que listar devuelve los valores sellados sin llamar al descifrado"""
+        for i in range(5):
+            self.contrasenia_crud.create_contrasenia(f"servicio{i}", "dev", f"clave{i}", self.id_usuario)
+        boveda = self.llavero.obtener(self.id_usuario)
+        aperturas = []
+        abrir = boveda.abrir
+        boveda.abrir = lambda *args: aperturas.append(args) or abrir(*args)
+
+        contrasenias, _ = self.contrasenia_crud.listar_pagina(self.id_usuario)
+        self.assertEqual(len(contrasenias), 5)
+        self.assertTrue(all(es_sellado(c.contrasenia_encriptada) for c in contrasenias))
+        self.assertEqual(aperturas, [])
+
+        self.contrasenia_crud.revelar_contrasenia(contrasenias[0].id_contrasenia)
+        self.assertEqual(len(aperturas), 1)
+
+    def test_usuario_y_contrasenias_de_una_version_anterior(self):
+        """Probar que el usuario recibe su sal al iniciar sesión y que las contraseñas en claro se sellan por lotes"""
+        antiguo = Usuario(nombre_usuario="antiguo", email="antiguo@example.com", password_hash="clave", rol="user")
+        self.session.add(antiguo)
+        self.session.commit()
+        self.session.add_all([
+            Contrasenia(servicio=f"s{i}", nombre_usuario_servicio="u", contrasenia_encriptada=f"pw{i}",
+                        id_usuario=antiguo.id_usuario)
+            for i in range(5)
+        ])
+        self.session.commit()
+        self.assertEqual(self.contrasenia_crud.descifrar(antiguo.id_usuario, "pw0"), "pw0")
+
+        self.usuario_crud.iniciar_sesion("antiguo@example.com", "clave")
+        self.assertIsNotNone(antiguo.sal_boveda)
+        self.assertEqual(self.contrasenia_crud.sellar_pendientes(antiguo.id_usuario, tamanio_lote=2), 5)
+        self.assertEqual(self.contrasenia_crud.sellar_pendientes(antiguo.id_usuario), 0)
+
+        self.session.expire_all()
+        for contrasenia in self.contrasenia_crud.get_contrasenias_by_user(antiguo.id_usuario):
+            self.assertTrue(es_sellado(contrasenia.contrasenia_encriptada))
+            self.assertEqual(self.contrasenia_crud.revelar_contrasenia(contrasenia.id_contrasenia),
+                             "pw" + contrasenia.servicio[1:])
+
+    def test_contrasenias_reutilizadas(self):
+        """Probar que se agrupan las contraseñas repetidas sin descifrar ninguna"""
+        crear = self.contrasenia_crud.create_contrasenia
+        github = crear("GitHub", "dev", "repetida", self.id_usuario)
+        crear("Jira", "dev", "única", self.id_usuario)
+        banco = crear("Banco", "dev", "otra", self.id_usuario)
+        correo = crear("Correo", "dev", "repetida", self.id_usuario)
+        self.contrasenia_crud.importar_contrasenias(self.id_usuario, [
+            (1, {"servicio": "Slack", "nombre_usuario_servicio": "dev", "contrasenia": "repetida", "nota": None, "etiquetas": []}),
+        ])
+        boveda = self.llavero.obtener(self.id_usuario)
+        boveda.abrir = None  # Falla si algo intenta descifrar
+
+        grupos = self.contrasenia_crud.contrasenias_reutilizadas(self.id_usuario)
+        self.assertEqual([[f.servicio for f in grupo] for grupo in grupos], [["Correo", "GitHub", "Slack"]])
+
+        # Editar una contraseña actualiza su huella
+        self.contrasenia_crud.editar_contrasena(banco.id_contrasenia, contrasenia_encriptada="repetida")
+        self.contrasenia_crud.editar_contrasena(github.id_contrasenia, contrasenia_encriptada="nueva")
+        self.contrasenia_crud.editar_contrasena(correo.id_contrasenia, contrasenia_encriptada="nueva")
+        grupos = self.contrasenia_crud.contrasenias_reutilizadas(self.id_usuario)
+        self.assertEqual([[f.servicio for f in grupo] for grupo in grupos], [["Banco", "Slack"], ["Correo", "GitHub"]])
+
+    def test_calcular_huellas(self):
+        """Probar que las entradas sin huella (anteriores, o guardadas en claro) la reciben una sola vez"""
+        self.contrasenia_crud.create_contrasenia("GitHub", "dev", "repetida", self.id_usuario)
+        self.session.add(Contrasenia(servicio="Antigua", nombre_usuario_servicio="u", contrasenia_encriptada="repetida",
+                                     id_usuario=self.id_usuario))
+        self.session.commit()
+        self.session.query(Contrasenia).update({"huella": None})
+        self.session.commit()
+        self.assertEqual(self.contrasenia_crud.contrasenias_reutilizadas(self.id_usuario), [])
+
+        self.assertEqual(self.contrasenia_crud.calcular_huellas(self.id_usuario, tamanio_lote=1), 2)
+        self.assertEqual(self.contrasenia_crud.calcular_huellas(self.id_usuario), 0)
+        grupos = self.contrasenia_crud.contrasenias_reutilizadas(self.id_usuario)
+        self.assertEqual([[f.servicio for f in grupo] for grupo in grupos], [["Antigua", "GitHub"]])
+
+        self.llavero.olvidar(self.id_usuario)
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.calcular_huellas(self.id_usuario)
+
+    def test_exportar_e_importar(self):
+        """Probar que la exportación escribe el texto descifrado y la importación lo vuelve a sellar"""
+        self.contrasenia_crud.create_contrasenia("Jira", "dev", "secreta", self.id_usuario)
+        archivo = io.StringIO()
+        exportar_archivo(self.contrasenia_crud, self.id_usuario, archivo)
+        archivo.seek(0)
+        filas = list(leer_exportacion(archivo, "csv"))
+        self.assertEqual(filas[0][1]["contrasenia"], "secreta")
+
+        self.contrasenia_crud.importar_contrasenias(self.id_usuario, [(1, dict(filas[0][1], servicio="Copia"))])
+        copia = self.session.query(Contrasenia).filter_by(servicio="Copia").one()
+        self.assertTrue(es_sellado(copia.contrasenia_encriptada))
+        self.assertEqual(self.contrasenia_crud.revelar_contrasenia(copia.id_contrasenia), "secreta")
+
+
+class TestRotacionClave(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.llavero = Llavero(costo=BARATO)
+        self.usuario_crud = UsuarioCRUD(self.session, hasheador=Hasheador(n=BARATO[0]), llavero=self.llavero)
+        self.contrasenia_crud = Contraseniacrud(self.session, llavero=self.llavero)
+
+        self.id_usuario = self.usuario_crud.create_usuario("user_test", "user_test@example.com", "maestra", "user").id_usuario
+        self.usuario_crud.iniciar_sesion("user_test@example.com", "maestra")
+        with self.contrasenia_crud.transaccion():
+            self.ids = [self.contrasenia_crud.create_contrasenia(f"s{i:02}", "u", f"pw{i}", self.id_usuario).id_contrasenia
+                        for i in range(25)]
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def _revelar_todas(self, crud):
+        return [crud.revelar_contrasenia(id_contrasenia) for id_contrasenia in self.ids]
+
+    def _claves_usadas(self):
+        return {id_clave_de(valor) for (valor,) in self.session.query(Contrasenia.contrasenia_encriptada)}
+
+    def test_cambiar_contrasenia_maestra(self):
+        """Probar que tras el cambio todo se sigue leyendo y la rotación deja todo con la clave nueva"""
+        anterior = self.llavero.obtener(self.id_usuario).id_clave
+        self.usuario_crud.update_usuario(self.id_usuario, password_hash="nueva maestra")
+        nueva = self.llavero.obtener(self.id_usuario)
+        self.assertNotEqual(nueva.id_clave, anterior)
+        self.assertEqual(self._revelar_todas(self.contrasenia_crud), [f"pw{i}" for i in range(25)])
+
+        progreso = []
+        resultado = self.contrasenia_crud.rotar_clave(self.id_usuario, tamanio_lote=10, hilos=3,
+                                                      al_progresar=lambda r: progreso.append(r.procesadas))
+        self.assertEqual(progreso, [10, 20, 25])
+        self.assertEqual((resultado.total, resultado.reselladas, resultado.reanudada), (25, 25, False))
+        self.assertGreater(resultado.filas_por_segundo, 0)
+        self.assertEqual(self._claves_usadas(), {nueva.id_clave})
+        self.assertEqual({huella.split("$")[0] for (huella,) in self.session.query(Contrasenia.huella)}, {nueva.id_clave})
+        self.assertEqual(nueva.anteriores, {})
+        self.assertIsNone(self.session.get(RotacionClave, self.id_usuario))
+
+        # La contraseña nueva abre la bóveda en otro inicio de sesión
+        llavero = Llavero(costo=BARATO)
+        UsuarioCRUD(self.session, hasheador=Hasheador(n=BARATO[0]), llavero=llavero).iniciar_sesion(
+            "user_test@example.com", "nueva maestra")
+        self.assertEqual(self._revelar_todas(Contraseniacrud(self.session, llavero=llavero))[3], "pw3")
+
+    def test_reanudar_tras_una_caida(self):
+        """Probar que una rotación interrumpida continúa desde el último lote confirmado, también tras volver a iniciar sesión"""
+        self.usuario_crud.update_usuario(self.id_usuario, password_hash="nueva maestra")
+
+        def caer(resultado):
+            if resultado.lotes == 2:
+                raise RuntimeError("caída")
+        with self.assertRaises(RuntimeError):
+            self.contrasenia_crud.rotar_clave(self.id_usuario, tamanio_lote=10, al_progresar=caer)
+        self.assertEqual(self.session.get(RotacionClave, self.id_usuario).ultimo_id, self.ids[19])
+        self.assertEqual(len(self._claves_usadas()), 2)
+
+        # Proceso nuevo: otra sesión y un llavero vacío
+        session = self.Session()
+        llavero = Llavero(costo=BARATO)
+        UsuarioCRUD(session, hasheador=Hasheador(n=BARATO[0]), llavero=llavero).iniciar_sesion(
+            "user_test@example.com", "nueva maestra")
+        crud = Contraseniacrud(session, llavero=llavero)
+        self.assertEqual(self._revelar_todas(crud)[-1], "pw24")
+        resultado = crud.rotar_clave(self.id_usuario, tamanio_lote=10)
+        self.assertEqual((resultado.total, resultado.procesadas, resultado.reanudada), (5, 5, True))
+        self.assertEqual(self._claves_usadas(), {llavero.obtener(self.id_usuario).id_clave})
+        session.close()
+
+    def test_cambio_con_la_boveda_bloqueada(self):
+        self.llavero.olvidar(self.id_usuario)
+        with self.assertRaises(BovedaBloqueada):
+            self.usuario_crud.update_usuario(self.id_usuario, password_hash="nueva maestra")
+        self.assertTrue(self.usuario_crud.hasheador.verificar("maestra", self.usuario_crud.get_usuario_by_id(self.id_usuario).password_hash))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Etiqueta
+from src.logica.CRUD import UsuarioCRUD, EtiquetaCRUD, SesionCRUD
+from src.logica.cache import CacheEntidades
+
+
+class RelojFalso:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+class TestCacheEntidades(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.reloj = RelojFalso()
+        self.cache = CacheEntidades(capacidad=2, ttl=10, reloj=self.reloj)
+
+    def _cargar(self, nombre):
+        return lambda: Etiqueta(id_etiqueta=len(nombre), nombre=nombre)
+
+    def test_instantanea_inmutable(self):
+        """Probar que se guarda una copia inmutable con los mismos campos que la entidad"""
+        etiqueta = self.cache.obtener("a", self._cargar("trabajo"))
+        self.assertEqual((etiqueta.id_etiqueta, etiqueta.nombre), (7, "trabajo"))
+        with self.assertRaises(AttributeError):
+            etiqueta.nombre = "otro"
+
+    def test_lru_y_estadisticas(self):
+        """Probar que se desaloja la entrada menos usada y se cuentan aciertos y fallos"""
+        self.cache.obtener("a", self._cargar("a"))
+        self.cache.obtener("b", self._cargar("b"))
+        self.cache.obtener("a", self._cargar("otra"))  # acierto: "a" pasa a ser la más reciente
+        self.cache.obtener("c", self._cargar("c"))     # desaloja "b"
+
+        self.assertEqual(self.cache.obtener("a", self._cargar("otra")).nombre, "a")
+        self.assertEqual(self.cache.obtener("b", self._cargar("nueva")).nombre, "nueva")
+        estadisticas = self.cache.estadisticas()
+        self.assertEqual((estadisticas["aciertos"], estadisticas["fallos"]), (2, 4))
+        self.assertEqual(estadisticas["desalojos"], 2)
+        self.assertEqual(estadisticas["entradas"], 2)
+
+    def test_ttl_e_invalidacion(self):
+        """Probar que las entradas vencen tras el TTL y que invalidar las quita"""
+        self.cache.obtener("a", self._cargar("a"))
+        self.reloj.ahora = 11
+        self.assertEqual(self.cache.obtener("a", self._cargar("nueva")).nombre, "nueva")
+        self.assertEqual(self.cache.estadisticas()["expiraciones"], 1)
+
+        self.cache.invalidar("a")
+        self.assertEqual(self.cache.obtener("a", self._cargar("otra")).nombre, "otra")
+
+    def test_invalidar_durante_la_carga(self):
+        """Probar que lo cargado antes de una invalidación concurrente no queda guardado"""
+        def cargar_y_cambiar():
+            etiqueta = self._cargar("vieja")()
+            self.cache.invalidar("a")  # Otro hilo modifica la fila mientras esta lectura sigue en curso
+            return etiqueta
+
+        self.assertEqual(self.cache.obtener("a", cargar_y_cambiar).nombre, "vieja")
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.obtener("a", self._cargar("nueva")).nombre, "nueva")
+        self.assertEqual(self.cache.obtener("a", self._cargar("otra")).nombre, "nueva")
+
+    def test_no_guarda_ausentes(self):
+        self.assertIsNone(self.cache.obtener("a", lambda: None))
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestCRUDConCache(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.cache = CacheEntidades()
+        self.usuario_crud = UsuarioCRUD(self.session, cache=self.cache)
+        self.id_usuario = self.usuario_crud.create_usuario("user_test", "user_test@example.com", "hashed_password", "user").id_usuario
+
+        self.consultas = 0
+        event.listen(self.engine, "before_cursor_execute", self._contar)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        event.remove(self.engine, "before_cursor_execute", self._contar)
+        self.session.close()
+
+    def _contar(self, *args):
+        self.consultas += 1
+
+    def test_lecturas_repetidas_no_consultan(self):
+        """Probar que solo la primera lectura de cada clave llega a la base de datos"""
+        for _ in range(3):
+            self.assertEqual(self.usuario_crud.get_usuario_by_id(self.id_usuario).email, "user_test@example.com")
+            self.assertEqual(self.usuario_crud.get_usuario_by_email("user_test@example.com").nombre_usuario, "user_test")
+        self.assertEqual(self.consultas, 2)
+
+    def test_update_y_delete_invalidan(self):
+        """Probar que modificar o eliminar invalida las claves afectadas, incluido el email anterior"""
+        self.usuario_crud.get_usuario_by_email("user_test@example.com")
+        self.usuario_crud.get_usuario_by_id(self.id_usuario)
+
+        self.usuario_crud.update_usuario(self.id_usuario, email="nuevo@example.com")
+        self.assertEqual(self.usuario_crud.get_usuario_by_id(self.id_usuario).email, "nuevo@example.com")
+        self.assertIsNone(self.usuario_crud.get_usuario_by_email("user_test@example.com"))
+
+        self.usuario_crud.delete_usuario(self.id_usuario)
+        self.assertIsNone(self.usuario_crud.get_usuario_by_id(self.id_usuario))
+
+    def test_etiquetas_y_sesiones(self):
+        """Probar la caché compartida con EtiquetaCRUD y SesionCRUD"""
+        etiqueta_crud = EtiquetaCRUD(self.session, cache=self.cache)
+        etiqueta = etiqueta_crud.create_etiqueta("trabajo")
+        etiqueta_crud.get_etiqueta(etiqueta.id_etiqueta)
+        etiqueta_crud.update_etiqueta(etiqueta.id_etiqueta, nombre="personal")
+        self.assertEqual(etiqueta_crud.get_etiqueta(etiqueta.id_etiqueta).nombre, "personal")
+        etiqueta_crud.delete_etiqueta(etiqueta.id_etiqueta)
+        with self.assertRaises(ValueError):
+            etiqueta_crud.get_etiqueta(etiqueta.id_etiqueta)
+
+        sesion_crud = SesionCRUD(self.session, cache=self.cache)
+        sesion = sesion_crud.create_sesion(self.id_usuario, "127.0.0.1")
+        self.assertIsNone(sesion_crud.get_sesion(sesion.id_sesion).fecha_fin)
+        self.usuario_crud.cerrar_sesion(sesion.id_sesion)
+        self.assertIsNotNone(sesion_crud.get_sesion(sesion.id_sesion).fecha_fin)
+
+
+    def test_transaccion_deshecha_no_queda_en_la_cache(self):
+        """Probar que lo leído dentro de una transacción que se deshace no se sirve después"""
+        etiqueta_crud = EtiquetaCRUD(self.session, cache=self.cache)
+        id_etiqueta = etiqueta_crud.create_etiqueta("trabajo").id_etiqueta
+        with self.assertRaises(RuntimeError):
+            with etiqueta_crud.transaccion():
+                etiqueta_crud.update_etiqueta(id_etiqueta, nombre="fantasma")
+                self.assertEqual(etiqueta_crud.get_etiqueta(id_etiqueta).nombre, "fantasma")
+                raise RuntimeError("falla")
+        self.assertEqual(etiqueta_crud.get_etiqueta(id_etiqueta).nombre, "trabajo")
+        self.assertEqual(len(self.cache), 1)  # Solo la lectura de después del rollback
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from sqlalchemy import pool
+from src.config import ConfiguracionBD, ContextoApp, cargar_configuracion, crear_engine, PRESETS
+from src.modelo.migraciones import MIGRACIONES
+
+
+class TestConfiguracionBD(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.directorio.name, 'test.db')}"
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.directorio.cleanup()
+
+    def _pragmas(self, engine, *nombres):
+        with engine.connect() as conexion:
+            return [conexion.exec_driver_sql(f"PRAGMA {nombre}").scalar() for nombre in nombres]
+
+    def test_pragmas_en_cada_conexion(self):
+        """Probar que el preajuste se aplica a todas las conexiones, también a las que abre el pool después"""
+        engine = crear_engine(url=self.url, preset="equilibrado", pool="NullPool")
+        for _ in range(2):  # NullPool abre una conexión nueva cada vez
+            self.assertEqual(self._pragmas(engine, "journal_mode", "synchronous", "cache_size", "temp_store"),
+                             ["wal", 1, PRESETS["equilibrado"]["cache_size"], 2])
+        self.assertIsInstance(engine.pool, pool.NullPool)
+        engine.dispose()
+
+    def test_ajuste_sobre_el_preajuste(self):
+        engine = crear_engine(url=self.url, preset="seguro", synchronous="OFF", busy_timeout=1234)
+        self.assertEqual(self._pragmas(engine, "synchronous", "busy_timeout"), [0, 1234])
+        engine.dispose()
+
+    def test_preajuste_original_no_toca_nada(self):
+        engine = crear_engine(url=self.url, preset="original")
+        self.assertEqual(self._pragmas(engine, "journal_mode", "synchronous"), ["delete", 2])
+        engine.dispose()
+
+    def test_archivo_y_entorno(self):
+        """Probar que se lee el archivo INI y que el entorno tiene prioridad"""
+        archivo = os.path.join(self.directorio.name, "passkeeper.ini")
+        with open(archivo, "w", encoding="utf-8") as f:
+            f.write(f"[base_de_datos]\nurl = {self.url}\npreset = rapido\ncache_size = -1000\npool = QueuePool\npool_size = 3\n")
+
+        configuracion = cargar_configuracion(archivo, entorno={"PASSKEEPER_DB_CACHE_SIZE": "-2000", "OTRA": "x"})
+        self.assertEqual(configuracion.url, self.url)
+        self.assertEqual(configuracion.preset, "rapido")
+        self.assertEqual(configuracion.pragmas["cache_size"], -2000)
+        self.assertEqual(configuracion.pragmas["synchronous"], "OFF")
+        self.assertEqual((configuracion.pool, configuracion.pool_size), ("QueuePool", 3))
+
+        configuracion = cargar_configuracion(entorno={"PASSKEEPER_CONFIG": archivo, "PASSKEEPER_DB_PRESET": "seguro"})
+        self.assertEqual(configuracion.pragmas["synchronous"], "FULL")
+
+    def test_ajustes_invalidos(self):
+        with self.assertRaises(ValueError):
+            ConfiguracionBD(preset="turbo")
+        with self.assertRaises(ValueError):
+            ConfiguracionBD(page_size=4096)
+        with self.assertRaises(ValueError):
+            cargar_configuracion(entorno={"PASSKEEPER_DB_POOL": "OtroPool"})
+        with self.assertRaises(FileNotFoundError):
+            cargar_configuracion(os.path.join(self.directorio.name, "no_existe.ini"), entorno={})
+
+
+class TestContextoApp(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "test.db")
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.directorio.cleanup()
+
+    def test_inicializacion_diferida(self):
+        """Probar que la base solo se crea al preparar el esquema, y una sola vez"""
+        contexto = ContextoApp(ConfiguracionBD(url=f"sqlite:///{self.ruta}"))
+        engine = contexto.engine
+        self.assertIs(contexto.engine, engine)
+        self.assertFalse(os.path.exists(self.ruta))
+
+        self.assertEqual(contexto.preparar_esquema(), MIGRACIONES[-1][0])
+        with contexto.sesion() as session:
+            self.assertEqual(session.connection().exec_driver_sql("SELECT count(*) FROM usuarios").scalar(), 0)
+        contexto.cerrar()
+
+    def test_importar_no_tiene_efectos(self):
+        """Probar que importar los módulos no crea la base de datos ni carga pkg_resources"""
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        codigo = ("import sys, src.modelo.modelo, src.logica.CRUD, src.logica.exportador, src.config; "
+                  "print('pkg_resources' in sys.modules)")
+        resultado = subprocess.run([sys.executable, "-c", codigo], cwd=self.directorio.name, capture_output=True,
+                                   text=True, env={**os.environ, "PYTHONPATH": raiz}, check=True)
+        self.assertEqual(resultado.stdout.strip(), "False")
+        self.assertEqual(os.listdir(self.directorio.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
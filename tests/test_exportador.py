@@ -0,0 +1,80 @@
+import io
+import json
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario, Contrasenia, Etiqueta
+from src.logica.CRUD import Contraseniacrud
+from src.logica.exportador import exportar_archivo
+from src.logica.importador import leer_exportacion
+
+
+class TestExportador(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        self.otro_usuario = Usuario(nombre_usuario="otro", email="otro@example.com", password_hash="hashed_password", rol="user")
+        self.session.add_all([self.usuario, self.otro_usuario])
+        self.session.commit()
+
+        trabajo = Etiqueta(nombre="trabajo")
+        social = Etiqueta(nombre="social")
+        self.session.add_all([
+            Contrasenia(servicio="Jira", nombre_usuario_servicio="dev", contrasenia_encriptada="pw1",
+                        id_usuario=self.usuario.id_usuario, etiquetas=[trabajo, social]),
+            Contrasenia(servicio="Banco", nombre_usuario_servicio="cliente", contrasenia_encriptada="pw2",
+                        id_usuario=self.usuario.id_usuario, nota="pin aparte"),
+            Contrasenia(servicio="Ajena", nombre_usuario_servicio="x", contrasenia_encriptada="pw3",
+                        id_usuario=self.otro_usuario.id_usuario, etiquetas=[trabajo]),
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def test_iterar_contrasenias_usuario(self):
+        """Probar que el recorrido agrupa las etiquetas y solo incluye las del usuario"""
+        filas = list(self.contrasenia_crud.iterar_contrasenias_usuario(self.usuario.id_usuario, tamanio_lote=1))
+        self.assertEqual([f["servicio"] for f in filas], ["Banco", "Jira"])
+        self.assertEqual(filas[0]["etiquetas"], [])
+        self.assertEqual(sorted(filas[1]["etiquetas"]), ["social", "trabajo"])
+
+    def test_exportar_csv_se_puede_reimportar(self):
+        """Probar que el CSV exportado se lee con el importador genérico"""
+        archivo = io.StringIO()
+        total = exportar_archivo(self.contrasenia_crud, self.usuario.id_usuario, archivo)
+        self.assertEqual(total, 2)
+
+        archivo.seek(0)
+        filas = [datos for _, datos in leer_exportacion(archivo, "csv")]
+        self.assertEqual(filas[0]["nota"], "pin aparte")
+        self.assertEqual(filas[1]["servicio"], "Jira")
+        self.assertEqual(filas[1]["contrasenia"], "pw1")
+        self.assertEqual(sorted(filas[1]["etiquetas"]), ["social", "trabajo"])
+
+    def test_exportar_jsonl(self):
+        """Probar la exportación en JSON lines"""
+        archivo = io.StringIO()
+        exportar_archivo(self.contrasenia_crud, self.usuario.id_usuario, archivo, formato="jsonl")
+        registros = [json.loads(linea) for linea in archivo.getvalue().splitlines()]
+        self.assertEqual(len(registros), 2)
+        self.assertEqual(registros[0]["servicio"], "Banco")
+        self.assertEqual(registros[0]["contrasenia"], "pw2")
+        self.assertNotIn("contrasenia_encriptada", registros[0])
+        self.assertIsNotNone(registros[0]["fecha_creacion"])
+
+    def test_formato_desconocido(self):
+        """Probar que un formato desconocido lanza ValueError"""
+        with self.assertRaises(ValueError):
+            exportar_archivo(self.contrasenia_crud, self.usuario.id_usuario, io.StringIO(), formato="xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
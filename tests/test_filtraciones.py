@@ -0,0 +1,155 @@
+import os
+import random
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Contrasenia
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import BovedaBloqueada, Llavero
+from src.logica.filtraciones import TAMANIO_PAGINA, CorpusFiltraciones, hash_ntlm, hash_sha1, _md4_puro
+from src.logica.seguridad import Hasheador
+
+# Costes bajos para que las pruebas sean rápidas
+BARATO = (2 ** 10, 8, 1)
+FILTRADAS = {"123456": 37359195, "password": 9545824, "qwerty": 3946737}
+
+
+def escribir_corpus(ruta, hashear, relleno=3000, semilla=1):
+    """Un corpus ordenado con FILTRADAS y `relleno` hashes al azar, con finales de línea de Windows como el original"""
+    aleatorio = random.Random(semilla)
+    ancho = len(hashear(""))
+    lineas = {hashear(texto): veces for texto, veces in FILTRADAS.items()}
+    for _ in range(relleno):
+        lineas[b"%0*X" % (ancho, aleatorio.getrandbits(ancho * 4))] = aleatorio.randint(1, 1000)
+    with open(ruta, "wb") as archivo:
+        for valor in sorted(lineas):
+            archivo.write(b"%s:%d\r\n" % (valor, lineas[valor]))
+    return lineas
+
+
+class TestCorpusFiltraciones(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "pwned-passwords-sha1.txt")
+        self.lineas = escribir_corpus(self.ruta, hash_sha1)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.directorio.cleanup()
+
+    def test_hashes(self):
+        self.assertEqual(hash_sha1("password"), b"5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8")
+        self.assertEqual(hash_ntlm("password"), b"8846F7EAEE8FB117AD06BDD830B7586C")
+        self.assertEqual(_md4_puro(b"abc").hex(), "a448017aaf21d8525fc10ae87aa6729d")
+        self.assertEqual(_md4_puro(b"1234567890" * 8).hex(), "e33b4ddc9c38f2199c3e7b164fcc0536")  # Dos bloques
+        self.assertEqual(_md4_puro(b"").hex(), "31d6cfe0d16ae931b73c59d7e0c089c0")
+
+    def test_veces(self):
+        """Probar que encuentra cada línea del corpus, en cualquier página, y no inventa las que faltan"""
+        with CorpusFiltraciones(self.ruta, paginas_cache=4) as corpus:
+            self.assertEqual(corpus.algoritmo, "sha1")
+            self.assertGreater(os.path.getsize(self.ruta), 10 * TAMANIO_PAGINA)
+            for texto, veces in FILTRADAS.items():
+                self.assertEqual(corpus.veces(texto), veces)
+            self.assertEqual(corpus.veces("una frase que nadie usó"), 0)
+            for valor, veces in self.lineas.items():
+                self.assertEqual(corpus.veces_hash(valor), veces)
+            self.assertEqual(corpus.veces_hash(b"0" * 40), 0)
+            self.assertEqual(corpus.veces_hash(b"F" * 40), 0)
+            self.assertLessEqual(len(corpus._cache), 4)
+
+    def test_cache_de_paginas(self):
+        """Probar que repetir una búsqueda no vuelve a leer páginas del mapa"""
+        with CorpusFiltraciones(self.ruta) as corpus:
+            corpus.veces("password")
+            lecturas = corpus.lecturas
+            corpus.veces("password")
+            self.assertEqual(corpus.lecturas, lecturas)
+            self.assertGreater(corpus.aciertos, 0)
+
+    def test_ntlm_y_archivos_invalidos(self):
+        ruta = os.path.join(self.directorio.name, "pwned-passwords-ntlm.txt")
+        escribir_corpus(ruta, hash_ntlm, relleno=10)
+        with CorpusFiltraciones(ruta) as corpus:
+            self.assertEqual(corpus.algoritmo, "ntlm")
+            self.assertEqual(corpus.veces("qwerty"), FILTRADAS["qwerty"])
+
+        for contenido in (b"", b"no es un corpus\n"):
+            with open(ruta, "wb") as archivo:
+                archivo.write(contenido)
+            with self.assertRaises(ValueError):
+                CorpusFiltraciones(ruta)
+
+
+class TestRevisionFiltraciones(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.directorio = tempfile.TemporaryDirectory()
+        ruta = os.path.join(self.directorio.name, "pwned-passwords-sha1.txt")
+        escribir_corpus(ruta, hash_sha1)
+        self.corpus = CorpusFiltraciones(ruta)
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.llavero = Llavero(costo=BARATO)
+        usuarios = UsuarioCRUD(self.session, hasheador=Hasheador(n=BARATO[0]), llavero=self.llavero)
+        self.id_usuario = usuarios.create_usuario("ana", "ana@example.com", "maestra", "user").id_usuario
+        usuarios.iniciar_sesion("ana@example.com", "maestra")
+        self.contrasenia_crud = Contraseniacrud(self.session, llavero=self.llavero, filtraciones=self.corpus)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+        self.corpus.cerrar()
+        self.directorio.cleanup()
+
+    def test_crear_y_editar(self):
+        """Probar que crear, editar e importar guardan cuántas veces aparece la contraseña"""
+        github = self.contrasenia_crud.create_contrasenia("GitHub", "ana", "password", self.id_usuario)
+        correo = self.contrasenia_crud.create_contrasenia("Correo", "ana", "una frase larga y propia", self.id_usuario)
+        self.assertEqual((github.veces_filtrada, correo.veces_filtrada), (FILTRADAS["password"], 0))
+        self.contrasenia_crud.importar_contrasenias(self.id_usuario, [(1, {
+            "servicio": "Banco", "nombre_usuario_servicio": "ana", "contrasenia": "123456", "nota": None, "etiquetas": []})])
+
+        filtradas = self.contrasenia_crud.contrasenias_filtradas(self.id_usuario)
+        self.assertEqual([(veces, fila.servicio) for veces, fila in filtradas],
+                         [(FILTRADAS["123456"], "Banco"), (FILTRADAS["password"], "GitHub")])
+
+        self.contrasenia_crud.editar_contrasena(github.id_contrasenia, "otra frase larga y propia")
+        self.assertEqual(github.veces_filtrada, 0)
+        sin_corpus = Contraseniacrud(self.session, llavero=self.llavero)
+        sin_corpus.editar_contrasena(correo.id_contrasenia, "qwerty")
+        self.assertIsNone(correo.veces_filtrada)  # Sin corpus no se sabe
+        self.assertEqual([fila.servicio for _, fila in self.contrasenia_crud.contrasenias_filtradas(self.id_usuario)],
+                         ["Banco"])
+
+    def test_revisar_filtraciones(self):
+        """Probar la revisión de toda la bóveda, selladas y en claro, y que repetirla no cambia nada"""
+        sin_corpus = Contraseniacrud(self.session, llavero=self.llavero)
+        for i, texto in enumerate(["password", "qwerty", "propia 1", "propia 2", "123456"]):
+            sin_corpus.create_contrasenia(f"servicio{i}", "ana", texto, self.id_usuario)
+        self.session.add(Contrasenia(servicio="Antigua", nombre_usuario_servicio="ana", contrasenia_encriptada="qwerty",
+                                     id_usuario=self.id_usuario))
+        self.session.commit()
+        with self.assertRaises(ValueError):
+            sin_corpus.revisar_filtraciones(self.id_usuario)
+
+        progreso = []
+        resultado = self.contrasenia_crud.revisar_filtraciones(self.id_usuario, tamanio_lote=4, hilos=2,
+                                                               al_progresar=lambda r: progreso.append(r.revisadas))
+        self.assertEqual((resultado.revisadas, resultado.filtradas, resultado.cambiadas), (6, 4, 6))
+        self.assertEqual(progreso, [4, 6])
+        veces = dict(self.session.query(Contrasenia.servicio, Contrasenia.veces_filtrada))
+        self.assertEqual(veces["Antigua"], FILTRADAS["qwerty"])
+        self.assertEqual(veces["servicio2"], 0)
+        self.assertEqual(self.contrasenia_crud.revisar_filtraciones(self.id_usuario).cambiadas, 0)
+
+        self.llavero.olvidar(self.id_usuario)
+        with self.assertRaises(BovedaBloqueada):
+            self.contrasenia_crud.revisar_filtraciones(self.id_usuario)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import io
+import json
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario, Contrasenia, Etiqueta, ContraseniaEtiqueta
+from src.logica.CRUD import Contraseniacrud
+from src.logica.importador import leer_exportacion, importar_archivo
+
+
+class TestImportador(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        self.session.add(self.usuario)
+        self.session.commit()
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def test_importar_csv_generico_con_etiquetas(self):
+        """Probar la importación del CSV propio, incluyendo la resolución de etiquetas"""
+        archivo = io.StringIO(
+            "servicio,nombre_usuario_servicio,contrasenia,nota,etiquetas\n"
+            "Facebook,fb_user,secreto1,nota fb,social;personal\n"
+            "Banco,cliente,secreto2,,finanzas\n"
+            "Twitter,tw_user,secreto3,,social\n"
+        )
+        self.session.add(Etiqueta(nombre="social"))
+        self.session.commit()
+
+        resultado = importar_archivo(self.contrasenia_crud, self.usuario.id_usuario, archivo, tamanio_lote=2)
+
+        self.assertEqual(resultado.importadas, 3)
+        self.assertEqual(resultado.errores, [])
+        self.assertEqual(self.session.query(Contrasenia).count(), 3)
+        # La etiqueta existente se reutiliza en lugar de duplicarse
+        self.assertEqual(self.session.query(Etiqueta).filter_by(nombre="social").count(), 1)
+        self.assertEqual(self.session.query(Etiqueta).count(), 3)
+        self.assertEqual(self.session.query(ContraseniaEtiqueta).count(), 4)
+
+        facebook = self.session.query(Contrasenia).filter_by(servicio="Facebook").one()
+        self.assertEqual(sorted(e.nombre for e in facebook.etiquetas), ["personal", "social"])
+        self.assertEqual(facebook.nota, "nota fb")
+
+    def test_importar_reporta_filas_invalidas_sin_abortar(self):
+        """Probar que las filas inválidas se reportan y el resto se importa"""
+        archivo = io.StringIO(
+            "name,url,username,password,note\n"
+            "Gmail,https://mail.google.com,yo@gmail.com,clave,\n"
+            ",https://sin-usuario.com,,clave,\n"
+            ",https://github.com/login,dev,clave2,\n"
+        )
+        resultado = importar_archivo(self.contrasenia_crud, self.usuario.id_usuario, archivo, formato="chrome")
+
+        self.assertEqual(resultado.importadas, 2)
+        self.assertEqual(len(resultado.errores), 1)
+        self.assertEqual(resultado.errores[0].fila, 3)
+        servicios = sorted(c.servicio for c in self.session.query(Contrasenia))
+        self.assertEqual(servicios, ["Gmail", "github.com"])
+
+    def test_leer_firefox_csv(self):
+        """Probar la lectura de la exportación de Firefox"""
+        archivo = io.StringIO(
+            '"url","username","password","httpRealm","formActionOrigin","guid","timeCreated","timeLastUsed","timePasswordChanged"\n'
+            '"https://www.example.com","ana","pw","","https://www.example.com","{1}","1","1","1"\n'
+        )
+        filas = list(leer_exportacion(archivo, "firefox"))
+        self.assertEqual(filas[0][1]["servicio"], "www.example.com")
+        self.assertEqual(filas[0][1]["nombre_usuario_servicio"], "ana")
+
+    def test_leer_bitwarden_json(self):
+        """Probar la lectura de la exportación JSON de Bitwarden, con la carpeta como etiqueta"""
+        archivo = io.StringIO(json.dumps({
+            "folders": [{"id": "f1", "name": "Trabajo"}],
+            "items": [
+                {"type": 1, "name": "Jira", "notes": None, "folderId": "f1",
+                 "login": {"username": "dev", "password": "pw", "uris": [{"uri": "https://jira.example.com"}]}},
+                {"type": 2, "name": "Nota segura", "notes": "texto"},
+            ],
+        }))
+        filas = list(leer_exportacion(archivo, "bitwarden_json"))
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0][1]["servicio"], "Jira")
+        self.assertEqual(filas[0][1]["etiquetas"], ["Trabajo"])
+
+    def test_formato_desconocido(self):
+        """Probar que un formato desconocido lanza ValueError"""
+        with self.assertRaises(ValueError):
+            leer_exportacion(io.StringIO(""), "keepass")
+
+
+if __name__ == '__main__':
+    unittest.main()
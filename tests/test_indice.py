@@ -0,0 +1,100 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario
+from src.logica.CRUD import Contraseniacrud
+from src.logica.indice import IndiceContrasenias, normalizar
+
+
+class TestIndiceContrasenias(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.contrasenia_crud = Contraseniacrud(self.session)
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="hashed_password", rol="user")
+        self.otro_usuario = Usuario(nombre_usuario="otro", email="otro@example.com", password_hash="hashed_password", rol="user")
+        self.session.add_all([self.usuario, self.otro_usuario])
+        self.session.commit()
+
+        crear = self.contrasenia_crud.create_contrasenia
+        self.github = crear("GitHub", "dev@example.com", "pw", self.usuario.id_usuario)
+        self.gitlab = crear("GitLab", "dev", "pw", self.usuario.id_usuario)
+        self.banco = crear("Banco Nación", "cliente", "pw", self.usuario.id_usuario)
+        crear("GitHub", "ajeno", "pw", self.otro_usuario.id_usuario)
+
+        self.indice = IndiceContrasenias.construir(self.contrasenia_crud, self.usuario.id_usuario)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar("  Banco NACIÓN "), "banco nacion")
+
+    def test_buscar_prefijo(self):
+        """Probar la búsqueda por prefijo del servicio y del usuario, solo del usuario del índice"""
+        self.assertEqual(len(self.indice), 3)
+        self.assertEqual(self.indice.buscar_prefijo("git"), [self.github.id_contrasenia, self.gitlab.id_contrasenia])
+        self.assertCountEqual(self.indice.buscar_prefijo("DEV"), [self.github.id_contrasenia, self.gitlab.id_contrasenia])
+        self.assertEqual(self.indice.buscar_prefijo("git", limite=1), [self.github.id_contrasenia])
+
+    def test_buscar_prefijo_de_palabra_sin_acentos(self):
+        """Probar que se encuentra por el inicio de cualquier palabra e ignorando acentos"""
+        self.assertEqual(self.indice.buscar_prefijo("nacion"), [self.banco.id_contrasenia])
+        self.assertEqual(self.indice.buscar_prefijo("banco nac"), [self.banco.id_contrasenia])
+        self.assertEqual(self.indice.buscar_prefijo("acion"), [])
+
+    def test_buscar_aproximado(self):
+        """Probar que una errata encuentra el servicio más parecido primero"""
+        self.assertEqual(self.indice.buscar_aproximado("githbu")[0], self.github.id_contrasenia)
+        self.assertEqual(self.indice.buscar("banko"), [self.banco.id_contrasenia])
+
+    def test_se_actualiza_con_el_crud(self):
+        """Probar que crear, editar y eliminar mediante el CRUD actualiza el índice"""
+        nueva = self.contrasenia_crud.create_contrasenia("Gmail", "yo", "pw", self.usuario.id_usuario)
+        self.assertEqual(self.indice.buscar_prefijo("gm"), [nueva.id_contrasenia])
+
+        # Las contraseñas de otros usuarios no entran en el índice
+        self.contrasenia_crud.create_contrasenia("Gmail", "ajeno", "pw", self.otro_usuario.id_usuario)
+        self.assertEqual(self.indice.buscar_prefijo("gm"), [nueva.id_contrasenia])
+
+        nueva.servicio = "Correo"
+        self.contrasenia_crud.editar_contrasena(nueva.id_contrasenia, nota="editada")
+        self.assertEqual(self.indice.buscar_prefijo("gm"), [])
+        self.assertEqual(self.indice.buscar_prefijo("corr"), [nueva.id_contrasenia])
+
+        self.contrasenia_crud.delete_contrasenia(self.github.id_contrasenia)
+        self.assertEqual(self.indice.buscar_prefijo("git"), [self.gitlab.id_contrasenia])
+        self.assertEqual(len(self.indice), 3)
+
+    def test_servicio_y_usuario_con_palabras_comunes(self):
+        """Probar editar y eliminar una entrada cuyo servicio y usuario comparten una palabra"""
+        comun = self.contrasenia_crud.create_contrasenia("Banco Andino", "andino", "pw", self.usuario.id_usuario)
+        self.assertEqual(self.indice.buscar_prefijo("andino"), [comun.id_contrasenia])
+
+        comun.servicio = "Caja Andina"
+        self.contrasenia_crud.editar_contrasena(comun.id_contrasenia, nota="editada")
+        self.assertEqual(self.indice.buscar_prefijo("andino"), [comun.id_contrasenia])
+        self.assertEqual(self.indice.buscar_prefijo("banco"), [self.banco.id_contrasenia])
+
+        comun.servicio = "Andino"
+        self.contrasenia_crud.editar_contrasena(comun.id_contrasenia, nota="otra vez")
+        self.contrasenia_crud.delete_contrasenia(comun.id_contrasenia)
+        self.assertEqual(self.indice.buscar_prefijo("andin"), [])
+        self.assertEqual(self.indice.buscar_aproximado("andino"), [])
+        self.assertEqual(self.indice.buscar_prefijo("b"), [self.banco.id_contrasenia])
+        self.assertEqual(self.indice._claves, sorted(self.indice._ids_por_clave))
+
+    def test_obtener_contrasenias_por_ids(self):
+        """Probar que las contraseñas se devuelven en el orden del índice"""
+        ids = [self.banco.id_contrasenia, self.github.id_contrasenia]
+        contrasenias = self.contrasenia_crud.obtener_contrasenias_por_ids(ids)
+        self.assertEqual([c.id_contrasenia for c in contrasenias], ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario, Contrasenia, Etiqueta, ContraseniaEtiqueta, Sesion
+from src.modelo.migraciones import actualizar_esquema, version_esquema, MIGRACIONES, recalcular_conteos_etiquetas
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud, EtiquetaCRUD, SesionCRUD
+
+
+class TestIndicesConsultas(unittest.TestCase):
+    """Comprueba con EXPLAIN QUERY PLAN que ninguna lectura del CRUD recorre una tabla completa"""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+        self.usuario = Usuario(nombre_usuario="user_test", email="user_test@example.com", password_hash="x", rol="user")
+        self.session.add(self.usuario)
+        self.session.commit()
+        self.etiqueta = Etiqueta(nombre="trabajo")
+        self.contrasenia = Contrasenia(servicio="Jira", nombre_usuario_servicio="dev", contrasenia_encriptada="pw",
+                                       id_usuario=self.usuario.id_usuario, etiquetas=[self.etiqueta])
+        self.sesion = Sesion(id_usuario=self.usuario.id_usuario)
+        self.session.add_all([self.contrasenia, self.sesion])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _planes(self, accion):
+        """Ejecuta la acción capturando sus SELECT y devuelve el plan de cada uno"""
+        sentencias = []
+
+        def capturar(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                sentencias.append((statement, parameters))
+
+        event.listen(self.engine, "before_cursor_execute", capturar)
+        try:
+            accion()
+        finally:
+            event.remove(self.engine, "before_cursor_execute", capturar)
+
+        self.assertTrue(sentencias, "La acción no ejecutó ninguna consulta")
+        conexion = self.session.connection()
+        return [
+            (sql, [fila[3] for fila in conexion.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, parametros)])
+            for sql, parametros in sentencias
+        ]
+
+    def assertUsaIndices(self, accion):
+        for sql, plan in self._planes(accion):
+            for paso in plan:
+                self.assertFalse(paso.startswith("SCAN"), f"Recorrido completo '{paso}' en:\n{sql}")
+
+    def test_lecturas_usuario(self):
+        crud = UsuarioCRUD(self.session)
+        self.assertUsaIndices(lambda: crud.get_usuario_by_id(self.usuario.id_usuario))
+        self.assertUsaIndices(lambda: crud.get_usuario_by_email("user_test@example.com"))
+
+    def test_lecturas_contrasenias(self):
+        crud = Contraseniacrud(self.session)
+        self.assertUsaIndices(lambda: crud.get_contrasenias_by_user(self.usuario.id_usuario))
+        self.assertUsaIndices(lambda: crud.obtener_contrasenias_usuario(self.usuario.id_usuario))
+        self.assertUsaIndices(lambda: list(crud.iterar_contrasenias_usuario(self.usuario.id_usuario)))
+        self.assertUsaIndices(lambda: crud.contrasenias_reutilizadas(self.usuario.id_usuario))
+        self.assertUsaIndices(lambda: crud.contrasenias_filtradas(self.usuario.id_usuario))
+
+    def test_paginacion_sin_ordenar_aparte(self):
+        """Cada orden de paginación debe resolverse con su índice, sin recorrer ni ordenar en temporal"""
+        crud = Contraseniacrud(self.session)
+        for orden in crud.ORDENES_PAGINACION:
+            contrasenias, _ = crud.listar_pagina(self.usuario.id_usuario, tamanio_pagina=1, orden=orden)
+            cursor = (getattr(contrasenias[0], "fecha_creacion" if orden == "ultima_modificacion" else orden),
+                      contrasenias[0].id_contrasenia)
+            for sql, plan in self._planes(lambda: crud.listar_pagina(self.usuario.id_usuario, cursor=cursor, orden=orden)):
+                self.assertEqual(len(plan), 1, f"{orden}: {plan}")
+                self.assertTrue(plan[0].startswith("SEARCH contrasenias USING INDEX"), f"{orden}: {plan}")
+
+    def test_relaciones(self):
+        self.session.expire_all()
+        self.assertUsaIndices(lambda: self.session.get(Contrasenia, self.contrasenia.id_contrasenia).etiquetas)
+        self.session.expire_all()
+        self.assertUsaIndices(lambda: self.session.get(Etiqueta, self.etiqueta.id_etiqueta).contrasenias)
+        self.session.expire_all()
+        self.assertUsaIndices(lambda: self.session.get(Usuario, self.usuario.id_usuario).sesiones)
+
+    def test_lecturas_etiquetas_y_sesiones(self):
+        self.assertUsaIndices(lambda: EtiquetaCRUD(self.session).get_etiqueta(self.etiqueta.id_etiqueta))
+        self.assertUsaIndices(lambda: EtiquetaCRUD(self.session).contar_etiquetas(self.usuario.id_usuario))
+        self.assertUsaIndices(lambda: SesionCRUD(self.session).get_sesion(self.sesion.id_sesion))
+
+    def test_consultas_de_sesiones(self):
+        """Probar que las sesiones activas salen del índice parcial y los rangos y el archivado no recorren la tabla"""
+        crud = SesionCRUD(self.session)
+        id_usuario = self.usuario.id_usuario
+        planes = self._planes(lambda: crud.sesiones_activas(id_usuario))
+        self.assertIn("ix_sesiones_activas", planes[0][1][0])
+        desde, hasta = datetime(2024, 1, 1), datetime(2024, 2, 1)
+        self.assertUsaIndices(lambda: crud.sesiones_en_rango(desde, hasta))
+        self.assertUsaIndices(lambda: crud.sesiones_en_rango(desde, hasta, id_usuario=id_usuario))
+        self.assertUsaIndices(lambda: crud.archivar_sesiones(30))
+
+
+class TestMigraciones(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        # Simular una base anterior: sin índices secundarios y con relaciones repetidas
+        with self.engine.begin() as conexion:
+            for tabla in Base.metadata.sorted_tables:
+                for indice in tabla.indexes:
+                    indice.drop(conexion)
+            conexion.exec_driver_sql("INSERT INTO contrasenia_etiqueta (id_contrasenia, id_etiqueta) VALUES (1, 1), (1, 1), (1, 2)")
+
+    def test_actualizar_esquema(self):
+        """Probar que la migración elimina duplicados, crea los índices y registra la versión"""
+        version = actualizar_esquema(self.engine)
+
+        self.assertEqual(version, MIGRACIONES[-1][0])
+        with self.engine.connect() as conexion:
+            nombres = {fila[0] for fila in conexion.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            for tabla in Base.metadata.sorted_tables:
+                for indice in tabla.indexes:
+                    self.assertIn(indice.name, nombres)
+            self.assertEqual(version_esquema(conexion), version)
+            self.assertEqual(conexion.exec_driver_sql("SELECT count(*) FROM contrasenia_etiqueta").scalar(), 2)
+
+    def test_actualizar_esquema_base_nueva(self):
+        """Probar la actualización de una base recién creada con create_all, que ya tiene todos los índices"""
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(engine)
+        self.assertEqual(actualizar_esquema(engine), MIGRACIONES[-1][0])
+
+    def test_conteos_de_una_base_anterior(self):
+        """Probar que la migración rellena conteo_etiquetas con las relaciones que ya existían"""
+        with self.engine.begin() as conexion:
+            conexion.exec_driver_sql("INSERT INTO usuarios (id_usuario, nombre_usuario, email, password_hash, rol) VALUES (7, 'u', 'u@x', 'x', 'user')")
+            conexion.exec_driver_sql("INSERT INTO contrasenias (id_contrasenia, servicio, nombre_usuario_servicio, contrasenia_encriptada, id_usuario) VALUES (1, 's', 'u', 'pw', 7)")
+            conexion.exec_driver_sql("DELETE FROM conteo_etiquetas")
+        actualizar_esquema(self.engine)
+        with self.engine.connect() as conexion:
+            filas = conexion.exec_driver_sql("SELECT id_usuario, id_etiqueta, cantidad FROM conteo_etiquetas ORDER BY id_etiqueta").all()
+        self.assertEqual([tuple(f) for f in filas], [(7, 1, 1), (7, 2, 1)])
+
+        with self.engine.begin() as conexion:
+            conexion.exec_driver_sql("UPDATE conteo_etiquetas SET cantidad = 99")
+        recalcular_conteos_etiquetas(self.engine)
+        with self.engine.connect() as conexion:
+            self.assertEqual(conexion.exec_driver_sql("SELECT sum(cantidad) FROM conteo_etiquetas").scalar(), 2)
+
+    def test_sal_boveda_en_una_base_anterior(self):
+        """Probar que la migración añade la columna de la sal de la bóveda a la tabla de usuarios"""
+        with self.engine.begin() as conexion:
+            conexion.exec_driver_sql("ALTER TABLE usuarios DROP COLUMN sal_boveda")
+        actualizar_esquema(self.engine)
+        with self.engine.connect() as conexion:
+            columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(usuarios)")}
+        self.assertIn("sal_boveda", columnas)
+
+    def test_huella_en_una_base_anterior(self):
+        """Probar que la migración añade la columna de la huella con su índice"""
+        with self.engine.begin() as conexion:
+            conexion.exec_driver_sql("ALTER TABLE contrasenias DROP COLUMN huella")
+        actualizar_esquema(self.engine)
+        with self.engine.connect() as conexion:
+            columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(contrasenias)")}
+            indices = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA index_list(contrasenias)")}
+        self.assertIn("huella", columnas)
+        self.assertIn("ix_contrasenias_usuario_huella", indices)
+
+    def test_filtraciones_en_una_base_anterior(self):
+        """Probar que la migración añade la columna veces_filtrada con su índice parcial"""
+        with self.engine.begin() as conexion:
+            conexion.exec_driver_sql("ALTER TABLE contrasenias DROP COLUMN veces_filtrada")
+        actualizar_esquema(self.engine)
+        with self.engine.connect() as conexion:
+            columnas = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA table_info(contrasenias)")}
+            indices = {fila[1] for fila in conexion.exec_driver_sql("PRAGMA index_list(contrasenias)")}
+        self.assertIn("veces_filtrada", columnas)
+        self.assertIn("ix_contrasenias_filtradas", indices)
+
+    def test_actualizar_esquema_es_idempotente(self):
+        """Probar que volver a ejecutar la actualización no falla ni cambia la versión"""
+        version = actualizar_esquema(self.engine)
+        self.assertEqual(actualizar_esquema(self.engine), version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import unittest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base
+from src.logica.CRUD import UsuarioCRUD, Contraseniacrud
+from src.logica.boveda import Llavero
+from src.logica.instrumentacion import INSTRUMENTACION, Histograma, instrumentado
+from src.logica.seguridad import Hasheador
+
+
+@instrumentado
+class Compuesta:
+    """Un método instrumentado que llama a otros del CRUD"""
+
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+
+    def dos_lecturas(self, id_usuario):
+        self.usuarios.get_usuario_by_id(id_usuario)
+        return self.usuarios.get_usuario_by_email("ana@example.com")
+
+
+class TestInstrumentacion(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.llavero = Llavero(costo=(2 ** 10, 8, 1))
+        self.usuarios = UsuarioCRUD(self.session, hasheador=Hasheador(n=2 ** 10, r=8, p=1), llavero=self.llavero)
+        self.id_usuario = self.usuarios.create_usuario("ana", "ana@example.com", "maestra", "user").id_usuario
+        self.usuarios.iniciar_sesion("ana@example.com", "maestra")
+        INSTRUMENTACION.reiniciar()
+        INSTRUMENTACION.activar(self.engine, umbral_lento=10)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        INSTRUMENTACION.desactivar()
+        INSTRUMENTACION.reiniciar()
+        INSTRUMENTACION.umbral_lento = 0.1
+        self.session.close()
+
+    def test_desactivada(self):
+        """Probar que desactivada no deja listeners ni registra llamadas"""
+        INSTRUMENTACION.desactivar()
+        self.assertFalse(event.contains(self.engine, "before_cursor_execute", INSTRUMENTACION._antes))
+        self.usuarios.get_usuario_by_id(self.id_usuario)
+        self.assertEqual(INSTRUMENTACION.instantanea()["metodos"], {})
+
+    def test_por_metodo(self):
+        """Probar las llamadas, sentencias y errores de cada método"""
+        for _ in range(3):
+            self.usuarios.get_usuario_by_id(self.id_usuario)
+        with self.assertRaises(Exception):
+            self.usuarios.create_usuario("otra", "ana@example.com", "x", "user")
+
+        metodos = INSTRUMENTACION.instantanea()["metodos"]
+        lectura = metodos["UsuarioCRUD.get_usuario_by_id"]
+        self.assertEqual((lectura["llamadas"], lectura["sentencias"], lectura["errores"]), (3, 3, 0))
+        self.assertEqual(lectura["histograma_segundos"]["total"], 3)
+        self.assertGreater(lectura["segundos_total"], 0)
+        self.assertLessEqual(lectura["segundos_bd"], lectura["segundos_total"])
+        self.assertEqual(metodos["UsuarioCRUD.create_usuario"]["errores"], 1)
+
+    def test_anidados_y_generadores(self):
+        """Probar que las sentencias de un método anidado cuentan también para el de afuera"""
+        Compuesta(self.usuarios).dos_lecturas(self.id_usuario)
+        contrasenias = Contraseniacrud(self.session, llavero=self.llavero)
+        contrasenias.create_contrasenia("GitHub", "ana", "x", self.id_usuario)
+        self.assertEqual(len(list(contrasenias.iterar_contrasenias_usuario(self.id_usuario))), 1)
+
+        metodos = INSTRUMENTACION.instantanea()["metodos"]
+        self.assertEqual(metodos["Compuesta.dos_lecturas"]["sentencias"], 2)
+        self.assertEqual(metodos["UsuarioCRUD.get_usuario_by_email"]["sentencias"], 1)
+        self.assertEqual(metodos["Contraseniacrud.iterar_contrasenias_usuario"]["sentencias"], 1)
+        self.assertEqual(metodos["Contraseniacrud.iterar_contrasenias_usuario"]["llamadas"], 1)
+
+    def test_consultas_lentas(self):
+        """Probar que las sentencias por encima del umbral se registran con su plan"""
+        recibidas = []
+        INSTRUMENTACION.al_lento = recibidas.append
+        INSTRUMENTACION.umbral_lento = 0
+        try:
+            self.usuarios.get_usuario_by_email("ana@example.com")
+        finally:
+            INSTRUMENTACION.al_lento = None
+        lentas = INSTRUMENTACION.instantanea()["lentas"]
+        self.assertEqual(lentas, recibidas)
+        self.assertEqual(lentas[0]["metodo"], "UsuarioCRUD.get_usuario_by_email")
+        self.assertIn("FROM usuarios", lentas[0]["sql"])
+        self.assertTrue(any("usuarios" in paso for paso in lentas[0]["plan"]))
+
+    def test_exposicion(self):
+        self.usuarios.get_usuario_by_id(self.id_usuario)
+        self.assertIn("UsuarioCRUD.get_usuario_by_id", json.loads(INSTRUMENTACION.a_json())["metodos"])
+        texto = INSTRUMENTACION.a_prometheus()
+        self.assertIn('passkeeper_crud_llamadas_total{metodo="UsuarioCRUD.get_usuario_by_id"} 1', texto)
+        self.assertIn('passkeeper_crud_segundos_bucket{metodo="UsuarioCRUD.get_usuario_by_id",le="+Inf"} 1', texto)
+        self.assertIn("passkeeper_sql_segundos_count 1", texto)
+
+    def test_histograma(self):
+        histograma = Histograma((0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            histograma.observar(valor)
+        self.assertEqual(histograma.acumulado(), [(0.1, 2), (1.0, 3), (float("inf"), 4)])
+        self.assertEqual(histograma.total, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from src.modelo.modelo import Base, Usuario
+from src.logica.CRUD import UsuarioCRUD
+from src.logica.seguridad import Hasheador
+from src.logica.boveda import Llavero
+
+# Costes bajos para que las pruebas sean rápidas
+BARATO = {"n": 2 ** 10, "r": 8, "p": 1}
+
+
+class TestHasheador(unittest.TestCase):
+    def test_scrypt(self):
+        """Probar que el hash lleva sus parámetros, usa sal y se verifica"""
+        hasheador = Hasheador(**BARATO)
+        almacenado = hasheador.hashear("clave secreta")
+        self.assertTrue(almacenado.startswith("$scrypt$n=1024,r=8,p=1$"))
+        self.assertNotEqual(almacenado, hasheador.hashear("clave secreta"))
+        self.assertTrue(hasheador.verificar("clave secreta", almacenado))
+        self.assertFalse(hasheador.verificar("otra clave", almacenado))
+        self.assertFalse(hasheador.necesita_rehash(almacenado))
+
+    def test_pbkdf2(self):
+        hasheador = Hasheador("pbkdf2-sha256", iteraciones=1000)
+        almacenado = hasheador.hashear("ñandú")
+        self.assertTrue(almacenado.startswith("$pbkdf2-sha256$i=1000$"))
+        self.assertTrue(hasheador.verificar("ñandú", almacenado))
+
+    def test_necesita_rehash(self):
+        """Probar que un cambio de coste o de algoritmo, o un valor en claro, piden regenerar el hash"""
+        almacenado = Hasheador(**BARATO).hashear("clave")
+        mas_caro = Hasheador(n=2 ** 11, r=8, p=1)
+        self.assertTrue(mas_caro.verificar("clave", almacenado))
+        self.assertTrue(mas_caro.necesita_rehash(almacenado))
+        self.assertTrue(Hasheador("pbkdf2-sha256", iteraciones=1000).necesita_rehash(almacenado))
+        self.assertTrue(mas_caro.necesita_rehash("clave"))
+
+    def test_contrasenia_en_claro_de_versiones_anteriores(self):
+        hasheador = Hasheador(**BARATO)
+        self.assertTrue(hasheador.verificar("hashed_password", "hashed_password"))
+        self.assertFalse(hasheador.verificar("otra", "hashed_password"))
+        self.assertFalse(hasheador.verificar("$scrypt$roto", "$scrypt$roto$"))
+
+    def test_pool_de_procesos(self):
+        """Probar que las derivaciones en procesos dan el mismo resultado que en el hilo"""
+        hasheador = Hasheador(procesos=2, **BARATO)
+        try:
+            futuros = [hasheador.enviar_hash(f"clave{i}") for i in range(6)]
+            almacenados = [futuro.result() for futuro in futuros]
+            for i, almacenado in enumerate(almacenados):
+                self.assertTrue(Hasheador(**BARATO).verificar(f"clave{i}", almacenado))
+                self.assertTrue(hasheador.verificar(f"clave{i}", almacenado))
+        finally:
+            hasheador.cerrar()
+
+
+class TestUsuarioCRUDConHash(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.llavero = Llavero(costo=(2 ** 10, 8, 1))
+        self.usuario_crud = UsuarioCRUD(self.session, hasheador=Hasheador(**BARATO), llavero=self.llavero)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.session.close()
+
+    def test_no_guarda_la_contrasenia(self):
+        usuario = self.usuario_crud.create_usuario("user_test", "user_test@example.com", "clave", "user")
+        self.assertNotIn("clave", usuario.password_hash)
+        self.assertIsNotNone(self.usuario_crud.iniciar_sesion("user_test@example.com", "clave"))
+        self.assertIsNone(self.usuario_crud.iniciar_sesion("user_test@example.com", "incorrecta"))
+
+    def test_rehash_al_iniciar_sesion(self):
+        """Probar que un valor en claro o con otro coste se regenera al iniciar sesión"""
+        self.session.add(Usuario(nombre_usuario="antiguo", email="antiguo@example.com", password_hash="clave", rol="user"))
+        self.session.commit()
+        self.assertIsNotNone(self.usuario_crud.iniciar_sesion("antiguo@example.com", "clave"))
+        usuario = self.usuario_crud.get_usuario_by_email("antiguo@example.com")
+        self.assertTrue(usuario.password_hash.startswith("$scrypt$n=1024,"))
+
+        mas_caro = UsuarioCRUD(self.session, hasheador=Hasheador(n=2 ** 11, r=8, p=1), llavero=self.llavero)
+        self.assertIsNotNone(mas_caro.iniciar_sesion("antiguo@example.com", "clave"))
+        self.assertTrue(usuario.password_hash.startswith("$scrypt$n=2048,"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import contextlib
+import http.client
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from src.config import ConfiguracionBD, ContextoApp
+from src.logica.boveda import Llavero
+from src.logica.instrumentacion import INSTRUMENTACION
+from src.logica.seguridad import Hasheador
+from src.vista.servicio import FirmaTokens, ManejadorAPI, ServidorPassKeeper, codificar_cursor, decodificar_cursor
+
+# Costes bajos para que las pruebas sean rápidas
+BARATO = {"n": 2 ** 10, "r": 8, "p": 1}
+
+
+class TestFirmaTokens(unittest.TestCase):
+    def test_emitir_y_verificar(self):
+        tokens = FirmaTokens(b"secreto")
+        token = tokens.emitir(7, 3)
+        self.assertEqual(tokens.verificar(token), (7, 3))
+        self.assertIsNone(FirmaTokens(b"otro").verificar(token))
+        self.assertIsNone(tokens.verificar(token.replace("7.3.", "8.3.", 1)))
+        self.assertIsNone(tokens.verificar(""))
+
+    def test_vencido(self):
+        ahora = [1000.0]
+        tokens = FirmaTokens(b"secreto", duracion=60, reloj=lambda: ahora[0])
+        token = tokens.emitir(1, 1)
+        ahora[0] += 61
+        self.assertIsNone(tokens.verificar(token))
+
+    def test_cursor(self):
+        from datetime import datetime
+        cursor = (datetime(2024, 5, 1, 10, 30), 42)
+        self.assertEqual(decodificar_cursor(codificar_cursor(cursor), "fecha_creacion"), cursor)
+        self.assertEqual(decodificar_cursor(codificar_cursor(("GitHub", 3)), "servicio"), ("GitHub", 3))
+
+
+class TestServicio(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba: el servicio en un hilo sobre una base en archivo"""
+        self.directorio = tempfile.TemporaryDirectory()
+        configuracion = ConfiguracionBD(url=f"sqlite:///{os.path.join(self.directorio.name, 'servicio.db')}")
+        self.servidor = ServidorPassKeeper(("127.0.0.1", 0), ContextoApp(configuracion), hilos=4,
+                                           hasheador=Hasheador(**BARATO), llavero=Llavero(costo=(2 ** 10, 8, 1)))
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self.hilo.start()
+
+    def tearDown(self):
+        """Limpieza después de cada prueba"""
+        self.servidor.shutdown()
+        self.servidor.server_close()
+        self.directorio.cleanup()
+
+    def pedir(self, metodo, ruta, cuerpo=None, token=None):
+        conexion = http.client.HTTPConnection(*self.servidor.server_address, timeout=10)
+        cabeceras = {"Content-Type": "application/json"}
+        if token:
+            cabeceras["Authorization"] = f"Bearer {token}"
+        conexion.request(metodo, ruta, json.dumps(cuerpo) if cuerpo is not None else None, cabeceras)
+        respuesta = conexion.getresponse()
+        datos = json.loads(respuesta.read())
+        conexion.close()
+        return respuesta.status, datos
+
+    def iniciar_sesion(self, email="ana@example.com", password="maestra"):
+        self.pedir("POST", "/usuarios", {"nombre_usuario": email.split("@")[0], "email": email, "password": password})
+        estado, datos = self.pedir("POST", "/sesiones", {"email": email, "password": password})
+        self.assertEqual(estado, 201)
+        return datos["token"]
+
+    def test_inicio_de_sesion(self):
+        estado, _ = self.pedir("POST", "/usuarios", {"nombre_usuario": "ana", "email": "ana@example.com", "password": "maestra"})
+        self.assertEqual(estado, 201)
+        self.assertEqual(self.pedir("POST", "/sesiones", {"email": "ana@example.com", "password": "otra"})[0], 401)
+        self.assertEqual(self.pedir("GET", "/contrasenias")[0], 401)
+        self.assertEqual(self.pedir("GET", "/contrasenias", token="1.1.9999999999.firma")[0], 401)
+
+        token = self.iniciar_sesion()
+        self.assertEqual(self.pedir("GET", "/contrasenias", token=token), (200, {"contrasenias": [], "cursor": None}))
+        self.assertEqual(self.pedir("DELETE", "/sesiones", token=token)[0], 200)
+        self.assertEqual(self.pedir("GET", "/contrasenias", token=token)[0], 401)
+
+    def test_contrasenias(self):
+        token = self.iniciar_sesion()
+        for i in range(5):
+            estado, creada = self.pedir("POST", "/contrasenias", {
+                "servicio": f"servicio{i}", "nombre_usuario_servicio": "ana", "contrasenia": f"clave{i}"}, token=token)
+            self.assertEqual(estado, 201)
+            self.assertNotIn("contrasenia", creada)
+
+        estado, pagina = self.pedir("GET", "/contrasenias?tamanio=3", token=token)
+        self.assertEqual([c["servicio"] for c in pagina["contrasenias"]], ["servicio0", "servicio1", "servicio2"])
+        _, siguiente = self.pedir("GET", f"/contrasenias?tamanio=3&cursor={pagina['cursor']}", token=token)
+        self.assertEqual([c["servicio"] for c in siguiente["contrasenias"]], ["servicio3", "servicio4"])
+        self.assertIsNone(siguiente["cursor"])
+
+        _, encontradas = self.pedir("GET", "/contrasenias?q=servicio3", token=token)
+        self.assertEqual([c["servicio"] for c in encontradas["contrasenias"]], ["servicio3"])
+        id_contrasenia = encontradas["contrasenias"][0]["id_contrasenia"]
+
+        self.assertEqual(self.pedir("GET", f"/contrasenias/{id_contrasenia}", token=token)[1]["contrasenia"], "clave3")
+        estado, _ = self.pedir("PATCH", f"/contrasenias/{id_contrasenia}", {"contrasenia": "nueva"}, token=token)
+        self.assertEqual(estado, 200)
+        self.assertEqual(self.pedir("GET", f"/contrasenias/{id_contrasenia}", token=token)[1]["contrasenia"], "nueva")
+        _, reutilizadas = self.pedir("GET", "/contrasenias/reutilizadas", token=token)
+        self.assertEqual(reutilizadas, {"grupos": []})
+        self.pedir("PATCH", f"/contrasenias/{id_contrasenia - 1}", {"contrasenia": "nueva"}, token=token)
+        _, reutilizadas = self.pedir("GET", "/contrasenias/reutilizadas", token=token)
+        self.assertEqual([[c["servicio"] for c in grupo] for grupo in reutilizadas["grupos"]], [["servicio2", "servicio3"]])
+        # Sin --filtraciones no se comprueba nada
+        self.assertIsNone(creada["veces_filtrada"])
+        self.assertEqual(self.pedir("GET", "/contrasenias/filtradas", token=token), (200, {"contrasenias": []}))
+        self.assertEqual(self.pedir("DELETE", f"/contrasenias/{id_contrasenia}", token=token)[0], 200)
+        self.assertEqual(self.pedir("GET", f"/contrasenias/{id_contrasenia}", token=token)[0], 404)
+
+    def test_etiquetas(self):
+        token = self.iniciar_sesion()
+        _, creada = self.pedir("POST", "/contrasenias", {
+            "servicio": "GitHub", "nombre_usuario_servicio": "ana", "contrasenia": "x"}, token=token)
+        id_contrasenia = creada["id_contrasenia"]
+        estado, etiqueta = self.pedir("POST", "/etiquetas", {"nombre": "trabajo"}, token=token)
+        self.assertEqual(estado, 201)
+        ruta = f"/contrasenias/{id_contrasenia}/etiquetas"
+        self.assertEqual(self.pedir("POST", ruta, {"id_etiqueta": etiqueta["id_etiqueta"]}, token=token)[0], 201)
+
+        _, etiquetadas = self.pedir("GET", "/contrasenias?etiquetas=trabajo", token=token)
+        self.assertEqual(etiquetadas["contrasenias"][0]["etiquetas"], ["trabajo"])
+        _, facetas = self.pedir("GET", "/etiquetas", token=token)
+        self.assertEqual(facetas["etiquetas"], [{"id_etiqueta": etiqueta["id_etiqueta"], "nombre": "trabajo", "cantidad": 1}])
+
+        self.assertEqual(self.pedir("DELETE", f"{ruta}/{etiqueta['id_etiqueta']}", token=token)[0], 200)
+        self.assertEqual(self.pedir("GET", "/etiquetas", token=token)[1], {"etiquetas": []})
+
+    def test_contrasenias_de_otro_usuario(self):
+        """Probar que un usuario no puede leer ni modificar las contraseñas de otro"""
+        token_ana = self.iniciar_sesion()
+        _, creada = self.pedir("POST", "/contrasenias", {
+            "servicio": "GitHub", "nombre_usuario_servicio": "ana", "contrasenia": "x"}, token=token_ana)
+        token_luis = self.iniciar_sesion("luis@example.com", "otra")
+        ruta = f"/contrasenias/{creada['id_contrasenia']}"
+        self.assertEqual(self.pedir("GET", ruta, token=token_luis)[0], 404)
+        self.assertEqual(self.pedir("DELETE", ruta, token=token_luis)[0], 404)
+        self.assertEqual(self.pedir("GET", "/contrasenias", token=token_luis)[1]["contrasenias"], [])
+
+    def test_pedidos_invalidos(self):
+        token = self.iniciar_sesion()
+        self.assertEqual(self.pedir("GET", "/nada", token=token)[0], 404)
+        self.assertEqual(self.pedir("PUT", "/contrasenias", {}, token=token)[0], 405)
+        self.assertEqual(self.pedir("PATCH", "/contrasenias", {}, token=token)[0], 405)
+        self.assertEqual(self.pedir("POST", "/contrasenias", {"servicio": "x"}, token=token)[0], 400)
+        self.assertEqual(self.pedir("GET", "/contrasenias?cursor=roto", token=token)[0], 400)
+
+    def test_sesiones_vencidas_se_cierran(self):
+        """Probar que el bucle del servidor cierra la sesión al vencer el token y la clave sale del llavero"""
+        ahora = [1000.0]
+        self.servidor.tokens = FirmaTokens(b"secreto", duracion=60, reloj=lambda: ahora[0])
+        token = self.iniciar_sesion()
+        id_usuario = int(token.split(".")[1])
+        self.pedir("DELETE", "/sesiones", token=self.iniciar_sesion("beto@example.com"))
+        time.sleep(0.6)  # Al menos una vuelta del bucle de serve_forever
+        self.assertIsNotNone(self.servidor.llavero.obtener(id_usuario))
+
+        ahora[0] += 61
+        limite = time.monotonic() + 5
+        while self.servidor.llavero.obtener(id_usuario) is not None:
+            self.assertLess(time.monotonic(), limite, "La sesión vencida no se cerró")
+            time.sleep(0.05)
+        ahora[0] -= 61
+        self.assertEqual(self.pedir("GET", "/contrasenias", token=token)[0], 401)
+        self.assertEqual(self.servidor.cerrar_sesiones_vencidas(), 0)
+
+    def test_errores_inesperados(self):
+        """Probar que un fallo que no es un error de uso responde 500 sin su detalle y se escribe en stderr"""
+        token = self.iniciar_sesion()
+        self.assertEqual(self.pedir("POST", "/usuarios", {"nombre_usuario": "ana", "email": "ana@example.com",
+                                                          "password": "otra"})[0], 400)  # Email repetido
+        stderr = io.StringIO()
+        with mock.patch.object(ManejadorAPI, "_listar_etiquetas", side_effect=KeyError("detalle interno")), \
+                contextlib.redirect_stderr(stderr):
+            estado, datos = self.pedir("GET", "/etiquetas", token=token)
+        self.assertEqual(estado, 500)
+        self.assertNotIn("detalle interno", datos["error"])
+        self.assertIn("detalle interno", stderr.getvalue())
+
+    def test_metricas(self):
+        self.assertEqual(self.pedir("GET", "/metricas")[0], 401)
+        token = self.iniciar_sesion()
+        self.assertEqual(self.pedir("GET", "/metricas", token=token)[0], 404)
+        INSTRUMENTACION.activar(self.servidor.contexto.engine)
+        try:
+            self.assertEqual(self.pedir("GET", "/metricas?formato=json")[0], 401)
+            self.iniciar_sesion()
+            estado, metricas = self.pedir("GET", "/metricas?formato=json", token=token)
+        finally:
+            INSTRUMENTACION.desactivar()
+            INSTRUMENTACION.reiniciar()
+        self.assertEqual(estado, 200)
+        self.assertEqual(metricas["metodos"]["UsuarioCRUD.iniciar_sesion"]["llamadas"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
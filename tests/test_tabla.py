@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from src.logica.CRUD import FilaListado
+from src.vista.tabla import FilasTabla, valores_fila, valores_filas
+
+
+class TreeviewFalso:
+    """Lo mínimo de ttk.Treeview que usa FilasTabla, contando las llamadas"""
+    def __init__(self):
+        self.items = []
+        self.valores = {}
+        self.llamadas = 0
+
+    def get_children(self, item=""):
+        return tuple(self.items)
+
+    def insert(self, padre, indice, iid, values):
+        self.llamadas += 1
+        self.items.insert(len(self.items) if indice == "end" else indice, iid)
+        self.valores[iid] = values
+        return iid
+
+    def item(self, iid, values):
+        self.llamadas += 1
+        self.valores[iid] = values
+
+    def move(self, iid, padre, indice):
+        self.llamadas += 1
+        self.items.remove(iid)
+        self.items.insert(indice, iid)
+
+    def delete(self, *iids):
+        self.llamadas += 1
+        for iid in iids:
+            self.items.remove(iid)
+            del self.valores[iid]
+
+
+def contrasenia(id_contrasenia, servicio, nota=None):
+    return SimpleNamespace(
+        id_contrasenia=id_contrasenia, servicio=servicio, nombre_usuario_servicio="yo",
+        contrasenia_encriptada="pw", fecha_creacion=datetime(2024, 1, 1), ultima_modificacion=None, nota=nota)
+
+
+class TestFilasTabla(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        self.tree = TreeviewFalso()
+        self.filas = FilasTabla(self.tree)
+        self.filas.reemplazar([contrasenia(i, f"Servicio {i:05d}") for i in range(0, 20000, 2)], orden="servicio")
+        self.tree.llamadas = 0
+
+    def test_insertar_en_su_posicion(self):
+        """Probar que una contraseña nueva se inserta en orden con una sola llamada a Tk"""
+        self.assertTrue(self.filas.insertar(contrasenia(20001, "Servicio 00003")))
+        self.assertEqual(self.tree.items[:3], ["0", "2", "20001"])
+        self.assertEqual(self.tree.valores["20001"][1], "Servicio 00003")
+        self.assertEqual(self.tree.llamadas, 1)
+
+    def test_insertar_despues_de_lo_cargado(self):
+        """Probar que no se muestra una fila que pertenece a una página aún no cargada"""
+        self.filas.hay_mas = True
+        self.assertFalse(self.filas.insertar(contrasenia(20001, "Zeta")))
+        self.assertNotIn(20001, self.filas)
+        self.filas.hay_mas = False
+        self.assertTrue(self.filas.insertar(contrasenia(20001, "Zeta")))
+        self.assertEqual(self.tree.items[-1], "20001")
+
+    def test_eliminar(self):
+        """Probar que eliminar quita solo esa fila"""
+        self.assertTrue(self.filas.eliminar(10))
+        self.assertFalse(self.filas.eliminar(11))
+        self.assertEqual(self.tree.items[:6], ["0", "2", "4", "6", "8", "12"])
+        self.assertEqual(len(self.filas), 9999)
+        self.assertEqual(self.tree.llamadas, 1)
+
+    def test_actualizar_mueve_la_fila(self):
+        """Probar que editar refresca los valores y mueve la fila si cambia su orden"""
+        self.assertTrue(self.filas.actualizar(contrasenia(4, "Servicio 00004", nota="nueva")))
+        self.assertEqual(self.tree.valores["4"][6], "nueva")
+        self.assertEqual(self.tree.llamadas, 1)
+
+        self.filas.actualizar(contrasenia(4, "AAA"))
+        self.assertEqual(self.tree.items[:2], ["4", "0"])
+        # Sigue en la lista de claves en su nueva posición
+        self.filas.eliminar(4)
+        self.assertEqual(self.tree.items[0], "0")
+
+    def test_resultados_de_busqueda(self):
+        """Probar que sin orden no se insertan filas nuevas pero sí se eliminan"""
+        self.filas.reemplazar([contrasenia(7, "B"), contrasenia(3, "A")])
+        self.assertEqual(self.tree.items, ["7", "3"])
+        self.assertFalse(self.filas.insertar(contrasenia(5, "C")))
+        self.assertTrue(self.filas.eliminar(7))
+        self.assertEqual(self.tree.items, ["3"])
+
+
+class TestValoresFilas(unittest.TestCase):
+    def test_igual_que_fila_por_fila(self):
+        """Probar que formatear por columnas da lo mismo que valores_fila, con entidades o proyecciones"""
+        entidades = [contrasenia(1, "A", nota="n"), contrasenia(2, "B")]
+        entidades[1].ultima_modificacion = datetime(2024, 3, 4, 5, 6, 7, 890)
+        proyecciones = [FilaListado(c.id_contrasenia, c.servicio, c.nombre_usuario_servicio, c.fecha_creacion,
+                                    c.ultima_modificacion, c.nota) for c in entidades]
+        esperado = [valores_fila(c) for c in entidades]
+        self.assertEqual(esperado[1][5], "2024-03-04 05:06:07")
+        self.assertEqual(valores_filas(entidades), esperado)
+        self.assertEqual(valores_filas(proyecciones), esperado)
+        self.assertEqual(valores_filas([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
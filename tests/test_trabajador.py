@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from sqlalchemy import create_engine
+from src.modelo.modelo import Base, Usuario
+from src.logica.CRUD import UsuarioCRUD
+from src.logica.trabajador import TrabajadorBD
+
+
+class TestTrabajadorBD(unittest.TestCase):
+    def setUp(self):
+        """Configuración antes de cada prueba"""
+        # Base en archivo: cada hilo del trabajador abre su propia conexión
+        self.directorio = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.directorio.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        self.trabajador = TrabajadorBD(self.engine)
+
+    def tearDown(self):
+        """Limpiar después de cada prueba"""
+        self.trabajador.detener()
+        self.engine.dispose()
+        self.directorio.cleanup()
+
+    def _esperar(self, plazo=5):
+        """Procesa resultados, como haría el bucle de Tk, hasta que no quede nada pendiente"""
+        limite = time.monotonic() + plazo
+        while self.trabajador.ocupado:
+            self.trabajador.procesar_resultados()
+            self.assertLess(time.monotonic(), limite, "El trabajador no terminó a tiempo")
+            time.sleep(0.005)
+
+    def test_resultado_llega_al_hilo_que_procesa(self):
+        """Probar que la operación corre en otro hilo y el callback en el que procesa los resultados"""
+        hilos = {}
+
+        def crear(session):
+            hilos["trabajo"] = threading.current_thread()
+            return UsuarioCRUD(session).create_usuario("user_test", "user_test@example.com", "hashed_password", "user")
+
+        def al_terminar(usuario):
+            hilos["callback"] = threading.current_thread()
+            hilos["nombre"] = usuario.nombre_usuario
+
+        self.trabajador.enviar(crear, al_terminar=al_terminar)
+        self._esperar()
+
+        self.assertIsNot(hilos["trabajo"], threading.current_thread())
+        self.assertIs(hilos["callback"], threading.current_thread())
+        # La entidad se puede leer tras el commit sin volver a la base de datos
+        self.assertEqual(hilos["nombre"], "user_test")
+
+    def test_errores_van_a_al_fallar(self):
+        """Probar que una excepción se entrega a al_fallar y la sesión sigue utilizable"""
+        errores = []
+        self.trabajador.enviar(lambda session: UsuarioCRUD(session).cerrar_sesion(999), al_fallar=errores.append)
+        usuarios = []
+        self.trabajador.enviar(lambda session: session.query(Usuario).count(), al_terminar=usuarios.append)
+        self._esperar()
+
+        self.assertEqual(len(errores), 1)
+        self.assertEqual(usuarios, [0])
+
+    def test_cada_trabajo_lee_datos_actuales(self):
+        """Probar que un trabajo no reutiliza las entidades que cargó el anterior"""
+        nombres = []
+        self.trabajador.enviar(lambda session: UsuarioCRUD(session).create_usuario(
+            "antes", "user_test@example.com", "hashed_password", "user").id_usuario, al_terminar=nombres.append)
+        self._esperar()
+        id_usuario = nombres.pop()
+        entidades = []  # La interfaz conserva la entidad: sigue en el mapa de identidad si la sesión no se cierra
+        self.trabajador.enviar(lambda session: session.get(Usuario, id_usuario), al_terminar=entidades.append)
+        self._esperar()
+        with self.engine.begin() as conexion:  # Otro proceso edita la fila
+            conexion.exec_driver_sql("UPDATE usuarios SET nombre_usuario = 'despues'")
+        self.trabajador.enviar(lambda session: session.get(Usuario, id_usuario).nombre_usuario, al_terminar=nombres.append)
+        self._esperar()
+
+        self.assertEqual(entidades[0].nombre_usuario, "antes")
+        self.assertEqual(nombres, ["despues"])
+
+    def test_trabajo_con_la_misma_clave_cancela_el_anterior(self):
+        """Probar que una recarga reemplaza a la que seguía en cola"""
+        liberar = threading.Event()
+        self.trabajador.enviar(lambda session: liberar.wait(5))  # Ocupa el hilo mientras se encolan las recargas
+        ejecutados, recibidos = [], []
+
+        def recarga(numero):
+            def funcion(session):
+                ejecutados.append(numero)
+                return numero
+            return funcion
+
+        self.trabajador.enviar(recarga(1), al_terminar=recibidos.append, clave="recarga")
+        self.trabajador.enviar(recarga(2), al_terminar=recibidos.append, clave="recarga")
+        liberar.set()
+        self._esperar()
+
+        self.assertEqual(ejecutados, [2])
+        self.assertEqual(recibidos, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()